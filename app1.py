@@ -1,22 +1,30 @@
 # -*- coding: utf-8 -*-
 import streamlit as st
+import os
 import urllib.request
 import urllib.parse
 import json
 import pandas as pd
 from datetime import datetime
-import base64
-from io import BytesIO
+from naver_cache import NaverResponseCache
+from documents import normalize_items, ENDPOINT_SOURCES
+from service import connect as connect_search_service, SEARCH_SERVICE_URL
+from result_pages import ResultPages, SearchPages
+from exports import EXPORT_FORMATS, export_bytes
+from thumbnails import ThumbnailCache
+from concurrent.futures import ThreadPoolExecutor
 
 class NaverApiClient:
-    def __init__(self, client_id, client_secret):  # 클라이언트 아이디와 시크릿키를 받아서 초기화하는 함수
+    def __init__(self, client_id, client_secret, cache=None, service=None):  # 클라이언트 아이디와 시크릿키를 받아서 초기화하는 함수
         self.client_id = client_id
         self.client_secret = client_secret
-        self.base_url = "https://openapi.naver.com/v1/search/"
+        self.base_url = os.environ.get("NAVER_API_BASE_URL", "https://openapi.naver.com/v1/search/")
+        self.cache = cache  # NaverResponseCache (None이면 매번 API 호출)
+        self.service = service  # 검색 서비스 클라이언트 (있으면 서비스의 공용 캐시를 거쳐 요청)
     
-    def get_data(self, media, count, query, start=1, sort="date"):
+    def fetch(self, media, count, query, start=1, sort="date"):
         """
-        네이버 API에서 데이터를 가져오는 메소드
+        네이버 API에서 데이터를 가져오는 메소드 (실패하면 예외 - 화면 없이 쓰는 백그라운드 페이지 요청용)
         
         Parameters:
         - media: 검색 미디어 타입 (news, blog, image 등)
@@ -25,6 +33,19 @@ class NaverApiClient:
         - start: 검색 시작 위치 (페이징용)
         - sort: 정렬 방식 (date, sim 등)
         """
+        if self.service is not None:
+            status, body = self.service.naver(media, query, count, start, sort, self.client_id, self.client_secret)
+            if status != 200:
+                raise RuntimeError(f"Error Code: {status}")
+            return body.decode('utf-8')
+        
+        # 같은 검색을 최근에 했으면 캐시된 응답 사용
+        cache_key = NaverResponseCache.make_key(media, query, count, start, sort)
+        if self.cache is not None:
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                return cached.decode('utf-8')
+        
         encText = urllib.parse.quote(query) # 검색어 인코딩
         url = f"{self.base_url}{media}?sort={sort}&display={count}&start={start}&query={encText}"
         
@@ -34,17 +55,19 @@ class NaverApiClient:
         request.add_header("X-Naver-Client-Secret", self.client_secret)
         
         # 응답
+        response = urllib.request.urlopen(request)
+        rescode = response.getcode()  # 응답 코드 확인 
+        if rescode != 200:
+            raise RuntimeError(f"Error Code: {rescode}")
+        response_body = response.read()  # 응답 본문 읽기 
+        if self.cache is not None:
+            self.cache.put(cache_key, response_body)
+        return response_body.decode('utf-8')  # utf-8 로 디코딩 한글로 예쁘게 출력 
+    
+    def get_data(self, media, count, query, start=1, sort="date"):
+        """fetch와 같지만 실패하면 화면에 오류를 표시하고 None"""
         try:
-            response = urllib.request.urlopen(request)
-            rescode = response.getcode()  # 응답 코드 확인 
-            
-            if(rescode==200):  # 정상 응답이면 
-                response_body = response.read()  # 응답 본문 읽기 
-                result = response_body.decode('utf-8')  # utf-8 로 디코딩 한글로 예쁘게 출력 
-                return result
-            else:
-                st.error(f"Error Code: {rescode}")
-                return None
+            return self.fetch(media, count, query, start, sort)
         except Exception as e:
             st.error(f"Exception occurred: {e}")
             return None
@@ -65,21 +88,57 @@ class NaverApiClient:
         """쇼핑 검색 결과를 가져오는 편의 메소드"""
         return self.get_data("shop", count, query, start, sort)
     
+    def page_fetcher(self, media, query, sort):
+        """ResultPages용 fetch(start, display) → 파싱된 응답 dict"""
+        def fetch(start, display):
+            return json.loads(self.fetch(media, display, query, start, sort))
+        return fetch
+    
     def parse_json(self, data):  # json 파일을 dictionary 형태로 변환하는 함수
         """API 응답을 JSON으로 파싱하는 메소드"""
         if data:
             return json.loads(data)
         return None
 
-#  csv 파일 다운로드 링크 생성 함수 
-def get_csv_download_link(df, filename):
-    """
-    데이터프레임을 CSV로 변환하고 다운로드 링크 생성
-    """
-    csv = df.to_csv(index=False, encoding='utf-8-sig') # 판다스 데이터 프레임을 csv 파일로 변환 
-    b64 = base64.b64encode(csv.encode('utf-8-sig')).decode()  # csv 파일을 base64 인코딩 
-    href = f'<a href="data:file/csv;base64,{b64}" download="{filename}">CSV 파일 다운로드</a>' # 링크 생성 
-    return href
+# 네이버 응답 캐시 (모든 세션이 공유)
+@st.cache_resource
+def get_naver_cache():
+    """프로세스 공용 네이버 응답 캐시"""
+    return NaverResponseCache.from_env()
+
+# 검색 서비스 (SEARCH_SERVICE_URL) - 연결되면 네이버 요청은 서비스가 처리 (다른 앱과 응답 캐시 공유)
+@st.cache_resource
+def get_search_service():
+    """프로세스 공용 검색 서비스 클라이언트 (미설정이거나 연결 실패면 None)"""
+    client, reason = connect_search_service(SEARCH_SERVICE_URL)
+    if client is None and SEARCH_SERVICE_URL:
+        st.warning(f"{reason} - 네이버 API를 직접 호출합니다.")
+    return client
+
+# 이미지 그리드 썸네일 캐시 (모든 세션이 공유)
+@st.cache_resource
+def get_thumbnail_cache():
+    return ThumbnailCache.from_env()
+
+# 다음 페이지 미리 가져오기용 스레드 (모든 세션이 공유)
+@st.cache_resource
+def get_prefetch_executor():
+    return ThreadPoolExecutor(max_workers=4, thread_name_prefix="page-prefetch")
+
+def items_frame(items, search_type):
+    """응답 항목을 HTML 태그/엔티티가 정리된 데이터프레임으로"""
+    records = normalize_items(items, ENDPOINT_SOURCES[search_type])  # HTML 태그/엔티티 정리는 한 번만
+    df = pd.DataFrame(items)
+    if 'title' in df.columns:
+        df['title'] = [record.title for record in records]
+    if 'description' in df.columns:
+        df['description'] = [record.description for record in records]
+    return df
+
+def page_frames(pages, search_type, first, last):
+    """first~last 페이지를 한 페이지씩 데이터프레임으로 (내보내기용 - 캐시에 없는 페이지만 새로 가져옴)"""
+    for page in range(first, last + 1):
+        yield items_frame(pages.page(page), search_type)
 
 # 화면 개발 
 def main():
@@ -96,7 +155,7 @@ def main():
         client_secret = st.text_input("Client Secret", value="HWYWOFBEYH", type="password")
     
     # 네이버 API 클라이언트 생성
-    naver_client = NaverApiClient(client_id, client_secret)
+    naver_client = NaverApiClient(client_id, client_secret, cache=get_naver_cache(), service=get_search_service())
     
     # 검색 설정 UI
     col1, col2 = st.columns(2) # 두 개의 열을 생성하여 화면을 나누어 줌
@@ -110,7 +169,7 @@ def main():
         search_type = search_type[1]  # news, blog, image, shop 중 하나를 선택하여 실제값 추출
         
         query = st.text_input("검색어:", value="빙그레 바나나 우유")
-        count = st.slider("결과 수:", min_value=1, max_value=100, value=50)
+        count = st.slider("페이지당 결과 수:", min_value=1, max_value=100, value=50)
     
     with col2: # 두번째 열의 검색 옵션을 설정
         sort_options = st.selectbox(
@@ -119,107 +178,113 @@ def main():
             format_func=lambda x: x[0] # 옵션의 첫번째 요소를 화면에 표시(최신순, 정확도순)
         )
         sort_options = sort_options[1]  # date, sim 중 하나를 선택하여 sort_options 에 할당
-        
-        start_page = st.slider("시작 위치:", min_value=1, max_value=100, value=1)
     
-    # 검색 버튼
+    # 검색 버튼 → 이 조건의 페이지 캐시를 탐색 대상으로 (같은 조건을 다시 검색하면 캐시된 페이지 그대로 사용)
+    search_pages = st.session_state.setdefault("search_pages", SearchPages())
     if st.button("검색", type="primary"): # type="primary" ? 강조된 스타일의 버튼, secondary ? 일반 버튼
         st.session_state.search_clicked = True # 검색 버튼 클릭 시 세션 상태를 True 로 설정
-        
+        browse_key = (query, search_type, sort_options, count)
+        pages = search_pages.get(browse_key, lambda: ResultPages(
+            naver_client.page_fetcher(search_type, query, sort_options), count, get_prefetch_executor()))
         with st.spinner(f"'{query}' 검색 중... 잠시만 기다려주세요"):
-            # 검색 타입에 따라 적절한 메소드 호출
-            if search_type == 'news':
-                data = naver_client.get_news(query, count, start_page, sort_options)
-            elif search_type == 'blog':
-                data = naver_client.get_blog(query, count, start_page, sort_options)
-            elif search_type == 'shop':
-                data = naver_client.get_shop(query, count, start_page, sort_options)
-            else:  # image
-                data = naver_client.get_image(query, count, start_page, sort_options)
-            
-            # 결과 파싱 및 표시(json 파일을 dictionary 형태로 변환)
-            parsed_data = naver_client.parse_json(data)
-            
-            if parsed_data:
-                # 결과 저장
-                st.session_state.search_results = parsed_data # 검색 결과를 세션 상태에 저장
-                
-                # 결과 표시 (검색 타입에 따라 다르게)
-                st.subheader(f"검색 결과 (총 {parsed_data['total']}개 중 {len(parsed_data['items'])}개 표시)")
-                
-                if search_type == 'image': # 이미지 검색 결과일 경우 
-                    # 이미지 그리드 형태로 표시
-                    image_cols = 4
-                    for i in range(0, len(parsed_data['items']), image_cols):
-                        cols = st.columns(image_cols)
-                        for j in range(image_cols):
-                            if i+j < len(parsed_data['items']):
-                                item = parsed_data['items'][i+j]
-                                with cols[j]:
-                                    st.image(item['thumbnail'], use_container_width=True)
-                                    st.markdown(item['title'].replace("<b>", "").replace("</b>", ""))
-                                    st.markdown(f"[원본 링크]({item['link']})")
-                else:
-                    # 뉴스나 블로그, 쇼핑은 테이블 형태로 표시
-                    df = pd.DataFrame(parsed_data['items'])
-                    # 불필요한 HTML 태그 제거
-                    for col in ['title', 'description']:
-                        if col in df.columns:
-                            df[col] = df[col].str.replace('<b>', '').str.replace('</b>', '').str.replace('&quot;', '"')
-                    
-                    # 필요한 열만 선택하여 표시
-                    if search_type == 'news':
-                        display_cols = ['title', 'description', 'pubDate', 'link']
-                    elif search_type == 'shop':
-                        display_cols = ['title','link','image','lprice','hprice','mallname','productname']
-                    else:  # blog
-                        display_cols = ['title', 'description', 'postdate', 'link', 'bloggername']
-                    
-                    # 가능한 열만 선택
-                    display_cols = [col for col in display_cols if col in df.columns]
-                    
-                    # 테이블 표시
-                    st.dataframe(df[display_cols], use_container_width=True)
-                    
-                    # 파일 내보내기 (타임스탬프 생성)
-                    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-                    
-                    # 검색 타입에 따라 파일명 접두어 설정
-                    type_prefix = {
-                        'news': 'news',
-                        'blog': 'blog',
-                        'shop': 'shopping',
-                        'image': 'image'
-                    }.get(search_type, 'naver')
-                    
-                    base_filename = f"{type_prefix}_{timestamp}"
-
-                    # 버튼을 나란히 배치하기 위한 컬럼 생성
-                    col_export1, col_export2 = st.columns(2)
+            try:
+                pages.page(0)
+            except Exception as e:
+                search_pages.pop(browse_key)
+                st.error(f"Exception occurred: {e}")
+                pages = None
+        if pages is not None and pages.total:
+            st.session_state.browse_key = browse_key
+            st.session_state.page_number = 1
+        else:
+            st.session_state.browse_key = None
+            st.error("검색 결과가 없거나 오류가 발생했습니다.")
+    
+    browse_key = st.session_state.get("browse_key")
+    if browse_key:
+        render_results(search_pages.find(browse_key), browse_key)
 
-                    with col_export1:
-                        # CSV 다운로드 버튼
-                        csv_filename = f"{base_filename}.csv"
-                        st.download_button(
-                            label="CSV 내보내기",
-                            data=df.to_csv(index=False, encoding='utf-8-sig').encode('utf-8-sig'),
-                            file_name=csv_filename,
-                            mime='text/csv',
-                        )
+def render_results(pages, browse_key):
+    """현재 페이지만 표시하고, 내보내기는 고른 페이지 범위를 캐시된 페이지에서 이어 붙임"""
+    if pages is None:  # 오래되어 세션 캐시에서 밀려난 검색
+        st.session_state.browse_key = None
+        return
+    query, search_type, sort_options, count = browse_key
+    page_count = pages.page_count
+    page_number = st.number_input("페이지:", min_value=1, max_value=page_count, step=1, key="page_number")
+    try:
+        items = pages.page(page_number - 1)  # 다음 페이지는 백그라운드에서 미리 가져옴
+    except Exception as e:
+        st.error(f"Exception occurred: {e}")
+        return
+    
+    st.subheader(f"검색 결과 (총 {pages.total}개 중 {pages.start_of(page_number - 1)}~"
+                 f"{pages.start_of(page_number - 1) + len(items) - 1}번째, {page_number}/{page_count} 페이지)")
+    
+    if search_type == 'image': # 이미지 검색 결과일 경우 
+        records = normalize_items(items, ENDPOINT_SOURCES[search_type])
+        # 썸네일은 서버에서 그리드 크기로 줄여 캐시한 것을 넘김 (실패한 것만 원래 URL)
+        thumbnails = get_thumbnail_cache().get_many([record.image for record in records])
+        # 이미지 그리드 형태로 표시
+        image_cols = 4
+        for i in range(0, len(items), image_cols):
+            cols = st.columns(image_cols)
+            for j in range(image_cols):
+                if i+j < len(items):
+                    record = records[i+j]
+                    with cols[j]:
+                        st.image(thumbnails[i+j] or record.image, use_container_width=True)
+                        st.markdown(record.title)
+                        st.markdown(f"[원본 링크]({record.url})")
+        return
+    
+    # 뉴스나 블로그, 쇼핑은 테이블 형태로 표시
+    df = items_frame(items, search_type)
+    
+    # 필요한 열만 선택하여 표시
+    if search_type == 'news':
+        display_cols = ['title', 'description', 'pubDate', 'link']
+    elif search_type == 'shop':
+        display_cols = ['title','link','image','lprice','hprice','mallname','productname']
+    else:  # blog
+        display_cols = ['title', 'description', 'postdate', 'link', 'bloggername']
+    
+    # 가능한 열만 선택
+    display_cols = [col for col in display_cols if col in df.columns]
+    
+    # 테이블 표시
+    st.dataframe(df[display_cols], use_container_width=True)
+    
+    # 내보낼 페이지 범위 (기본은 현재 페이지)
+    if page_count > 1:
+        first_page, last_page = st.slider("내보낼 페이지:", min_value=1, max_value=page_count,
+                                          value=(page_number, page_number))
+    else:
+        first_page, last_page = 1, 1
+    
+    # 파일 내보내기 (타임스탬프 생성)
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    
+    # 검색 타입에 따라 파일명 접두어 설정
+    type_prefix = {
+        'news': 'news',
+        'blog': 'blog',
+        'shop': 'shopping',
+        'image': 'image'
+    }.get(search_type, 'naver')
+    
+    base_filename = f"{type_prefix}_{timestamp}_p{first_page}-{last_page}"
 
-                    with col_export2:
-                        # JSON 다운로드 버튼
-                        json_filename = f"{base_filename}.json"
-                        # 데이터프레임을 JSON으로 변환 (한글 인코딩 처리)
-                        json_data = df.to_json(orient='records', force_ascii=False, indent=4)
-                        st.download_button(
-                            label="JSON 내보내기",
-                            data=json_data,
-                            file_name=json_filename,
-                            mime='application/json',
-                        )
-            else:
-                st.error("검색 결과가 없거나 오류가 발생했습니다.")
+    # 형식마다 버튼 하나 - 파일은 버튼을 누를 때 페이지 단위로 이어 써서 만듦
+    for col_export, fmt in zip(st.columns(len(EXPORT_FORMATS)), EXPORT_FORMATS):
+        label, extension, mime, _ = EXPORT_FORMATS[fmt]
+        with col_export:
+            st.download_button(
+                label=label,
+                data=lambda fmt=fmt: export_bytes(fmt, page_frames(pages, search_type, first_page - 1, last_page - 1)),
+                file_name=f"{base_filename}.{extension}",
+                mime=mime,
+            )
 
 if __name__ == "__main__":
     main()
@@ -3,27 +3,33 @@ import json
 import os
 import tempfile
 from datetime import datetime
-from supabase import create_client
+from storage import open_store
 import numpy as np
 # from openai import OpenAI  # 이 줄 제거
-from sentence_transformers import SentenceTransformer  # 추가
 import dotenv
-import re
+from documents import normalize_item, clean_html, embedding_tag
+from embedding_server import connect as connect_embedding_server, EMBEDDING_SERVER_URL
 
 # 환경 변수 로드
 dotenv.load_dotenv()
 
-# Supabase 클라이언트 초기화
-supabase_url = os.environ.get("SUPABASE_URL")
-supabase_key = os.environ.get("SUPABASE_KEY")
-supabase = create_client(supabase_url, supabase_key)
+# 문서 저장소 초기화 (STORAGE_BACKEND: supabase 또는 local)
+document_store = open_store(os.environ.get("SUPABASE_URL"), os.environ.get("SUPABASE_KEY"))
 
 # Sentence Transformer 모델 초기화 (무료)
+EMBEDDING_MODEL_NAME = 'sentence-transformers/all-mpnet-base-v2'
+
 @st.cache_resource
 def load_embedding_model():
-    """임베딩 모델 로드 (1536차원으로 변경)"""
+    """임베딩 모델 로드 (1536차원으로 변경) - 같은 모델의 임베딩 서버가 있으면 서버 사용"""
+    if EMBEDDING_SERVER_URL:
+        client, reason = connect_embedding_server(EMBEDDING_MODEL_NAME, EMBEDDING_SERVER_URL)
+        if client is not None:
+            return client
+        st.warning(f"{reason} - 로컬 모델을 로딩합니다.")
+    from sentence_transformers import SentenceTransformer  # 로컬 모델이 필요할 때만 import
     # 1536차원을 생성하는 더 큰 모델 사용
-    return SentenceTransformer('sentence-transformers/all-mpnet-base-v2')
+    return SentenceTransformer(EMBEDDING_MODEL_NAME)
 
 # 모델 로드 (이 부분이 누락되어 있었습니다!)
 embedding_model = load_embedding_model()
@@ -44,12 +50,6 @@ def generate_embedding(text):
     
     return embedding_list[:1536]  # 정확히 1536차원만 반환
 
-def clean_html_tags(text):
-    """HTML 태그 제거"""
-    if not text:
-        return ""
-    return re.sub(r'<.*?>', '', text)
-
 def detect_naver_api_type(data):
     """네이버 API 응답 타입 감지 (블로그, 쇼핑, 뉴스)"""
     if not isinstance(data, dict) or 'items' not in data:
@@ -98,71 +98,64 @@ def process_json_file(file_path, collection_name=None, source_type=None):
     # 처리된 문서 수 카운트
     doc_count = 0
     
-    # 각 항목 처리
+    # 각 항목 처리 (HTML 정리와 필드 추출은 normalize_item에서 한 번만)
     for i, item in enumerate(items):
+        record = normalize_item(item, source_type)
+        
         # 소스 타입별로 다른 필드 처리
         if source_type == "블로그":
-            title = clean_html_tags(item.get('title', ''))
-            content = clean_html_tags(item.get('description', ''))
-            full_content = title + " " + content
+            full_content = record.title + " " + record.description
             
             metadata = {
-                "title": title,
+                "title": record.title,
                 "collection": source_type,
                 "collected_at": datetime.now().isoformat(),
-                "url": item.get('link', ''),
-                "date": item.get('postdate', ''),
-                "bloggername": item.get('bloggername', ''),
-                "bloggerlink": item.get('bloggerlink', '')
+                "url": record.url,
+                "date": record.date,
+                "bloggername": record.author,
+                "bloggerlink": record.author_url
             }
             
         elif source_type == "쇼핑":
-            title = clean_html_tags(item.get('title', ''))
-            content = clean_html_tags(item.get('description', item.get('category3', '')))
-            full_content = title + " " + content
+            full_content = record.title + " " + (clean_html(item.get('description')) or record.description)
             
             # 가격 정보 숫자로 변환
-            price = item.get('lprice', '')
             try:
-                price = int(price)
+                price = int(record.lprice)
             except (ValueError, TypeError):
                 price = None
                 
             metadata = {
-                "title": title,
+                "title": record.title,
                 "collection": source_type,
                 "collected_at": datetime.now().isoformat(),
-                "url": item.get('link', ''),
+                "url": record.url,
                 "price": price,
-                "maker": item.get('maker', ''),
-                "brand": item.get('brand', ''),
-                "mallName": item.get('mallName', ''),
-                "productId": item.get('productId', ''),
-                "productType": item.get('productType', '')
+                "maker": record.maker,
+                "brand": record.brand,
+                "mallName": record.mall_name,
+                "productId": record.product_id,
+                "productType": record.product_type
             }
             
         elif source_type == "뉴스":
-            title = clean_html_tags(item.get('title', ''))
-            content = clean_html_tags(item.get('description', ''))
-            full_content = title + " " + content
+            full_content = record.title + " " + record.description
             
             metadata = {
-                "title": title,
+                "title": record.title,
                 "collection": source_type,
                 "collected_at": datetime.now().isoformat(),
-                "url": item.get('link', item.get('originallink', '')),
-                "date": item.get('pubDate', ''),
-                "publisher": item.get('publisher', '')
+                "url": record.url or record.original_url,
+                "date": record.date,
+                "publisher": record.publisher
             }
             
         else:
             # 기본 처리 (타입이 불분명한 경우)
-            title = clean_html_tags(item.get('title', ''))
-            content = clean_html_tags(item.get('description', item.get('content', '')))
-            full_content = title + " " + content
+            full_content = record.title + " " + (record.description or clean_html(item.get('content', '')))
             
             metadata = {
-                "title": title,
+                "title": record.title,
                 "collection": source_type if source_type else "general",
                 "collected_at": datetime.now().isoformat()
             }
@@ -171,17 +164,18 @@ def process_json_file(file_path, collection_name=None, source_type=None):
             if 'link' in item:
                 metadata['url'] = item['link']
             
-        # 임베딩 생성 (무료 모델 사용)
+        # 임베딩 생성 (무료 모델 사용) - 어떤 모델 벡터인지 태그
         embedding = generate_embedding(full_content)
+        metadata.update(embedding_tag(EMBEDDING_MODEL_NAME))
         
-        # Supabase에 데이터 삽입
+        # 저장소에 데이터 삽입
         data = {
             'content': full_content,
             'embedding': embedding,
             'metadata': metadata
         }
         
-        supabase.table('documents').insert(data).execute()
+        document_store.insert(data)
         doc_count += 1
     
     return collection_name, doc_count, source_type
@@ -228,8 +222,7 @@ if uploaded_file is not None:
                 
                 # 데이터베이스 상태 표시
                 try:
-                    result = supabase.table('documents').select('id', count='exact').execute()
-                    doc_count_total = result.count if hasattr(result, 'count') else len(result.data)
+                    doc_count_total = document_store.count()
                     st.write(f"데이터베이스 총 문서 수: {doc_count_total}개")
                 except Exception as e:
                     st.warning(f"데이터베이스 상태 확인 중 오류: {str(e)}")
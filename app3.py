@@ -2,8 +2,10 @@ import streamlit as st
 import os
 import json
 import numpy as np
-from supabase import create_client
+from storage import open_store, STORAGE_BACKEND
 from openai import OpenAI
+from documents import parse_metadata, is_embedded_with, include_untagged_for
+from service import connect as connect_search_service, SEARCH_SERVICE_URL
 
 # 페이지 구성
 st.set_page_config(page_title="전자담배 시맨틱 검색", layout="wide")
@@ -27,16 +29,16 @@ except Exception as e:
         st.stop()
 
 # API 키 확인
-if not supabase_url or not supabase_key or not openai_api_key:
+if (STORAGE_BACKEND == "supabase" and (not supabase_url or not supabase_key)) or not openai_api_key:
     st.error("필요한 API 키가 설정되지 않았습니다.")
     st.stop()
 
-# Supabase 클라이언트 초기화
+# 문서 저장소 초기화 (STORAGE_BACKEND: supabase 또는 local)
 try:
-    supabase = create_client(supabase_url, supabase_key)
-    st.sidebar.success("Supabase 연결 성공!")
+    document_store = open_store(supabase_url, supabase_key)
+    st.sidebar.success("Supabase 연결 성공!" if document_store.backend == "supabase" else "로컬 저장소 사용")
 except Exception as e:
-    st.error(f"Supabase 연결 중 오류가 발생했습니다: {str(e)}")
+    st.error(f"문서 저장소 연결 중 오류가 발생했습니다: {str(e)}")
     st.stop()
 
 # OpenAI 클라이언트 초기화
@@ -47,15 +49,28 @@ except Exception as e:
     st.error(f"OpenAI 연결 중 오류가 발생했습니다: {str(e)}")
     st.stop()
 
+# 검색 서비스 (SEARCH_SERVICE_URL) - 연결되면 임베딩/벡터 검색은 서비스가 처리
+@st.cache_resource
+def get_search_service():
+    """프로세스 공용 검색 서비스 클라이언트 (미설정이거나 연결 실패면 None)"""
+    client, reason = connect_search_service(SEARCH_SERVICE_URL)
+    if client is None and SEARCH_SERVICE_URL:
+        st.sidebar.warning(f"{reason} - 직접 검색합니다.")
+    return client
+
+search_service = get_search_service()
+
 # chatGPT 임베딩 모델 설정
 # chatGPT 임베딩 모델은 영어에 최적화되어있다. 그리고 과금 이슈가 있다.
 # 한국어 무료 임베딩을 더 추천합니다.
+EMBEDDING_MODEL_NAME = "text-embedding-3-small"
+
 def generate_embedding(text):
     """텍스트에서 OpenAI 임베딩 생성"""
     try:
         response = openai_client.embeddings.create(
             input=text,
-            model="text-embedding-3-small"
+            model=EMBEDDING_MODEL_NAME
         )
         return response.data[0].embedding
     except Exception as e:
@@ -67,35 +82,49 @@ def generate_embedding(text):
 # semantic_search(시멘틱 검색어, 출력 결과 수, 유사도 임계값 )
 def semantic_search(query_text, limit=10, match_threshold=0.5):
     """시맨틱 검색 수행"""
+    if search_service is not None:
+        try:
+            return search_service.search(query_text, limit=limit, match_threshold=match_threshold, embedding="openai")
+        except Exception as e:
+            st.sidebar.warning(f"검색 서비스 실패, 직접 검색합니다: {str(e)}")
     try:
         # 쿼리 텍스트에 대한 임베딩 생성
         query_embedding = generate_embedding(query_text)
         
         # RPC를 통한 벡터 검색 (Supabase에 match_documents RPC 함수가 있는 경우)
         try:
-            response = supabase.rpc(
-                'match_documents', 
-                {
-                    'query_embedding': query_embedding,
-                    'match_threshold': match_threshold,
-                    'match_count': limit
-                }
-            ).execute()
+            # 다른 모델 벡터를 걸러낸 뒤에도 충분하도록 limit * 5개
+            matched = document_store.match(query_embedding, match_threshold, limit * 5)
             
-            if response.data and len(response.data) > 0:
+            # 쿼리와 같은 임베딩 모델로 만든 문서만 사용
+            rows = [r for r in matched if is_embedded_with(parse_metadata(r.get('metadata')), EMBEDDING_MODEL_NAME, include_untagged=include_untagged_for(EMBEDDING_MODEL_NAME))]
+            # RPC가 됐으면 전체 스캔은 하지 않음 (같은 임계값/모델 필터라 결과도 같음)
+            if matched and not rows:
+                st.warning(f"인덱스에 {EMBEDDING_MODEL_NAME} 모델로 만든 벡터가 없습니다 "
+                           f"(유사 문서 {len(matched)}개가 모두 다른 임베딩 모델). "
+                           f"이 모델로 임베딩해 저장한 문서가 있어야 검색할 수 있습니다.")
+            else:
                 st.sidebar.success("RPC 검색 성공!")
-                return response.data
+            return rows[:limit]
         except Exception as e:
             st.sidebar.warning(f"RPC 검색 실패, 대체 방법으로 검색합니다: {str(e)}")
         
         # 백업 방법: 모든 문서를 가져와서 클라이언트 측에서 유사도 계산
         st.sidebar.info("데이터베이스에서 문서를 가져오는 중...")
-        result = supabase.table('documents').select('id, content, metadata, embedding').execute()
+        documents = []
+        while True:
+            page = document_store.scan(documents[-1]['id'] if documents else 0, 1000,
+                                       columns=('id', 'content', 'metadata', 'embedding'))
+            documents.extend(page)
+            if len(page) < 1000:
+                break
         
-        st.sidebar.info(f"총 {len(result.data)}개의 문서에서 유사도 계산 중...")
+        st.sidebar.info(f"총 {len(documents)}개의 문서에서 유사도 계산 중...")
         results = []
         
-        for item in result.data:
+        for item in documents:
+            if not is_embedded_with(parse_metadata(item.get('metadata')), EMBEDDING_MODEL_NAME, include_untagged=include_untagged_for(EMBEDDING_MODEL_NAME)):
+                continue
             if 'embedding' in item and item['embedding'] is not None:
                 try:
                     # 임베딩 데이터 타입 확인 및 변환
@@ -180,7 +209,7 @@ if st.button("검색", key="search_button"):
                         similarity = result['similarity'] * 100  # 백분율로 변환
                         
                         # 메타데이터에서 정보 추출
-                        metadata = result.get('metadata', {})
+                        metadata = parse_metadata(result.get('metadata'))
                         title = metadata.get('title', '제목 없음')
                         
                         # 블로그 URL 추출 (메타데이터 구조에 따라 다르게 처리)
@@ -217,8 +246,7 @@ if st.button("검색", key="search_button"):
 # 데이터베이스 상태
 st.sidebar.title("데이터베이스 상태")
 try:
-    result = supabase.table('documents').select('id', count='exact').execute()
-    doc_count = result.count if hasattr(result, 'count') else len(result.data)
+    doc_count = document_store.count()
     st.sidebar.info(f"저장된 문서 수: {doc_count}개")
 except Exception as e:
     st.sidebar.error("데이터베이스 상태를 확인할 수 없습니다.")
@@ -0,0 +1,8 @@
+# -*- coding: utf-8 -*-
+"""로컬 대역(Naver / Supabase / OpenAI) 기반 재현 가능한 벤치마크
+
+실행:
+    python -m benchmarks.run --sizes 1000,10000,100000
+
+리포트는 BENCH_REPORT 경로(없으면 임시 디렉터리의 naver-bench-report.json)에 저장됩니다 (--output으로 변경).
+"""
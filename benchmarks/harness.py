@@ -0,0 +1,129 @@
+# -*- coding: utf-8 -*-
+"""벤치마크 실행 환경 구성: 대역 서버 시작, 환경 변수 설정, 앱 모듈 로딩"""
+import importlib
+import logging
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import types
+
+from benchmarks.standins import NaverStandin, SupabaseStandin, OpenAIStandin, HashingEmbeddingModel
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# supabase 클라이언트가 형식만 검사하는 가짜 JWT
+STANDIN_SUPABASE_KEY = "eyJhbGciOiJIUzI1NiJ9.eyJyb2xlIjoiYW5vbiJ9.standin"
+
+class Standins:
+    """세 개의 로컬 대역 서버 묶음"""
+
+    def __init__(self, naver_latency_ms=0, db_latency_ms=0, openai_latency_ms=0, naver_total_per_query=1000):
+        self.naver = NaverStandin(total_per_query=naver_total_per_query, latency_ms=naver_latency_ms)
+        self.supabase = SupabaseStandin(latency_ms=db_latency_ms)
+        self.openai = OpenAIStandin(latency_ms=openai_latency_ms)
+
+    def env(self):
+        """앱들이 대역 서버를 보도록 하는 환경 변수"""
+        return {
+            "SUPABASE_URL": self.supabase.url,
+            "SUPABASE_KEY": STANDIN_SUPABASE_KEY,
+            "OPENAI_API_KEY": "sk-standin",
+            "OPENAI_BASE_URL": self.openai.base_url,
+            "NAVER_CLIENT_ID": "standin-id",
+            "NAVER_CLIENT_SECRET": "standin-secret",
+            "NAVER_API_BASE_URL": self.naver.base_url,
+        }
+
+    def counters(self):
+        counters = {}
+        for server in (self.naver, self.supabase, self.openai):
+            counters.update(server.snapshot())
+        return counters
+
+    def reset_counters(self):
+        for server in (self.naver, self.supabase, self.openai):
+            server.reset_counters()
+
+    def close(self):
+        for server in (self.naver, self.supabase, self.openai):
+            server.close()
+
+def install_hashing_model():
+    """sentence_transformers 대신 결정적 해싱 모델을 쓰도록 등록 (모델 다운로드/GPU 없이 재현 가능)"""
+    module = types.ModuleType("sentence_transformers")
+    module.SentenceTransformer = HashingEmbeddingModel
+    sys.modules["sentence_transformers"] = module
+
+def quiet_streamlit_logs():
+    """bare mode에서 반복되는 ScriptRunContext 경고 숨기기"""
+    for name in list(logging.root.manager.loggerDict):
+        if name.startswith("streamlit"):
+            logging.getLogger(name).setLevel(logging.ERROR)
+
+def load_apps(standins, names=("total", "app2", "app3"), real_model=False):
+    """대역 서버 환경에서 앱 모듈을 import (Streamlit bare mode로 UI 코드는 그대로 실행됨)"""
+    os.environ.update(standins.env())
+    os.environ.setdefault("METRICS_PORT", "0")  # 메트릭 엔드포인트는 빈 포트에 띄움
+    os.environ.setdefault("STREAMLIT_GLOBAL_SHOW_WARNING_ON_DIRECT_EXECUTION", "false")
+    # 답변 warm-up은 시나리오가 직접 실행 (백그라운드 GPT 호출이 다른 시나리오 카운터에 섞이지 않도록)
+    os.environ.setdefault("ANSWER_WARMUP", "0")
+    warmup_dir = tempfile.mkdtemp(prefix="bench-warmup-")
+    os.environ.setdefault("WARMUP_DB", os.path.join(warmup_dir, "warmup.sqlite3"))
+    os.environ.setdefault("QUERY_LOG", os.path.join(warmup_dir, "query_log.jsonl"))
+    os.environ.setdefault("JOB_DB", os.path.join(warmup_dir, "jobs.sqlite3"))
+    os.environ.setdefault("JOB_WORKERS", "0")  # 수집 작업자는 시나리오가 직접 띄움
+    os.environ.setdefault("REFRESH_STATE", os.path.join(warmup_dir, "refresh_state.json"))
+    os.environ.setdefault("URL_BLOOM", os.path.join(warmup_dir, "url_bloom.npz"))
+    os.environ.setdefault("PRICE_HISTORY_PATH", os.path.join(warmup_dir, "price_history"))
+    import streamlit  # noqa: F401
+    quiet_streamlit_logs()
+    if not real_model:
+        install_hashing_model()
+    if REPO_ROOT not in sys.path:
+        sys.path.insert(0, REPO_ROOT)
+
+    apps = {}
+    for name in names:
+        if name in sys.modules:
+            apps[name] = importlib.reload(sys.modules[name])
+        else:
+            apps[name] = importlib.import_module(name)
+    quiet_streamlit_logs()
+    return apps
+
+# 검색 서비스 프로세스 부트스트랩: sentence_transformers 대신 호출당 비용이 있는 해싱 모델로 service.main 실행
+_SERVICE_BOOTSTRAP = (
+    "import sys, types\n"
+    "from benchmarks.standins import SimulatedCostModel\n"
+    "module = types.ModuleType('sentence_transformers')\n"
+    "module.SentenceTransformer = SimulatedCostModel\n"
+    "sys.modules['sentence_transformers'] = module\n"
+    "import service\n"
+    "sys.exit(service.main(sys.argv[1:]))\n"
+)
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def start_service_process(standins, log_path, env=None):
+    """대역 서버를 보는 검색 서비스를 별도 프로세스로 시작 - (process, url). 준비되면 반환"""
+    from service import connect
+    port = free_port()
+    with open(log_path, "ab") as log:
+        process = subprocess.Popen([sys.executable, "-c", _SERVICE_BOOTSTRAP, "--port", str(port)], cwd=REPO_ROOT,
+                                   env={**os.environ, **standins.env(), **(env or {})}, stdout=log, stderr=log)
+    url = f"http://127.0.0.1:{port}"
+    deadline = time.time() + 60
+    while True:
+        client, reason = connect(url)
+        if client is not None:
+            return process, url
+        if process.poll() is not None or time.time() > deadline:
+            process.kill()
+            raise RuntimeError(f"검색 서비스 프로세스 시작 실패: {reason} (로그: {log_path})")
+        time.sleep(0.1)
@@ -0,0 +1,1863 @@
+# -*- coding: utf-8 -*-
+"""벤치마크 시나리오 실행 및 JSON 리포트 작성
+
+예:
+    python -m benchmarks.run                                  # 1k/10k/100k 전체 시나리오
+    python -m benchmarks.run --sizes 1000 --scenarios semantic_search_total
+    python -m benchmarks.run --output base.json && python -m benchmarks.run --compare base.json  # 기존 리포트와 처리량 비교
+
+리포트는 실행한 머신에 따라 달라지므로 저장소에 넣지 않습니다 (기본 경로: BENCH_REPORT, 없으면 임시 디렉터리).
+"""
+import argparse
+import contextlib
+import io
+import json
+import math
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+from datetime import datetime
+
+import numpy as np
+
+from benchmarks.harness import Standins, load_apps, start_service_process, REPO_ROOT
+from documents import build_document, normalize_items, embedding_tag
+from benchmarks.standins import make_naver_item, hashing_embedding, HashingEmbeddingModel, SimulatedCostModel
+
+DEFAULT_SIZES = [1000, 10000, 100000]
+DEFAULT_OUTPUT = os.environ.get("BENCH_REPORT", os.path.join(tempfile.gettempdir(), "naver-bench-report.json"))
+
+SOURCE_TYPES = ["블로그", "뉴스", "쇼핑"]
+ENDPOINTS = {"블로그": "blog", "뉴스": "news", "쇼핑": "shop"}
+
+QUERIES = [
+    "가성비 좋은 전자담배 추천해 주세요.",
+    "전자담배 액상 추천해주세요.",
+    "입호흡과 폐호흡 전자담배 차이점이 뭐예요?",
+    "전자담배 초보자가 알아야 할 꿀팁이 뭐가 있나요?",
+    "전자담배 관련 최신 규제나 이슈가 있나요?",
+    "전자담배 코일 교체 주기",
+    "멘솔 액상 후기",
+    "전자담배 세금 인상 뉴스",
+    "청소년 전자담배 판매 규제",
+    "배터리 오래가는 전자담배 기기",
+]
+
+# ---------------------------------------------------------------------------
+# 측정 도우미
+# ---------------------------------------------------------------------------
+
+def latency_stats(samples):
+    """지연 시간 샘플(초) 요약 (ms)"""
+    if not samples:
+        return {}
+    ms = np.asarray(samples) * 1000
+    return {
+        "mean": round(float(ms.mean()), 3),
+        "p50": round(float(np.percentile(ms, 50)), 3),
+        "p95": round(float(np.percentile(ms, 95)), 3),
+        "p99": round(float(np.percentile(ms, 99)), 3),
+        "max": round(float(ms.max()), 3),
+    }
+
+def timed_calls(fn, args_list):
+    """fn(*args)를 순서대로 실행하며 호출별 지연 시간과 결과 수집"""
+    latencies = []
+    results = []
+    started = time.perf_counter()
+    for args in args_list:
+        t0 = time.perf_counter()
+        results.append(fn(*args))
+        latencies.append(time.perf_counter() - t0)
+    return time.perf_counter() - started, latencies, results
+
+def document_text(source_type, item):
+    """수집 작업(ingest)과 같은 형식의 저장 텍스트/메타데이터"""
+    return build_document(item, source_type)
+
+def seed_corpus(store, size, embed, tag=None):
+    """size개 문서를 세 소스 타입에 고르게 나눠 저장소에 직접 적재 (tag: 임베딩 모델 태그)"""
+    store.reset()
+    batch = []
+    for position in range(size):
+        source_type = SOURCE_TYPES[position % len(SOURCE_TYPES)]
+        item = make_naver_item(ENDPOINTS[source_type], QUERIES[position % len(QUERIES)], position // len(QUERIES) + 1)
+        text, metadata = document_text(source_type, item)
+        if tag:
+            metadata.update(tag)
+        batch.append({"content": text, "metadata": metadata, "embedding": embed(text)})
+        if len(batch) >= 5000:
+            store.seed(batch)
+            batch = []
+    store.seed(batch)
+
+def padded_local_embedding(model):
+    """total.py와 같은 방식(768 → 1536 제로 패딩)의 로컬 임베딩 함수"""
+    def embed(text):
+        vector = np.asarray(model.encode(text), dtype=np.float32)
+        return np.concatenate([vector, np.zeros(1536 - len(vector), dtype=np.float32)])
+    return embed
+
+# ---------------------------------------------------------------------------
+# 시나리오
+# ---------------------------------------------------------------------------
+
+def collect(total, query, source_type, count):
+    """total.py 화면의 '데이터 수집 및 저장' 작업(run_collect_job)을 바로 실행 - 수집 요약 반환"""
+    return total.run_collect_job({"source_type": source_type, "query": query, "count": count}, lambda **progress: None)
+
+def scenario_ui_collect(ctx, size):
+    """total.run_collect_job: 네이버 수집(응답 캐시/single-flight) → 묶음 임베딩 → 중복 확인 → 저장 (size개 문서)"""
+    total = ctx.apps["total"]
+    ctx.reset_store()
+    total.naver_cache.clear()
+    calls = []
+    for i in range(math.ceil(size / 100)):
+        source_type = SOURCE_TYPES[i % len(SOURCE_TYPES)]
+        calls.append((total, f"전자담배 수집 {i}", source_type, min(100, size - i * 100)))
+    seconds, latencies, results = timed_calls(collect, calls)
+    saved = sum(r["saved"] for r in results)
+    return {"ops": len(calls), "items": saved, "seconds": seconds, "latencies": latencies}
+
+def scenario_batch_ingest(ctx, size):
+    """ingest.run: ui_collect와 같은 양을 병렬 수집 + 배치 임베딩/저장으로 처리 (중단 후 재개 확인 포함)"""
+    import ingest
+    total = ctx.apps["total"]
+    ctx.reset_store()
+    jobs = [(SOURCE_TYPES[i % len(SOURCE_TYPES)], f"전자담배 수집 {i}") for i in range(math.ceil(size / 1000))]
+    with tempfile.TemporaryDirectory() as tmp:
+        checkpoint_path = os.path.join(tmp, "checkpoint.json")
+        stats = ingest.Stats()
+        fetcher = ingest.NaverFetcher("standin-id", "standin-secret", stats, base_url=ctx.standins.naver.base_url)
+        t0 = time.perf_counter()
+        summary, errors = ingest.run(jobs, total.embedding_model, total.document_store, fetcher,
+                                     ingest.Checkpoint(checkpoint_path), stats, max_items=min(size, 1000), progress=False,
+                                     model_name=total.embedding_model_name)
+        seconds = time.perf_counter() - t0
+
+        # 같은 체크포인트로 다시 실행하면 네이버 요청 없이 끝나야 함
+        before = ctx.standins.naver.snapshot()
+        rerun_stats = ingest.Stats()
+        fetcher.stats = rerun_stats
+        ingest.run(jobs, total.embedding_model, total.document_store, fetcher, ingest.Checkpoint(checkpoint_path),
+                   rerun_stats, max_items=min(size, 1000), progress=False, model_name=total.embedding_model_name)
+        resumed_requests = sum(ctx.standins.naver.snapshot().values()) - sum(before.values())
+    if errors or summary["saved"] != size or resumed_requests:
+        raise AssertionError(f"배치 수집 결과 이상: saved={summary['saved']}, errors={errors}, resumed_requests={resumed_requests}")
+    return {"ops": summary["pages"], "items": summary["saved"], "seconds": seconds, "latencies": [seconds],
+            "checks": {"saved": summary["saved"], "embed_seconds": summary["embed_seconds"],
+                       "write_seconds": summary["write_seconds"], "resumed_naver_requests": resumed_requests}}
+
+def scenario_process_json_file(ctx, size):
+    """app2.process_json_file: 네이버 JSON 파일 size건 임베딩 및 저장"""
+    app2 = ctx.apps["app2"]
+    ctx.reset_store()
+    items = [make_naver_item("blog", "전자담배 파일", position) for position in range(1, size + 1)]
+    with tempfile.NamedTemporaryFile("w", suffix=".json", delete=False, encoding="utf-8") as f:
+        json.dump({"total": size, "start": 1, "display": size, "items": items}, f, ensure_ascii=False)
+        path = f.name
+    try:
+        seconds, latencies, results = timed_calls(app2.process_json_file, [(path, f"bench_{size}", "블로그")])
+    finally:
+        os.unlink(path)
+    return {"ops": 1, "items": results[0][1], "seconds": seconds, "latencies": latencies}
+
+def scenario_semantic_search_total(ctx, size):
+    """total.semantic_search: 소스 타입별 쿼리 임베딩 + match_documents RPC + 필터링"""
+    total = ctx.apps["total"]
+    ctx.ensure_corpus("total", size)
+    calls = [(q, source_type, 10, 0.4) for source_type in SOURCE_TYPES for q in QUERIES[:ctx.queries]]
+    seconds, latencies, results = timed_calls(total.semantic_search, calls)
+    return {"ops": len(calls), "items": sum(len(r) for r in results), "seconds": seconds, "latencies": latencies}
+
+def scenario_semantic_search_app3(ctx, size):
+    """app3.semantic_search: OpenAI 임베딩 + match_documents RPC"""
+    app3 = ctx.apps["app3"]
+    ctx.ensure_corpus("app3", size)
+    calls = [(q, 10, 0.1) for q in QUERIES[:ctx.queries]]
+    seconds, latencies, results = timed_calls(app3.semantic_search, calls)
+
+    # 다른 모델로만 임베딩된 인덱스: RPC 결과가 모델 필터로 비어도 전체 스캔으로 넘어가지 않음
+    total = ctx.apps["total"]
+    seed_corpus(ctx.standins.supabase, size, lambda text: hashing_embedding(text, 1536), embedding_tag(total.embedding_model_name))
+    ctx.standins.reset_counters()
+    other_model = [app3.semantic_search(q, 10, 0.1) for q in QUERIES[:2]]
+    scans = ctx.standins.supabase.snapshot().get("db.select", 0)
+    # 태그 없는 기존 행: 기본은 제외, EMBEDDING_UNTAGGED_MODEL을 total 모델로 지정하면 total.py 행만 포함 (app2 행은 collected_at으로 제외)
+    import documents
+    seed_corpus(ctx.standins.supabase, size, padded_local_embedding(total.embedding_model))
+    for i, row in enumerate(ctx.standins.supabase.rows):
+        if i % 2:
+            row["metadata"]["collected_at"] = "2025-01-01T00:00:00"
+    legacy = {}
+    untagged_model = documents.UNTAGGED_EMBEDDING_MODEL
+    try:
+        for label, model in (("default", ""), ("opt_in", total.embedding_model_name)):
+            documents.UNTAGGED_EMBEDDING_MODEL = model
+            legacy[label] = total.semantic_search(QUERIES[0], "블로그", 10, 0.4)
+    finally:
+        documents.UNTAGGED_EMBEDDING_MODEL = untagged_model
+    ctx._corpus = None
+    if any(other_model) or scans:
+        raise AssertionError(f"다른 모델 인덱스에서 결과가 나오거나 전체 스캔함: {sum(map(len, other_model))}개, select {scans}회")
+    if legacy["default"] or not legacy["opt_in"] or any("collected_at" in r["metadata"] for r in legacy["opt_in"]):
+        raise AssertionError(f"태그 없는 기존 행 처리 이상: 기본 {len(legacy['default'])}개, 지정 {len(legacy['opt_in'])}개")
+    return {"ops": len(calls), "items": sum(len(r) for r in results), "seconds": seconds, "latencies": latencies,
+            "checks": {"other_model_selects": scans, "legacy_untagged_results": {k: len(v) for k, v in legacy.items()}}}
+
+def scenario_generate_answer_with_gpt(ctx, size):
+    """total.generate_answer_with_gpt: 컨텍스트 구성 + GPT 호출 (검색 시간 제외)"""
+    total = ctx.apps["total"]
+    ctx.ensure_corpus("total", size)
+    calls = []
+    for source_type in SOURCE_TYPES:
+        for q in QUERIES[:ctx.queries]:
+            calls.append((q, total.semantic_search(q, source_type, 10, 0.4), source_type))
+    ctx.standins.reset_counters()
+    seconds, latencies, results = timed_calls(total.generate_answer_with_gpt, calls)
+
+    # 구분자와 잘라낸 문서의 말줄임표까지 포함해 컨텍스트가 토큰 예산을 넘지 않는지 (작은 예산에서 잘림 유도)
+    from context_builder import build_context, count_tokens
+    checks = {"truncated": 0, "over_budget": 0}
+    for q, search_results, source_type in calls:
+        for budget in (200, 500, 1000):
+            context, _, stats = build_context(
+                search_results, lambda rank, result, content: total.format_context_entry(rank, result, content, source_type),
+                token_budget=budget)
+            checks["truncated"] += stats["truncated"]
+            if count_tokens(context) > budget or stats["context_tokens"] != count_tokens(context):
+                checks["over_budget"] += 1
+    if checks["over_budget"]:
+        raise AssertionError(f"컨텍스트가 토큰 예산을 넘음: {checks}")
+    return {"ops": len(calls), "items": len(results), "seconds": seconds, "latencies": latencies, "checks": checks}
+
+class _NoCoalescing:
+    """single-flight 비교용: 항상 직접 실행"""
+
+    def do(self, key, fn, *args, **kwargs):
+        return fn(*args, **kwargs)
+
+def concurrent_burst(fn, args, sessions):
+    """sessions개 스레드가 동시에 fn(*args) 호출 (같은 프리셋 버튼 동시 클릭 흉내)"""
+    barrier = threading.Barrier(sessions)
+    latencies = [None] * sessions
+    results = [None] * sessions
+
+    def session(i):
+        barrier.wait()
+        t0 = time.perf_counter()
+        results[i] = fn(*args)
+        latencies[i] = time.perf_counter() - t0
+
+    threads = [threading.Thread(target=session, args=(i,)) for i in range(sessions)]
+    t0 = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return time.perf_counter() - t0, latencies, results
+
+def scenario_single_flight_burst(ctx, size, sessions=8):
+    """total.py 동시 세션 burst: 같은 질문의 수집/검색/답변 업스트림 호출이 한 번으로 합쳐지는지 확인"""
+    total = ctx.apps["total"]
+    ctx.ensure_corpus("total", size)
+    query, source_type = QUERIES[0], "블로그"
+
+    def ask():
+        results = total.semantic_search(query, source_type, 10, 0.4)
+        return total.generate_answer_with_gpt(query, results, source_type)
+
+    def collect_same():
+        return collect(total, f"{query} 동시 수집", source_type, 20)
+
+    # 업스트림 지연이 있어야 동시 호출이 겹침
+    servers = (ctx.standins.naver, ctx.standins.supabase, ctx.standins.openai)
+    saved_latency = [server.latency_ms for server in servers]
+    for server in servers:
+        server.latency_ms = max(server.latency_ms, 50)
+    flight = total.single_flight
+    upstream = {}
+    try:
+        for label, coalescer in (("without", _NoCoalescing()), ("with", flight)):
+            total.single_flight = coalescer
+            total.naver_cache.clear()
+            ctx.standins.reset_counters()
+            concurrent_burst(collect_same, (), sessions)
+            naver_calls = ctx.standins.naver.snapshot().get("naver.blog", 0)
+            ctx.standins.reset_counters()
+            seconds, latencies, answers = concurrent_burst(ask, (), sessions)
+            counters = ctx.standins.counters()
+            upstream[label] = {"naver": naver_calls, "rpc": counters.get("db.rpc.match_documents", 0),
+                               "chat": counters.get("openai.chat", 0)}
+    finally:
+        total.single_flight = flight
+        for server, latency in zip(servers, saved_latency):
+            server.latency_ms = latency
+
+    # 검색은 검색어 변형마다 RPC 한 번
+    expected = {"naver": 1, "rpc": len(total.query_variants(query, source_type)), "chat": 1}
+    if upstream["with"] != expected or len(set(answers)) != 1:
+        raise AssertionError(f"동시 호출이 합쳐지지 않았습니다: {upstream}")
+    return {"ops": sessions, "items": sessions, "seconds": seconds, "latencies": latencies,
+            "checks": {"sessions": sessions, "upstream_without": upstream["without"], "upstream_with": upstream["with"]}}
+
+def scenario_naver_cache(ctx, size):
+    """네이버 응답 캐시: total/app1 반복 검색이 API를 다시 부르지 않는지, 디스크 캐시가 재시작 후에도 쓰이는지 확인"""
+    import app1
+    from naver_cache import NaverResponseCache
+    total = ctx.apps["total"]
+    ctx.reset_store()
+    total.naver_cache.clear()
+    repeats = 5
+    calls = [(f"전자담배 캐시 {i}", SOURCE_TYPES[i % 3], 20) for i in range(min(size // 100, 10)) for _ in range(repeats)]
+    seconds, latencies, results = timed_calls(collect, [(total,) + call for call in calls])
+    total_requests = sum(v for k, v in ctx.standins.naver.snapshot().items() if k != "naver.429")
+
+    with tempfile.TemporaryDirectory() as cache_dir:
+        client = app1.NaverApiClient("standin-id", "standin-secret", cache=NaverResponseCache(disk_dir=cache_dir))
+        ctx.standins.reset_counters()
+        for _ in range(repeats):
+            client.get_shop("전자담배 캐시 app1", 50, 1, "sim")
+        restarted = app1.NaverApiClient("standin-id", "standin-secret", cache=NaverResponseCache(disk_dir=cache_dir))
+        restarted.get_shop("전자담배 캐시 app1", 50, 1, "sim")
+        app1_requests = ctx.standins.naver.snapshot().get("naver.shop", 0)
+
+    expected = len(calls) // repeats
+    if total_requests != expected or app1_requests != 1:
+        raise AssertionError(f"캐시 미적중: total {total_requests}/{expected}, app1 {app1_requests}/1")
+    return {"ops": len(calls), "items": sum(r["items"] for r in results), "seconds": seconds, "latencies": latencies,
+            "checks": {"searches": len(calls), "naver_requests_total": total_requests, "naver_requests_app1": app1_requests}}
+
+_LEGACY_TAG = '<[^<]+?>'
+
+def legacy_display_path(items, source_type):
+    """정규화 레코드 도입 전 total.py의 수집+표+펼침 경로 (아이템마다 HTML 정리를 여러 번 반복)"""
+    import re
+    rows = []
+    for item in items:
+        # search_naver_api
+        title = re.sub(_LEGACY_TAG, '', item.get('title', '')) if item.get('title') else '제목 없음'
+        content = re.sub(_LEGACY_TAG, '', item.get('description', '')) if item.get('description') else ''
+        publisher = item.get('originallink', '').replace('https://', '').replace('http://', '').split('/')[0] if item.get('originallink') else ''
+        metadata = {'title': title, 'url': item.get('link', ''), 'publisher': publisher, 'date': item.get('pubDate', ''), 'collection': source_type}
+        full_text = f"뉴스 제목: {title}\n뉴스 내용: {content}\n언론사: {publisher}\n날짜: {item.get('pubDate', '')}\n분류: 뉴스 기사"
+        # 표
+        title = re.sub(_LEGACY_TAG, '', item.get('title', '')) if item.get('title') else '제목 없음'
+        description = re.sub(_LEGACY_TAG, '', item.get('description', '')) if item.get('description') else ''
+        publisher = item.get('originallink', '').replace('https://', '').replace('http://', '').split('/')[0] if item.get('originallink') else ''
+        rows.append({'제목': title, '내용 미리보기': description[:100] + "..." if len(description) > 100 else description, '언론사': publisher})
+        # 펼침
+        title = re.sub(_LEGACY_TAG, '', item.get('title', '')) if item.get('title') else '제목 없음'
+        description = re.sub(_LEGACY_TAG, '', item.get('description', '')) if item.get('description') else ''
+        publisher = item.get('originallink', '').replace('https://', '').replace('http://', '').split('/')[0]
+    return rows
+
+def record_display_path(items, source_type):
+    """현재 경로: 한 번 정규화한 레코드를 수집/표/펼침에서 재사용"""
+    records = normalize_items(items, source_type)
+    for record in records:
+        record.to_document()
+    rows = [record.display_row() for record in records]
+    for record in records:
+        (record.display_title, record.description, record.publisher)
+    return rows
+
+def scenario_item_display(ctx, size):
+    """아이템 정규화 마이크로벤치마크: 뉴스 size건의 수집+표+펼침 처리 CPU 시간 (기존 방식 대비)"""
+    items = [make_naver_item("news", "전자담배 <b>표시</b>", position) for position in range(1, size + 1)]
+    timings = {}
+    for label, fn in (("legacy", legacy_display_path), ("record", record_display_path)):
+        samples = []
+        for _ in range(5):
+            t0 = time.process_time()
+            fn(items, "뉴스")
+            samples.append(time.process_time() - t0)
+        timings[label] = min(samples)
+    seconds = timings["record"]
+    return {"ops": size, "items": size, "seconds": seconds, "latencies": [seconds / size],
+            "checks": {"legacy_us_per_item": round(timings["legacy"] / size * 1e6, 3),
+                       "record_us_per_item": round(timings["record"] / size * 1e6, 3),
+                       "speedup": round(timings["legacy"] / timings["record"], 2) if timings["record"] else None}}
+
+def scenario_reembed_migration(ctx, size):
+    """reembed.run: 모델이 섞인 말뭉치를 초당 행 수 제한으로 재임베딩하며 같은 시간 검색 지연 측정"""
+    import reembed
+    total = ctx.apps["total"]
+    store = ctx.standins.supabase
+    ctx.reset_store()
+    # 절반은 태그 없음(기존 행), 절반은 다른 모델 태그 - 둘 다 검색에서 제외되어야 함
+    other = embedding_tag("sentence-transformers/all-mpnet-base-v2")
+    seed_corpus(store, size, lambda text: hashing_embedding(text + " 다른 모델", 1536))
+    for i, row in enumerate(store.rows):
+        if i % 2:
+            row["metadata"].update(other)
+    before = sum(len(total.semantic_search(q, "블로그", 10, 0.1)) for q in QUERIES[:ctx.queries])
+
+    idle_seconds, idle_latencies, _ = timed_calls(total.semantic_search, [(q, "블로그", 10, 0.4) for q in QUERIES[:ctx.queries]] * 3)
+
+    rows_per_second = max(500, size / 4)   # 크기와 관계없이 약 4초 안에 끝나도록
+    stop = threading.Event()
+    state = {}
+    def migrate():
+        state.update(reembed.run(total.embedding_model, total.embedding_model_name, total.document_store,
+                                 batch_size=64, rows_per_second=rows_per_second, stop_event=stop, progress=False))
+    t0 = time.perf_counter()
+    worker = threading.Thread(target=migrate, name="reembed")
+    worker.start()
+    busy_latencies = []
+    while worker.is_alive():
+        _, latencies, _ = timed_calls(total.semantic_search, [(q, "블로그", 10, 0.4) for q in QUERIES[:ctx.queries]])
+        busy_latencies.extend(latencies)
+    worker.join()
+    seconds = time.perf_counter() - t0
+
+    tagged = sum(1 for row in store.rows if row["metadata"].get("embedding_model") == total.embedding_model_name)
+    after = sum(len(total.semantic_search(q, "블로그", 10, 0.1)) for q in QUERIES[:ctx.queries])
+    if before or tagged != size or not after or seconds < size / rows_per_second * 0.9:
+        raise AssertionError(f"재임베딩 결과 이상: before={before}, tagged={tagged}/{size}, after={after}, seconds={seconds:.2f}")
+    return {"ops": size, "items": state.get("migrated", 0), "seconds": seconds, "latencies": busy_latencies,
+            "checks": {"results_before": before, "results_after": after, "tagged": tagged,
+                       "rows_per_second_limit": rows_per_second, "rows_per_second_actual": round(size / seconds, 1),
+                       "search_p50_ms_idle": latency_stats(idle_latencies)["p50"],
+                       "search_p50_ms_during": latency_stats(busy_latencies)["p50"]}}
+
+PROJECTION_DIMS = [32, 64, 128, 256]
+
+def exact_top_k(matrix, queries, k=10):
+    """정규화된 행렬에서 코사인 상위 k개 id (쿼리별)"""
+    scores = queries @ matrix.T
+    top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    order = np.take_along_axis(scores, top, axis=1).argsort(axis=1)[:, ::-1]
+    return np.take_along_axis(top, order, axis=1)
+
+def recall_at_k(found, truth):
+    k = truth.shape[1]
+    return float(np.mean([len(set(f[:k]) & set(t)) / k for f, t in zip(found, truth)]))
+
+def l2_normalize(x):
+    x = np.asarray(x, dtype=np.float32)
+    return x / np.maximum(np.linalg.norm(x, axis=1, keepdims=True), 1e-12)
+
+def projection_corpora(ctx, size, num_queries=100):
+    """(이름, 코퍼스 벡터, 쿼리 벡터): 파이프라인 임베딩 모델 결과 + 실제 문장 임베딩처럼 고유값이 빠르게 줄어드는 합성 벡터"""
+    model = ctx.apps["total"].embedding_model
+    texts = []
+    for position in range(size):
+        source_type = SOURCE_TYPES[position % len(SOURCE_TYPES)]
+        item = make_naver_item(ENDPOINTS[source_type], QUERIES[position % len(QUERIES)], position // len(QUERIES) + 1)
+        texts.append(document_text(source_type, item)[0])
+    rng = np.random.default_rng(0)
+    query_texts = [texts[i] + " 추천 후기" for i in rng.choice(size, num_queries, replace=False)]
+    model_corpus = model.encode(texts, batch_size=256, convert_to_numpy=True, show_progress_bar=False)
+    model_queries = model.encode(query_texts, convert_to_numpy=True, show_progress_bar=False)
+
+    native = model_corpus.shape[1]
+    scales = np.arange(1, native + 1, dtype=np.float32) ** -0.8
+    rotation, _ = np.linalg.qr(rng.standard_normal((native, native)).astype(np.float32))
+    synthetic = (rng.standard_normal((size + num_queries, native)).astype(np.float32) * scales) @ rotation
+    return [("model", model_corpus, model_queries), ("synthetic", synthetic[:size], synthetic[size:])]
+
+def scenario_projection_recall(ctx, size):
+    """projection: 축소 차원별 recall@10 (전체 차원 정확 검색 대비), 벡터당 바이트, 검색 지연"""
+    from projection import fit_pca, truncation, Projection
+    checks = {}
+    latencies = []
+    started = time.perf_counter()
+    for name, corpus, queries in projection_corpora(ctx, size):
+        full = l2_normalize(corpus)
+        q_full = l2_normalize(queries)
+        truth = exact_top_k(full, q_full)
+        t0 = time.perf_counter()
+        exact_top_k(full, q_full)
+        rows = {"full": {"dim": full.shape[1], "bytes_per_vector": full.shape[1] * 4, "recall@10": 1.0,
+                         "search_ms_per_query": round((time.perf_counter() - t0) / len(q_full) * 1000, 4)}}
+        sample = corpus[np.random.default_rng(1).choice(len(corpus), min(len(corpus), 20000), replace=False)]
+        for dim in PROJECTION_DIMS:
+            for method in ("pca", "truncate"):
+                projection = fit_pca(sample, dim, "bench") if method == "pca" else truncation(dim, "bench")
+                with tempfile.NamedTemporaryFile(suffix=".npz", delete=False) as f:
+                    path = f.name
+                try:
+                    projection.save(path)
+                    reloaded = Projection.load(path)
+                finally:
+                    os.unlink(path)
+                if reloaded.version != projection.version:
+                    raise AssertionError(f"투영 버전 불일치: {projection.version} != {reloaded.version}")
+                reduced = reloaded.transform(corpus)
+                q_reduced = reloaded.transform(queries)
+                t0 = time.perf_counter()
+                found = exact_top_k(reduced, q_reduced)
+                elapsed = time.perf_counter() - t0
+                latencies.append(elapsed / len(q_reduced))
+                rows[f"{method}{dim}"] = {"dim": dim, "bytes_per_vector": dim * 4, "recall@10": round(recall_at_k(found, truth), 4),
+                                         "search_ms_per_query": round(elapsed / len(q_reduced) * 1000, 4)}
+        checks[name] = rows
+    return {"ops": len(latencies), "items": size, "seconds": time.perf_counter() - started, "latencies": latencies, "checks": checks}
+
+def scenario_pq_index(ctx, size):
+    """pq_index: PQ/OPQ 인덱스 recall@10, 쿼리당 지연(QPS), 코드 메모리 (정확 검색 대비) + total.semantic_search 로컬 경로"""
+    from pq_index import PQIndex
+    checks = {}
+    latencies = []
+    started = time.perf_counter()
+    with tempfile.TemporaryDirectory() as directory:
+        for name, corpus, queries in projection_corpora(ctx, size):
+            full = l2_normalize(corpus)
+            q_full = l2_normalize(queries)
+            truth = exact_top_k(full, q_full)
+            t0 = time.perf_counter()
+            for q in q_full:   # PQ와 같은 조건으로 쿼리 하나씩
+                exact_top_k(full, q[None, :])
+            exact_seconds = (time.perf_counter() - t0) / len(q_full)
+            rows = {"exact": {"bytes": int(full.nbytes), "qps": round(1 / exact_seconds, 1), "recall@10": 1.0}}
+            for opq in (False, True):
+                t0 = time.perf_counter()
+                index = PQIndex.build(os.path.join(directory, f"{name}-{opq}"), corpus, np.arange(len(corpus)), opq=opq)
+                build_seconds = time.perf_counter() - t0
+                for rerank in (0, 100):
+                    found = []
+                    t0 = time.perf_counter()
+                    for q in queries:
+                        found.append(index.search(q, k=10, rerank=rerank)[0])
+                    elapsed = (time.perf_counter() - t0) / len(queries)
+                    latencies.append(elapsed)
+                    rows[f"{'opq' if opq else 'pq'}{index.codec.m}_rerank{rerank}"] = {
+                        "bytes": index.code_bytes(), "memory_ratio": round(full.nbytes / index.code_bytes(), 1),
+                        "qps": round(1 / elapsed, 1), "recall@10": round(recall_at_k(np.asarray(found), truth), 4),
+                        "build_seconds": round(build_seconds, 2)}
+            checks[name] = rows
+            best = rows[f"opq{index.codec.m}_rerank100"]["recall@10"]
+            if best < 0.8:
+                raise AssertionError(f"{name}: OPQ + 재정렬 recall@10이 너무 낮음 ({best})")
+
+        # total.semantic_search가 로컬 인덱스로 RPC와 같은 결과를 내는지 확인
+        # 인덱스는 앞쪽 절반으로만 빌드 - 나머지(빌드 뒤 저장된 문서)는 검색 때 저장소에서 읽어 추가분으로 붙어야 함
+        total = ctx.apps["total"]
+        ctx.ensure_corpus("total", size)
+        store = ctx.standins.supabase
+        n = len(store)
+        built = n // 2
+        dim = total.embedding_model.get_sentence_embedding_dimension()
+        index = PQIndex.build(os.path.join(directory, "store"), store._matrix[:built, :dim], np.arange(1, built + 1),
+                              model_name=total.embedding_model_name, version=total.current_embedding_version)
+        calls = [(q, source_type, 10, 0.4) for source_type in SOURCE_TYPES for q in QUERIES[:ctx.queries]]
+        rpc_results = [total.semantic_search(*call) for call in calls]
+        rpc_before = store.snapshot().get("db.rpc.match_documents", 0)
+        total.vector_index = index
+        try:
+            local_results = [total.semantic_search(*call) for call in calls]
+            newest = total.match_documents_local(store._matrix[n - 1, :dim], 0.5, 1)
+        finally:
+            total.vector_index = None
+        checks["appended_after_build"] = index.appended
+        if index.appended != n - built or index.scanned_id != n or not newest or newest[0]["id"] != n:
+            raise AssertionError(f"빌드 뒤 저장된 문서가 인덱스에 반영되지 않음: 추가 {index.appended}/{n - built}, "
+                                 f"읽은 id {index.scanned_id}/{n}, 최신 문서 검색 {newest[:1]}")
+        if store.snapshot().get("db.rpc.match_documents", 0) != rpc_before:
+            raise AssertionError("로컬 인덱스 경로에서 match_documents RPC가 호출됨")
+        overlap = [len({r["id"] for r in a} & {r["id"] for r in b}) / max(1, len(a))
+                   for a, b in zip(rpc_results, local_results) if a]
+        checks["semantic_search_overlap"] = round(float(np.mean(overlap)), 4) if overlap else None
+        if overlap and np.mean(overlap) < 0.8:
+            raise AssertionError(f"로컬 인덱스 검색 결과가 RPC와 다름 (overlap={np.mean(overlap):.2f})")
+
+        # pq_index 명령행 빌드: 저장소를 페이지로 읽어 미리 잡은 float32 배열에 채움
+        import pq_index
+        import storage
+        output = os.path.join(directory, "cli")
+        open_store = storage.open_store
+        storage.open_store = lambda: total.document_store
+        try:
+            with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()):
+                code = pq_index.main(["--output", output, "--model", total.embedding_model_name,
+                                      "--version", total.current_embedding_version, "--dim", str(dim), "--page-size", "257"])
+        finally:
+            storage.open_store = open_store
+        cli = PQIndex.load(output)
+        checks["cli_build_rows"] = len(cli)
+        if code != 0 or len(cli) != n or not np.array_equal(cli.ids, np.arange(1, n + 1)):
+            raise AssertionError(f"pq_index 명령행 빌드 결과가 저장소와 다름: {len(cli)}/{n}행")
+    return {"ops": len(latencies), "items": size, "seconds": time.perf_counter() - started, "latencies": latencies, "checks": checks}
+
+FACET_BENCH_ROWS = 1_000_000
+
+def synthetic_facets(n, seed=0):
+    """(가격, 판매처 키, 브랜드 키) n건 - 판매처 2000곳/브랜드 500개, 몇몇 값에 몰리는 분포"""
+    rng = np.random.default_rng(seed)
+    prices = np.round(np.exp(rng.uniform(np.log(3000), np.log(500000), n)), -2).astype(np.int64)
+    prices[rng.random(n) < 0.02] = -1   # 가격 없는 상품
+    malls = np.minimum(rng.zipf(1.3, n), 2000) - 1
+    brands = np.minimum(rng.zipf(1.5, n), 500) - 1
+    return prices, malls, brands
+
+def scenario_shop_facets(ctx, size):
+    """facets: 100만 상품 패싯 필터 지연/메모리 (전수 비교로 정확성 확인) + total.semantic_search 가격 필터"""
+    from facets import FacetIndex
+    n = FACET_BENCH_ROWS
+    prices, malls, brands = synthetic_facets(n)
+    index = FacetIndex()
+    t0 = time.perf_counter()
+    index.add_arrays(np.arange(1, n + 1), [None if p < 0 else p for p in prices.tolist()],
+                     [f"mall{m}" for m in malls.tolist()], [f"brand{b}" for b in brands.tolist()])
+    index.filter(price_max=0)   # 컴파일
+    build_seconds = time.perf_counter() - t0
+
+    cases = {
+        "price_range": ({"price_min": 10000, "price_max": 30000}, (prices >= 10000) & (prices <= 30000)),
+        "popular_mall": ({"malls": ["mall0"]}, malls == 0),
+        "rare_malls": ({"malls": ["mall500", "mall1500"]}, (malls == 500) | (malls == 1500)),
+        "price_mall_brand": ({"price_max": 50000, "malls": ["mall0", "mall1", "mall7"], "brands": ["brand0", "brand2"]},
+                             (prices >= 0) & (prices <= 50000) & np.isin(malls, [0, 1, 7]) & np.isin(brands, [0, 2])),
+    }
+    latencies = []
+    checks = {"rows": n, "build_seconds": round(build_seconds, 2), "index_mb": round(index.nbytes() / 1e6, 1)}
+    for name, (filters, expected) in cases.items():
+        samples = []
+        for _ in range(20):
+            t0 = time.perf_counter()
+            found = index.filter(**filters)
+            samples.append(time.perf_counter() - t0)
+        if not np.array_equal(found, np.flatnonzero(expected) + 1):
+            raise AssertionError(f"패싯 필터 결과 불일치: {name} ({len(found)} != {int(expected.sum())})")
+        latencies.extend(samples)
+        checks[name] = {"matched": len(found), "p50_ms": latency_stats(samples)["p50"]}
+
+    # 검색 경로: 가격 상한을 주면 결과가 모두 조건을 만족해야 함
+    total = ctx.apps["total"]
+    ctx.ensure_corpus("total", size)
+    total.facet_index = FacetIndex()
+    price_cap = 50000
+    under_cap = lambda rows: sum(1 for r in rows if 0 <= (r["metadata"].get("price_min") or -1) <= price_cap)
+    unfiltered = filtered = 0
+    started = time.perf_counter()
+    for q in QUERIES[:ctx.queries]:
+        plain = total.semantic_search(q, "쇼핑", 10, 0.1)
+        capped = total.semantic_search(q, "쇼핑", 10, 0.1, filters={"price_max": price_cap})
+        if under_cap(capped) != len(capped):
+            raise AssertionError(f"가격 필터를 벗어난 결과: {q}")
+        unfiltered += under_cap(plain)
+        filtered += len(capped)
+    checks["semantic_search"] = {"indexed_products": len(total.facet_index), "price_cap": price_cap,
+                                 "results_under_cap_unfiltered": unfiltered, "results_under_cap_filtered": filtered,
+                                 "seconds": round(time.perf_counter() - started, 3)}
+    return {"ops": len(latencies), "items": n, "seconds": sum(latencies), "latencies": latencies, "checks": checks}
+
+TIME_BENCH_ROWS = 1_000_000
+
+def scenario_news_time_index(ctx, size):
+    """time_index: 100만 기사 기간 조회 (전수 스캔 대비) + total.semantic_search 기간 필터/최신성 가중치"""
+    from time_index import TimeIndex, DAY_SECONDS
+    n = TIME_BENCH_ROWS
+    rng = np.random.default_rng(0)
+    now = int(time.time())
+    epochs = now - rng.integers(0, 3 * 365 * DAY_SECONDS, n)
+    ids = rng.permutation(n) + 1
+    index = TimeIndex()
+    t0 = time.perf_counter()
+    for chunk in np.array_split(np.arange(n), 10):   # 수집 배치처럼 나눠서 추가
+        index.add_arrays("뉴스", epochs[chunk], ids[chunk])
+    build_seconds = time.perf_counter() - t0
+    for i in range(1000):   # 실시간 수집분 (대기 목록 → 첫 조회 때 병합)
+        index.add(n + 1 + i, "뉴스", now - i)
+    all_epochs = np.concatenate([epochs, now - np.arange(1000)])
+    all_ids = np.concatenate([ids, n + 1 + np.arange(1000)])
+
+    cases = {
+        "last_7_days": (now - 7 * DAY_SECONDS, None),
+        "one_day_year_ago": (now - 366 * DAY_SECONDS, now - 365 * DAY_SECONDS),
+        "30_days_2y_ago": (now - 760 * DAY_SECONDS, now - 730 * DAY_SECONDS),
+    }
+    latencies = []
+    checks = {"rows": len(index), "build_seconds": round(build_seconds, 2)}
+    for name, (start, end) in cases.items():
+        index_samples, scan_samples = [], []
+        for _ in range(20):
+            t0 = time.perf_counter()
+            found = index.range("뉴스", start, end)
+            index_samples.append(time.perf_counter() - t0)
+            t0 = time.perf_counter()
+            mask = all_epochs >= start if end is None else (all_epochs >= start) & (all_epochs <= end)
+            expected = np.sort(all_ids[mask])
+            scan_samples.append(time.perf_counter() - t0)
+        if not np.array_equal(found, expected):
+            raise AssertionError(f"기간 조회 결과 불일치: {name} ({len(found)} != {len(expected)})")
+        latencies.extend(index_samples)
+        checks[name] = {"matched": len(found), "index_p50_ms": latency_stats(index_samples)["p50"],
+                        "scan_p50_ms": latency_stats(scan_samples)["p50"]}
+
+    # 검색 경로: 기간 필터 결과는 모두 기간 안, 최신성 가중치를 올리면 같은 후보가 더 최근 기사 순으로
+    # (변형 예산 안에 끝난 변형 수에 따라 후보가 달라지지 않도록 예산을 넉넉히 고정하고, 가중치는 고정된 후보 목록에서 비교)
+    from search_pipeline import apply_recency
+    total = ctx.apps["total"]
+    ctx.ensure_corpus("total", size)
+    total.time_index = TimeIndex()
+    latest = total.refresh_time_index().latest("뉴스")
+    window = (latest - 7 * DAY_SECONDS, latest)
+    published = lambda row: row["metadata"].get("published_at")
+    ages = {0.0: [], 0.5: []}
+    # 대역 말뭉치는 2025-05-01 이전 기사라 지금 기준으로는 모두 오래됨 - 말뭉치의 가장 최근 기사 시각을 기준으로 계산
+    budget = total.QUERY_EXPANSION_BUDGET_MS
+    total.QUERY_EXPANSION_BUDGET_MS = 60000
+    try:
+        for q in QUERIES[:ctx.queries]:
+            ranged = total.semantic_search(q, "뉴스", 10, 0.3, date_range=window, recency_weight=0.0)
+            if any(not window[0] <= published(r) <= window[1] for r in ranged):
+                raise AssertionError(f"기간 밖 결과: {q}")
+            candidates = total.semantic_search(q, "뉴스", 50, 0.3, recency_weight=0.0)
+            for weight in ages:
+                rows = apply_recency(candidates, weight, total.RECENCY_HALF_LIFE_DAYS, now=latest)
+                if sorted(r["id"] for r in rows) != sorted(r["id"] for r in candidates):
+                    raise AssertionError(f"최신성 가중치가 후보를 바꿈: {q}")
+                ages[weight].extend((latest - published(r)) / DAY_SECONDS for r in rows[:10])
+    finally:
+        total.QUERY_EXPANSION_BUDGET_MS = budget
+
+    # 같은 검색어/기간으로 뉴스와 블로그를 동시에 검색해도 다른 소스의 허용 id로 걸러진 결과를 나눠 받지 않음
+    both = [total.time_index.latest(source_type) for source_type in ("뉴스", "블로그")]
+    shared_window = (min(both) - 30 * DAY_SECONDS, max(both))
+    search = lambda source_type: [(r["id"], round(r.get("fusion", r["similarity"]), 6)) for r in total.semantic_search(
+        QUERIES[0], source_type, 10, 0.3, date_range=shared_window, recency_weight=0.0)]   # 융합 점수까지 (변형별 순위가 빠지면 달라짐)
+    saved = (total.QUERY_EXPANSION_BUDGET_MS, ctx.standins.supabase.latency_ms)
+    total.QUERY_EXPANSION_BUDGET_MS, ctx.standins.supabase.latency_ms = 60000, max(saved[1], 30)  # 변형이 빠지지 않게
+    try:
+        sequential = {source_type: search(source_type) for source_type in ("뉴스", "블로그")}
+        barrier = threading.Barrier(2)
+        concurrent = {}
+        def session(source_type):
+            barrier.wait()
+            concurrent[source_type] = search(source_type)
+        threads = [threading.Thread(target=session, args=(source_type,)) for source_type in ("뉴스", "블로그")]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    finally:
+        total.QUERY_EXPANSION_BUDGET_MS, ctx.standins.supabase.latency_ms = saved
+    if concurrent != sequential:
+        raise AssertionError(f"동시 검색이 다른 소스의 필터 결과를 공유함: {concurrent} != {sequential}")
+    checks["concurrent_sources_same_window"] = {k: len(v) for k, v in sequential.items()}
+    if ages[0.5] and np.mean(ages[0.5]) >= np.mean(ages[0.0]):
+        raise AssertionError(f"최신성 가중치가 결과에 반영되지 않음: {np.mean(ages[0.5]):.1f}일 >= {np.mean(ages[0.0]):.1f}일")
+    checks["semantic_search"] = {"indexed_docs": len(total.time_index),
+                                 "mean_age_days_similarity_only": round(float(np.mean(ages[0.0])), 2) if ages[0.0] else None,
+                                 "mean_age_days_recency_0.5": round(float(np.mean(ages[0.5])), 2) if ages[0.5] else None}
+    return {"ops": len(latencies), "items": n, "seconds": sum(latencies), "latencies": latencies, "checks": checks}
+
+def concurrent_encode(encode, texts, sessions):
+    """sessions개 스레드가 texts를 나눠 한 건씩 encode - (걸린 시간, 호출별 지연)"""
+    latencies = []
+    lock = threading.Lock()
+    def worker(chunk):
+        for text in chunk:
+            t0 = time.perf_counter()
+            encode(text)
+            with lock:
+                latencies.append(time.perf_counter() - t0)
+    threads = [threading.Thread(target=worker, args=(texts[i::sessions],)) for i in range(sessions)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return time.perf_counter() - started, latencies
+
+def scenario_embedding_server(ctx, size, sessions=16):
+    """embedding_server: 동시 세션의 쿼리 임베딩 - 공유 모델 직접 호출 vs 마이크로 배칭 서버 (호출당 고정 비용 모델)"""
+    from embedding_server import start_server, EmbeddingClient
+    total = ctx.apps["total"]
+    texts = [f"{QUERIES[i % len(QUERIES)]} {i}" for i in range(min(size, 20 * sessions))]
+    model = SimulatedCostModel(total.embedding_model_name)
+    direct_seconds, direct_latencies = concurrent_encode(model.encode, texts, sessions)
+
+    server, batcher = start_server(model, total.embedding_model_name, port=0, window_ms=5, max_batch=64)
+    url = "http://%s:%s" % server.server_address[:2]
+    try:
+        client = EmbeddingClient(url)
+        if not np.allclose(client.encode(texts[0]), model.encode(texts[0]), atol=1e-6):
+            raise AssertionError("서버 임베딩이 직접 계산한 값과 다릅니다")
+        batched_seconds, batched_latencies = concurrent_encode(client.encode, texts, sessions)
+        batches = batcher.batches
+
+        # total.generate_embedding이 설정만으로 서버를 쓰는지 (모델 재로딩 경로 포함)
+        original = total.embedding_model, total.EMBEDDING_SERVER_URL
+        total.EMBEDDING_SERVER_URL = url
+        total.load_embedding_model.clear()
+        try:
+            total.embedding_model, _ = total.load_embedding_model()
+            switched = isinstance(total.embedding_model, EmbeddingClient)
+            via_server = total.generate_embedding(texts[0])
+        finally:
+            total.embedding_model, total.EMBEDDING_SERVER_URL = original
+            total.load_embedding_model.clear()
+        if not switched or not np.allclose(via_server, total.generate_embedding(texts[0]), atol=1e-6):
+            raise AssertionError("total.generate_embedding이 임베딩 서버로 전환되지 않았습니다")
+    finally:
+        batcher.close()
+        server.shutdown()
+        server.server_close()
+    checks = {"sessions": sessions, "texts": len(texts), "model_cost": f"{model.call_ms}ms/call + {model.text_ms}ms/text",
+              "direct_texts_per_s": round(len(texts) / direct_seconds, 1),
+              "server_texts_per_s": round(len(texts) / batched_seconds, 1),
+              "speedup": round(direct_seconds / batched_seconds, 2),
+              "server_batches": batches, "mean_batch": round(len(texts) / max(batches, 1), 1),
+              "direct_p50_ms": latency_stats(direct_latencies)["p50"], "server_p50_ms": latency_stats(batched_latencies)["p50"]}
+    if batched_seconds >= direct_seconds:
+        raise AssertionError(f"마이크로 배칭이 처리량을 높이지 못함: {checks}")
+    return {"ops": len(texts), "items": len(texts), "seconds": batched_seconds, "latencies": batched_latencies, "checks": checks}
+
+def scenario_answer_warmup(ctx, size):
+    """warmup: 프리셋/자주 묻는 질문 미리 계산 → 클릭 시 저장소 조회만, 새 문서가 들어오면 버전이 바뀌어 다시 계산"""
+    from warmup import AnswerStore, QueryLog, WarmupWorker, stored_answer_key, corpus_version
+    total = ctx.apps["total"]
+    ctx.ensure_corpus("total", size)
+    workdir = tempfile.mkdtemp(prefix="bench-warmup-")
+    store = AnswerStore(os.path.join(workdir, "answers.sqlite3"))
+    log = QueryLog(os.path.join(workdir, "query_log.jsonl"))
+    for _ in range(3):
+        log.append("블로그", QUERIES[5])   # 질문 기록 상위 질문도 warm-up 대상
+    original_log = total.query_log
+    total.query_log = log
+    try:
+        get_version = lambda: corpus_version(total.document_store, total.current_embedding_version)
+        worker = WarmupWorker(store, get_version, total.warmup_jobs, total.compute_answer)
+        jobs = total.warmup_jobs()
+        if not any(kwargs["query"] == QUERIES[5] and kwargs["source_type"] == "블로그" for _, kwargs in jobs):
+            raise AssertionError("질문 기록 상위 질문이 warm-up 대상에 없습니다")
+
+        ctx.standins.reset_counters()
+        t0 = time.perf_counter()
+        first = worker.run_once()
+        warm_seconds = time.perf_counter() - t0
+        warm_chat = ctx.standins.counters().get("openai.chat", 0)
+        version = worker.warmed_version
+
+        # 클릭 경로: 화면 기본값으로 만든 키 → 저장소 조회 (검색/GPT 호출 없음)
+        ctx.standins.reset_counters()
+        latencies, hits = [], 0
+        for _, kwargs in jobs:
+            params = total.search_params(kwargs["source_type"], total.DEFAULT_RESULT_COUNT, total.DEFAULT_SIMILARITY_THRESHOLD,
+                                         total.DEFAULT_TOKEN_BUDGET)
+            t0 = time.perf_counter()
+            stored = store.get(version, stored_answer_key(kwargs["source_type"], kwargs["query"], **params))
+            latencies.append(time.perf_counter() - t0)
+            hits += stored is not None
+        lookup_upstream = ctx.standins.counters()
+        if hits != first["computed"] or lookup_upstream.get("openai.chat", 0) or lookup_upstream.get("db.rpc.match_documents", 0):
+            raise AssertionError(f"미리 계산된 답변 조회가 상위 서비스를 호출했거나 누락됨: hits={hits} {first} {lookup_upstream}")
+
+        _, kwargs = jobs[0]
+        t0 = time.perf_counter()
+        total.compute_answer(**kwargs)
+        cold_ms = (time.perf_counter() - t0) * 1000
+
+        # 버전이 같으면 다시 계산하지 않음
+        if worker.run_once() is not None:
+            raise AssertionError("코퍼스가 그대로인데 warm-up이 다시 실행됨")
+
+        # 새 문서 → 버전 변경 → 예전 답변 삭제 후 다시 계산
+        item = make_naver_item("blog", QUERIES[0], size + 1)
+        text, metadata = document_text("블로그", item)
+        metadata.update(embedding_tag(total.embedding_model_name))
+        ctx.standins.supabase.seed([{"content": text, "metadata": metadata,
+                                     "embedding": padded_local_embedding(total.embedding_model)(text)}])
+        ctx._corpus = None   # 말뭉치가 바뀌었으므로 다음 시나리오에서 다시 적재
+        second = worker.run_once()
+        if second is None or worker.warmed_version == version or store.count(version) or not second["computed"]:
+            raise AssertionError(f"새 문서 이후 warm-up이 갱신되지 않음: {second}")
+    finally:
+        total.query_log = original_log
+    lookup = latency_stats(latencies)
+    checks = {"jobs": len(jobs), "computed": first["computed"], "empty": first["empty"], "warm_chat_calls": warm_chat,
+              "warm_seconds": round(warm_seconds, 3), "lookup_p50_ms": lookup["p50"], "cold_answer_ms": round(cold_ms, 2),
+              "recomputed_after_new_doc": second["computed"], "versions": [version, worker.warmed_version]}
+    return {"ops": len(latencies), "items": hits, "seconds": sum(latencies), "latencies": latencies, "checks": checks}
+
+class _CountingModel:
+    """쿼리 임베딩 encode 호출 횟수를 세는 모델 래퍼 (문서 임베딩 호출은 제외)"""
+
+    def __init__(self, model):
+        self.model = model
+        self.query_calls = 0
+
+    def encode(self, sentences, *args, **kwargs):
+        texts = [sentences] if isinstance(sentences, str) else sentences
+        if any(text.startswith(("상품 검색", "블로그 검색", "뉴스 검색")) for text in texts):
+            self.query_calls += 1
+        return self.model.encode(sentences, *args, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self.model, name)
+
+def scenario_multi_source(ctx, size):
+    """total.multi_source_answers: 세 소스 검색+답변 동시 실행 vs 소스별 순차 실행 (업스트림 지연 50ms 이상)"""
+    total = ctx.apps["total"]
+    ctx.ensure_corpus("total", size)
+    queries = QUERIES[:max(1, min(ctx.queries, 4))]
+
+    def serial(query):
+        answers = {}
+        for source_type in total.MULTI_SOURCE_TYPES:
+            results = total.semantic_search(query, source_type, 10, 0.4)
+            answers[source_type] = total.generate_answer_with_gpt(query, results, source_type) if results else None
+        return answers
+
+    def concurrent(query):
+        return {source_type: answer for source_type, _, answer in total.multi_source_answers(query, limit=10, match_threshold=0.4)}
+
+    servers = (ctx.standins.supabase, ctx.standins.openai)
+    saved_latency = [server.latency_ms for server in servers]
+    for server in servers:
+        server.latency_ms = max(server.latency_ms, 50)
+    original_model = total.embedding_model
+    try:
+        serial_latencies, serial_answers = [], []
+        for query in queries:
+            t0 = time.perf_counter()
+            serial_answers.append(serial(query))
+            serial_latencies.append(time.perf_counter() - t0)
+        total.embedding_model = counting = _CountingModel(original_model)
+        ctx.standins.reset_counters()
+        latencies, answers = [], []
+        for query in queries:
+            t0 = time.perf_counter()
+            answers.append(concurrent(query))
+            latencies.append(time.perf_counter() - t0)
+        upstream = ctx.standins.counters()
+        merge_t0 = time.perf_counter()
+        merged = total.merge_answers(queries[0], answers[0])
+        merge_ms = (time.perf_counter() - merge_t0) * 1000
+    finally:
+        total.embedding_model = original_model
+        for server, latency in zip(servers, saved_latency):
+            server.latency_ms = latency
+
+    if answers != serial_answers or not merged:
+        raise AssertionError("동시 실행 결과가 순차 실행과 다릅니다")
+    if counting.query_calls != len(queries):
+        raise AssertionError(f"쿼리 임베딩이 질문당 한 번이 아님: {counting.query_calls}회 / {len(queries)}개 질문")
+    serial_stats, concurrent_stats = latency_stats(serial_latencies), latency_stats(latencies)
+    checks = {"queries": len(queries), "sources": len(total.MULTI_SOURCE_TYPES),
+              "serial_p50_ms": serial_stats["p50"], "concurrent_p50_ms": concurrent_stats["p50"],
+              "speedup": round(sum(serial_latencies) / sum(latencies), 2), "query_encode_calls": counting.query_calls,
+              "chat_calls": upstream.get("openai.chat", 0), "merge_ms": round(merge_ms, 2)}
+    if sum(latencies) * 1.8 > sum(serial_latencies):
+        raise AssertionError(f"동시 실행이 순차 실행보다 충분히 빠르지 않음: {checks}")
+    return {"ops": len(queries), "items": len(queries) * len(total.MULTI_SOURCE_TYPES), "seconds": sum(latencies),
+            "latencies": latencies, "checks": checks}
+
+def scenario_query_expansion(ctx, size):
+    """total.semantic_search 검색어 확장: 단일 검색어 vs 변형(소스 접두어/원문/핵심어) 배치 임베딩 + 동시 검색 + RRF 융합"""
+    from query_expansion import keyword_query
+    total = ctx.apps["total"]
+    ctx.ensure_corpus("total", size)
+    calls = [(q, source_type, 10, 0.4) for source_type in SOURCE_TYPES for q in QUERIES[:ctx.queries]]
+
+    def keyword_hits(query, results):
+        """결과 중 핵심어를 모두 포함한 문서 비율 (정답 대용)"""
+        keywords = keyword_query(query).split()
+        if not results:
+            return 0.0
+        return sum(all(k in (row.get('content') or '') for k in keywords) for row in results) / len(results)
+
+    saved = (total.QUERY_EXPANSION, total.embedding_model, ctx.standins.supabase.latency_ms)
+    ctx.standins.supabase.latency_ms = max(saved[2], 30)
+    runs = {}
+    try:
+        for label, enabled in (("single", False), ("expanded", True)):
+            total.QUERY_EXPANSION = enabled
+            total.embedding_model = counting = _CountingModel(saved[1])
+            ctx.standins.reset_counters()
+            seconds, latencies, results = timed_calls(total.semantic_search, calls)
+            runs[label] = {"seconds": seconds, "latencies": latencies, "results": results,
+                           "encode_calls": counting.query_calls, "rpc": ctx.standins.counters().get("db.rpc.match_documents", 0)}
+    finally:
+        total.QUERY_EXPANSION, total.embedding_model, ctx.standins.supabase.latency_ms = saved
+
+    single, expanded = runs["single"], runs["expanded"]
+    variants = sum(len(total.query_variants(q, s)) for q, s, _, _ in calls)
+    if expanded["encode_calls"] != len(calls) or expanded["rpc"] != variants:
+        raise AssertionError(f"변형 임베딩이 검색당 한 번이 아니거나 RPC 수가 다름: {expanded['encode_calls']}회, RPC {expanded['rpc']}/{variants}")
+    overhead_ms = (latency_stats(expanded["latencies"])["p50"] - latency_stats(single["latencies"])["p50"])
+    if overhead_ms > total.QUERY_EXPANSION_BUDGET_MS:
+        raise AssertionError(f"확장 검색 추가 지연이 예산을 넘음: {overhead_ms:.1f}ms > {total.QUERY_EXPANSION_BUDGET_MS}ms")
+    hits = {label: round(float(np.mean([keyword_hits(q, r) for (q, *_), r in zip(calls, run["results"])])), 3)
+            for label, run in runs.items()}
+    overlap = np.mean([len({row['id'] for row in a} & {row['id'] for row in b}) / max(len(a), 1)
+                       for a, b in zip(single["results"], expanded["results"])])
+    checks = {"searches": len(calls), "variants": variants, "rpc_single": single["rpc"], "rpc_expanded": expanded["rpc"],
+              "single_p50_ms": latency_stats(single["latencies"])["p50"],
+              "expanded_p50_ms": latency_stats(expanded["latencies"])["p50"], "overhead_p50_ms": round(overhead_ms, 2),
+              "budget_ms": total.QUERY_EXPANSION_BUDGET_MS, "keyword_hit_rate": hits, "top10_overlap": round(float(overlap), 3),
+              "results": {label: sum(len(r) for r in run["results"]) for label, run in runs.items()}}
+    return {"ops": len(calls), "items": checks["results"]["expanded"], "seconds": expanded["seconds"],
+            "latencies": expanded["latencies"], "checks": checks}
+
+def scenario_collect_jobs(ctx, size, sessions=8):
+    """jobqueue: 수집 작업 등록(화면 대기 시간) vs 동기 수집, 동시 중복 등록 합치기, 작업자 처리량, lease 만료 복구"""
+    from jobqueue import JobQueue, JobWorkers
+    total = ctx.apps["total"]
+    ctx.reset_store()
+    workdir = tempfile.mkdtemp(prefix="bench-jobs-")
+    queue = JobQueue(os.path.join(workdir, "jobs.sqlite3"))
+    count = 50
+    saved_latency = ctx.standins.naver.latency_ms
+    ctx.standins.naver.latency_ms = max(saved_latency, 50)
+    try:
+        # 기존 방식: 화면 스크립트 안에서 동기 수집
+        t0 = time.perf_counter()
+        collect(total, f"{QUERIES[0]} 동기", "블로그", count)
+        sync_seconds = time.perf_counter() - t0
+
+        # 같은 검색어를 여러 세션이 동시에 등록 → 작업 하나
+        key = total.collect_dedup_key("블로그", QUERIES[1])
+        params = {"source_type": "블로그", "query": QUERIES[1], "count": count}
+        _, enqueue_latencies, outcomes = concurrent_burst(lambda: queue.enqueue("collect", params, key), (), sessions)
+        created = sum(1 for _, is_new in outcomes if is_new)
+        if created != 1 or len({job["id"] for job, _ in outcomes}) != 1:
+            raise AssertionError(f"동시 중복 등록이 합쳐지지 않음: 새 작업 {created}개")
+        jobs = [outcomes[0][0]]
+        for i, source_type in enumerate(SOURCE_TYPES * 2):
+            job, _ = queue.enqueue("collect", {"source_type": source_type, "query": f"{QUERIES[2 + i % 4]} {i}", "count": count},
+                                   total.collect_dedup_key(source_type, f"{QUERIES[2 + i % 4]} {i}"))
+            jobs.append(job)
+
+        workers = JobWorkers(queue, {"collect": total.run_collect_job}, workers=2, poll_seconds=0.05)
+        t0 = time.perf_counter()
+        workers.start()
+        while any(queue.get(job["id"])["status"] in ("queued", "running") for job in jobs):
+            if time.perf_counter() - t0 > 120:
+                raise AssertionError("수집 작업이 끝나지 않음")
+            time.sleep(0.02)
+        workers_seconds = time.perf_counter() - t0
+        finished = [queue.get(job["id"]) for job in jobs]
+        failed = [job for job in finished if job["status"] != "done"]
+        if failed:
+            raise AssertionError(f"수집 작업 실패: {failed[0]['error']}")
+        saved = sum(job["result"]["saved"] for job in finished)
+
+        # 끝난 작업과 같은 검색어는 다시 등록되고, 이미 저장된 URL은 건너뜀
+        again, is_new = queue.enqueue("collect", params, key)
+        workers.wake()
+        while queue.get(again["id"])["status"] in ("queued", "running"):
+            time.sleep(0.02)
+        workers.stop()
+        again = queue.get(again["id"])
+        if not is_new or again["result"]["saved"] != 0:
+            raise AssertionError(f"재수집이 중복 저장됨: {again['result']}")
+
+        # 작업자가 죽은 경우: lease가 지나면 다른 작업자가 다시 가져감
+        short = JobQueue(os.path.join(workdir, "lease.sqlite3"), lease_seconds=0.05)
+        orphan, _ = short.enqueue("collect", params, key)
+        short.claim("죽은 작업자")
+        time.sleep(0.1)
+        reclaimed = short.claim("새 작업자")
+        if reclaimed is None or reclaimed["id"] != orphan["id"] or reclaimed["attempts"] != 2:
+            raise AssertionError("lease가 끝난 작업을 다시 가져가지 못함")
+    finally:
+        ctx.standins.naver.latency_ms = saved_latency
+    enqueue_stats = latency_stats(enqueue_latencies)
+    checks = {"sync_collect_ms": round(sync_seconds * 1000, 1), "enqueue_p50_ms": enqueue_stats["p50"],
+              "enqueue_p95_ms": enqueue_stats["p95"], "concurrent_enqueues": sessions, "created": created,
+              "jobs": len(jobs), "workers_seconds": round(workers_seconds, 3), "saved": saved,
+              "recollect_saved": again["result"]["saved"]}
+    return {"ops": len(jobs), "items": saved, "seconds": workers_seconds, "latencies": enqueue_latencies, "checks": checks}
+
+def scenario_storage_backends(ctx, size):
+    """storage: Supabase 어댑터(대역 서버) vs 로컬 어댑터(SQLite + memmap) - 같은 결과, 연산별 지연"""
+    from storage import LocalStore
+    total = ctx.apps["total"]
+    ctx.ensure_corpus("total", size)
+    remote = total.document_store
+    workdir = tempfile.mkdtemp(prefix="bench-store-")
+    local = LocalStore(os.path.join(workdir, "store"))
+
+    # 대역 서버의 말뭉치를 scan으로 읽어 로컬 저장소에 복사 (벡터 파일이 여러 번 늘어남)
+    t0 = time.perf_counter()
+    last_id, copied = 0, 0
+    while True:
+        rows = remote.scan(last_id, 1000, columns=('id', 'content', 'metadata', 'embedding'))
+        if not rows:
+            break
+        local.insert_many([{k: v for k, v in row.items() if k != 'id'} for row in rows])
+        last_id, copied = rows[-1]['id'], copied + len(rows)
+    copy_seconds = time.perf_counter() - t0
+    local = LocalStore(local.path)   # 다시 열어도 그대로인지
+    if local.count() != remote.count() or local.count_by_collection(SOURCE_TYPES) != remote.count_by_collection(SOURCE_TYPES):
+        raise AssertionError("로컬 저장소 문서 수가 원본과 다릅니다")
+
+    queries = [total.generate_embedding(total.preprocess_query(q, source_type))
+               for source_type in SOURCE_TYPES for q in QUERIES[:ctx.queries]]
+    urls = [parse_url for parse_url in (row['metadata'].get('url') for row in local.sample(limit=50)) if parse_url]
+    urls += [f"https://example.com/missing/{i}" for i in range(50)]
+    operations = {
+        "match": lambda store: [store.match(q, 0.2, 50) for q in queries],
+        "existing_urls": lambda store: store.existing_urls(urls),
+        "url_exists": lambda store: [store.url_exists(u) for u in urls[:20]],
+        "count_by_collection": lambda store: store.count_by_collection(SOURCE_TYPES),
+        "fetch": lambda store: store.fetch(range(1, 201)),
+    }
+    checks, latencies = {}, []
+    for name, operation in operations.items():
+        timings = {}
+        for label, store in (("supabase", remote), ("local", local)):
+            t0 = time.perf_counter()
+            result = operation(store)
+            timings[label] = time.perf_counter() - t0
+            if label == "supabase":
+                expected = result
+        if name == "match":
+            # 같은 점수(중복 본문)끼리는 순서가 다를 수 있어 점수 목록과 경계 위쪽 id 집합을 비교
+            for a, b in zip(expected, result):
+                scores_a, scores_b = [r['similarity'] for r in a], [r['similarity'] for r in b]
+                above = lambda rows, cut: {r['id'] for r in rows if r['similarity'] > cut + 1e-4}
+                if len(a) != len(b) or not np.allclose(scores_a, scores_b, atol=1e-4) or \
+                        (a and above(a, scores_a[-1]) != above(b, scores_a[-1])):
+                    raise AssertionError("로컬 top-k가 match_documents와 다릅니다")
+        elif name == "fetch":
+            if sorted(r['id'] for r in expected) != sorted(r['id'] for r in result):
+                raise AssertionError("fetch 결과가 다릅니다")
+        elif expected != result:
+            raise AssertionError(f"{name} 결과가 다릅니다: {expected} != {result}")
+        latencies.append(timings["local"])
+        checks[name] = {"supabase_ms": round(timings["supabase"] * 1000, 2), "local_ms": round(timings["local"] * 1000, 2)}
+
+    # 앱 검색 경로 전체를 로컬 저장소로
+    original = total.document_store
+    try:
+        expected = [total.semantic_search(q, source_type, 10, 0.4) for source_type in SOURCE_TYPES for q in QUERIES[:ctx.queries]]
+        total.document_store = local
+        t0 = time.perf_counter()
+        found = [total.semantic_search(q, source_type, 10, 0.4) for source_type in SOURCE_TYPES for q in QUERIES[:ctx.queries]]
+        search_seconds = time.perf_counter() - t0
+    finally:
+        total.document_store = original
+    similarity = lambda results: [[round(r['similarity'], 4) for r in rs] for rs in results]
+    if similarity(found) != similarity(expected):
+        raise AssertionError("로컬 저장소로 바꾼 semantic_search 결과가 다릅니다")
+
+    # 같은 경로를 연 두 핸들(앱과 수집 도구처럼)이 번갈아 써도 슬롯이 겹치지 않고 서로의 행이 보이는지
+    writer_a, writer_b = local, LocalStore(local.path)
+    probes = [hashing_embedding(f"다중 핸들 {i}", local.dim) for i in range(4)]
+    for i, probe in enumerate(probes):
+        (writer_a if i % 2 == 0 else writer_b).insert({'content': f"다중 핸들 {i}", 'embedding': probe, 'metadata': {}})
+    for reader in (writer_a, writer_b, LocalStore(local.path)):
+        for i, probe in enumerate(probes):
+            top = reader.match(probe, 0.5, 1)
+            if not top or top[0]['content'] != f"다중 핸들 {i}":
+                raise AssertionError(f"다른 핸들이 쓴 벡터를 찾지 못하거나 덮어씀: {i} → {top[:1]}")
+    checks.update({"rows": copied, "copy_seconds": round(copy_seconds, 3),
+                   "semantic_search_local_ms": round(search_seconds * 1000 / len(found), 2),
+                   "vector_file_mb": round(os.path.getsize(os.path.join(local.path, "vectors.f32")) / 1e6, 1)})
+    return {"ops": len(latencies), "items": copied, "seconds": sum(latencies), "latencies": latencies, "checks": checks}
+
+def scenario_incremental_refresh(ctx, size, queries=24):
+    """refresh: 저장된 검색어 증분 갱신(sort=date, 저장된 URL에서 멈춤) vs 수집 작업으로 재수집 - 요청 수/조회 수"""
+    import ingest
+    import refresh
+    total = ctx.apps["total"]
+    ctx.reset_store()
+    store = total.document_store
+    naver = ctx.standins.naver
+    saved_total = naver.total_per_query
+    naver.total_per_query = 200
+    endpoints = {"블로그": "blog", "뉴스": "news", "쇼핑": "shop"}
+    jobs = [(SOURCE_TYPES[i % 3], f"{QUERIES[i % len(QUERIES)]} 갱신 {i}") for i in range(queries)]
+    workdir = tempfile.mkdtemp(prefix="bench-refresh-")
+    try:
+        # 처음 수집 (검색어당 100건)
+        stats = ingest.Stats()
+        fetcher = ingest.NaverFetcher("bench", "bench", stats, base_url=naver.base_url, sort="date")
+        ingest.run(jobs, total.embedding_model, store, fetcher, ingest.Checkpoint(None), stats, max_items=100,
+                   model_name=total.embedding_model_name)
+        state = refresh.RefreshState(os.path.join(workdir, "state.json"))
+        bloom = refresh.UrlBloom(capacity=10000)
+
+        def run_refresh():
+            stats = ingest.Stats()
+            fetcher = ingest.NaverFetcher("bench", "bench", stats, base_url=naver.base_url, sort="date")
+            ctx.standins.reset_counters()
+            t0 = time.perf_counter()
+            summary, results, errors = refresh.refresh(jobs, total.embedding_model, store, fetcher, state, bloom, stats,
+                                                       model_name=total.embedding_model_name)
+            if errors:
+                raise AssertionError(f"갱신 실패: {errors[0]}")
+            return time.perf_counter() - t0, summary, results, ctx.standins.counters()
+
+        # 첫 갱신: high-water mark가 없어도 저장된 URL에서 멈춤 (Bloom 필터는 저장소 scan으로 채워짐)
+        run_refresh()
+        # 검색어마다 새 글 0~4건
+        published = {}
+        for i, (source_type, query) in enumerate(jobs):
+            published[ingest.job_key(source_type, query)] = i % 5
+            naver.publish(endpoints[source_type], query, i % 5)
+        rows_before = store.count()
+        refresh_seconds, summary, results, counters = run_refresh()
+        new_rows = store.count() - rows_before
+        wrong = {key: result["new"] for key, result in results.items() if result["new"] != published[key]}
+        if wrong or new_rows != sum(published.values()):
+            raise AssertionError(f"새 글만 저장되지 않음: 저장 {new_rows}건, 기대 {sum(published.values())}건, 검색어별 차이 {wrong}")
+        refresh_naver = sum(v for k, v in counters.items() if k.startswith("naver."))
+        refresh_selects = counters.get("db.select", 0)
+        if refresh_naver != len(jobs):
+            raise AssertionError(f"갱신 요청 수가 검색어 수와 다름: {refresh_naver}")
+
+        # 새 글이 없으면 아무것도 저장하지 않음
+        _, idle_summary, _, idle_counters = run_refresh()
+        if idle_summary["saved"]:
+            raise AssertionError(f"새 글이 없는데 {idle_summary['saved']}건 저장됨")
+
+        # 기존 방식: 검색어마다 100건 다시 수집해 중복 확인
+        total.naver_cache.clear()
+        ctx.standins.reset_counters()
+        t0 = time.perf_counter()
+        for source_type, query in jobs:
+            collect(total, query, source_type, 100)
+        recollect_seconds = time.perf_counter() - t0
+        recollect_counters = ctx.standins.counters()
+    finally:
+        naver.total_per_query = saved_total
+    checks = {"queries": len(jobs), "new_items": new_rows,
+              "refresh": {"naver_requests": refresh_naver, "db_selects": refresh_selects,
+                          "seconds": round(refresh_seconds, 3)},
+              "refresh_idle": {"naver_requests": sum(v for k, v in idle_counters.items() if k.startswith("naver.")),
+                               "db_selects": idle_counters.get("db.select", 0)},
+              "recollect": {"naver_requests": sum(v for k, v in recollect_counters.items() if k.startswith("naver.")),
+                            "db_selects": recollect_counters.get("db.select", 0), "seconds": round(recollect_seconds, 3)},
+              "bloom_false_positives": sum(result["false_positives"] for result in results.values()),
+              "stops": sorted({result["stop"] for result in results.values()})}
+    return {"ops": len(jobs), "items": new_rows, "seconds": refresh_seconds, "latencies": [refresh_seconds], "checks": checks}
+
+def scenario_price_history(ctx, size, products=100000, observations=8):
+    """price_history: 상품 10만 개 가격 이력 압축 저장/기간 최저·평균/가격 하락 조회, 재수집 시 임베딩 없이 가격만 기록"""
+    import ingest
+    from price_history import PriceHistory, DAY_SECONDS
+    total = ctx.apps["total"]
+    workdir = tempfile.mkdtemp(prefix="bench-prices-")
+    rng = np.random.default_rng(7)
+
+    # 합성 이력: 상품마다 observations번 관측, 가격은 직전 값에서 조금씩 변동
+    now = int(time.time())
+    n = products * observations
+    product_ids = np.repeat(np.arange(products), observations)
+    times = now - np.tile(np.arange(observations)[::-1], products) * 5 * DAY_SECONDS - rng.integers(0, 3600, n)
+    base = rng.integers(5, 300, products) * 1000
+    steps = rng.choice([-0.15, -0.05, 0.0, 0.0, 0.05], size=(products, observations))
+    steps[:, 0] = 0.0
+    prices = (base[:, None] * np.cumprod(1 + steps, axis=1)).round(-1).astype(np.int64).ravel()
+    malls = [f"몰{p % 50}" for p in range(products)]
+    history = PriceHistory(os.path.join(workdir, "history"))
+    t0 = time.perf_counter()
+    history.record_many(product_ids, (malls[p] for p in product_ids), times, prices)
+    history.compact(force=True)
+    build_seconds = time.perf_counter() - t0
+    raw_bytes = n * 3 * 8
+    reopened = PriceHistory(os.path.join(workdir, "history"))
+    t0 = time.perf_counter()
+    if len(reopened) != n:
+        raise AssertionError(f"다시 연 이력 수가 다름: {len(reopened)} != {n}")
+    load_seconds = time.perf_counter() - t0
+
+    window_start, since = now - 30 * DAY_SECONDS, now - 12 * DAY_SECONDS
+    seconds, latencies, results = timed_calls(
+        lambda kind: reopened.window_stats(start=window_start) if kind == "window" else reopened.price_drops(since, 0.1, limit=100),
+        [("window",), ("drops",)] * ctx.queries)
+    stats, drops = results[0], results[1]
+
+    # 표본 상품을 직접 계산한 값과 비교
+    index = {key: i for i, key in enumerate(stats["keys"])}
+    for p in rng.choice(products, 200, replace=False):
+        lo, hi = p * observations, (p + 1) * observations
+        t, v = times[lo:hi], prices[lo:hi]
+        in_window = v[t >= window_start]
+        i = index[(str(p), malls[p].lower())]
+        if stats["min"][i] != in_window.min() or abs(stats["avg"][i] - in_window.mean()) > 1e-6:
+            raise AssertionError(f"기간 통계가 다름: 상품 {p}")
+    for product_id, mall, reference, current, drop in drops[:50]:
+        p = int(product_id)
+        t, v = times[p * observations:(p + 1) * observations], prices[p * observations:(p + 1) * observations]
+        expected_ref = v[t <= since][-1] if (t <= since).any() else v[0]
+        if reference != expected_ref or current != v[-1] or drop < 0.1:
+            raise AssertionError(f"가격 하락 계산이 다름: 상품 {p} {reference}->{current}, 기대 {expected_ref}->{v[-1]}")
+
+    # 수집 연동: 이미 저장된 상품을 다시 수집하면 문서는 건너뛰고 가격만 기록
+    ctx.reset_store()
+    naver = ctx.standins.naver
+    live = PriceHistory(os.path.join(workdir, "live"))
+    jobs = [("쇼핑", f"{QUERIES[i]} 가격") for i in range(3)]
+
+    def collect():
+        stats = ingest.Stats()
+        fetcher = ingest.NaverFetcher("bench", "bench", stats, base_url=naver.base_url)
+        summary, errors = ingest.run(jobs, total.embedding_model, total.document_store, fetcher, ingest.Checkpoint(None), stats,
+                                     max_items=100, model_name=total.embedding_model_name, prices=live, progress=False)
+        if errors:
+            raise AssertionError(f"수집 실패: {errors[0]}")
+        return summary
+
+    first = collect()
+    first_observations = len(live)
+    naver.price_round = 1
+    try:
+        again = collect()
+    finally:
+        naver.price_round = 0
+    added = len(live) - first_observations
+    dropped = live.price_drops(0, 0.05, limit=1000)
+    if again["saved"] or again["embed_seconds"]:
+        raise AssertionError(f"재수집에서 문서가 다시 저장/임베딩됨: {again}")
+    if not added or added != len(dropped):
+        raise AssertionError(f"바뀐 가격만 기록되어야 함: 추가 {added}건, 하락 상품 {len(dropped)}개")
+    row = total.document_store.sample('쇼핑', limit=1)[0]
+    saved_history = total.price_history
+    total.price_history = live
+    try:
+        context = total.format_context_entry(1, {**row, 'similarity': 0.5}, row['content'], "쇼핑")
+    finally:
+        total.price_history = saved_history
+
+    checks = {"products": products, "observations": n, "build_seconds": round(build_seconds, 3),
+              "load_seconds": round(load_seconds, 3), "disk_bytes": reopened.nbytes(), "raw_bytes": raw_bytes,
+              "compression": round(raw_bytes / max(reopened.nbytes(), 1), 1),
+              "window_products": len(stats["keys"]), "drops": len(drops),
+              "window_ms": round(latency_stats(latencies[0::2])["p50"], 2),
+              "drops_ms": round(latency_stats(latencies[1::2])["p50"], 2),
+              "recollect": {"saved": again["saved"], "duplicates": again["duplicates"], "price_observations": added},
+              "context_has_history": "가격 이력" in context}
+    return {"ops": len(latencies), "items": n, "seconds": seconds, "latencies": latencies, "checks": checks}
+
+def concurrent_users(fn, users):
+    """users개 스레드가 동시에 fn(사용자 번호) 실행 - (걸린 시간, 사용자별 반환값)"""
+    barrier = threading.Barrier(users)
+    results = [None] * users
+
+    def user(i):
+        barrier.wait()
+        results[i] = fn(i)
+
+    threads = [threading.Thread(target=user, args=(i,)) for i in range(users)]
+    t0 = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return time.perf_counter() - t0, results
+
+def scenario_search_service(ctx, size, users=32, searches=3):
+    """service: 동시 사용자 부하 - Streamlit 프로세스 안에서 직접 처리 vs 별도 검색 서비스 프로세스 (스트리밍 답변 포함)"""
+    from service import ServiceClient
+    total = ctx.apps["total"]
+    ctx.ensure_corpus("total", size)
+    workdir = tempfile.mkdtemp(prefix="bench-service-")
+    process, url = start_service_process(ctx.standins, os.path.join(workdir, "service.log"), {"JOB_WORKERS": "1"})
+    client = ServiceClient(url)
+    checks = {"users": users, "requests_per_user": searches + 1}
+    try:
+        # 같은 설정이면 직접 검색/답변과 같은 결과
+        for query, source_type in ((QUERIES[0], "쇼핑"), (QUERIES[3], "블로그"), (QUERIES[4], "뉴스")):
+            local = total.semantic_search(query, source_type, 10, 0.4)
+            remote = client.search(query, source_type, limit=10, match_threshold=0.4)
+            if [r['id'] for r in local] != [r['id'] for r in remote]:
+                raise AssertionError(f"서비스 검색 결과가 다름: {source_type} {query}")
+        events = list(client.answer_events(QUERIES[3], "블로그", limit=10, match_threshold=0.4))
+        deltas = [e["text"] for e in events if e["type"] == "delta"]
+        if events[0]["type"] != "results" or events[-1]["type"] != "done" or len(deltas) < 2:
+            raise AssertionError(f"답변 스트림 형식이 다름: {[e['type'] for e in events]}")
+        if "".join(deltas) != total.generate_answer_with_gpt(QUERIES[3], events[0]["results"], "블로그"):
+            raise AssertionError("스트리밍 답변이 직접 생성한 답변과 다름")
+        checks["answer_chunks"] = len(deltas)
+        try:
+            client.search("  ")
+            raise AssertionError("빈 검색어가 거부되지 않음")
+        except RuntimeError as e:
+            if "400" not in str(e):
+                raise
+
+        # 부하: 사용자마다 서로 다른 검색어로 검색 searches번 + 스트리밍 답변 1번 (업스트림 지연 포함)
+        servers = (ctx.standins.supabase, ctx.standins.openai)
+        saved = (total.embedding_model, [server.latency_ms for server in servers])
+        for server in servers:
+            server.latency_ms = max(server.latency_ms, 20)
+        runs = {}
+
+        def workload(search, answer):
+            def run(i):
+                latencies, first_chunk = [], None
+                for j in range(searches):
+                    t0 = time.perf_counter()
+                    results = search(f"{QUERIES[(i + j) % len(QUERIES)]} {i}-{j}", SOURCE_TYPES[j % len(SOURCE_TYPES)])
+                    latencies.append(time.perf_counter() - t0)
+                t0 = time.perf_counter()
+                for n, _ in enumerate(answer(f"{QUERIES[i % len(QUERIES)]} {i}", SOURCE_TYPES[-1], results)):
+                    if n == 0:
+                        first_chunk = time.perf_counter() - t0
+                latencies.append(time.perf_counter() - t0)
+                return latencies, first_chunk
+            seconds, per_user = concurrent_users(run, users)
+            return {"seconds": seconds, "latencies": [l for user_latencies, _ in per_user for l in user_latencies],
+                    "first_chunk": [f for _, f in per_user]}
+
+        try:
+            # 직접 처리도 서비스와 같은 비용 모델 (encode 호출마다 고정 비용)
+            total.embedding_model = SimulatedCostModel(total.embedding_model_name)
+            runs["in_process"] = workload(lambda q, s: total.semantic_search(q, s, 10, 0.4),
+                                          lambda q, s, results: [total.generate_answer_with_gpt(q, results, s)])
+            total.embedding_model = saved[0]
+            before = client._json("GET", "/health")
+            runs["service"] = workload(lambda q, s: client.search(q, s, limit=10, match_threshold=0.4),
+                                       lambda q, s, results: client.answer_stream(q, s, results))
+            after = client._json("GET", "/health")
+        finally:
+            total.embedding_model = saved[0]
+            for server, latency in zip(servers, saved[1]):
+                server.latency_ms = latency
+        requests = users * (searches + 1)
+        for label, run in runs.items():
+            stats = latency_stats(run["latencies"])
+            checks[label] = {"requests_per_s": round(requests / run["seconds"], 1), "p50_ms": stats["p50"],
+                             "p95_ms": stats["p95"], "answer_first_chunk_p50_ms": latency_stats(run["first_chunk"])["p50"]}
+        checks["service_embedding_requests"] = after["embedding_requests"] - before["embedding_requests"]
+        checks["service_embedding_batches"] = after["embedding_batches"] - before["embedding_batches"]
+        checks["speedup"] = round(runs["in_process"]["seconds"] / runs["service"]["seconds"], 2)
+        # 처리량은 같은 프로세스의 대역 서버가 상한이라 기록만 하고, 검색어 임베딩이 요청 사이에 묶이는지 확인
+        if checks["service_embedding_batches"] >= checks["service_embedding_requests"]:
+            raise AssertionError(f"동시 요청의 임베딩이 배치로 묶이지 않음: {checks}")
+
+        # 수집 작업 등록 → 서비스 작업자가 처리 (같은 검색어 중복 등록은 하나로)
+        job, created = client.ingest("collect", "블로그", f"{QUERIES[1]} 서비스 수집", 30)
+        duplicate, created_again = client.ingest("collect", "블로그", f"{QUERIES[1]} 서비스 수집", 30)
+        t0 = time.perf_counter()
+        while (job := next(j for j in client.jobs() if j["id"] == job["id"]))["status"] in ("queued", "running"):
+            if time.perf_counter() - t0 > 60:
+                raise AssertionError("서비스 수집 작업이 끝나지 않음")
+            time.sleep(0.05)
+        if not created or created_again or duplicate["id"] != job["id"] or job["status"] != "done" or not job["result"]["saved"]:
+            raise AssertionError(f"서비스 수집 작업 실패: {job}")
+        checks["ingest_saved"] = job["result"]["saved"]
+
+        # app1용 네이버 원본 요청은 서비스 캐시를 공유
+        ctx.standins.reset_counters()
+        bodies = [client.naver("blog", f"{QUERIES[2]} 원본", 20, 1, "date") for _ in range(3)]
+        if {status for status, _ in bodies} != {200} or ctx.standins.naver.snapshot().get("naver.blog", 0) != 1:
+            raise AssertionError("서비스 네이버 응답 캐시가 재사용되지 않음")
+    finally:
+        process.terminate()
+        process.wait(10)
+    ctx._corpus = None   # 서비스 수집 작업이 문서를 추가함
+    return {"ops": requests, "items": requests, "seconds": runs["service"]["seconds"],
+            "latencies": runs["service"]["latencies"], "checks": checks}
+
+def scenario_app1_pagination(ctx, size):
+    """app1 페이지 탐색: 페이지를 읽는 동안 다음 페이지를 미리 가져오면 '다음' 대기가 줄어드는지, 캐시/내보내기 범위 확인"""
+    import app1
+    from concurrent.futures import ThreadPoolExecutor
+    from result_pages import ResultPages, MAX_START
+    page_size, read_seconds = 20, 0.06
+    views = max(min(size // 100, 20), 5)
+    saved_latency = ctx.standins.naver.latency_ms
+    ctx.standins.naver.latency_ms = max(saved_latency, 40)
+    client = app1.NaverApiClient("standin-id", "standin-secret")
+    executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="bench-prefetch")
+
+    def browse(pages):
+        """첫 페이지부터 차례로 읽기 - 페이지마다 표시까지 기다린 시간"""
+        waits = []
+        for page in range(views):
+            t0 = time.perf_counter()
+            app1.items_frame(pages.page(page), "news")
+            waits.append(time.perf_counter() - t0)
+            time.sleep(read_seconds)
+        return waits
+
+    try:
+        # 기존 방식: 시작 위치를 옮길 때마다 한 페이지를 새로 요청
+        legacy_waits = []
+        for page in range(views):
+            t0 = time.perf_counter()
+            data = client.parse_json(client.get_news("페이지 기존", page_size, page * page_size + 1, "date"))
+            app1.items_frame(data["items"], "news")
+            legacy_waits.append(time.perf_counter() - t0)
+            time.sleep(read_seconds)
+        ctx.standins.reset_counters()
+        lazy = ResultPages(client.page_fetcher("news", "페이지 미리없음", "date"), page_size)
+        lazy_waits = browse(lazy)
+        prefetched = ResultPages(client.page_fetcher("news", "페이지 미리", "date"), page_size, executor)
+        prefetch_waits = browse(prefetched)
+        executor.shutdown(wait=True)
+        requests_after_browse = ctx.standins.naver.snapshot().get("naver.news", 0)
+
+        # 이미 본 페이지로 돌아가거나 범위를 내보내면 새 요청 없음 (범위는 요청한 페이지 그대로 이어짐)
+        revisit = [prefetched.page(page) for page in range(views)]
+        exported = list(prefetched.iter_items(0, views - 1))
+        direct = client.parse_json(client.get_news("페이지 미리", min(views * page_size, 100), 1, "date"))
+        extra_requests = ctx.standins.naver.snapshot().get("naver.news", 0) - requests_after_browse - 1
+    finally:
+        ctx.standins.naver.latency_ms = saved_latency
+
+    if [item["link"] for item in exported[:len(direct["items"])]] != [item["link"] for item in direct["items"]]:
+        raise AssertionError("페이지를 이어 붙인 결과가 한 번에 받은 결과와 다름")
+    if sum(len(items) for items in revisit) != len(exported) or extra_requests:
+        raise AssertionError(f"본 페이지를 다시 요청함: {extra_requests}회")
+    if prefetched.fetches != views + 1 or lazy.fetches != views:  # 미리 가져오기는 마지막 페이지 다음 한 장까지만
+        raise AssertionError(f"요청 수 이상: 미리 {prefetched.fetches}, 미리없음 {lazy.fetches}")
+    if prefetched.page_count != -(-min(prefetched.total, MAX_START + page_size - 1) // page_size):
+        raise AssertionError(f"페이지 수 계산 오류: {prefetched.page_count}")
+    lazy_stats, prefetch_stats = latency_stats(lazy_waits[1:]), latency_stats(prefetch_waits[1:])
+    if prefetch_stats["p50"] >= lazy_stats["p50"]:
+        raise AssertionError(f"미리 가져오기가 대기를 줄이지 못함: {prefetch_stats['p50']}ms ≥ {lazy_stats['p50']}ms")
+    return {"ops": views, "items": len(exported), "seconds": sum(prefetch_waits), "latencies": prefetch_waits,
+            "checks": {"page_views": views, "page_size": page_size, "read_ms": read_seconds * 1000,
+                       "legacy_wait_ms": latency_stats(legacy_waits[1:]), "lazy_wait_ms": lazy_stats,
+                       "prefetch_wait_ms": prefetch_stats, "naver_requests_browse": requests_after_browse,
+                       "page_count": prefetched.page_count}}
+
+def scenario_app1_exports(ctx, size):
+    """app1 내보내기: 형식별 생성 시간/크기/최대 메모리 - 페이지 단위로 이어 쓰기 vs 기존 전체 데이터프레임 변환"""
+    import app1
+    import base64
+    import gzip
+    import tracemalloc
+    import pandas as pd
+    from exports import EXPORT_FORMATS, export_bytes
+    from streamlit.runtime.download_data_util import convert_data_to_bytes_and_infer_mime
+    page_size = 100
+    total_items = max(size * 20, 1000)  # 네이버 한 검색의 상한(1100)보다 많은 여러 검색어 결과를 합친 규모
+    items_by_page = [[make_naver_item("news", f"내보내기 {page // 10}", page % 10 * page_size + i + 1)
+                      for i in range(page_size)] for page in range(total_items // page_size)]
+
+    def frames():
+        for items in items_by_page:
+            yield app1.items_frame(items, "news")
+
+    def legacy():
+        """기존 app1: 전체 데이터프레임 → CSV 문자열 + JSON(indent=4) 문자열 + base64 CSV 링크"""
+        df = app1.items_frame([item for items in items_by_page for item in items], "news")
+        csv = df.to_csv(index=False, encoding='utf-8-sig')
+        json_data = df.to_json(orient='records', force_ascii=False, indent=4)
+        b64 = base64.b64encode(csv.encode('utf-8-sig')).decode()
+        return len(csv.encode('utf-8-sig')) + len(json_data.encode('utf-8')) + len(b64)
+
+    def measure(fn):
+        t0 = time.perf_counter()
+        fn()
+        seconds = time.perf_counter() - t0
+        tracemalloc.start()
+        try:
+            result = fn()
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+        return seconds, peak, result
+
+    formats = {}
+    latencies = []
+    legacy_seconds, legacy_peak, legacy_bytes = measure(legacy)
+    for fmt in EXPORT_FORMATS:
+        # app1 버튼과 같은 경로: data=callable의 반환값을 Streamlit이 bytes로 변환
+        seconds, peak, data = measure(lambda: export_bytes(fmt, frames()))
+        data = convert_data_to_bytes_and_infer_mime(data, TypeError(f"{fmt}: Streamlit이 받지 않는 내보내기 형식"))[0]
+        latencies.append(seconds)
+        formats[fmt] = {"seconds": round(seconds, 4), "bytes": len(data), "peak_mb": round(peak / 2 ** 20, 2)}
+        if fmt == "csv":
+            rows = len(pd.read_csv(io.BytesIO(data), encoding='utf-8-sig'))
+        elif fmt == "json":
+            rows = len(json.loads(data))
+        elif fmt == "jsonl.gz":
+            rows = len(gzip.decompress(data).splitlines())
+        else:
+            import pyarrow.parquet as pq
+            rows = pq.read_table(io.BytesIO(data)).num_rows
+        if rows != total_items:
+            raise AssertionError(f"{fmt} 내보내기 행 수 불일치: {rows}/{total_items}")
+        if peak >= legacy_peak:
+            raise AssertionError(f"{fmt} 내보내기 최대 메모리가 기존보다 큼: {peak} ≥ {legacy_peak}")
+    for fmt in ("jsonl.gz", "parquet"):
+        if fmt in formats and formats[fmt]["bytes"] >= formats["csv"]["bytes"]:
+            raise AssertionError(f"{fmt}가 CSV보다 큼")
+    return {"ops": len(formats), "items": total_items * len(formats), "seconds": sum(latencies), "latencies": latencies,
+            "checks": {"items": total_items, "formats": formats,
+                       "legacy": {"seconds": round(legacy_seconds, 4), "bytes": legacy_bytes,
+                                  "peak_mb": round(legacy_peak / 2 ** 20, 2)}}}
+
+def scenario_app1_thumbnails(ctx, size):
+    """app1 이미지 그리드: 원본을 브라우저가 직접 받기 vs 썸네일 프록시 캐시 - 그리기 시간과 전송 바이트
+
+    기존 방식은 브라우저가 호스트당 6개 연결로 원본을 받는다고 보고, 다시 그릴 때도 다시 받는 경우(캐시 없음)로 잽니다.
+    """
+    from concurrent.futures import ThreadPoolExecutor
+    from PIL import Image
+    from benchmarks.standins import ImageStandin
+    from thumbnails import ThumbnailCache
+    images = ImageStandin(latency_ms=20)
+    grid = max(min(size // 10, 100), 20)
+    items = [make_naver_item("image", "썸네일 그리드", position) for position in range(1, grid + 1)]
+    urls = [images.image_url(f"p{position}", item["sizewidth"], item["sizeheight"])
+            for position, item in enumerate(items, 1)]
+    cache_dir = tempfile.mkdtemp(prefix="bench-thumbnails-")
+
+    def browser_render():
+        with ThreadPoolExecutor(max_workers=6) as browser:
+            return sum(len(data) for data in browser.map(lambda url: urllib.request.urlopen(url).read(), urls))
+
+    def proxy_render(cache):
+        images.reset_counters()
+        t0 = time.perf_counter()
+        thumbnails = cache.get_many(urls)
+        seconds = time.perf_counter() - t0
+        return seconds, thumbnails, images.snapshot()
+
+    try:
+        browser_render()  # 대역 서버의 그림 생성은 재지 않음
+        legacy = []
+        for _ in range(2):
+            t0 = time.perf_counter()
+            legacy_bytes = browser_render()
+            legacy.append(time.perf_counter() - t0)
+
+        cache = ThumbnailCache(cache_dir, 64 * 1024 * 1024, size=320, workers=16)
+        cold_seconds, thumbnails, cold = proxy_render(cache)
+        warm_seconds, warm_thumbnails, warm = proxy_render(cache)
+        restarted = ThumbnailCache(cache_dir, 64 * 1024 * 1024, size=320, workers=16)
+        restart_seconds, _, restart = proxy_render(restarted)
+        served_bytes = sum(len(data) for data in thumbnails if data)
+
+        # 용량을 절반으로 줄이면 가장 오래 안 쓴 썸네일부터 지워지고 최근 것은 남음
+        small = ThumbnailCache(cache_dir, restarted.disk_bytes // 2, size=320, workers=16)
+        recent = urls[-3:]
+        images.reset_counters()
+        small.get_many(recent)
+        evicted_refetch = images.snapshot().get("image.requests", 0)
+    finally:
+        images.close()
+        shutil.rmtree(cache_dir, ignore_errors=True)
+
+    if any(data is None for data in thumbnails) or warm_thumbnails != thumbnails:
+        raise AssertionError("썸네일 생성 실패 또는 다시 그릴 때 내용이 다름")
+    largest = max(max(Image.open(io.BytesIO(data)).size) for data in thumbnails)
+    if largest > 320:
+        raise AssertionError(f"썸네일이 그리드 크기보다 큼: {largest}px")
+    if cold.get("image.requests", 0) != grid or warm.get("image.requests", 0) or restart.get("image.requests", 0):
+        raise AssertionError(f"캐시 미적중: 처음 {cold}, 다시 {warm}, 재시작 {restart}")
+    if served_bytes >= legacy_bytes:
+        raise AssertionError(f"썸네일 전송량이 원본보다 큼: {served_bytes} ≥ {legacy_bytes}")
+    if small.disk_bytes > restarted.disk_bytes // 2 or len(small) >= grid or evicted_refetch:
+        raise AssertionError(f"LRU 제거 이상: {small.disk_bytes}B, {len(small)}개, 최근 항목 재요청 {evicted_refetch}")
+    return {"ops": 3, "items": grid * 3, "seconds": cold_seconds + warm_seconds + restart_seconds,
+            "latencies": [cold_seconds, warm_seconds, restart_seconds],
+            "checks": {"grid": grid, "legacy_render_ms": [round(x * 1000, 1) for x in legacy],
+                       "legacy_bytes_per_render": legacy_bytes,
+                       "proxy_render_ms": {"cold": round(cold_seconds * 1000, 1), "warm": round(warm_seconds * 1000, 1),
+                                           "restart": round(restart_seconds * 1000, 1)},
+                       "origin_bytes_cold": cold.get("image.bytes", 0), "served_bytes_per_render": served_bytes,
+                       "largest_thumbnail_px": largest, "evicted_to": len(small)}}
+
+REQUIRED_METRICS = [
+    "naver_requests_total", "naver_request_seconds_bucket", "embedding_seconds_count",
+    "db_request_seconds_bucket", "rpc_requests_total", "ingested_documents_total",
+    "gpt_request_seconds_count", "gpt_tokens_total",
+]
+
+def scrape_metrics(url):
+    """/metrics 텍스트를 {시리즈: 값} 형태로 파싱"""
+    with urllib.request.urlopen(url, timeout=5) as response:
+        text = response.read().decode("utf-8")
+    series = {}
+    for line in text.splitlines():
+        if line and not line.startswith("#"):
+            name, _, value = line.rpartition(" ")
+            series[name] = float(value)
+    return series
+
+def scenario_metrics_scrape(ctx, size):
+    """수집/검색/답변 경로 실행 후 total.py의 /metrics 엔드포인트를 긁어 주요 시리즈 확인"""
+    total = ctx.apps["total"]
+    server = total.start_metrics_server()
+    if server is None:
+        raise RuntimeError("메트릭 엔드포인트가 시작되지 않았습니다 (METRICS_PORT 확인)")
+    host, port = server.server_address[:2]
+    url = f"http://{host}:{port}/metrics"
+
+    ctx.reset_store()
+    ctx.standins.naver.rate_limit_every = 4  # 429 집계 확인용
+    try:
+        for i in range(8):
+            collect(total, f"전자담배 메트릭 {i}", SOURCE_TYPES[i % 3], min(size, 20))
+    finally:
+        ctx.standins.naver.rate_limit_every = 0
+    for q in QUERIES[:ctx.queries]:
+        total.generate_answer_with_gpt(q, total.semantic_search(q, "블로그", 10, 0.1), "블로그")
+
+    seconds, latencies, results = timed_calls(scrape_metrics, [(url,)])
+    series = results[0]
+    missing = [m for m in REQUIRED_METRICS if not any(name.startswith(m) for name in series)]
+    rate_limited = sum(v for name, v in series.items() if name.startswith("naver_requests_total") and 'status="429"' in name)
+    if missing or not rate_limited:
+        raise AssertionError(f"메트릭 누락: {missing}, 429 집계: {rate_limited}")
+    return {"ops": 1, "items": len(series), "seconds": seconds, "latencies": latencies,
+            "checks": {"series": len(series), "naver_429": rate_limited, "missing": missing}}
+
+SCENARIOS = {
+    "ui_collect": scenario_ui_collect,
+    "batch_ingest": scenario_batch_ingest,
+    "process_json_file": scenario_process_json_file,
+    "semantic_search_total": scenario_semantic_search_total,
+    "semantic_search_app3": scenario_semantic_search_app3,
+    "generate_answer_with_gpt": scenario_generate_answer_with_gpt,
+    "metrics_scrape": scenario_metrics_scrape,
+    "single_flight_burst": scenario_single_flight_burst,
+    "naver_cache": scenario_naver_cache,
+    "item_display": scenario_item_display,
+    "reembed_migration": scenario_reembed_migration,
+    "projection_recall": scenario_projection_recall,
+    "pq_index": scenario_pq_index,
+    "shop_facets": scenario_shop_facets,
+    "news_time_index": scenario_news_time_index,
+    "embedding_server": scenario_embedding_server,
+    "answer_warmup": scenario_answer_warmup,
+    "multi_source": scenario_multi_source,
+    "collect_jobs": scenario_collect_jobs,
+    "storage_backends": scenario_storage_backends,
+    "incremental_refresh": scenario_incremental_refresh,
+    "price_history": scenario_price_history,
+    "query_expansion": scenario_query_expansion,
+    "search_service": scenario_search_service,
+    "app1_pagination": scenario_app1_pagination,
+    "app1_exports": scenario_app1_exports,
+    "app1_thumbnails": scenario_app1_thumbnails,
+}
+
+class BenchContext:
+    """시나리오 간에 공유되는 대역 서버, 앱 모듈, 적재된 말뭉치 상태"""
+
+    def __init__(self, standins, apps, queries):
+        self.standins = standins
+        self.apps = apps
+        self.queries = queries
+        self._corpus = None
+
+    def reset_store(self):
+        """문서 저장소 비우기 (적재된 말뭉치 정보도 무효화)"""
+        self.standins.supabase.reset()
+        self._corpus = None
+
+    def ensure_corpus(self, kind, size):
+        """검색 시나리오용 말뭉치 적재 (같은 종류/크기면 재사용)"""
+        if self._corpus == (kind, size):
+            return
+        if kind == "app3":
+            embed = lambda text: hashing_embedding(text, 1536)  # OpenAIStandin과 같은 벡터 공간
+            tag = embedding_tag(self.apps["app3"].EMBEDDING_MODEL_NAME)
+        else:
+            embed = padded_local_embedding(self.apps["total"].embedding_model)
+            tag = embedding_tag(self.apps["total"].embedding_model_name)
+        seed_corpus(self.standins.supabase, size, embed, tag)
+        self._corpus = (kind, size)
+
+# ---------------------------------------------------------------------------
+# 리포트
+# ---------------------------------------------------------------------------
+
+def git_revision():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT, text=True).strip()
+    except Exception:
+        return None
+
+def compare_reports(baseline, report):
+    """기존 리포트 대비 처리량 변화 출력"""
+    previous = {(r["scenario"], r["size"]): r for r in baseline.get("results", [])}
+    print(f"\n{'scenario':<28}{'size':>8}{'baseline/s':>14}{'current/s':>14}{'change':>10}")
+    for result in report["results"]:
+        old = previous.get((result["scenario"], result["size"]))
+        if not old or not old.get("ops_per_s"):
+            continue
+        change = (result["ops_per_s"] - old["ops_per_s"]) / old["ops_per_s"] * 100
+        print(f"{result['scenario']:<28}{result['size']:>8}{old['ops_per_s']:>14.2f}{result['ops_per_s']:>14.2f}{change:>9.1f}%")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="로컬 대역 서버 기반 벤치마크")
+    parser.add_argument("--sizes", default=",".join(str(s) for s in DEFAULT_SIZES), help="문서 수 목록 (쉼표 구분)")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help="실행할 시나리오 (쉼표 구분)")
+    parser.add_argument("--queries", type=int, default=len(QUERIES), help="검색 시나리오의 소스별 쿼리 수")
+    parser.add_argument("--output", default=DEFAULT_OUTPUT, help="JSON 리포트 경로")
+    parser.add_argument("--compare", help="비교할 기존 JSON 리포트")
+    parser.add_argument("--real-model", action="store_true", help="해싱 모델 대신 실제 SentenceTransformer 사용")
+    parser.add_argument("--naver-latency-ms", type=float, default=0)
+    parser.add_argument("--db-latency-ms", type=float, default=0)
+    parser.add_argument("--openai-latency-ms", type=float, default=0)
+    args = parser.parse_args(argv)
+
+    sizes = [int(s) for s in args.sizes.split(",") if s]
+    scenario_names = [s for s in args.scenarios.split(",") if s]
+    unknown = set(scenario_names) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"알 수 없는 시나리오: {', '.join(sorted(unknown))}")
+
+    standins = Standins(args.naver_latency_ms, args.db_latency_ms, args.openai_latency_ms)
+    try:
+        apps = load_apps(standins, real_model=args.real_model)
+        ctx = BenchContext(standins, apps, min(args.queries, len(QUERIES)))
+
+        results = []
+        for size in sizes:
+            for name in scenario_names:
+                standins.reset_counters()
+                print(f"[{name}] size={size} ...", end=" ", flush=True)
+                outcome = SCENARIOS[name](ctx, size)
+                upstream = standins.counters()
+                result = {
+                    "scenario": name,
+                    "size": size,
+                    "ops": outcome["ops"],
+                    "items": outcome["items"],
+                    "seconds": round(outcome["seconds"], 4),
+                    "ops_per_s": round(outcome["ops"] / outcome["seconds"], 3) if outcome["seconds"] else None,
+                    "items_per_s": round(outcome["items"] / outcome["seconds"], 3) if outcome["seconds"] else None,
+                    "latency_ms": latency_stats(outcome["latencies"]),
+                    "upstream": upstream,
+                }
+                if "checks" in outcome:
+                    result["checks"] = outcome["checks"]
+                results.append(result)
+                print(f"{result['seconds']:.2f}s, {result['ops_per_s']} ops/s")
+
+        report = {
+            "generated_at": datetime.now().isoformat(timespec="seconds"),
+            "git_revision": git_revision(),
+            "environment": {
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "numpy": np.__version__,
+                "embedding_model": "real" if args.real_model else f"{HashingEmbeddingModel.__name__}(768)",
+            },
+            "config": {
+                "sizes": sizes,
+                "queries_per_source": ctx.queries,
+                "naver_latency_ms": args.naver_latency_ms,
+                "db_latency_ms": args.db_latency_ms,
+                "openai_latency_ms": args.openai_latency_ms,
+            },
+            "results": results,
+        }
+
+        if args.compare and os.path.exists(args.compare):
+            with open(args.compare, encoding="utf-8") as f:
+                compare_reports(json.load(f), report)
+
+        if args.output:
+            os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+            with open(args.output, "w", encoding="utf-8") as f:
+                json.dump(report, f, ensure_ascii=False, indent=2)
+            print(f"리포트 저장: {args.output}")
+        return report
+    finally:
+        standins.close()
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,628 @@
+# -*- coding: utf-8 -*-
+"""외부 API 로컬 대역 서버
+
+- NaverStandin: 네이버 검색 API (/v1/search/{blog,news,shop,image}) 응답 형식 그대로 생성
+- SupabaseStandin: PostgREST의 documents 테이블 + match_documents RPC 인메모리 구현
+- OpenAIStandin: /v1/chat/completions, /v1/embeddings 가짜 엔드포인트
+- HashingEmbeddingModel: SentenceTransformer 대신 쓰는 결정적 임베딩 모델
+
+모든 응답은 (엔드포인트, 쿼리, 위치)에서 결정적으로 만들어지므로 실행마다 같은 결과가 나옵니다.
+"""
+import hashlib
+import io
+import json
+import random
+import re
+import threading
+import time
+import zlib
+from collections import Counter
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qsl
+
+import numpy as np
+
+# ---------------------------------------------------------------------------
+# 공통: 결정적 해싱 임베딩
+# ---------------------------------------------------------------------------
+
+_TOKEN_RE = re.compile(r"[\w가-힣]+")
+
+def hashing_embedding(text, dim):
+    """단어/글자 bigram 해싱으로 만든 정규화된 결정적 벡터 (비슷한 텍스트는 비슷한 벡터)"""
+    vector = np.zeros(dim, dtype=np.float32)
+    for token in _TOKEN_RE.findall(text or ""):
+        features = [token] + [token[i:i + 2] for i in range(len(token) - 1)]
+        for feature in features:
+            h = zlib.crc32(feature.encode("utf-8"))
+            vector[h % dim] += 1.0 if (h >> 16) & 1 else -1.0
+    norm = np.linalg.norm(vector)
+    if norm > 0:
+        vector /= norm
+    return vector
+
+class HashingEmbeddingModel:
+    """SentenceTransformer.encode 호환 로컬 임베딩 모델 (768차원)"""
+
+    def __init__(self, model_name_or_path=None, dim=768, **kwargs):
+        self.model_name = model_name_or_path
+        self.dim = dim
+
+    def get_sentence_embedding_dimension(self):
+        return self.dim
+
+    def encode(self, sentences, batch_size=32, show_progress_bar=False, convert_to_numpy=True,
+               convert_to_tensor=False, normalize_embeddings=False, **kwargs):
+        if isinstance(sentences, str):
+            return hashing_embedding(sentences, self.dim)
+        return np.stack([hashing_embedding(s, self.dim) for s in sentences]) if sentences else np.zeros((0, self.dim), dtype=np.float32)
+
+class SimulatedCostModel(HashingEmbeddingModel):
+    """연산 장치 하나를 쓰는 실제 모델처럼 encode마다 고정 비용 + 텍스트당 비용이 드는 해싱 모델
+
+    호출은 잠금으로 직렬화되므로 한 번에 여러 텍스트를 넣을수록 텍스트당 비용이 줄어듭니다.
+    """
+
+    def __init__(self, model_name_or_path=None, dim=768, call_ms=8.0, text_ms=0.5, **kwargs):
+        super().__init__(model_name_or_path, dim)
+        self.call_ms = call_ms
+        self.text_ms = text_ms
+        self._device = threading.Lock()
+
+    def encode(self, sentences, **kwargs):
+        count = 1 if isinstance(sentences, str) else len(sentences)
+        with self._device:
+            time.sleep((self.call_ms + self.text_ms * count) / 1000)
+        return super().encode(sentences, **kwargs)
+
+# ---------------------------------------------------------------------------
+# 공통: HTTP 서버 베이스
+# ---------------------------------------------------------------------------
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+    request_queue_size = 256   # 동시 사용자 부하에서 새 연결이 리셋되지 않도록 (기본 5)
+
+class StandinServer:
+    """백그라운드 스레드에서 도는 로컬 HTTP 대역 서버"""
+
+    def __init__(self, latency_ms=0):
+        self.latency_ms = latency_ms
+        self.counters = Counter()
+        self._counter_lock = threading.Lock()
+        standin = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = True  # keep-alive에서 헤더/본문 분리 전송 시 지연(ACK 대기) 방지
+
+            def log_message(self, format, *args):
+                pass
+
+            def _dispatch(self, method):
+                parts = urlsplit(self.path)
+                length = int(self.headers.get("Content-Length") or 0)
+                body = self.rfile.read(length) if length else b""
+                if standin.latency_ms:
+                    time.sleep(standin.latency_ms / 1000)
+                try:
+                    status, payload, headers = standin.handle(method, parts.path, parse_qsl(parts.query, keep_blank_values=True), self.headers, body)
+                except Exception as e:
+                    status, payload, headers = 500, {"message": str(e)}, {}
+                data = payload if isinstance(payload, bytes) else json.dumps(payload, ensure_ascii=False).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", headers.pop("Content-Type", "application/json; charset=utf-8"))
+                self.send_header("Content-Length", str(len(data)))
+                for key, value in headers.items():
+                    self.send_header(key, value)
+                self.end_headers()
+                if method != "HEAD":
+                    self.wfile.write(data)
+
+            def do_GET(self):
+                self._dispatch("GET")
+
+            def do_HEAD(self):
+                self._dispatch("HEAD")
+
+            def do_POST(self):
+                self._dispatch("POST")
+
+            def do_PATCH(self):
+                self._dispatch("PATCH")
+
+            def do_DELETE(self):
+                self._dispatch("DELETE")
+
+        self.server = _Server(("127.0.0.1", 0), Handler)
+        self.thread = threading.Thread(target=self.server.serve_forever, name=type(self).__name__, daemon=True)
+        self.thread.start()
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def count(self, key, n=1):
+        with self._counter_lock:
+            self.counters[key] += n
+
+    def reset_counters(self):
+        with self._counter_lock:
+            self.counters.clear()
+
+    def snapshot(self):
+        with self._counter_lock:
+            return dict(self.counters)
+
+    def handle(self, method, path, query, headers, body):
+        raise NotImplementedError
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+# ---------------------------------------------------------------------------
+# 네이버 검색 API 대역
+# ---------------------------------------------------------------------------
+
+_WORDS = ["전자담배", "액상", "입호흡", "폐호흡", "기기", "코일", "팟", "니코틴", "무화기", "배터리",
+          "가성비", "추천", "후기", "입문", "초보", "맛", "향", "멘솔", "과일", "규제", "세금",
+          "건강", "연구", "정부", "판매", "가격", "할인", "신제품", "출시", "안전", "청소년"]
+_PUBLISHERS = ["yna.co.kr", "news1.kr", "hani.co.kr", "chosun.com", "donga.com", "mk.co.kr", "hankyung.com"]
+_MALLS = ["네이버", "쿠팡", "11번가", "G마켓", "베이프샵", "액상나라", "전담마켓"]
+_BRANDS = ["릴", "아이코스", "글로", "베이포레소", "긱베이프", "부푸", "유웰"]
+
+def _sentence(rng, query, n_words):
+    words = [rng.choice(_WORDS) for _ in range(n_words)]
+    words.insert(rng.randrange(len(words) + 1), f"<b>{query}</b>")
+    return " ".join(words)
+
+def make_naver_item(endpoint, query, position):
+    """(엔드포인트, 쿼리, 위치)로부터 실제 응답 형식의 아이템 생성"""
+    seed = zlib.crc32(f"{endpoint}|{query}|{position}".encode("utf-8"))
+    rng = random.Random(seed)
+    uid = f"{seed:08x}{position:06d}"
+    base_date = datetime(2025, 5, 1) - timedelta(hours=position * 3)
+
+    if endpoint == "blog":
+        user = f"user{rng.randrange(10000)}"
+        return {
+            "title": _sentence(rng, query, rng.randint(3, 8)),
+            "link": f"https://blog.naver.com/{user}/{uid}",
+            "description": _sentence(rng, query, rng.randint(15, 60)),
+            "bloggername": f"블로거{rng.randrange(1000)}",
+            "bloggerlink": f"blog.naver.com/{user}",
+            "postdate": base_date.strftime("%Y%m%d"),
+        }
+    if endpoint == "news":
+        publisher = rng.choice(_PUBLISHERS)
+        return {
+            "title": _sentence(rng, query, rng.randint(4, 10)),
+            "originallink": f"https://www.{publisher}/news/{uid}",
+            "link": f"https://n.news.naver.com/mnews/article/{uid}",
+            "description": _sentence(rng, query, rng.randint(20, 80)),
+            "pubDate": base_date.strftime("%a, %d %b %Y %H:%M:%S +0900"),
+        }
+    if endpoint == "shop":
+        price = rng.randrange(5, 300) * 1000
+        brand = rng.choice(_BRANDS)
+        return {
+            "title": _sentence(rng, query, rng.randint(3, 8)),
+            "link": f"https://search.shopping.naver.com/catalog/{uid}",
+            "image": f"https://shopping-phinf.pstatic.net/{uid}.jpg",
+            "lprice": str(price),
+            "hprice": str(price + rng.randrange(0, 50) * 1000) if rng.random() < 0.3 else "",
+            "mallName": rng.choice(_MALLS),
+            "productId": str(seed % 10 ** 11 + position),
+            "productType": str(rng.choice([1, 2, 3])),
+            "brand": brand,
+            "maker": brand,
+            "category1": "생활/건강",
+            "category2": "흡연용품",
+            "category3": "전자담배",
+            "category4": rng.choice(["액상", "기기", "코일", ""]),
+        }
+    # image
+    return {
+        "title": _sentence(rng, query, rng.randint(2, 6)),
+        "link": f"https://search.pstatic.net/common/{uid}.jpg",
+        "thumbnail": f"https://search.pstatic.net/thumb/{uid}.jpg",
+        "sizeheight": str(rng.randrange(200, 1200)),
+        "sizewidth": str(rng.randrange(200, 1200)),
+    }
+
+class NaverStandin(StandinServer):
+    """네이버 검색 API 대역 (쿼리별 total_per_query개의 결정적 결과)
+
+    rate_limit_every가 N이면 N번째 요청마다 429(호출 한도 초과)를 돌려줍니다.
+    """
+
+    ENDPOINTS = ("blog", "news", "shop", "image")
+
+    def __init__(self, total_per_query=1000, latency_ms=0, rate_limit_every=0):
+        self.total_per_query = total_per_query
+        self.rate_limit_every = rate_limit_every
+        self.price_round = 0   # 0보다 크면 쇼핑 상품 절반의 가격이 회차마다 10%씩 내려감
+        self._requests = 0
+        self._published = {}
+        super().__init__(latency_ms)
+
+    def publish(self, endpoint, query, count):
+        """(엔드포인트, 쿼리)에 새 글 count개 추가 - 최신 글이 맨 앞(위치 0, -1, ...)에 붙음"""
+        with self._counter_lock:
+            self._published[(endpoint, query)] = self._published.get((endpoint, query), 0) + count
+
+    @property
+    def base_url(self):
+        return f"{self.url}/v1/search/"
+
+    def handle(self, method, path, query, headers, body):
+        endpoint = path.rstrip("/").rsplit("/", 1)[-1]
+        if endpoint.endswith(".json"):
+            endpoint = endpoint[:-5]
+        self.count(f"naver.{endpoint}")
+        if endpoint not in self.ENDPOINTS:
+            return 404, {"errorMessage": "Not Found", "errorCode": "404"}, {}
+        if not headers.get("X-Naver-Client-Id") or not headers.get("X-Naver-Client-Secret"):
+            return 401, {"errorMessage": "Authentication failed", "errorCode": "024"}, {}
+        with self._counter_lock:
+            self._requests += 1
+            limited = self.rate_limit_every and self._requests % self.rate_limit_every == 0
+        if limited:
+            self.count("naver.429")
+            return 429, {"errorMessage": "Rate limit exceeded. (속도 제한을 초과했습니다.)", "errorCode": "012"}, {}
+
+        params = dict(query)
+        q = params.get("query", "")
+        if not q:
+            return 400, {"errorMessage": "Incorrect query request", "errorCode": "SE01"}, {}
+        display = min(max(int(params.get("display", 10)), 1), 100)
+        start = min(max(int(params.get("start", 1)), 1), 1000)
+
+        published = self._published.get((endpoint, q), 0)
+        total = self.total_per_query + published
+        end = min(start - 1 + display, total)
+        items = [make_naver_item(endpoint, q, position - published) for position in range(start, end + 1)]
+        if endpoint == "shop" and self.price_round:
+            for item in items:
+                if int(item["productId"]) % 2 == 0:
+                    item["lprice"] = str(int(item["lprice"]) * (10 - min(self.price_round, 9)) // 10)
+        return 200, {
+            "lastBuildDate": "Mon, 19 May 2025 10:00:00 +0900",
+            "total": total,
+            "start": start,
+            "display": len(items),
+            "items": items,
+        }, {}
+
+# ---------------------------------------------------------------------------
+# 이미지 CDN 대역
+# ---------------------------------------------------------------------------
+
+class ImageStandin(StandinServer):
+    """이미지 CDN 대역: /img/<이름>.jpg?w=&h= 에 그 크기의 결정적 JPEG (보낸 바이트 수를 셈)"""
+
+    def __init__(self, latency_ms=0):
+        self._images = {}
+        super().__init__(latency_ms)
+
+    def image_url(self, name, width, height):
+        return f"{self.url}/img/{name}.jpg?w={int(width)}&h={int(height)}"
+
+    def _render(self, name, width, height):
+        from PIL import Image
+        rng = np.random.default_rng(zlib.crc32(name.encode("utf-8")))
+        # 저해상도 색 격자를 키우고 잡음을 얹어 실제 사진 정도로 압축되게
+        base = Image.fromarray(rng.integers(0, 256, (12, 16, 3), dtype=np.uint8)).resize((width, height), Image.BICUBIC)
+        pixels = np.asarray(base, dtype=np.int16) + rng.integers(-12, 13, (height, width, 3), dtype=np.int16)
+        out = io.BytesIO()
+        Image.fromarray(np.clip(pixels, 0, 255).astype(np.uint8)).save(out, format="JPEG", quality=90)
+        return out.getvalue()
+
+    def handle(self, method, path, query, headers, body):
+        if not path.startswith("/img/"):
+            return 404, {"message": "Not Found"}, {}
+        params = dict(query)
+        name = path[len("/img/"):]
+        width, height = min(int(params.get("w", 800)), 4000), min(int(params.get("h", 600)), 4000)
+        key = (name, width, height)
+        with self._counter_lock:
+            data = self._images.get(key)
+        if data is None:
+            data = self._render(name, width, height)
+            with self._counter_lock:
+                self._images[key] = data
+        self.count("image.requests")
+        self.count("image.bytes", len(data))
+        return 200, data, {"Content-Type": "image/jpeg"}
+
+# ---------------------------------------------------------------------------
+# Supabase (PostgREST) 대역
+# ---------------------------------------------------------------------------
+
+def _json_path(row, column):
+    """'metadata->>url' 같은 PostgREST 컬럼 표현식 해석"""
+    if "->>" in column:
+        base, key = column.split("->>", 1)
+        value = row.get(base)
+        if isinstance(value, dict):
+            value = value.get(key)
+            return None if value is None else str(value)
+        return None
+    return row.get(column)
+
+class SupabaseStandin(StandinServer):
+    """documents 테이블과 match_documents RPC의 인메모리 구현 (PostgREST 형식)"""
+
+    def __init__(self, dim=1536, latency_ms=0):
+        self.dim = dim
+        self._lock = threading.RLock()
+        self.reset()
+        super().__init__(latency_ms)
+
+    def reset(self):
+        with self._lock:
+            self.rows = []                      # id - 1 위치에 저장
+            self.url_index = {}                 # metadata.url -> [row index]
+            self._matrix = np.zeros((1024, self.dim), dtype=np.float32)
+            self._valid = np.zeros(1024, dtype=bool)
+            self._raw_norms = np.zeros(1024, dtype=np.float32)  # 원래 벡터 복원용
+
+    # --- 저장 ---
+
+    def _append(self, row, index=None):
+        """행 추가 (index를 주면 그 자리의 기존 행을 교체 - upsert)"""
+        replace = index is not None
+        if not replace:
+            index = len(self.rows)
+        if index >= len(self._matrix):
+            grow = len(self._matrix)
+            self._matrix = np.vstack([self._matrix, np.zeros((grow, self.dim), dtype=np.float32)])
+            self._valid = np.concatenate([self._valid, np.zeros(grow, dtype=bool)])
+            self._raw_norms = np.concatenate([self._raw_norms, np.zeros(grow, dtype=np.float32)])
+        row = dict(row)
+        row["id"] = index + 1
+        if replace:
+            old_metadata = self.rows[index].get("metadata")
+            if isinstance(old_metadata, dict) and old_metadata.get("url"):
+                self.url_index[str(old_metadata["url"])].remove(index)
+            self._valid[index] = False
+        embedding = row.pop("embedding", None)
+        if isinstance(embedding, str):
+            embedding = json.loads(embedding)
+        if embedding is not None:
+            vector = np.asarray(embedding, dtype=np.float32)
+            if vector.shape != (self.dim,):
+                raise ValueError(f"expected {self.dim} dimensions, not {vector.shape[0]}")
+            norm = np.linalg.norm(vector)
+            self._matrix[index] = vector / norm if norm > 0 else vector
+            self._valid[index] = norm > 0
+            self._raw_norms[index] = norm
+        if replace:
+            self.rows[index] = row
+        else:
+            self.rows.append(row)
+        metadata = row.get("metadata")
+        if isinstance(metadata, dict) and metadata.get("url"):
+            self.url_index.setdefault(str(metadata["url"]), []).append(index)
+        return row
+
+    def _output(self, index, columns):
+        """행 출력 (embedding은 pgvector처럼 문자열로 직렬화)"""
+        row = self.rows[index]
+        out = dict(row) if columns is None else {c.split("->>")[-1]: _json_path(row, c) for c in columns if c != "embedding"}
+        if columns is None or "embedding" in columns:
+            out["embedding"] = json.dumps((self._matrix[index] * self._raw_norms[index]).tolist()) if self._valid[index] else None
+        return out
+
+    def seed(self, rows):
+        """HTTP를 거치지 않고 문서를 대량 적재 (검색 벤치마크 준비용)"""
+        with self._lock:
+            for row in rows:
+                self._append(row)
+
+    def __len__(self):
+        return len(self.rows)
+
+    # --- 조회 ---
+
+    def _candidate_indexes(self, filters):
+        for column, op, value in filters:
+            if column == "metadata->>url" and op == "eq":
+                return list(self.url_index.get(value, []))
+            if column == "metadata->>url" and op == "in":
+                options = [o.strip().strip('"') for o in value.strip("()").split(",")]
+                return sorted({i for o in options for i in self.url_index.get(o, [])})
+            if column == "id" and op in ("eq", "in"):
+                options = [o.strip().strip('"') for o in value.strip("()").split(",")]
+                return sorted({int(o) - 1 for o in options if o.isdigit() and 0 < int(o) <= len(self.rows)})
+        return range(len(self.rows))
+
+    def _select(self, query):
+        select = "*"
+        limit = None
+        offset = 0
+        order = None
+        filters = []
+        for key, value in query:
+            if key == "select":
+                select = value
+            elif key == "limit":
+                limit = int(value)
+            elif key == "offset":
+                offset = int(value)
+            elif key == "order":
+                column, _, direction = value.partition(".")
+                order = (column, direction.startswith("desc"))
+            else:
+                op, _, operand = value.partition(".")
+                filters.append((key, op, operand))
+
+        def matches(row):
+            for column, op, operand in filters:
+                actual = _json_path(row, column)
+                if op == "eq" and str(actual) != operand:
+                    return False
+                if op == "neq" and str(actual) == operand:
+                    return False
+                if op in ("gt", "gte", "lt", "lte"):
+                    if actual is None:
+                        return False
+                    a, b = float(actual), float(operand)
+                    if not {"gt": a > b, "gte": a >= b, "lt": a < b, "lte": a <= b}[op]:
+                        return False
+                if op == "in":
+                    options = [o.strip().strip('"') for o in operand.strip("()").split(",")]
+                    if str(actual) not in options:
+                        return False
+            return True
+
+        columns = [c.strip() for c in select.split(",")] if select != "*" else None
+        with self._lock:
+            matched = [i for i in self._candidate_indexes(filters) if matches(self.rows[i])]
+            if order is not None and order != ("id", False):   # 행은 id 순으로 저장되어 있음
+                column, descending = order
+                if column == "id":
+                    matched.reverse()
+                else:
+                    matched.sort(key=lambda i: (_json_path(self.rows[i], column) is None, _json_path(self.rows[i], column)),
+                                 reverse=descending)
+            total = len(matched)
+            matched = matched[offset:offset + limit if limit is not None else None]
+            return total, [self._output(i, columns) for i in matched]
+
+    def match_documents(self, query_embedding, match_threshold, match_count):
+        """match_documents RPC: 코사인 유사도 상위 match_count개"""
+        if isinstance(query_embedding, str):
+            query_embedding = json.loads(query_embedding)
+        query = np.asarray(query_embedding, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        if norm == 0:
+            return []
+        query = query / norm
+        with self._lock:
+            n = len(self.rows)
+            if n == 0:
+                return []
+            scores = self._matrix[:n] @ query
+            scores[~self._valid[:n]] = -1.0
+            k = min(int(match_count), n)
+            top = np.argpartition(-scores, k - 1)[:k]
+            top = top[np.argsort(-scores[top])]
+            return [
+                {
+                    "id": self.rows[i]["id"],
+                    "content": self.rows[i].get("content"),
+                    "metadata": self.rows[i].get("metadata"),
+                    "similarity": float(scores[i]),
+                }
+                for i in top if scores[i] > match_threshold
+            ]
+
+    # --- HTTP ---
+
+    def handle(self, method, path, query, headers, body):
+        prefix = "/rest/v1/"
+        if not path.startswith(prefix):
+            return 404, {"message": "not found"}, {}
+        resource = path[len(prefix):]
+
+        if resource == "rpc/match_documents" and method == "POST":
+            self.count("db.rpc.match_documents")
+            args = json.loads(body or b"{}")
+            return 200, self.match_documents(args["query_embedding"], args.get("match_threshold", 0.0), args.get("match_count", 10)), {}
+
+        if resource != "documents":
+            return 404, {"message": f"relation \"{resource}\" does not exist"}, {}
+
+        prefer = headers.get("Prefer", "")
+        if method in ("GET", "HEAD"):
+            self.count("db.select")
+            total, rows = self._select(query)
+            extra = {}
+            if "count=" in prefer:
+                extra["Content-Range"] = f"0-{max(len(rows) - 1, 0)}/{total}" if rows else f"*/{total}"
+            return 200, rows, extra
+
+        if method == "POST":
+            payload = json.loads(body or b"[]")
+            rows = payload if isinstance(payload, list) else [payload]
+            upsert = "resolution=merge-duplicates" in prefer
+            self.count("db.upsert" if upsert else "db.insert")
+            self.count("db.upsert_rows" if upsert else "db.insert_rows", len(rows))
+            with self._lock:
+                inserted = []
+                for row in rows:
+                    index = None
+                    if upsert and row.get("id") is not None and 0 < int(row["id"]) <= len(self.rows):
+                        index = int(row["id"]) - 1
+                    inserted.append(self._output(self._append(row, index)["id"] - 1, None))
+            if "return=minimal" in prefer:
+                return 201, b"", {}
+            return 201, inserted, {}
+
+        return 405, {"message": "method not allowed"}, {}
+
+# ---------------------------------------------------------------------------
+# OpenAI 대역
+# ---------------------------------------------------------------------------
+
+class OpenAIStandin(StandinServer):
+    """chat.completions / embeddings 가짜 엔드포인트"""
+
+    def __init__(self, embedding_dim=1536, latency_ms=0):
+        self.embedding_dim = embedding_dim
+        super().__init__(latency_ms)
+
+    @property
+    def base_url(self):
+        return f"{self.url}/v1"
+
+    def handle(self, method, path, query, headers, body):
+        payload = json.loads(body or b"{}")
+        if path.endswith("/embeddings"):
+            inputs = payload.get("input", [])
+            if isinstance(inputs, str):
+                inputs = [inputs]
+            self.count("openai.embeddings")
+            self.count("openai.embedding_inputs", len(inputs))
+            data = [
+                {"object": "embedding", "index": i, "embedding": hashing_embedding(text, self.embedding_dim).tolist()}
+                for i, text in enumerate(inputs)
+            ]
+            tokens = sum(len(text) for text in inputs)
+            return 200, {"object": "list", "data": data, "model": payload.get("model"),
+                         "usage": {"prompt_tokens": tokens, "total_tokens": tokens}}, {}
+
+        if path.endswith("/chat/completions"):
+            messages = payload.get("messages", [])
+            prompt_chars = sum(len(m.get("content") or "") for m in messages)
+            digest = hashlib.sha1(json.dumps(messages, ensure_ascii=False).encode("utf-8")).hexdigest()[:8]
+            answer = f"로컬 대역 답변 ({digest}): 제공된 문서를 바탕으로 요약한 내용입니다."
+            self.count("openai.chat")
+            self.count("openai.prompt_tokens", prompt_chars)
+            if payload.get("stream"):
+                # stream=True: 어절 단위 chunk를 SSE로 (마지막은 finish_reason + [DONE])
+                words = answer.split(" ")
+                pieces = [word + (" " if i < len(words) - 1 else "") for i, word in enumerate(words)]
+                chunks = [{"id": f"chatcmpl-{digest}", "object": "chat.completion.chunk", "created": 0,
+                           "model": payload.get("model", "gpt-4o-mini"),
+                           "choices": [{"index": 0, "delta": delta, "finish_reason": reason}]}
+                          for delta, reason in [({"role": "assistant", "content": piece}, None) for piece in pieces] + [({}, "stop")]]
+                body = "".join(f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n" for chunk in chunks) + "data: [DONE]\n\n"
+                return 200, body.encode("utf-8"), {"Content-Type": "text/event-stream"}
+            return 200, {
+                "id": f"chatcmpl-{digest}",
+                "object": "chat.completion",
+                "created": 0,
+                "model": payload.get("model", "gpt-4o-mini"),
+                "choices": [{"index": 0, "finish_reason": "stop",
+                             "message": {"role": "assistant", "content": answer}}],
+                "usage": {"prompt_tokens": prompt_chars, "completion_tokens": len(answer),
+                          "total_tokens": prompt_chars + len(answer)},
+            }, {}
+
+        return 404, {"error": {"message": "not found"}}, {}
@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+"""수집/갱신 작업 본문 (total.py 작업 스레드와 검색 서비스 공용)
+
+화면이나 /ingest 요청은 jobqueue에 작업만 등록하고, 작업자가 여기의 collect/refresh를 실행합니다.
+모델, 저장소, 네이버 응답 캐시, single-flight, URL Bloom 필터/갱신 상태는 호출하는 쪽이 넘겨줍니다.
+"""
+import ingest
+import refresh
+from metrics import INGESTED_DOCUMENTS
+
+def dedup_key(kind, source_type, query):
+    """같은 소스/검색어의 진행 중 작업은 하나만 (공백/대소문자 무시)"""
+    return f"{kind}\t{source_type}\t{' '.join(query.split()).lower()}"
+
+def job_params(source_type, query, count=20):
+    return {"source_type": source_type, "query": query, "count": int(count)}
+
+class CollectJobs:
+    """작업 종류 → 실행 함수 (handlers를 JobWorkers에 넘김)
+
+    on_saved(summary): 새 문서를 저장한 작업이 끝난 뒤 호출 (로컬 인덱스 반영, 미리 계산한 답변 갱신 등)
+    """
+
+    def __init__(self, model, model_name, store, credentials, url_bloom, refresh_state, naver_cache=None,
+                 single_flight=None, base_url=ingest.NAVER_API_BASE_URL, projection=None, prices=None, on_saved=None):
+        self.model = model
+        self.model_name = model_name
+        self.store = store
+        self.credentials = credentials
+        self.url_bloom = url_bloom
+        self.refresh_state = refresh_state
+        self.naver_cache = naver_cache
+        self.single_flight = single_flight
+        self.base_url = base_url
+        self.projection = projection
+        self.prices = prices
+        self.on_saved = on_saved
+
+    @property
+    def handlers(self):
+        return {"collect": self.collect, "refresh": self.refresh}
+
+    def fetcher(self, stats, sort):
+        return ingest.NaverFetcher(*self.credentials, stats, base_url=self.base_url, sort=sort,
+                                   cache=self.naver_cache, single_flight=self.single_flight)
+
+    def collect(self, params, report):
+        """수집 작업: 네이버 페이지 수집 → 묶음 임베딩 → 묶음 저장 (ingest 파이프라인)"""
+        source_type, query, count = params["source_type"], params["query"], int(params["count"])
+        stats = ingest.Stats()
+        report(stage="수집 중", items=0, saved=0, target=count)
+        progress = lambda summary: report(stage="저장 중", items=summary["items"], saved=summary["saved"],
+                                          duplicates=summary["duplicates"], target=count)
+        summary, errors = ingest.run([(source_type, query)], self.model, self.store, self.fetcher(stats, "sim"),
+                                     ingest.Checkpoint(None), stats, workers=1, max_items=count, batch_size=16,
+                                     progress=progress, model_name=self.model_name, projection=self.projection,
+                                     prices=self.prices)
+        if errors:
+            raise RuntimeError(errors[0][2])
+        self._finished(source_type, summary)
+        return summary
+
+    def refresh(self, params, report):
+        """갱신 작업: sort=date로 새 글만 가져오다 이미 저장된 글을 만나면 멈춤"""
+        source_type, query = params["source_type"], params["query"]
+        stats = ingest.Stats()
+        report(stage="새 글 확인 중", items=0, saved=0)
+        summary, results, errors = refresh.refresh([(source_type, query)], self.model, self.store, self.fetcher(stats, "date"),
+                                                   self.refresh_state, self.url_bloom, stats, workers=1, batch_size=16,
+                                                   model_name=self.model_name, projection=self.projection,
+                                                   prices=self.prices)
+        if errors:
+            raise RuntimeError(errors[0][2])
+        self.url_bloom.save(refresh.URL_BLOOM_PATH)
+        self._finished(source_type, summary)
+        return {**summary, "stop": results[ingest.job_key(source_type, query)]["stop"]}
+
+    def _finished(self, source_type, summary):
+        INGESTED_DOCUMENTS.inc(summary["saved"], source_type=source_type, result="saved")
+        INGESTED_DOCUMENTS.inc(summary["duplicates"], source_type=source_type, result="duplicate")
+        if summary["saved"] and self.on_saved is not None:
+            self.on_saved(summary)
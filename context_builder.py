@@ -0,0 +1,175 @@
+# -*- coding: utf-8 -*-
+"""GPT 답변용 컨텍스트 구성 (토큰 예산 + MMR 다양성)"""
+import logging
+import numpy as np
+
+try:
+    import tiktoken  # 로컬 토크나이저 (없으면 근사치 사용)
+except ImportError:
+    tiktoken = None
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TOKEN_BUDGET = 3000   # 컨텍스트(문서 목록)에 쓸 최대 토큰 수
+DEFAULT_MMR_LAMBDA = 0.7      # 1에 가까울수록 관련성, 0에 가까울수록 다양성 우선
+DUPLICATE_THRESHOLD = 0.95    # 이미 고른 문서와 이 이상 비슷하면 중복으로 보고 제외
+MIN_PARTIAL_TOKENS = 150      # 남은 예산이 이보다 크면 긴 문서를 잘라서라도 채움
+ENTRY_SEPARATOR = "\n"        # 문서 사이 구분자
+TRUNCATION_MARK = "…"         # 잘라낸 문서 끝 표시
+
+_encoding = None
+
+def _get_encoding():
+    """gpt-4o-mini 토크나이저 로딩 (한 번만)"""
+    global _encoding
+    if _encoding is None and tiktoken is not None:
+        try:
+            _encoding = tiktoken.encoding_for_model("gpt-4o-mini")
+        except Exception:
+            try:
+                _encoding = tiktoken.get_encoding("o200k_base")
+            except Exception:
+                _encoding = False  # 토크나이저 파일을 받을 수 없는 환경
+    return _encoding or None
+
+def count_tokens(text):
+    """텍스트의 토큰 수 계산"""
+    if not text:
+        return 0
+    encoding = _get_encoding()
+    if encoding is not None:
+        return len(encoding.encode(text))
+    # 토크나이저가 없으면 글자 수로 보수적으로 추정 (한글은 대략 글자당 1토큰)
+    return len(text)
+
+def truncate_to_tokens(text, max_tokens):
+    """텍스트를 최대 토큰 수에 맞게 자르기"""
+    if max_tokens <= 0:
+        return ""
+    encoding = _get_encoding()
+    if encoding is not None:
+        tokens = encoding.encode(text)
+        if len(tokens) <= max_tokens:
+            return text
+        return encoding.decode(tokens[:max_tokens])
+    return text[:max_tokens]
+
+def _normalize_rows(vectors):
+    """코사인 유사도 계산을 위한 행 단위 정규화"""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+def mmr_order(relevance, embeddings=None, mmr_lambda=DEFAULT_MMR_LAMBDA,
+              duplicate_threshold=DUPLICATE_THRESHOLD):
+    """
+    MMR(Maximal Marginal Relevance) 순서로 문서 인덱스 정렬
+
+    Parameters:
+    - relevance: 문서별 쿼리 유사도 리스트
+    - embeddings: 문서 임베딩 (없으면 유사도 순서 그대로 사용)
+    - mmr_lambda: 관련성과 다양성의 가중치
+    - duplicate_threshold: 이미 선택된 문서와 이 이상 유사하면 제외
+    """
+    relevance = np.asarray(relevance, dtype=np.float32)
+    if embeddings is None or len(relevance) == 0:
+        return [int(i) for i in np.argsort(-relevance, kind="stable")]
+
+    vectors = _normalize_rows(embeddings)
+    pairwise = vectors @ vectors.T
+
+    selected = []
+    remaining = list(range(len(relevance)))
+    max_sim = np.full(len(relevance), -1.0, dtype=np.float32)  # 선택된 문서들과의 최대 유사도
+
+    while remaining:
+        candidates = np.array(remaining)
+        redundancy = np.where(max_sim[candidates] < 0, 0.0, max_sim[candidates])
+        scores = mmr_lambda * relevance[candidates] - (1 - mmr_lambda) * redundancy
+        best = int(candidates[int(np.argmax(scores))])
+        remaining.remove(best)
+
+        if selected and max_sim[best] >= duplicate_threshold:
+            continue  # 거의 같은 내용의 문서는 건너뛰기
+
+        selected.append(best)
+        max_sim = np.maximum(max_sim, pairwise[best])
+
+    return selected
+
+def build_context(search_results, format_entry, token_budget=DEFAULT_TOKEN_BUDGET,
+                  embed_fn=None, mmr_lambda=DEFAULT_MMR_LAMBDA):
+    """
+    토큰 예산 안에서 최대한 많은 서로 다른 문서로 컨텍스트 구성
+
+    Parameters:
+    - search_results: 시맨틱 검색 결과 (similarity, content 포함)
+    - format_entry: (문서 번호, 검색 결과, 본문) -> 컨텍스트 문자열 함수
+    - token_budget: 컨텍스트에 사용할 최대 토큰 수
+    - embed_fn: 텍스트 리스트 -> 임베딩 배열 함수 (MMR 중복 제거용, 선택)
+    - mmr_lambda: MMR 관련성/다양성 가중치
+
+    Returns:
+    - (컨텍스트 문자열, 사용된 검색 결과 리스트, 통계 dict)
+    """
+    if not search_results:
+        return "", [], {"context_tokens": 0, "documents": 0, "candidates": 0, "truncated": 0}
+
+    relevance = [result.get('similarity', 0) for result in search_results]
+    embeddings = None
+    if embed_fn is not None and len(search_results) > 1:
+        try:
+            embeddings = embed_fn([result.get('content', '') for result in search_results])
+        except Exception as e:
+            logger.warning("MMR용 임베딩 생성 실패, 유사도 순서 사용: %s", e)
+
+    order = mmr_order(relevance, embeddings, mmr_lambda)
+
+    entries = []
+    used_results = []
+    used_tokens = 0
+    skipped = []
+    truncated = 0
+    separator_tokens = count_tokens(ENTRY_SEPARATOR)
+
+    for index in order:
+        result = search_results[index]
+        entry = format_entry(len(entries) + 1, result, result.get('content', ''))
+        entry_tokens = count_tokens(entry) + (separator_tokens if entries else 0)
+        if used_tokens + entry_tokens <= token_budget:
+            entries.append(entry)
+            used_results.append(result)
+            used_tokens += entry_tokens
+        else:
+            skipped.append(result)
+
+    # 남은 예산이 충분하면 들어가지 못한 가장 관련성 높은 문서를 잘라서 추가 (구분자와 말줄임표도 예산에 포함)
+    remaining = token_budget - used_tokens - (separator_tokens if entries else 0)
+    if skipped and remaining >= MIN_PARTIAL_TOKENS:
+        result = skipped[0]
+        header_tokens = count_tokens(format_entry(len(entries) + 1, result, ""))
+        content_budget = remaining - header_tokens - count_tokens(TRUNCATION_MARK)
+        while content_budget > 0:
+            content = truncate_to_tokens(result.get('content', ''), content_budget)
+            if not content:
+                break
+            entry = format_entry(len(entries) + 1, result, content + TRUNCATION_MARK)
+            # 이어 붙인 경계에서 토큰이 달라질 수 있어 실제 길이로 확인하고 넘치면 그만큼 더 자름
+            overflow = count_tokens(ENTRY_SEPARATOR.join(entries + [entry])) - token_budget
+            if overflow <= 0:
+                entries.append(entry)
+                used_results.append(result)
+                truncated += 1
+                break
+            content_budget -= overflow
+
+    context = ENTRY_SEPARATOR.join(entries)
+    used_tokens = count_tokens(context)
+    stats = {
+        "context_tokens": used_tokens,
+        "documents": len(entries),
+        "candidates": len(search_results),
+        "truncated": truncated,
+    }
+    return context, used_results, stats
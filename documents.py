@@ -0,0 +1,242 @@
+# -*- coding: utf-8 -*-
+"""네이버 검색 결과 → 저장용 문서 변환 (Streamlit 앱과 배치 수집 CLI 공용)"""
+import html
+import json
+import os
+import re
+from datetime import datetime, timedelta, timezone
+from email.utils import parsedate_to_datetime
+
+# 소스 타입별 네이버 검색 API 엔드포인트
+SOURCE_ENDPOINTS = {"블로그": "blog", "뉴스": "news", "쇼핑": "shop"}
+ENDPOINT_SOURCES = {"blog": "블로그", "news": "뉴스", "shop": "쇼핑", "image": "이미지"}
+
+EMBEDDING_DIM = 1536   # documents.embedding 컬럼 차원 (768차원 모델은 0으로 패딩)
+MAX_EMBEDDING_CHARS = 512
+
+# 임베딩 전처리(prepare_embedding_text/pad_embedding) 규칙 버전 - 규칙을 바꾸면 올리고 재임베딩
+EMBEDDING_VERSION = "v1"
+# 1이면 모델 태그가 없는(재임베딩 전) 행도 어떤 모델로 검색하든 결과에 포함
+INCLUDE_UNTAGGED_EMBEDDINGS = os.environ.get("EMBEDDING_INCLUDE_UNTAGGED", "0") == "1"
+# 태그 없는 기존 행은 기본적으로 검색에서 제외 (reembed.py로 태그를 붙인 뒤 검색됨)
+# 기존 total.py 행이 모두 한 모델로 만든 것이 확실하면 그 모델 이름 지정 - 그 모델로 검색할 때 태그 없는 total.py 행 포함
+# (app2 행은 collected_at으로 구분해 제외, total.py 대체 모델(MiniLM)로 저장한 적이 있으면 지정하지 말 것)
+UNTAGGED_EMBEDDING_MODEL = os.environ.get("EMBEDDING_UNTAGGED_MODEL", "")
+
+_TAG_RE = re.compile(r'<[^<]+?>')
+_HOST_RE = re.compile(r'^(?:https?://)?([^/]*)')
+
+# 소스 타입별 필드 매핑: 레코드 속성 -> 네이버 아이템 키 (HTML이 섞여 오는 필드는 HTML_FIELDS)
+FIELD_MAPS = {
+    "블로그": {"title": "title", "description": "description", "url": "link", "date": "postdate",
+              "author": "bloggername", "author_url": "bloggerlink"},
+    "뉴스": {"title": "title", "description": "description", "url": "link", "original_url": "originallink",
+            "date": "pubDate"},
+    "쇼핑": {"title": "title", "description": "category3", "url": "link", "image": "image",
+            "lprice": "lprice", "hprice": "hprice", "mall_name": "mallName", "maker": "maker", "brand": "brand",
+            "product_id": "productId", "product_type": "productType"},
+    "이미지": {"title": "title", "url": "link", "image": "thumbnail"},
+}
+DEFAULT_FIELD_MAP = {"title": "title", "description": "description", "url": "link"}
+HTML_FIELDS = ("title", "description")
+
+def clean_html(text):
+    """HTML 태그 제거 + 엔티티(&quot; 등) 복원"""
+    if not text:
+        return ''
+    return html.unescape(_TAG_RE.sub('', text))
+
+def publisher_from_url(url):
+    """원문 링크에서 언론사 도메인 추출"""
+    if not url:
+        return ''
+    return _HOST_RE.match(url).group(1)
+
+def parse_price(value):
+    """가격 문자열('12900', '12,900원', '') → 정수 (없거나 숫자가 아니면 None)"""
+    digits = re.sub(r'[^0-9]', '', str(value or ''))
+    return int(digits) if digits else None
+
+KST = timezone(timedelta(hours=9))
+
+def parse_date_epoch(value):
+    """네이버 날짜 → epoch 초 (뉴스 RFC-822 'Mon, 28 Apr 2025 21:00:00 +0900', 블로그 '20250428') - 실패하면 None"""
+    value = str(value or '').strip()
+    if not value:
+        return None
+    try:
+        if value.isdigit() and len(value) == 8:
+            return int(datetime.strptime(value, "%Y%m%d").replace(tzinfo=KST).timestamp())
+        return int(parsedate_to_datetime(value).timestamp())
+    except (TypeError, ValueError, IndexError):
+        return None
+
+def published_epoch(metadata):
+    """metadata의 게시 시각 (수집 시 저장한 published_at, 없으면 date 문자열에서 계산)"""
+    epoch = metadata.get('published_at')
+    return int(epoch) if epoch is not None else parse_date_epoch(metadata.get('date'))
+
+def facet_key(text):
+    """판매처/브랜드 비교용 정규화 키 (대소문자/공백 차이 무시)"""
+    return ' '.join(str(text or '').lower().split())
+
+def shop_facets(metadata):
+    """쇼핑 metadata의 타입 패싯 (수집 시 저장한 값이 없으면 문자열 필드에서 계산)"""
+    if 'price_min' in metadata:
+        return {key: metadata.get(key) for key in ('price_min', 'price_max', 'mall_key', 'brand_key')}
+    price_min = parse_price(metadata.get('lprice'))
+    price_max = parse_price(metadata.get('hprice'))
+    return {
+        'price_min': price_min,
+        'price_max': price_max if price_max is not None else price_min,
+        'mall_key': facet_key(metadata.get('mallname')),
+        'brand_key': facet_key(metadata.get('brand') or metadata.get('maker')),
+    }
+
+def parse_metadata(metadata):
+    """DB 행의 metadata (dict 또는 JSON 문자열)를 dict로"""
+    if isinstance(metadata, dict):
+        return metadata
+    if isinstance(metadata, str):
+        try:
+            parsed = json.loads(metadata)
+        except ValueError:
+            return {}
+        return parsed if isinstance(parsed, dict) else {}
+    return {}
+
+class NaverItem:
+    """네이버 검색 아이템 한 건을 한 번만 정리해 둔 레코드 (수집/화면/내보내기 공용)"""
+    __slots__ = ("source_type", "title", "description", "url", "original_url", "date", "author", "author_url",
+                 "publisher", "image", "lprice", "hprice", "mall_name", "maker", "brand", "product_id", "product_type")
+
+    def __init__(self, source_type, **fields):
+        self.source_type = source_type
+        for name in self.__slots__[1:]:
+            setattr(self, name, fields.get(name, ''))
+
+    @property
+    def display_title(self):
+        return self.title or '제목 없음'
+
+    def preview(self, length=100):
+        """내용 미리보기 (length자 초과 시 말줄임)"""
+        return self.description[:length] + "..." if len(self.description) > length else self.description
+
+    def to_document(self):
+        """저장용 (텍스트, 메타데이터) - 지원하지 않는 소스 타입이면 None"""
+        title = self.display_title
+        if self.source_type == "블로그":
+            metadata = {
+                'title': title,
+                'url': self.url,
+                'bloggername': self.author,
+                'date': self.date,
+                'published_at': parse_date_epoch(self.date),
+                'collection': self.source_type
+            }
+            full_text = f"제목: {title}\n내용: {self.description}\n블로거: {self.author}\n카테고리: 블로그"
+
+        elif self.source_type == "뉴스":
+            metadata = {
+                'title': title,
+                'url': self.url,
+                'publisher': self.publisher,
+                'date': self.date,
+                'published_at': parse_date_epoch(self.date),
+                'collection': self.source_type
+            }
+            full_text = f"뉴스 제목: {title}\n뉴스 내용: {self.description}\n언론사: {self.publisher}\n날짜: {self.date}\n분류: 뉴스 기사"
+
+        elif self.source_type == "쇼핑":
+            content = f"{title}. {self.description}" if self.description else title
+            metadata = {
+                'title': title,
+                'url': self.url,
+                'lprice': self.lprice,
+                'hprice': self.hprice,
+                'mallname': self.mall_name,
+                'maker': self.maker,
+                'brand': self.brand,
+                'product_id': self.product_id,
+                'collection': self.source_type
+            }
+            metadata.update(shop_facets(metadata))   # 가격(정수)/판매처/브랜드 패싯
+            full_text = f"상품명: {title}\n설명: {content}\n브랜드: {self.brand}\n제조사: {self.maker}\n판매처: {self.mall_name}\n카테고리: 쇼핑"
+
+        else:
+            return None
+
+        return full_text, metadata
+
+    def display_row(self):
+        """검색 결과 표(DataFrame) 한 행"""
+        if self.source_type == "블로그":
+            return {'제목': self.display_title, '내용 미리보기': self.preview(), '블로거': self.author, '날짜': self.date, '링크': self.url}
+        if self.source_type == "뉴스":
+            return {'제목': self.display_title, '내용 미리보기': self.preview(), '언론사': self.publisher, '날짜': self.date, '링크': self.url}
+        if self.source_type == "쇼핑":
+            price_display = f"{self.lprice}원" if self.lprice else '가격 정보 없음'
+            return {'제품명': self.display_title, '가격': price_display, '판매처': self.mall_name, '제조사': self.maker, '링크': self.url}
+        return {'제목': self.display_title, '링크': self.url}
+
+def normalize_item(item, source_type):
+    """네이버 API 아이템 → NaverItem (HTML 정리는 여기서 한 번만)"""
+    fields = {}
+    for name, key in FIELD_MAPS.get(source_type, DEFAULT_FIELD_MAP).items():
+        value = item.get(key)
+        if not value:
+            continue
+        fields[name] = clean_html(value) if name in HTML_FIELDS else str(value)
+    if source_type == "뉴스":
+        fields['publisher'] = publisher_from_url(fields.get('original_url'))
+    return NaverItem(source_type, **fields)
+
+def normalize_items(items, source_type):
+    return [normalize_item(item, source_type) for item in items]
+
+def build_document(item, source_type):
+    """
+    네이버 API 아이템 하나를 (저장 텍스트, 메타데이터)로 변환
+
+    지원하지 않는 소스 타입이면 None을 반환합니다.
+    """
+    return normalize_item(item, source_type).to_document()
+
+def prepare_embedding_text(text):
+    """임베딩 입력 정규화 (너무 짧으면 None)"""
+    if not text or len(text.strip()) < 10:  # 너무 짧은 텍스트 제외
+        return None
+
+    cleaned_text = re.sub(r'\s+', ' ', text.strip())            # 공백 정규화
+    cleaned_text = re.sub(r'[^\w\s가-힣\.]', ' ', cleaned_text)  # 특수문자 제거 (마침표는 유지)
+    cleaned_text = ' '.join(cleaned_text.split())               # 중복 공백 제거
+
+    # 너무 긴 텍스트는 잘라내기 (sentence-transformers 일반적 제한)
+    return cleaned_text[:MAX_EMBEDDING_CHARS]
+
+def pad_embedding(embedding, dim=EMBEDDING_DIM):
+    """임베딩을 리스트로 바꾸고 documents 컬럼 차원에 맞게 0 패딩/자르기"""
+    embedding_list = embedding.tolist() if hasattr(embedding, 'tolist') else list(embedding)
+    if len(embedding_list) < dim:
+        return embedding_list + [0.0] * (dim - len(embedding_list))
+    return embedding_list[:dim]
+
+def embedding_tag(model_name, version=EMBEDDING_VERSION):
+    """행 metadata에 넣는 임베딩 모델/버전 태그"""
+    return {'embedding_model': model_name, 'embedding_version': version}
+
+def include_untagged_for(model_name):
+    """model_name으로 검색할 때 태그 없는 행을 포함할지 (재임베딩 대상 판단에는 쓰지 않음)"""
+    return INCLUDE_UNTAGGED_EMBEDDINGS or (bool(UNTAGGED_EMBEDDING_MODEL) and model_name == UNTAGGED_EMBEDDING_MODEL)
+
+def is_embedded_with(metadata, model_name, version=None, include_untagged=False):
+    """metadata의 임베딩이 model_name(버전 지정 시 버전까지)으로 만든 것인지
+
+    include_untagged면 태그 없는 행도 일치로 봅니다 (검색에서는 include_untagged_for(model_name)).
+    EMBEDDING_INCLUDE_UNTAGGED가 아니면 app2가 저장한 행(collected_at, 다른 모델)은 제외합니다.
+    """
+    tagged_model = metadata.get('embedding_model')
+    if tagged_model is None:
+        return include_untagged and (INCLUDE_UNTAGGED_EMBEDDINGS or 'collected_at' not in metadata)
+    return tagged_model == model_name and (version is None or metadata.get('embedding_version') == version)
@@ -0,0 +1,284 @@
+# -*- coding: utf-8 -*-
+"""프로세스 간 공유 임베딩 서버 (localhost HTTP, 동적 마이크로 배칭)
+
+Streamlit 워커 프로세스마다 SentenceTransformer를 올리지 않고, 서버 하나가 모델을 들고
+동시에 들어온 요청을 짧은 시간(기본 5ms) 모아 한 번에 encode 합니다.
+
+    python embedding_server.py --model jhgan/ko-sroberta-multitask --port 8765
+    EMBEDDING_SERVER_URL=http://127.0.0.1:8765 streamlit run total.py
+
+API:
+    POST /embed    {"texts": [...]} → float32 바이트 (n × dim, 헤더 X-Embedding-Dim/X-Embedding-Model)
+    GET  /health   {"model", "dim", "requests", "batches", "texts"}
+    GET  /metrics  Prometheus 텍스트
+"""
+import argparse
+import http.client
+import json
+import logging
+import os
+import sys
+import threading
+import time
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+from metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+EMBEDDING_SERVER_URL = os.environ.get("EMBEDDING_SERVER_URL", "")
+BATCH_WINDOW_MS = float(os.environ.get("EMBEDDING_BATCH_WINDOW_MS", "5"))
+MAX_BATCH = int(os.environ.get("EMBEDDING_MAX_BATCH", "64"))
+MAX_TEXTS_PER_REQUEST = 256
+
+BATCH_SIZE = REGISTRY.histogram(
+    "embedding_server_batch_size", "Texts encoded per micro-batch", buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256))
+QUEUE_SECONDS = REGISTRY.histogram(
+    "embedding_server_queue_seconds", "Time a request waited before its micro-batch started")
+
+class _Request:
+    __slots__ = ("texts", "enqueued", "done", "result", "error")
+
+    def __init__(self, texts):
+        self.texts = texts
+        self.enqueued = time.perf_counter()
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+class MicroBatcher:
+    """동시 요청을 window_ms 동안(또는 max_batch개까지) 모아 encode_fn 한 번으로 처리"""
+
+    def __init__(self, encode_fn, window_ms=BATCH_WINDOW_MS, max_batch=MAX_BATCH):
+        self.encode_fn = encode_fn
+        self.window = window_ms / 1000
+        self.max_batch = max_batch
+        self._queue = []
+        self._cond = threading.Condition()
+        self._closed = False
+        self.requests = self.batches = self.texts = 0
+        self._thread = threading.Thread(target=self._run, name="embedding-batcher", daemon=True)
+        self._thread.start()
+
+    def submit(self, texts):
+        """texts 임베딩 (n, dim) - 배치가 끝날 때까지 대기"""
+        request = _Request(list(texts))
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("임베딩 배처가 종료되었습니다")
+            self._queue.append(request)
+            self._cond.notify()
+        request.done.wait()
+        if request.error is not None:
+            raise request.error
+        return request.result
+
+    def _take_batch(self):
+        with self._cond:
+            while not self._queue and not self._closed:
+                self._cond.wait()
+            if self._closed and not self._queue:
+                return None
+            # 첫 요청이 들어온 뒤 window 동안 더 모음 (max_batch가 차면 바로 시작)
+            deadline = time.perf_counter() + self.window
+            while sum(len(r.texts) for r in self._queue) < self.max_batch:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0 or self._closed:
+                    break
+                self._cond.wait(remaining)
+            batch, count = [], 0
+            while self._queue and (not batch or count + len(self._queue[0].texts) <= self.max_batch):
+                request = self._queue.pop(0)
+                batch.append(request)
+                count += len(request.texts)
+            return batch
+
+    def _run(self):
+        while True:
+            batch = self._take_batch()
+            if batch is None:
+                return
+            started = time.perf_counter()
+            texts = [text for request in batch for text in request.texts]
+            try:
+                vectors = np.asarray(self.encode_fn(texts), dtype=np.float32)
+            except Exception as e:
+                for request in batch:
+                    request.error = e
+                    request.done.set()
+                continue
+            BATCH_SIZE.observe(len(texts))
+            self.requests += len(batch)
+            self.batches += 1
+            self.texts += len(texts)
+            offset = 0
+            for request in batch:
+                QUEUE_SECONDS.observe(started - request.enqueued)
+                request.result = vectors[offset:offset + len(request.texts)]
+                offset += len(request.texts)
+                request.done.set()
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+class _EmbeddingHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"   # keep-alive (클라이언트가 연결 재사용)
+    disable_nagle_algorithm = True  # 헤더/본문이 나뉘어 나갈 때 ACK 대기 지연 방지
+    batcher = None
+    model_name = ""
+    dim = 0
+
+    def _send(self, status, body, content_type, headers=None):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_json(self, status, payload):
+        self._send(status, json.dumps(payload, ensure_ascii=False).encode("utf-8"), "application/json")
+
+    def do_GET(self):
+        path = self.path.split("?", 1)[0]
+        if path == "/health":
+            b = self.batcher
+            self._send_json(200, {"model": self.model_name, "dim": self.dim, "requests": b.requests,
+                                  "batches": b.batches, "texts": b.texts})
+        elif path == "/metrics":
+            self._send(200, REGISTRY.exposition().encode("utf-8"), "text/plain; version=0.0.4; charset=utf-8")
+        else:
+            self._send_json(404, {"error": "not found"})
+
+    def do_POST(self):
+        if self.path.split("?", 1)[0] != "/embed":
+            self._send_json(404, {"error": "not found"})
+            return
+        try:
+            payload = json.loads(self.rfile.read(int(self.headers.get("Content-Length") or 0)) or b"{}")
+            texts = payload.get("texts")
+            if not isinstance(texts, list) or not all(isinstance(t, str) for t in texts):
+                raise ValueError("texts는 문자열 목록이어야 합니다")
+            if len(texts) > MAX_TEXTS_PER_REQUEST:
+                raise ValueError(f"요청당 최대 {MAX_TEXTS_PER_REQUEST}개까지 보낼 수 있습니다")
+        except ValueError as e:
+            self._send_json(400, {"error": str(e)})
+            return
+        try:
+            vectors = self.batcher.submit(texts) if texts else np.zeros((0, self.dim), dtype=np.float32)
+        except Exception as e:
+            logger.exception("임베딩 실패")
+            self._send_json(500, {"error": str(e)})
+            return
+        self._send(200, np.ascontiguousarray(vectors, dtype=np.float32).tobytes(), "application/octet-stream",
+                   {"X-Embedding-Dim": str(vectors.shape[1] if vectors.ndim == 2 else self.dim),
+                    "X-Embedding-Model": urllib.parse.quote(self.model_name)})
+
+    def log_message(self, format, *args):
+        pass
+
+class _EmbeddingHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+def start_server(model, model_name, port=8765, addr="127.0.0.1", window_ms=BATCH_WINDOW_MS, max_batch=MAX_BATCH):
+    """백그라운드 스레드에서 서버 시작 - (server, batcher). port=0이면 빈 포트"""
+    encode = lambda texts: model.encode(texts, batch_size=max_batch, convert_to_numpy=True, show_progress_bar=False)
+    batcher = MicroBatcher(encode, window_ms, max_batch)
+    handler = type("EmbeddingHandler", (_EmbeddingHandler,), {
+        "batcher": batcher, "model_name": model_name, "dim": model.get_sentence_embedding_dimension()})
+    server = _EmbeddingHTTPServer((addr, int(port)), handler)
+    threading.Thread(target=server.serve_forever, name="embedding-http", daemon=True).start()
+    return server, batcher
+
+class EmbeddingClient:
+    """임베딩 서버 클라이언트 - SentenceTransformer.encode와 같은 방식으로 호출"""
+
+    def __init__(self, url=EMBEDDING_SERVER_URL, timeout=30):
+        parsed = urllib.parse.urlparse(url)
+        self.host, self.port = parsed.hostname or "127.0.0.1", parsed.port or 80
+        self.timeout = timeout
+        self._local = threading.local()   # 스레드별 keep-alive 연결
+        health = self._request("GET", "/health")[1]
+        info = json.loads(health)
+        self.model_name = info["model"]
+        self.dim = int(info["dim"])
+
+    def _request(self, method, path, body=None, headers=None):
+        for attempt in range(2):   # 서버가 끊은 keep-alive 연결이면 한 번 다시 연결
+            connection = getattr(self._local, "connection", None)
+            if connection is None:
+                connection = self._local.connection = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+            try:
+                connection.request(method, path, body=body, headers=headers or {})
+                response = connection.getresponse()
+                data = response.read()
+            except (http.client.HTTPException, ConnectionError):
+                connection.close()
+                self._local.connection = None
+                if attempt:
+                    raise
+                continue
+            if response.status != 200:
+                raise RuntimeError(f"임베딩 서버 오류 {response.status}: {data[:200].decode('utf-8', 'replace')}")
+            return response, data
+
+    def get_sentence_embedding_dimension(self):
+        return self.dim
+
+    def encode(self, sentences, batch_size=None, show_progress_bar=False, convert_to_numpy=True,
+               convert_to_tensor=False, **kwargs):
+        """문자열 하나면 (dim,), 목록이면 (n, dim) float32 배열"""
+        single = isinstance(sentences, str)
+        texts = [sentences] if single else list(sentences)
+        chunks = []
+        for start in range(0, len(texts), MAX_TEXTS_PER_REQUEST):
+            body = json.dumps({"texts": texts[start:start + MAX_TEXTS_PER_REQUEST]}, ensure_ascii=False).encode("utf-8")
+            _, data = self._request("POST", "/embed", body, {"Content-Type": "application/json"})
+            chunks.append(np.frombuffer(data, dtype=np.float32).reshape(-1, self.dim))
+        vectors = np.vstack(chunks) if chunks else np.zeros((0, self.dim), dtype=np.float32)
+        return vectors[0] if single else vectors
+
+def connect(model_name, url=EMBEDDING_SERVER_URL):
+    """url의 서버가 model_name을 서비스하면 클라이언트, 아니면 None - (client, 사유)"""
+    if not url:
+        return None, "EMBEDDING_SERVER_URL 미설정"
+    try:
+        client = EmbeddingClient(url)
+    except Exception as e:
+        return None, f"임베딩 서버 연결 실패 ({url}): {e}"
+    if client.model_name != model_name:
+        return None, f"임베딩 서버 모델({client.model_name})이 {model_name}와 다릅니다"
+    return client, ""
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="공유 임베딩 서버 (마이크로 배칭)")
+    parser.add_argument("--model", default=os.environ.get("EMBEDDING_MODEL", "jhgan/ko-sroberta-multitask"))
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--addr", default="127.0.0.1")
+    parser.add_argument("--window-ms", type=float, default=BATCH_WINDOW_MS, help="요청을 모으는 시간 (ms)")
+    parser.add_argument("--max-batch", type=int, default=MAX_BATCH, help="한 번에 encode할 최대 텍스트 수")
+    args = parser.parse_args(argv)
+
+    from sentence_transformers import SentenceTransformer
+
+    logging.basicConfig(level=logging.INFO)
+    model = SentenceTransformer(args.model)
+    server, _ = start_server(model, args.model, args.port, args.addr, args.window_ms, args.max_batch)
+    logger.info("임베딩 서버 시작: http://%s:%s (model=%s, window=%sms, max_batch=%s)",
+                args.addr, server.server_address[1], args.model, args.window_ms, args.max_batch)
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
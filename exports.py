@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+"""검색 결과 내보내기 (CSV, JSON, gzip JSONL, Parquet)
+
+결과를 데이터프레임 조각(보통 한 페이지) 단위로 받아 파일에 바로 이어 씁니다.
+전체를 한 데이터프레임/문자열로 모으지 않으므로 항목 수가 많아도 메모리는 조각 하나 + 출력 버퍼 정도입니다.
+출력은 EXPORT_SPOOL_MB를 넘으면 임시 파일로 넘어가는 버퍼에 씁니다.
+"""
+import codecs
+import gzip
+import os
+import tempfile
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # pyarrow가 없으면 Parquet 내보내기 없음
+    pa = pq = None
+
+EXPORT_SPOOL_MB = int(os.environ.get("EXPORT_SPOOL_MB", "16"))
+
+def write_csv(frames, out):
+    """UTF-8 BOM + 머리글은 한 번만 (엑셀에서 한글이 깨지지 않도록)"""
+    out.write(codecs.BOM_UTF8)
+    header = True
+    for frame in frames:
+        out.write(frame.to_csv(index=False, header=header).encode('utf-8'))
+        header = False
+
+def write_json(frames, out):
+    """레코드 배열 (기존 내보내기와 같은 indent=4 형식)"""
+    out.write(b"[")
+    first = True
+    for frame in frames:
+        if frame.empty:
+            continue
+        body = frame.to_json(orient='records', force_ascii=False, indent=4).strip()[1:-1].rstrip()
+        out.write((body if first else "," + body).encode('utf-8'))
+        first = False
+    out.write(b"\n]" if not first else b"]")
+
+def write_jsonl_gz(frames, out):
+    """한 줄에 레코드 하나, gzip 압축"""
+    with gzip.GzipFile(fileobj=out, mode='wb', compresslevel=6) as gz:
+        for frame in frames:
+            if not frame.empty:
+                gz.write(frame.to_json(orient='records', lines=True, force_ascii=False).rstrip("\n").encode('utf-8') + b"\n")
+
+def write_parquet(frames, out):
+    """조각마다 row group 하나 - 열 구성은 첫 조각 기준, 값은 문자열"""
+    writer = None
+    try:
+        for frame in frames:
+            if frame.empty:
+                continue
+            if writer is None:
+                columns = list(frame.columns)
+                schema = pa.schema([(column, pa.string()) for column in columns])
+                writer = pq.ParquetWriter(out, schema, compression='zstd')
+            frame = frame.reindex(columns=columns).astype("string")
+            writer.write_table(pa.Table.from_pandas(frame, schema=schema, preserve_index=False))
+    finally:
+        if writer is not None:
+            writer.close()
+
+# 형식 → (버튼 이름, 확장자, MIME, 쓰기 함수)
+EXPORT_FORMATS = {
+    "csv": ("CSV 내보내기", "csv", "text/csv", write_csv),
+    "json": ("JSON 내보내기", "json", "application/json", write_json),
+    "jsonl.gz": ("JSONL(gzip) 내보내기", "jsonl.gz", "application/gzip", write_jsonl_gz),
+}
+if pq is not None:
+    EXPORT_FORMATS["parquet"] = ("Parquet 내보내기", "parquet", "application/vnd.apache.parquet", write_parquet)
+
+def export_file(fmt, frames):
+    """frames(데이터프레임 조각들)를 fmt 형식으로 쓴 파일 객체 (처음 위치로 되감아 반환)"""
+    out = tempfile.SpooledTemporaryFile(max_size=EXPORT_SPOOL_MB * 1024 * 1024)
+    EXPORT_FORMATS[fmt][3](frames, out)
+    out.seek(0)
+    return out
+
+def export_bytes(fmt, frames):
+    """st.download_button(data=callable)용 bytes - Streamlit은 SpooledTemporaryFile을 받지 않음 (bytes/BytesIO/BufferedReader만)"""
+    with export_file(fmt, frames) as out:
+        return out.read()
@@ -0,0 +1,166 @@
+# -*- coding: utf-8 -*-
+"""쇼핑 문서 패싯(가격/판매처/브랜드) 인덱스
+
+수집 시 metadata에 타입이 정해진 패싯 값(price_min/price_max 정수, mall_key/brand_key 정규화 문자열)을
+넣고, 검색 전에 이 인덱스로 조건에 맞는 문서 id만 골라 유사도 계산 대상을 줄입니다.
+
+    가격   정렬된 최저가 배열 + searchsorted (범위 → 연속 구간)
+    판매처/브랜드  값별 포스팅 - 자주 나오는 값은 비트맵(np.packbits), 드문 값은 정렬된 위치 배열
+"""
+import threading
+
+import numpy as np
+
+from documents import shop_facets, facet_key, parse_metadata
+
+# 값이 전체 행의 1/32 이상에 나오면 위치 배열(4바이트/행)보다 비트맵(1비트/행)이 작음
+BITMAP_MIN_FRACTION = 1 / 32
+
+class _Postings:
+    """한 패싯 필드의 값 사전 + 값별 포스팅"""
+
+    def __init__(self):
+        self.codes = {}      # 정규화 키 -> 코드
+        self.labels = []     # 코드 -> 처음 본 원래 표기
+        self.postings = []   # 코드 -> ("bitmap", packed) 또는 ("array", 위치)
+        self.counts = np.zeros(0, dtype=np.int64)
+
+    def code(self, key, label):
+        code = self.codes.get(key)
+        if code is None:
+            code = self.codes[key] = len(self.labels)
+            self.labels.append(label or key)
+        return code
+
+    def compile(self, row_codes, n):
+        """행별 코드 배열(-1은 값 없음)로 포스팅 다시 만들기"""
+        counts = np.bincount(row_codes[row_codes >= 0], minlength=len(self.labels))
+        order = np.argsort(row_codes, kind="stable")[int((row_codes < 0).sum()):]
+        ends = np.cumsum(counts)
+        postings = []
+        for end, count in zip(ends, counts):
+            positions = order[end - count:end].astype(np.int32)
+            if count >= n * BITMAP_MIN_FRACTION:
+                bits = np.zeros(n, dtype=bool)
+                bits[positions] = True
+                postings.append(("bitmap", np.packbits(bits)))
+            else:
+                postings.append(("array", positions))
+        # 조회 중인 스레드가 있어도 한 번에 교체
+        self.counts, self.postings = counts, postings
+
+    def mask(self, keys, n):
+        """keys 중 하나라도 일치하는 행 마스크 (n,)"""
+        mask = np.zeros(n, dtype=bool)
+        for key in keys:
+            code = self.codes.get(key)
+            if code is None:
+                continue
+            kind, data = self.postings[code]
+            if kind == "bitmap":
+                mask |= np.unpackbits(data, count=n).view(bool)
+            else:
+                mask[data] = True
+        return mask
+
+    def top(self, limit):
+        order = np.argsort(-self.counts)[:limit]
+        return [(self.labels[c], int(self.counts[c])) for c in order if self.counts[c] > 0]
+
+    def nbytes(self):
+        return sum(data.nbytes for _, data in self.postings)
+
+class FacetIndex:
+    """쇼핑 문서 id별 패싯 인덱스 (행 추가 후 첫 조회 때 다시 컴파일)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._ids = []
+        self._prices = []
+        self._mall_codes = []
+        self._brand_codes = []
+        self.malls = _Postings()
+        self.brands = _Postings()
+        self.max_id = 0
+        self._compiled = None
+
+    def __len__(self):
+        return len(self._ids)
+
+    def add(self, doc_id, metadata):
+        """문서 한 건 추가 (metadata는 dict, 타입 패싯이 없는 예전 행은 문자열 필드에서 계산)"""
+        facets = shop_facets(metadata)
+        with self._lock:
+            self._ids.append(int(doc_id))
+            self._prices.append(-1 if facets['price_min'] is None else facets['price_min'])
+            self._mall_codes.append(self.malls.code(facets['mall_key'], metadata.get('mallname')) if facets['mall_key'] else -1)
+            self._brand_codes.append(self.brands.code(facets['brand_key'], metadata.get('brand') or metadata.get('maker')) if facets['brand_key'] else -1)
+            self.max_id = max(self.max_id, int(doc_id))
+            self._compiled = None
+
+    def add_arrays(self, ids, prices, mall_keys, brand_keys):
+        """대량 적재 (벤치마크/재빌드용) - 이미 정규화된 키 목록"""
+        with self._lock:
+            self._ids.extend(int(i) for i in ids)
+            self._prices.extend(-1 if p is None else int(p) for p in prices)
+            self._mall_codes.extend(self.malls.code(k, k) if k else -1 for k in mall_keys)
+            self._brand_codes.extend(self.brands.code(k, k) if k else -1 for k in brand_keys)
+            if len(ids):
+                self.max_id = max(self.max_id, int(np.max(ids)))
+            self._compiled = None
+
+    def _compile(self):
+        with self._lock:
+            if self._compiled is None:
+                n = len(self._ids)
+                ids = np.asarray(self._ids, dtype=np.int64)
+                prices = np.asarray(self._prices, dtype=np.int64)
+                price_order = np.argsort(prices, kind="stable")
+                self.malls.compile(np.asarray(self._mall_codes, dtype=np.int32), n)
+                self.brands.compile(np.asarray(self._brand_codes, dtype=np.int32), n)
+                self._compiled = (n, ids, price_order, prices[price_order])
+            return self._compiled
+
+    def filter(self, price_min=None, price_max=None, malls=None, brands=None):
+        """조건에 맞는 문서 id 배열 (오름차순) - 조건이 없으면 None"""
+        if price_min is None and price_max is None and not malls and not brands:
+            return None
+        n, ids, price_order, sorted_prices = self._compile()
+        mask = None
+        if price_min is not None or price_max is not None:
+            # 가격 없는 행(-1)은 가격 조건이 있으면 제외
+            lo = np.searchsorted(sorted_prices, max(0, price_min or 0), side="left")
+            hi = np.searchsorted(sorted_prices, price_max, side="right") if price_max is not None else n
+            mask = np.zeros(n, dtype=bool)
+            mask[price_order[lo:hi]] = True
+        for postings, keys in ((self.malls, malls), (self.brands, brands)):
+            if keys:
+                keys = [key for key in (facet_key(k) for k in keys) if key]
+                field_mask = postings.mask(keys, n)
+                mask = field_mask if mask is None else mask & field_mask
+        return ids[np.flatnonzero(mask)]
+
+    def top_values(self, field, limit=50):
+        """화면 선택지용 (표기, 문서 수) - field는 'mall' 또는 'brand'"""
+        self._compile()
+        return (self.malls if field == "mall" else self.brands).top(limit)
+
+    def price_bounds(self):
+        _, _, _, sorted_prices = self._compile()
+        priced = sorted_prices[sorted_prices >= 0]
+        return (int(priced[0]), int(priced[-1])) if len(priced) else (0, 0)
+
+    def nbytes(self):
+        n, ids, price_order, sorted_prices = self._compile()
+        return int(ids.nbytes + price_order.nbytes + sorted_prices.nbytes + self.malls.nbytes() + self.brands.nbytes())
+
+    def refresh(self, store, page_size=1000):
+        """지난 갱신 이후 추가된 쇼핑 문서(id > max_id)만 읽어 반영 - 추가된 행 수 (store: storage 저장소)"""
+        added = 0
+        while True:
+            rows = store.scan(self.max_id, page_size, collections=('쇼핑',))
+            for row in rows:
+                self.add(row['id'], parse_metadata(row.get('metadata')))
+            added += len(rows)
+            if len(rows) < page_size:
+                return added
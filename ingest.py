@@ -0,0 +1,359 @@
+# -*- coding: utf-8 -*-
+"""네이버 검색 결과 대량 수집 CLI (UI 없이 cron/작업 서버에서 실행)
+
+검색어 파일 형식 (한 줄에 하나, '#'으로 시작하면 주석):
+    쇼핑<TAB>가성비 전자담배
+    블로그,전자담배 입문 후기
+    {"source_type": "뉴스", "query": "전자담배 규제"}      # JSON 한 줄도 가능
+
+예:
+    python ingest.py queries.txt --max-items 1000 --workers 4
+    python ingest.py queries.txt --checkpoint ingest_checkpoint.json   # 중단된 실행 이어서 하기
+
+여러 검색어를 동시에 페이지 단위로 가져오고(수집 스레드), 새 문서만 모아
+한 번에 임베딩하고 묶음으로 저장합니다(저장 스레드). 페이지가 저장될 때마다
+체크포인트를 기록하므로 중단 후 다시 실행하면 저장된 다음 페이지부터 이어갑니다.
+"""
+import argparse
+import json
+import os
+import queue
+import sys
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+from documents import build_document, prepare_embedding_text, pad_embedding, embedding_tag, SOURCE_ENDPOINTS, EMBEDDING_VERSION
+from projection import load_projection, embedding_version, PROJECTION_PATH
+from price_history import PriceHistory, PRICE_HISTORY_PATH
+from metrics import NAVER_REQUESTS, NAVER_SECONDS
+
+NAVER_API_BASE_URL = os.environ.get("NAVER_API_BASE_URL", "https://openapi.naver.com/v1/search/")
+DEFAULT_MODEL = "jhgan/ko-sroberta-multitask"
+PAGE_SIZE = 100          # 네이버 API display 최대값
+MAX_START = 1000         # 네이버 API start 최대값
+RETRY_DELAYS = (0.5, 1, 2, 4, 8)   # 429/일시 오류 재시도 간격(초)
+
+def read_jobs(path):
+    """검색어 파일에서 (소스 타입, 검색어) 목록 읽기"""
+    jobs = []
+    with open(path, encoding="utf-8") as f:
+        for line_no, line in enumerate(f, 1):
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            if line.startswith("{"):
+                row = json.loads(line)
+                source_type, query = row.get("source_type", ""), row.get("query", "")
+            else:
+                sep = "\t" if "\t" in line else ","
+                source_type, _, query = line.partition(sep)
+            source_type, query = source_type.strip(), query.strip()
+            if source_type not in SOURCE_ENDPOINTS or not query:
+                raise ValueError(f"{path}:{line_no}: '소스타입<TAB>검색어' 형식이 아닙니다 (소스타입: {', '.join(SOURCE_ENDPOINTS)})")
+            if (source_type, query) not in jobs:
+                jobs.append((source_type, query))
+    return jobs
+
+def job_key(source_type, query):
+    return f"{source_type}\t{query}"
+
+class Checkpoint:
+    """검색어별 다음 시작 위치와 진행 상황을 JSON 파일에 기록"""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self.jobs = {}
+        if path and os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                self.jobs = json.load(f).get("jobs", {})
+
+    def get(self, source_type, query):
+        with self._lock:
+            return dict(self.jobs.get(job_key(source_type, query), {"next_start": 1, "saved": 0, "done": False}))
+
+    def update(self, source_type, query, next_start, saved, done):
+        with self._lock:
+            state = self.jobs.setdefault(job_key(source_type, query), {"next_start": 1, "saved": 0, "done": False})
+            state["next_start"] = next_start
+            state["saved"] += saved
+            state["done"] = done
+            if self.path:
+                tmp_path = f"{self.path}.tmp"
+                with open(tmp_path, "w", encoding="utf-8") as f:
+                    json.dump({"jobs": self.jobs}, f, ensure_ascii=False, indent=1)
+                os.replace(tmp_path, self.path)  # 중간에 끊겨도 이전 체크포인트는 유지
+
+class Stats:
+    """처리량 통계"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.values = {"requests": 0, "rate_limited": 0, "cached": 0, "pages": 0, "items": 0, "duplicates": 0,
+                       "skipped": 0, "saved": 0, "fetch_seconds": 0.0, "embed_seconds": 0.0, "write_seconds": 0.0}
+        self.started = time.perf_counter()
+
+    def add(self, **values):
+        with self._lock:
+            for key, value in values.items():
+                self.values[key] += value
+
+    def summary(self):
+        with self._lock:
+            values = dict(self.values)
+        elapsed = time.perf_counter() - self.started
+        values["elapsed_seconds"] = round(elapsed, 3)
+        values["items_per_second"] = round(values["items"] / elapsed, 2) if elapsed else 0.0
+        values["saved_per_second"] = round(values["saved"] / elapsed, 2) if elapsed else 0.0
+        for key in ("fetch_seconds", "embed_seconds", "write_seconds"):
+            values[key] = round(values[key], 3)
+        return values
+
+class NaverFetcher:
+    """네이버 검색 API 페이지 요청 (429/일시 오류 재시도)
+
+    cache(naver_cache.NaverResponseCache)가 있으면 TTL 동안 같은 페이지 응답을 다시 받지 않고,
+    single_flight가 있으면 같은 페이지를 동시에 요청해도 한 번만 보냅니다.
+    """
+
+    def __init__(self, client_id, client_secret, stats, base_url=NAVER_API_BASE_URL, sort="date", cache=None,
+                 single_flight=None):
+        self.client_id = client_id
+        self.client_secret = client_secret
+        self.stats = stats
+        self.base_url = base_url
+        self.sort = sort
+        self.cache = cache
+        self.single_flight = single_flight
+
+    def fetch_page(self, source_type, query, start, display=PAGE_SIZE):
+        endpoint = SOURCE_ENDPOINTS[source_type]
+        cache_key = None
+        if self.cache is not None:
+            cache_key = self.cache.make_key(endpoint, query, display, start, self.sort)
+            body = self.cache.get(cache_key)
+            if body is not None:
+                self.stats.add(cached=1)
+                return json.loads(body.decode("utf-8"))
+        encoded_query = urllib.parse.quote(query)
+        url = f"{self.base_url}{endpoint}?query={encoded_query}&display={display}&start={start}&sort={self.sort}"
+        if self.single_flight is not None:
+            body = self.single_flight.do(("naver.fetch", url), self._fetch, url, endpoint, cache_key, source_type, query, start)
+        else:
+            body = self._fetch(url, endpoint, cache_key, source_type, query, start)
+        return json.loads(body.decode("utf-8"))
+
+    def _fetch(self, url, endpoint, cache_key, source_type, query, start):
+        """재시도하며 응답 본문(bytes) 받기 - 정상 응답은 캐시에 저장"""
+        for attempt, delay in enumerate((0,) + RETRY_DELAYS):
+            if delay:
+                time.sleep(delay)
+            request = urllib.request.Request(url)
+            request.add_header("X-Naver-Client-Id", self.client_id)
+            request.add_header("X-Naver-Client-Secret", self.client_secret)
+            t0 = time.perf_counter()
+            try:
+                with NAVER_SECONDS.time(endpoint=endpoint), urllib.request.urlopen(request, timeout=15) as response:
+                    body = response.read()
+                NAVER_REQUESTS.inc(endpoint=endpoint, status=response.getcode())
+                self.stats.add(requests=1, fetch_seconds=time.perf_counter() - t0)
+                if self.cache is not None and cache_key is not None:
+                    self.cache.put(cache_key, body)
+                return body
+            except urllib.error.HTTPError as e:
+                NAVER_REQUESTS.inc(endpoint=endpoint, status=e.code)
+                self.stats.add(requests=1, fetch_seconds=time.perf_counter() - t0)
+                if e.code == 429 or e.code >= 500:
+                    self.stats.add(rate_limited=int(e.code == 429))
+                    continue
+                raise
+            except urllib.error.URLError:
+                NAVER_REQUESTS.inc(endpoint=endpoint, status="network_error")
+                self.stats.add(requests=1, fetch_seconds=time.perf_counter() - t0)
+                continue
+        raise RuntimeError(f"네이버 API 재시도 횟수 초과: {source_type} '{query}' start={start}")
+
+def collect_job(source_type, query, fetcher, checkpoint, store, out_queue, seen, seen_lock, max_items, stats, prices=None):
+    """검색어 하나를 페이지 단위로 수집해 저장 큐에 넣기 (prices가 있으면 쇼핑 가격 이력도 기록)"""
+    state = checkpoint.get(source_type, query)
+    if state["done"]:
+        return
+    start = state["next_start"]
+    limit = min(max_items, MAX_START + PAGE_SIZE - 1)
+
+    while start <= limit:
+        display = min(PAGE_SIZE, limit - start + 1)
+        data = fetcher.fetch_page(source_type, query, start, display)
+        items = data.get("items", [])
+        stats.add(pages=1, items=len(items))
+
+        documents = []
+        for item in items:
+            document = build_document(item, source_type)
+            if document is None or len(document[0].strip()) < 20:
+                stats.add(skipped=1)
+                continue
+            documents.append(document)
+        if prices is not None and source_type == "쇼핑":
+            prices.record(m for _, m in documents)   # 이미 저장된 상품도 가격은 기록
+
+        # 이번 실행에서 이미 본 URL, DB에 이미 있는 URL 제외
+        with seen_lock:
+            fresh = []
+            for text, metadata in documents:
+                url = metadata.get('url', '')
+                if url and url in seen:
+                    continue
+                if url:
+                    seen.add(url)
+                fresh.append((text, metadata))
+        stored = store.existing_urls({m['url'] for _, m in fresh if m.get('url')})
+        new_documents = [(t, m) for t, m in fresh if m.get('url') not in stored]
+        stats.add(duplicates=len(documents) - len(new_documents))
+
+        next_start = start + display
+        done = len(items) < display or next_start > min(limit, data.get("total", 0))
+        out_queue.put((source_type, query, next_start, done, new_documents))
+        if done:
+            return
+        start = next_start
+
+def embed_documents(documents, model, model_name, projection, stats, batch_size=64):
+    """(본문, metadata) 목록을 한 번에 임베딩해 저장할 행 목록으로 (임베딩할 수 없는 짧은 본문은 제외)"""
+    texts = [prepare_embedding_text(text) for text, _ in documents]
+    keep = [i for i, text in enumerate(texts) if text]
+    stats.add(skipped=len(documents) - len(keep))
+    if not keep:
+        return []
+    t0 = time.perf_counter()
+    vectors = model.encode([texts[i] for i in keep], batch_size=batch_size, convert_to_numpy=True, show_progress_bar=False)
+    if projection is not None:
+        vectors = projection.transform(vectors)
+    stats.add(embed_seconds=time.perf_counter() - t0)
+    tag = embedding_tag(model_name, embedding_version(EMBEDDING_VERSION, projection))
+    return [{'content': documents[i][0], 'embedding': pad_embedding(vector), 'metadata': {**documents[i][1], **tag}}
+            for i, vector in zip(keep, vectors)]
+
+def write_batches(in_queue, model, model_name, projection, store, checkpoint, stats, batch_size, insert_chunk, progress):
+    """저장 스레드: 페이지들을 모아 한 번에 임베딩하고 묶음 저장 후 체크포인트 갱신"""
+    pending_pages = []
+    pending_documents = 0
+    finished = False
+
+    def flush():
+        nonlocal pending_pages, pending_documents
+        if not pending_pages:
+            return
+        documents = [d for page in pending_pages for d in page[4]]
+        rows = embed_documents(documents, model, model_name, projection, stats, batch_size)
+
+        t0 = time.perf_counter()
+        store.insert_many(rows, insert_chunk)
+        stats.add(write_seconds=time.perf_counter() - t0, saved=len(rows))
+
+        # 페이지 순서대로 체크포인트 기록 (저장이 끝난 페이지까지만)
+        for source_type, query, next_start, done, page_documents in pending_pages:
+            checkpoint.update(source_type, query, next_start, len(page_documents), done)
+        if callable(progress):
+            progress(stats.summary())
+        elif progress:
+            summary = stats.summary()
+            print(f"  저장 {summary['saved']}건 / 수집 {summary['items']}건 ({summary['items_per_second']}건/초)", file=sys.stderr)
+        pending_pages = []
+        pending_documents = 0
+
+    while not finished:
+        page = in_queue.get()
+        if page is None:
+            finished = True
+        else:
+            pending_pages.append(page)
+            pending_documents += len(page[4])
+        if finished or pending_documents >= batch_size * 4:
+            flush()
+
+def run(jobs, model, store, fetcher, checkpoint, stats, workers=4, max_items=1000,
+        batch_size=64, insert_chunk=100, progress=True, model_name=DEFAULT_MODEL, projection=None, prices=None):
+    """수집 스레드 workers개 + 저장 스레드 1개로 전체 작업 실행 (prices: price_history.PriceHistory)"""
+    pages = queue.Queue(maxsize=workers * 2)   # 저장이 밀리면 수집도 기다림
+    seen = set()
+    seen_lock = threading.Lock()
+    errors = []
+
+    writer_errors = []
+    def writer():
+        try:
+            write_batches(pages, model, model_name, projection, store, checkpoint, stats, batch_size, insert_chunk, progress)
+        except Exception as e:
+            writer_errors.append(e)
+            # 수집 스레드가 큐에서 막히지 않도록 남은 페이지 비우기
+            while True:
+                if pages.get() is None:
+                    break
+
+    writer_thread = threading.Thread(target=writer, name="ingest-writer", daemon=True)
+    writer_thread.start()
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="ingest-fetch") as executor:
+        futures = {executor.submit(collect_job, source_type, query, fetcher, checkpoint, store,
+                                   pages, seen, seen_lock, max_items, stats, prices): (source_type, query)
+                   for source_type, query in jobs}
+        for future, (source_type, query) in futures.items():
+            try:
+                future.result()
+            except Exception as e:
+                errors.append((source_type, query, str(e)))
+                print(f"[오류] {source_type} '{query}': {e}", file=sys.stderr)
+
+    pages.put(None)
+    writer_thread.join()
+    if writer_errors:
+        raise writer_errors[0]
+    return stats.summary(), errors
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="네이버 검색 결과 대량 수집 및 저장 (STORAGE_BACKEND)")
+    parser.add_argument("queries", help="검색어 파일 (소스타입<TAB>검색어)")
+    parser.add_argument("--checkpoint", default="ingest_checkpoint.json", help="진행 상황 파일 (빈 값이면 기록 안 함)")
+    parser.add_argument("--max-items", type=int, default=1000, help="검색어별 최대 수집 수 (네이버 제한: 1100)")
+    parser.add_argument("--workers", type=int, default=4, help="동시에 수집할 검색어 수")
+    parser.add_argument("--batch-size", type=int, default=64, help="임베딩 배치 크기")
+    parser.add_argument("--insert-chunk", type=int, default=100, help="한 번에 저장할 행 수")
+    parser.add_argument("--sort", default="date", choices=["date", "sim"], help="네이버 정렬 방식")
+    parser.add_argument("--model", default=DEFAULT_MODEL, help="SentenceTransformer 모델 이름")
+    parser.add_argument("--projection", default=PROJECTION_PATH, help="차원 축소 투영 파일 (.npz, 앱과 같은 파일 사용)")
+    parser.add_argument("--price-history", default=PRICE_HISTORY_PATH, help="쇼핑 가격 이력 폴더 (빈 값이면 기록 안 함)")
+    args = parser.parse_args(argv)
+    projection = load_projection(args.projection)
+    if projection is not None and projection.model_name != args.model:
+        parser.error(f"임베딩 투영이 다른 모델({projection.model_name})용입니다. --model을 맞추거나 --projection을 비워 주세요.")
+
+    import dotenv
+    from storage import open_store
+    from sentence_transformers import SentenceTransformer
+
+    dotenv.load_dotenv()
+    store = open_store()
+    model = SentenceTransformer(args.model)
+
+    jobs = read_jobs(args.queries)
+    checkpoint = Checkpoint(args.checkpoint or None)
+    stats = Stats()
+    fetcher = NaverFetcher(os.environ.get("NAVER_CLIENT_ID"), os.environ.get("NAVER_CLIENT_SECRET"), stats, sort=args.sort)
+    prices = PriceHistory(args.price_history) if args.price_history else None
+
+    print(f"검색어 {len(jobs)}개 수집 시작 (workers={args.workers}, max_items={args.max_items})", file=sys.stderr)
+    summary, errors = run(jobs, model, store, fetcher, checkpoint, stats, workers=args.workers,
+                          max_items=args.max_items, batch_size=args.batch_size, insert_chunk=args.insert_chunk,
+                          model_name=args.model, projection=projection, prices=prices)
+    if prices is not None:
+        prices.compact()
+    print(json.dumps(summary, ensure_ascii=False, indent=2))
+    return 1 if errors else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
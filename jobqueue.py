@@ -0,0 +1,216 @@
+# -*- coding: utf-8 -*-
+"""SQLite 기반 백그라운드 작업 큐 (수집 작업용)
+
+Streamlit 스크립트는 작업을 등록하고 상태만 조회합니다. 실제 수집은 작업 스레드(JobWorkers)가
+처리하므로 화면을 떠나도 작업은 계속되고, 같은 프로세스/다른 프로세스가 같은 DB 파일을 공유합니다.
+
+- 같은 dedup_key의 대기/실행 중 작업이 있으면 새로 만들지 않고 그 작업을 돌려줌 (부분 UNIQUE 인덱스)
+- 작업자는 주기적으로 heartbeat를 남기고, lease가 끝난 실행 중 작업은 다른 작업자가 다시 가져감
+"""
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+
+logger = logging.getLogger(__name__)
+
+JOB_DB_PATH = os.environ.get("JOB_DB", "jobs.sqlite3")
+JOB_WORKERS = int(os.environ.get("JOB_WORKERS", "2"))
+JOB_POLL_SECONDS = float(os.environ.get("JOB_POLL_SECONDS", "1"))
+JOB_LEASE_SECONDS = float(os.environ.get("JOB_LEASE_SECONDS", "300"))
+JOB_MAX_ATTEMPTS = 3
+
+ACTIVE_STATUSES = ("queued", "running")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    kind TEXT NOT NULL,
+    dedup_key TEXT,
+    params TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'queued',
+    progress TEXT,
+    result TEXT,
+    error TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    worker TEXT,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    heartbeat_at REAL,
+    finished_at REAL
+);
+CREATE UNIQUE INDEX IF NOT EXISTS jobs_active_dedup ON jobs (dedup_key)
+    WHERE dedup_key IS NOT NULL AND status IN ('queued', 'running');
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, id);
+"""
+
+def _row_to_job(row):
+    if row is None:
+        return None
+    job = dict(row)
+    for field in ("params", "progress", "result"):
+        job[field] = json.loads(job[field]) if job[field] else None
+    return job
+
+class JobQueue:
+    """작업 등록/조회/가져가기 - 호출마다 짧은 연결을 열어 여러 프로세스에서 안전하게 사용"""
+
+    def __init__(self, path=JOB_DB_PATH, lease_seconds=JOB_LEASE_SECONDS, max_attempts=JOB_MAX_ATTEMPTS):
+        self.path = path
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(_SCHEMA)
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        return _Connection(conn)
+
+    def enqueue(self, kind, params, dedup_key=None):
+        """작업 등록 - (작업, 새로 만들었는지). 같은 키의 진행 중 작업이 있으면 그것을 반환"""
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            if dedup_key is not None:
+                row = conn.execute("SELECT * FROM jobs WHERE dedup_key = ? AND status IN ('queued', 'running')",
+                                   (dedup_key,)).fetchone()
+                if row is not None:
+                    conn.execute("COMMIT")
+                    return _row_to_job(row), False
+            cursor = conn.execute("INSERT INTO jobs (kind, dedup_key, params, created_at) VALUES (?, ?, ?, ?)",
+                                  (kind, dedup_key, json.dumps(params, ensure_ascii=False), time.time()))
+            row = conn.execute("SELECT * FROM jobs WHERE id = ?", (cursor.lastrowid,)).fetchone()
+            conn.execute("COMMIT")
+        return _row_to_job(row), True
+
+    def claim(self, worker, kinds=None):
+        """가장 오래된 대기 작업을 실행 중으로 바꿔 반환 (없으면 None)"""
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            # lease가 끝난 실행 중 작업 (작업자 프로세스가 죽은 경우) 되살리기
+            conn.execute("""UPDATE jobs SET status = CASE WHEN attempts >= ? THEN 'failed' ELSE 'queued' END,
+                                error = CASE WHEN attempts >= ? THEN '작업자 응답 없음 (재시도 횟수 초과)' ELSE error END,
+                                finished_at = CASE WHEN attempts >= ? THEN ? ELSE finished_at END
+                            WHERE status = 'running' AND heartbeat_at < ?""",
+                         (self.max_attempts, self.max_attempts, self.max_attempts, now, now - self.lease_seconds))
+            query = "SELECT * FROM jobs WHERE status = 'queued'"
+            args = []
+            if kinds:
+                query += f" AND kind IN ({', '.join('?' * len(kinds))})"
+                args.extend(kinds)
+            row = conn.execute(query + " ORDER BY id LIMIT 1", args).fetchone()
+            if row is None:
+                conn.execute("COMMIT")
+                return None
+            conn.execute("""UPDATE jobs SET status = 'running', worker = ?, attempts = attempts + 1,
+                                started_at = ?, heartbeat_at = ? WHERE id = ?""", (worker, now, now, row["id"]))
+            row = conn.execute("SELECT * FROM jobs WHERE id = ?", (row["id"],)).fetchone()
+            conn.execute("COMMIT")
+        return _row_to_job(row)
+
+    def report(self, job_id, **progress):
+        """진행 상황 기록 + heartbeat"""
+        with self._connect() as conn:
+            conn.execute("UPDATE jobs SET progress = ?, heartbeat_at = ? WHERE id = ? AND status = 'running'",
+                         (json.dumps(progress, ensure_ascii=False), time.time(), job_id))
+
+    def finish(self, job_id, result=None):
+        with self._connect() as conn:
+            conn.execute("UPDATE jobs SET status = 'done', result = ?, finished_at = ? WHERE id = ?",
+                         (json.dumps(result, ensure_ascii=False, default=str), time.time(), job_id))
+
+    def fail(self, job_id, error):
+        with self._connect() as conn:
+            conn.execute("UPDATE jobs SET status = 'failed', error = ?, finished_at = ? WHERE id = ?",
+                         (str(error), time.time(), job_id))
+
+    def get(self, job_id):
+        with self._connect() as conn:
+            return _row_to_job(conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone())
+
+    def recent(self, limit=10, kind=None):
+        """최근 작업 목록 (새 작업부터)"""
+        with self._connect() as conn:
+            if kind is None:
+                rows = conn.execute("SELECT * FROM jobs ORDER BY id DESC LIMIT ?", (limit,)).fetchall()
+            else:
+                rows = conn.execute("SELECT * FROM jobs WHERE kind = ? ORDER BY id DESC LIMIT ?", (kind, limit)).fetchall()
+        return [_row_to_job(row) for row in rows]
+
+    def counts(self):
+        """상태별 작업 수"""
+        with self._connect() as conn:
+            return dict(conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
+
+class _Connection:
+    """with 블록이 끝나면 닫히는 sqlite3 연결 (sqlite3.Connection의 with는 닫지 않음)"""
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __enter__(self):
+        return self.conn
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None and self.conn.in_transaction:
+            self.conn.execute("ROLLBACK")
+        self.conn.close()
+
+class JobWorkers:
+    """작업 스레드 묶음 - handlers {kind: fn(params, report)}의 반환값을 결과로 저장"""
+
+    def __init__(self, queue, handlers, workers=JOB_WORKERS, poll_seconds=JOB_POLL_SECONDS):
+        self.queue = queue
+        self.handlers = handlers
+        self.poll_seconds = poll_seconds
+        self.name = f"{os.getpid()}-{uuid.uuid4().hex[:6]}"
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._threads = [threading.Thread(target=self._run, args=(i,), name=f"job-worker-{i}", daemon=True)
+                         for i in range(workers)]
+
+    def start(self):
+        for thread in self._threads:
+            thread.start()
+        return self
+
+    def wake(self):
+        """작업을 등록한 직후 - 다음 폴링을 기다리지 않고 가져가도록"""
+        self._wake.set()
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        self._wake.set()
+        for thread in self._threads:
+            thread.join(timeout)
+
+    def run_one(self, worker):
+        """대기 작업 하나 실행 - 실행했으면 True"""
+        job = self.queue.claim(worker, list(self.handlers))
+        if job is None:
+            return False
+        report = lambda **progress: self.queue.report(job["id"], **progress)
+        try:
+            result = self.handlers[job["kind"]](job["params"], report)
+        except Exception as e:
+            logger.warning("작업 #%s (%s) 실패: %s", job["id"], job["kind"], e)
+            self.queue.fail(job["id"], e)
+        else:
+            self.queue.finish(job["id"], result)
+        return True
+
+    def _run(self, index):
+        worker = f"{self.name}/{index}"
+        while not self._stop.is_set():
+            try:
+                if self.run_one(worker):
+                    continue
+            except Exception as e:
+                logger.warning("작업 큐 조회 실패: %s", e)
+            self._wake.wait(self.poll_seconds)
+            self._wake.clear()
@@ -0,0 +1,264 @@
+# -*- coding: utf-8 -*-
+"""프로세스 공용 메트릭 수집 및 Prometheus 텍스트 형식 노출
+
+사용 예:
+    NAVER_REQUESTS.inc(endpoint="blog", status="429")
+    with DB_SECONDS.time(op="insert"):
+        supabase.table('documents').insert(data).execute()
+    start_http_server(9464)   # http://127.0.0.1:9464/metrics
+
+모든 Streamlit 세션이 같은 프로세스에서 실행되므로 모듈 전역 레지스트리 하나를 공유합니다.
+"""
+import bisect
+import logging
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+logger = logging.getLogger(__name__)
+
+# 메트릭 HTTP 포트 (빈 값이면 엔드포인트를 띄우지 않음)
+METRICS_PORT = os.environ.get("METRICS_PORT", "9464")
+METRICS_ADDR = os.environ.get("METRICS_ADDR", "127.0.0.1")
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format_labels(names, values, extra=None):
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name}: 레이블은 {self.labelnames} 이어야 합니다 (받은 값: {tuple(labels)})")
+        return tuple(str(labels[n]) for n in self.labelnames)
+
+    def header(self):
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+class Counter(_Metric):
+    """단조 증가 카운터"""
+    kind = "counter"
+
+    def __init__(self, name, documentation, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        self._values = {}
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+    def collect(self):
+        lines = self.header()
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}")
+        return lines
+
+class Gauge(Counter):
+    """현재 값 (증감 가능)"""
+    kind = "gauge"
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+class _Timer:
+    __slots__ = ("histogram", "labels", "start")
+
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.histogram.observe(time.perf_counter() - self.start, **self.labels)
+        return False
+
+class Histogram(_Metric):
+    """누적 버킷 히스토그램 (초 단위 지연 시간 등)"""
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}  # key -> [버킷별 개수..., 합계, 개수]
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * (len(self.buckets) + 3)
+            series[index] += 1          # 해당 구간 (마지막 칸은 +Inf 구간)
+            series[-2] += value
+            series[-1] += 1
+
+    def time(self, **labels):
+        """with 블록 실행 시간을 관측하는 컨텍스트 매니저"""
+        return _Timer(self, labels)
+
+    def count(self, **labels):
+        with self._lock:
+            series = self._series.get(self._key(labels))
+            return series[-1] if series else 0
+
+    def collect(self):
+        lines = self.header()
+        with self._lock:
+            items = sorted((key, list(series)) for key, series in self._series.items())
+        for key, series in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), series[:len(self.buckets) + 1]):
+                cumulative += count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {_format_value(series[-2])}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {series[-1]}")
+        return lines
+
+class Registry:
+    """메트릭 등록소 (이름 중복 등록 시 기존 메트릭 반환)"""
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name, documentation, labelnames=()):
+        return self.register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def exposition(self):
+        """Prometheus 텍스트 형식 (version 0.0.4)"""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.collect())
+        return "\n".join(lines) + "\n"
+
+REGISTRY = Registry()
+
+# --- 파이프라인 공용 메트릭 ---
+
+NAVER_REQUESTS = REGISTRY.counter(
+    "naver_requests_total", "Naver search API requests by endpoint and HTTP status", ("endpoint", "status"))
+NAVER_SECONDS = REGISTRY.histogram(
+    "naver_request_seconds", "Naver search API round-trip latency", ("endpoint",))
+NAVER_CACHE_REQUESTS = REGISTRY.counter(
+    "naver_cache_requests_total", "Naver response cache lookups by endpoint and result (hit/disk_hit/miss)", ("endpoint", "result"))
+NAVER_CACHE_ENTRIES = REGISTRY.gauge(
+    "naver_cache_entries", "Naver responses held in the in-memory cache")
+EMBEDDING_SECONDS = REGISTRY.histogram(
+    "embedding_seconds", "Embedding model encode time per call", ("kind",))
+DB_SECONDS = REGISTRY.histogram(
+    "db_request_seconds", "Supabase round-trip latency by operation", ("op",))
+LOCAL_INDEX_SECONDS = REGISTRY.histogram(
+    "local_index_search_seconds", "Local PQ index search time (ADC scan + re-rank)")
+RPC_REQUESTS = REGISTRY.counter(
+    "rpc_requests_total", "match_documents RPC calls by outcome (ok/empty/error)", ("outcome",))
+INGESTED_DOCUMENTS = REGISTRY.counter(
+    "ingested_documents_total", "Collected items by source type and result (saved/duplicate/skipped/error)", ("source_type", "result"))
+GPT_SECONDS = REGISTRY.histogram(
+    "gpt_request_seconds", "Chat completion latency", ("model",))
+GPT_TOKENS = REGISTRY.counter(
+    "gpt_tokens_total", "Chat completion token usage", ("model", "kind"))
+THUMBNAIL_REQUESTS = REGISTRY.counter(
+    "thumbnail_requests_total", "Image grid thumbnail lookups by result (hit/miss/error)", ("result",))
+THUMBNAIL_BYTES = REGISTRY.counter(
+    "thumbnail_bytes_total", "Thumbnail proxy bytes by direction (origin=downloaded from CDN, served=sent to the page)", ("direction",))
+SINGLEFLIGHT_CALLS = REGISTRY.counter(
+    "singleflight_calls_total", "Coalesced calls by operation and role (leader ran it, follower shared the result)", ("op", "role"))
+
+# --- HTTP 엔드포인트 ---
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    registry = REGISTRY
+
+    def do_GET(self):
+        if self.path.split("?", 1)[0] not in ("/metrics", "/"):
+            self.send_error(404)
+            return
+        body = self.registry.exposition().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+class _MetricsServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+_server = None
+_server_lock = threading.Lock()
+
+def start_http_server(port=None, addr=None, registry=REGISTRY):
+    """백그라운드 스레드에서 /metrics 엔드포인트 시작 (프로세스당 한 번, 실패 시 None)"""
+    global _server
+    with _server_lock:
+        if _server is not None:
+            return _server
+        port = METRICS_PORT if port is None else port
+        if port in ("", None):
+            return None
+        handler = type("MetricsHandler", (_MetricsHandler,), {"registry": registry})
+        try:
+            server = _MetricsServer((addr or METRICS_ADDR, int(port)), handler)
+        except OSError as e:
+            logger.warning("메트릭 엔드포인트 시작 실패 (port=%s): %s", port, e)
+            return None
+        thread = threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True)
+        thread.start()
+        _server = server
+        return server
@@ -0,0 +1,163 @@
+# -*- coding: utf-8 -*-
+"""네이버 검색 API 원본 응답 공유 캐시 (엔드포인트별 TTL, 개수 제한, 선택적 디스크 저장)
+
+키는 (endpoint, query, display, start, sort) 이고 값은 응답 본문(bytes)입니다.
+같은 검색을 다시 누르거나 다른 세션이 같은 검색을 하면 TTL 동안 API를 다시 부르지 않습니다.
+
+환경 변수:
+    NAVER_CACHE_MAX_ENTRIES   메모리에 둘 최대 응답 수 (기본 512, 0이면 캐시 사용 안 함)
+    NAVER_CACHE_TTLS          엔드포인트별 TTL(초) 덮어쓰기, 예: "news=60,shop=7200"
+    NAVER_CACHE_DIR           지정하면 응답을 디렉터리에 파일로도 저장 (프로세스 재시작/다른 앱과 공유)
+"""
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from metrics import NAVER_CACHE_REQUESTS, NAVER_CACHE_ENTRIES
+
+logger = logging.getLogger(__name__)
+
+# 엔드포인트별 기본 TTL(초): 뉴스는 자주 바뀌고 쇼핑/이미지는 상대적으로 안정적
+DEFAULT_TTLS = {"news": 120, "blog": 900, "shop": 3600, "image": 3600}
+DEFAULT_TTL = 600
+
+def parse_ttls(text):
+    """'news=60,shop=7200' 형식을 {엔드포인트: 초}로 변환"""
+    ttls = {}
+    for part in (text or "").split(","):
+        endpoint, sep, seconds = part.partition("=")
+        if sep and endpoint.strip():
+            ttls[endpoint.strip()] = float(seconds)
+    return ttls
+
+class NaverResponseCache:
+    """스레드 안전 LRU + TTL 캐시 (프로세스 공용으로 하나만 만들어 공유)"""
+
+    def __init__(self, max_entries=512, ttls=None, disk_dir=None):
+        self.max_entries = max_entries
+        self.ttls = dict(DEFAULT_TTLS)
+        self.ttls.update(ttls or {})
+        self.disk_dir = disk_dir or None
+        self._entries = OrderedDict()   # key -> (저장 시각, 본문)
+        self._lock = threading.Lock()
+        self._disk_writes = 0
+        if self.disk_dir:
+            os.makedirs(self.disk_dir, exist_ok=True)
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            max_entries=int(os.environ.get("NAVER_CACHE_MAX_ENTRIES", "512")),
+            ttls=parse_ttls(os.environ.get("NAVER_CACHE_TTLS", "")),
+            disk_dir=os.environ.get("NAVER_CACHE_DIR", ""),
+        )
+
+    @staticmethod
+    def make_key(endpoint, query, display, start=1, sort="sim"):
+        return (endpoint, query, int(display), int(start), sort)
+
+    def ttl(self, endpoint):
+        return self.ttls.get(endpoint, DEFAULT_TTL)
+
+    def get(self, key):
+        """저장된 응답 본문 (없거나 만료되면 None)"""
+        if self.max_entries <= 0:
+            return None
+        endpoint = key[0]
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if now - entry[0] < self.ttl(endpoint):
+                    self._entries.move_to_end(key)
+                    NAVER_CACHE_REQUESTS.inc(endpoint=endpoint, result="hit")
+                    return entry[1]
+                del self._entries[key]
+                NAVER_CACHE_ENTRIES.set(len(self._entries))
+
+        entry = self._read_disk(key, now)
+        if entry is not None:
+            self._remember(key, entry)
+            NAVER_CACHE_REQUESTS.inc(endpoint=endpoint, result="disk_hit")
+            return entry[1]
+
+        NAVER_CACHE_REQUESTS.inc(endpoint=endpoint, result="miss")
+        return None
+
+    def put(self, key, body):
+        """정상 응답 본문 저장"""
+        if self.max_entries <= 0 or not body:
+            return
+        entry = (time.time(), body)
+        self._remember(key, entry)
+        self._write_disk(key, entry)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            NAVER_CACHE_ENTRIES.set(0)
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+    def _remember(self, key, entry):
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)   # 가장 오래 안 쓴 응답부터 제거
+            NAVER_CACHE_ENTRIES.set(len(self._entries))
+
+    # --- 디스크 ---
+
+    def _path(self, key):
+        digest = hashlib.sha1(json.dumps(key, ensure_ascii=False).encode("utf-8")).hexdigest()
+        return os.path.join(self.disk_dir, f"{digest}.json")
+
+    def _read_disk(self, key, now):
+        if not self.disk_dir:
+            return None
+        path = self._path(key)
+        try:
+            with open(path, encoding="utf-8") as f:
+                saved = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if tuple(saved.get("key", ())) != key or now - saved.get("stored_at", 0) >= self.ttl(key[0]):
+            return None
+        return saved["stored_at"], saved["body"].encode("utf-8")
+
+    def _write_disk(self, key, entry):
+        if not self.disk_dir:
+            return
+        path = self._path(key)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"key": list(key), "stored_at": entry[0], "body": entry[1].decode("utf-8")}, f, ensure_ascii=False)
+            os.replace(tmp_path, path)
+        except (OSError, UnicodeDecodeError) as e:
+            logger.warning("네이버 응답 캐시 파일 저장 실패: %s", e)
+            return
+        with self._lock:
+            self._disk_writes += 1
+            prune = self._disk_writes % 64 == 0
+        if prune:
+            self._prune_disk()
+
+    def _prune_disk(self):
+        """디스크 파일 수를 max_entries 이하로 (오래된 파일부터 삭제)"""
+        try:
+            files = [os.path.join(self.disk_dir, name) for name in os.listdir(self.disk_dir) if name.endswith(".json")]
+            if len(files) <= self.max_entries:
+                return
+            files.sort(key=os.path.getmtime)
+            for path in files[:len(files) - self.max_entries]:
+                os.remove(path)
+        except OSError as e:
+            logger.warning("네이버 응답 캐시 정리 실패: %s", e)
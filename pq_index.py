@@ -0,0 +1,370 @@
+# -*- coding: utf-8 -*-
+"""로컬 벡터 검색용 PQ/OPQ 압축 인덱스
+
+벡터를 m개 부분 공간으로 나눠 부분 공간마다 k-means 코드북(256개 중심)을 학습하고,
+각 벡터를 uint8 코드 m개로 저장합니다 (768차원 float32 3072바이트 → m=96이면 96바이트, 1/32).
+검색은 쿼리와 코드북 중심의 내적 표(ADC)를 한 번 만들고 코드로 표를 찾아 더하며,
+상위 후보는 원본 벡터(디스크 memmap)로 정확히 다시 계산합니다.
+
+인덱스 디렉터리 구성:
+    index.json       설정 (차원, m, 모델/버전, 행 수)
+    codebooks.npz    코드북, OPQ 회전 행렬, 문서 id
+    codes.u8         (m, n) uint8 코드 (memmap, 부분 공간별로 연속 저장해 ADC 조회가 순차 접근)
+    vectors.f32      (n, dim) float32 정규화 원본 벡터 (memmap, 재정렬용 - 메모리에 올리지 않음)
+
+빌드 후 저장된 문서(id가 인덱스의 마지막 id보다 큰 행)는 append_from_store로 메모리의 추가분에 붙이고,
+추가분은 원본 벡터로 정확히 계산합니다. 추가분이 커지면 다시 빌드하면 됩니다.
+
+빌드 예:
+    python pq_index.py --output vector_index --opq
+    LOCAL_VECTOR_INDEX=vector_index streamlit run total.py
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+
+import numpy as np
+
+LOCAL_VECTOR_INDEX = os.environ.get("LOCAL_VECTOR_INDEX", "")
+KSUB = 256   # 부분 공간별 중심 수 (uint8 코드)
+
+def _normalize(x):
+    x = np.asarray(x, dtype=np.float32)
+    norms = np.linalg.norm(x, axis=-1, keepdims=True)
+    return x / np.where(norms > 0, norms, 1)
+
+def kmeans(x, k=KSUB, iters=12, seed=0):
+    """간단한 Lloyd k-means (k-means++ 초기화) - 중심 (k, d)"""
+    rng = np.random.default_rng(seed)
+    n = len(x)
+    if n <= k:
+        # 점이 중심 수보다 적으면 점을 그대로 쓰고 나머지는 작은 잡음으로 채움
+        extra = x[rng.integers(0, n, k - n)] + rng.normal(0, 1e-4, (k - n, x.shape[1])).astype(np.float32)
+        return np.vstack([x, extra]).astype(np.float32)
+    # k-means++ 초기화는 표본(최대 k*8개)에서만 수행
+    seed_points = x[rng.choice(n, min(n, k * 8), replace=False)]
+    centroids = np.empty((k, x.shape[1]), dtype=np.float32)
+    centroids[0] = seed_points[rng.integers(len(seed_points))]
+    closest = ((seed_points - centroids[0]) ** 2).sum(axis=1)
+    for i in range(1, k):
+        total = closest.sum()
+        centroids[i] = seed_points[rng.choice(len(seed_points), p=closest / total if total > 0 else None)]
+        closest = np.minimum(closest, ((seed_points - centroids[i]) ** 2).sum(axis=1))
+    for _ in range(iters):
+        # |x|^2 은 argmin에 영향이 없으므로 생략
+        assign = ((centroids ** 2).sum(axis=1) - 2 * x @ centroids.T).argmin(axis=1)
+        counts = np.bincount(assign, minlength=k)
+        order = assign.argsort(kind="stable")
+        filled = counts > 0
+        starts = np.concatenate([[0], np.cumsum(counts)[:-1]])[filled]
+        centroids[filled] = np.add.reduceat(x[order], starts, axis=0) / counts[filled, None]
+        # 빈 중심은 임의의 점으로 다시 배치
+        if not filled.all():
+            centroids[~filled] = x[rng.choice(n, int((~filled).sum()), replace=False)]
+    return centroids
+
+class PQCodec:
+    """PQ(선택적으로 OPQ 회전) 코덱"""
+
+    def __init__(self, codebooks, rotation=None):
+        self.codebooks = np.asarray(codebooks, dtype=np.float32)   # (m, 256, dsub)
+        self.rotation = None if rotation is None else np.asarray(rotation, dtype=np.float32)
+        self.m, _, self.dsub = self.codebooks.shape
+
+    @property
+    def dim(self):
+        return self.m * self.dsub
+
+    @classmethod
+    def train(cls, vectors, m, iters=12, opq_iters=0, seed=0):
+        """정규화된 벡터로 코드북 학습 (opq_iters > 0이면 OPQ 회전도 학습)"""
+        x = _normalize(vectors)
+        if x.shape[1] % m:
+            raise ValueError(f"차원({x.shape[1]})이 부분 공간 수({m})로 나누어떨어져야 합니다")
+        rotation = np.eye(x.shape[1], dtype=np.float32) if opq_iters else None
+        codec = None
+        for step in range(max(opq_iters, 1)):
+            xr = x @ rotation if rotation is not None else x
+            last = step == max(opq_iters, 1) - 1
+            codebooks = cls._train_codebooks(xr, m, iters if last else max(4, iters // 3), seed)
+            codec = cls(codebooks, rotation)
+            if rotation is not None and not last:
+                # Procrustes: 복원 벡터에 가장 잘 맞는 직교 회전
+                reconstructed = codec._decode_rotated(codec._encode_rotated(xr))
+                u, _, vt = np.linalg.svd(x.T @ reconstructed)
+                rotation = (u @ vt).astype(np.float32)
+        return codec
+
+    @staticmethod
+    def _train_codebooks(x, m, iters, seed):
+        dsub = x.shape[1] // m
+        return np.stack([kmeans(np.ascontiguousarray(x[:, j * dsub:(j + 1) * dsub]), KSUB, iters, seed + j)
+                         for j in range(m)])
+
+    def rotate(self, x):
+        return x @ self.rotation if self.rotation is not None else x
+
+    def _encode_rotated(self, xr):
+        codes = np.empty((len(xr), self.m), dtype=np.uint8)
+        for j in range(self.m):
+            sub = xr[:, j * self.dsub:(j + 1) * self.dsub]
+            c = self.codebooks[j]
+            distances = -2 * sub @ c.T + (c ** 2).sum(axis=1)
+            codes[:, j] = distances.argmin(axis=1)
+        return codes
+
+    def _decode_rotated(self, codes):
+        return np.hstack([self.codebooks[j][codes[:, j]] for j in range(self.m)])
+
+    def encode(self, vectors, batch=65536):
+        x = _normalize(vectors)
+        return np.vstack([self._encode_rotated(self.rotate(x[i:i + batch])) for i in range(0, len(x), batch)]) \
+            if len(x) else np.empty((0, self.m), dtype=np.uint8)
+
+    def distance_table(self, query):
+        """ADC 표 (m, 256): 쿼리 부분 벡터와 각 중심의 내적"""
+        q = self.rotate(_normalize(query)).reshape(self.m, 1, self.dsub)
+        return np.matmul(self.codebooks, q.transpose(0, 2, 1))[:, :, 0]
+
+    def adc_scores(self, table, codes_t):
+        """코드((m, n) 전치 배열)로 표를 찾아 더한 근사 내적 (n,)"""
+        scores = np.zeros(codes_t.shape[1], dtype=np.float32)
+        for j in range(self.m):
+            scores += table[j].take(codes_t[j])
+        return scores
+
+class PQIndex:
+    """디스크 memmap 기반 PQ 인덱스 (id, 코드, 재정렬용 원본 벡터)"""
+
+    def __init__(self, path, codec, ids, codes, vectors, info):
+        self.path = path
+        self.codec = codec
+        self.ids = ids
+        self.codes = codes
+        self.vectors = vectors
+        self.info = info
+        self._id_order = None
+        # 빌드 뒤 추가된 행 (id 배열, 정규화 벡터) - append가 통째로 바꿔 끼우므로 검색은 잠금 없이 읽음
+        self._extra = (np.empty(0, np.int64), np.empty((0, codec.dim), np.float32))
+        self._append_lock = threading.Lock()
+        self.built_max_id = int(ids.max()) if len(ids) else 0
+        self.scanned_id = max(int(info.get("scanned_id", 0)), self.built_max_id)   # 저장소에서 여기까지 읽었음
+
+    @property
+    def dim(self):
+        return self.codec.dim
+
+    def __len__(self):
+        return len(self.ids) + len(self._extra[0])
+
+    @property
+    def appended(self):
+        """빌드 뒤 추가된 행 수"""
+        return len(self._extra[0])
+
+    @property
+    def max_id(self):
+        """인덱스에 들어 있는 가장 큰 문서 id (추가분 포함)"""
+        extra_ids = self._extra[0]
+        return int(extra_ids[-1]) if len(extra_ids) else self.built_max_id
+
+    def append(self, ids, vectors):
+        """새 문서 벡터를 추가분에 붙임 (id 오름차순, 이미 있는 id 이하는 무시)"""
+        ids = np.asarray(ids, dtype=np.int64)
+        if not len(ids):
+            return 0
+        with self._append_lock:
+            keep = ids > self.max_id
+            if not keep.any():
+                return 0
+            x = _normalize(np.asarray(vectors, dtype=np.float32)[keep][:, :self.dim])
+            extra_ids, extra_vectors = self._extra
+            self._extra = (np.concatenate([extra_ids, ids[keep]]), np.concatenate([extra_vectors, x]))
+            return int(keep.sum())
+
+    def append_from_store(self, store, model_name, version, page_size=1000):
+        """저장소에서 마지막으로 읽은 id 뒤에 저장된 같은 모델/버전 행을 읽어 추가 - 추가한 행 수"""
+        added = 0
+        for ids, vectors, last_id in iter_embeddings(store, model_name, version, self.scanned_id, page_size):
+            added += self.append(ids, vectors)
+            self.scanned_id = max(self.scanned_id, last_id)
+        return added
+
+    @classmethod
+    def build(cls, path, vectors, ids, m=None, opq=False, train_sample=10000, model_name="", version="", seed=0,
+              scanned_id=0):
+        """벡터(정규화 전 가능)로 인덱스를 만들어 path에 저장 (scanned_id: 빌드 때 저장소에서 읽은 마지막 id)"""
+        os.makedirs(path, exist_ok=True)
+        x = _normalize(vectors)
+        m = m or max(1, x.shape[1] // 8)
+        rng = np.random.default_rng(seed)
+        sample = x[rng.choice(len(x), min(len(x), train_sample), replace=False)]
+        t0 = time.perf_counter()
+        codec = PQCodec.train(sample, m, opq_iters=5 if opq else 0, seed=seed)
+        train_seconds = time.perf_counter() - t0
+
+        codes = np.memmap(os.path.join(path, "codes.u8"), dtype=np.uint8, mode="w+", shape=(m, len(x)))
+        codes[:] = codec.encode(x).T
+        codes.flush()
+        raw = np.memmap(os.path.join(path, "vectors.f32"), dtype=np.float32, mode="w+", shape=x.shape)
+        raw[:] = x
+        raw.flush()
+        arrays = {"codebooks": codec.codebooks, "ids": np.asarray(ids, dtype=np.int64)}
+        if codec.rotation is not None:
+            arrays["rotation"] = codec.rotation
+        with open(os.path.join(path, "codebooks.npz"), "wb") as f:
+            np.savez(f, **arrays)
+        info = {"rows": len(x), "dim": int(x.shape[1]), "m": m, "opq": bool(opq), "model_name": model_name,
+                "version": version, "scanned_id": int(scanned_id), "train_rows": len(sample), "train_seconds": round(train_seconds, 3),
+                "built_at": time.strftime("%Y-%m-%dT%H:%M:%S")}
+        with open(os.path.join(path, "index.json"), "w", encoding="utf-8") as f:
+            json.dump(info, f, ensure_ascii=False, indent=1)
+        return cls.load(path)
+
+    @classmethod
+    def load(cls, path):
+        with open(os.path.join(path, "index.json"), encoding="utf-8") as f:
+            info = json.load(f)
+        with np.load(os.path.join(path, "codebooks.npz")) as data:
+            codec = PQCodec(data["codebooks"], data["rotation"] if "rotation" in data.files else None)
+            ids = data["ids"]
+        shape = (info["m"], info["rows"])
+        codes = np.memmap(os.path.join(path, "codes.u8"), dtype=np.uint8, mode="r", shape=shape) if info["rows"] else np.empty(shape, np.uint8)
+        vectors_path = os.path.join(path, "vectors.f32")
+        vectors = np.memmap(vectors_path, dtype=np.float32, mode="r", shape=(info["rows"], info["dim"])) \
+            if info["rows"] and os.path.exists(vectors_path) else None
+        return cls(path, codec, ids, codes, vectors, info)
+
+    def code_bytes(self):
+        return int(self.codes.nbytes)
+
+    def positions_of(self, ids):
+        """문서 id 배열 → 인덱스 내 위치 배열 (인덱스에 없는 id는 제외)"""
+        if self._id_order is None:
+            self._id_order = np.argsort(self.ids, kind="stable")
+        sorted_ids = self.ids[self._id_order]
+        ids = np.asarray(ids, dtype=np.int64)
+        found = np.minimum(np.searchsorted(sorted_ids, ids), len(sorted_ids) - 1)
+        return np.sort(self._id_order[found[sorted_ids[found] == ids]])
+
+    def search(self, query, k=10, rerank=100, allowed_ids=None):
+        """(id 배열, 유사도 배열) - 근사 점수 상위 rerank개를 원본 벡터로 다시 계산
+
+        allowed_ids를 주면 (패싯 필터 결과 등) 그 문서들만 점수를 계산합니다.
+        """
+        empty = np.empty(0, np.int64), np.empty(0, np.float32)
+        query = np.asarray(query, dtype=np.float32)[:self.dim]
+        ids, scores = self._search_built(query, k, rerank, allowed_ids)
+        extra_ids, extra_vectors = self._extra
+        if len(extra_ids):
+            if allowed_ids is not None:
+                mask = np.isin(extra_ids, np.asarray(allowed_ids, dtype=np.int64))
+                extra_ids, extra_vectors = extra_ids[mask], extra_vectors[mask]
+            ids = np.concatenate([ids, extra_ids])
+            scores = np.concatenate([scores, extra_vectors @ _normalize(query)])
+            order = np.argsort(-scores, kind="stable")[:k]
+            ids, scores = ids[order], scores[order]
+        return (ids, scores) if len(ids) else empty
+
+    def _search_built(self, query, k, rerank, allowed_ids):
+        empty = np.empty(0, np.int64), np.empty(0, np.float32)
+        if not len(self.ids):
+            return empty
+        table = self.codec.distance_table(query)
+        if allowed_ids is None:
+            positions = np.arange(len(self.ids))
+            scores = self.codec.adc_scores(table, self.codes)
+        else:
+            positions = self.positions_of(allowed_ids)
+            if not len(positions):
+                return empty
+            scores = self.codec.adc_scores(table, self.codes[:, positions])
+        candidates = min(len(scores), max(k, rerank if self.vectors is not None else k))
+        top = np.argpartition(-scores, candidates - 1)[:candidates]
+        if self.vectors is not None and rerank:
+            top = np.sort(top)   # memmap을 순서대로 읽도록
+            scores_top = self.vectors[positions[top]] @ _normalize(query)
+        else:
+            scores_top = scores[top]
+        order = np.argsort(-scores_top)[:k]
+        return self.ids[positions[top[order]]], scores_top[order]
+
+def iter_embeddings(store, model_name, version, after_id=0, page_size=1000):
+    """id > after_id 인 행 중 model_name/version 벡터를 페이지마다 (id 목록, 벡터 목록, 마지막으로 읽은 id)로"""
+    from documents import parse_metadata, is_embedded_with, include_untagged_for
+    include_untagged = include_untagged_for(model_name)
+    while True:
+        rows = store.scan(after_id, page_size, columns=('id', 'embedding', 'metadata'))
+        if not rows:
+            return
+        after_id = rows[-1]['id']
+        ids, vectors = [], []
+        for row in rows:
+            if row.get('embedding') is None or \
+                    not is_embedded_with(parse_metadata(row.get('metadata')), model_name, version, include_untagged):
+                continue
+            embedding = row['embedding']
+            ids.append(row['id'])
+            vectors.append(json.loads(embedding) if isinstance(embedding, str) else embedding)
+        yield ids, vectors, after_id
+        if len(rows) < page_size:
+            return
+
+def infer_dim(vectors):
+    """0 패딩을 제외한 실제 차원 (마지막으로 0이 아닌 열 + 1)"""
+    nonzero = np.flatnonzero(np.any(vectors != 0, axis=0))
+    return int(nonzero[-1]) + 1 if len(nonzero) else vectors.shape[1]
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="documents 임베딩으로 로컬 PQ 인덱스 빌드")
+    parser.add_argument("--output", default=LOCAL_VECTOR_INDEX or "vector_index", help="인덱스 디렉터리")
+    parser.add_argument("--model", default=os.environ.get("EMBEDDING_MODEL", "jhgan/ko-sroberta-multitask"), help="이 모델로 태그된 행만 사용")
+    parser.add_argument("--version", default=None, help="이 임베딩 버전으로 태그된 행만 사용 (기본: 투영 설정 반영)")
+    parser.add_argument("--dim", type=int, default=0, help="사용할 차원 (0이면 0 패딩을 보고 자동 판단)")
+    parser.add_argument("--m", type=int, default=0, help="부분 공간 수 (0이면 차원/8)")
+    parser.add_argument("--opq", action="store_true", help="OPQ 회전 학습")
+    parser.add_argument("--page-size", type=int, default=1000)
+    args = parser.parse_args(argv)
+
+    import dotenv
+    from storage import open_store
+    from documents import EMBEDDING_VERSION
+    from projection import load_projection, embedding_version
+
+    dotenv.load_dotenv()
+    store = open_store()
+    version = args.version or embedding_version(EMBEDDING_VERSION, load_projection())
+
+    # 전체 행 수만큼 float32 배열을 미리 잡고 페이지마다 채움 (파이썬 리스트로 모으지 않음)
+    ids = np.empty(store.count(), dtype=np.int64)
+    matrix, rows, last_id = None, 0, 0
+    for page_ids, page_vectors, last_id in iter_embeddings(store, args.model, version, 0, args.page_size):
+        if not page_ids:
+            continue
+        page = np.asarray(page_vectors, dtype=np.float32)
+        if matrix is None:
+            matrix = np.empty((len(ids), page.shape[1]), dtype=np.float32)
+        if rows + len(page) > len(ids):   # 읽는 동안 새 행이 저장된 경우
+            grow = max(len(ids), rows + len(page))
+            ids = np.resize(ids, grow)
+            matrix = np.resize(matrix, (grow, matrix.shape[1]))
+        ids[rows:rows + len(page)] = page_ids
+        matrix[rows:rows + len(page)] = page
+        rows += len(page)
+        print(f"  id {last_id}까지 읽음, {rows}건 사용", file=sys.stderr)
+
+    if not rows:
+        print("인덱스에 넣을 행이 없습니다.", file=sys.stderr)
+        return 1
+    ids, matrix = ids[:rows], matrix[:rows]
+    dim = args.dim or infer_dim(matrix)
+    index = PQIndex.build(args.output, matrix[:, :dim], ids, m=args.m or None, opq=args.opq,
+                          model_name=args.model, version=version, scanned_id=last_id)
+    print(json.dumps(index.info, ensure_ascii=False, indent=2))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
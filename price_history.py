@@ -0,0 +1,338 @@
+# -*- coding: utf-8 -*-
+"""쇼핑 상품 가격 이력 (productId + 판매처별 시계열)
+
+문서 저장은 URL 중복이면 건너뛰지만, 가격은 수집할 때마다 관측값으로 따로 남깁니다.
+임베딩/문서 저장 없이 (상품, 시각, 가격)만 기록합니다.
+
+    log.tsv        새 관측값을 한 줄씩 덧붙이는 로그 (여러 프로세스가 같이 써도 됨)
+    segments.npz   압축된 열 저장 - 상품별 첫 시각/가격 + 이후 값은 직전 값과의 차이(int32)
+
+메모리에서는 (상품 코드, 시각) 순으로 정렬된 열 배열 세 개로 풀어 두고, 기간별 최저/평균이나
+"가격 하락" 같은 조회를 상품 수만큼 반복하지 않고 배열 연산 한 번으로 계산합니다.
+"""
+import os
+import threading
+import time
+
+import numpy as np
+
+from documents import facet_key, parse_price
+
+PRICE_HISTORY_PATH = os.environ.get("PRICE_HISTORY_PATH", "price_history")
+MIN_INTERVAL_SECONDS = 3600    # 같은 가격이 이 간격 안에 다시 관측되면 기록하지 않음
+COMPACT_MIN_LINES = 50000      # 로그가 이만큼 쌓이면 compact()에서 압축 저장
+DAY_SECONDS = 86400
+
+def price_observation(metadata):
+    """쇼핑 metadata → (productId, 판매처 키, 가격) - 상품 id나 가격이 없으면 None"""
+    product_id = str(metadata.get('product_id') or '').strip()
+    price = metadata.get('price_min')
+    if price is None:
+        price = parse_price(metadata.get('lprice'))
+    if not product_id or price is None:
+        return None
+    return product_id, facet_key(metadata.get('mallname')), int(price)
+
+def _empty():
+    return np.empty(0, np.int32), np.empty(0, np.int64), np.empty(0, np.int64)
+
+class PriceHistory:
+    """가격 관측값 저장/조회 - path가 None이면 메모리에만 보관"""
+
+    def __init__(self, path=PRICE_HISTORY_PATH, min_interval=MIN_INTERVAL_SECONDS):
+        self.path = path
+        self.min_interval = min_interval
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._reset()
+        if path:
+            os.makedirs(path, exist_ok=True)
+
+    def _reset(self):
+        self._keys = []            # 코드 -> (productId, 판매처 키)
+        self._codes = {}           # (productId, 판매처 키) -> 코드
+        self._columns = _empty()   # (코드, 시각, 가격) - 코드, 시각 순 정렬
+        self._offsets = np.zeros(1, np.int64)
+        self._pending = []         # 아직 정렬 배열에 합치지 않은 (코드, 시각, 가격)
+        self._last = {}            # 코드 -> 마지막 (시각, 가격)
+        self._segments_stamp = None
+        self._log_offset = 0
+
+    @property
+    def _segments_path(self):
+        return os.path.join(self.path, "segments.npz")
+
+    @property
+    def _log_path(self):
+        return os.path.join(self.path, "log.tsv")
+
+    def __len__(self):
+        with self._lock:
+            self._sync()
+            return len(self._columns[0]) + len(self._pending)
+
+    def _code(self, key):
+        code = self._codes.get(key)
+        if code is None:
+            code = self._codes[key] = len(self._keys)
+            self._keys.append(key)
+        return code
+
+    # ------------------------------------------------------------------ 기록
+
+    def record(self, metadatas, observed_at=None):
+        """쇼핑 metadata 목록의 현재 가격 기록 - 새로 기록한 관측 수
+
+        직전 관측과 가격이 같고 min_interval 안이면 건너뜁니다 (반복 갱신으로 이력이 불어나지 않도록).
+        """
+        observed_at = int(observed_at if observed_at is not None else time.time())
+        observations = {}
+        for metadata in metadatas:
+            observation = price_observation(metadata)
+            if observation is not None:
+                observations[observation[:2]] = observation[2]   # 같은 배치에 같은 상품이 여러 번 나오면 마지막 값
+        with self._lock:
+            self._sync()
+            fresh = []
+            for key, price in observations.items():
+                last = self._last.get(self._codes.get(key))
+                if last is not None and last[1] == price and observed_at - last[0] < self.min_interval:
+                    continue
+                fresh.append((key, observed_at, price))
+        return self._append(fresh)
+
+    def record_many(self, product_ids, malls, times, prices):
+        """대량 기록 (벤치마크/이관용) - 중복 확인 없이 그대로 추가"""
+        rows = [((str(p), facet_key(m)), int(t), int(v)) for p, m, t, v in zip(product_ids, malls, times, prices)]
+        return self._append(rows)
+
+    def _append(self, rows):
+        if not rows:
+            return 0
+        if self.path:
+            lines = "".join(f"{product_id}\t{mall}\t{t}\t{price}\n" for (product_id, mall), t, price in rows)
+            with self._write_lock, open(self._log_path, "a", encoding="utf-8") as f:
+                f.write(lines)
+            with self._lock:
+                self._sync()   # 방금 쓴 줄(다른 프로세스가 쓴 줄 포함)을 로그에서 읽어 반영
+        else:
+            with self._lock:
+                self._add_rows(rows)
+        return len(rows)
+
+    def _add_rows(self, rows):
+        for key, t, price in rows:
+            code = self._code(key)
+            self._pending.append((code, t, price))
+            last = self._last.get(code)
+            if last is None or t >= last[0]:
+                self._last[code] = (t, price)
+
+    # ------------------------------------------------------------------ 파일 동기화
+
+    def _sync(self):
+        """압축 파일이 바뀌었으면 다시 읽고, 로그에 새로 붙은 줄 반영 (호출 측에서 잠금)"""
+        if not self.path:
+            return
+        try:
+            stat = os.stat(self._segments_path)
+            stamp = (stat.st_mtime_ns, stat.st_size)
+        except FileNotFoundError:
+            stamp = None
+        if stamp != self._segments_stamp:
+            self._reset()
+            if stamp is not None:
+                self._load_segments()
+            self._segments_stamp = stamp
+        try:
+            with open(self._log_path, "rb") as f:
+                f.seek(self._log_offset)
+                data = f.read()
+        except FileNotFoundError:
+            return
+        end = data.rfind(b"\n") + 1   # 쓰는 중인 마지막 줄은 다음에
+        if not end:
+            return
+        rows = []
+        for line in data[:end].decode("utf-8").splitlines():
+            product_id, mall, t, price = line.split("\t")
+            rows.append(((product_id, mall), int(t), int(price)))
+        self._add_rows(rows)
+        self._log_offset += end
+
+    def _load_segments(self):
+        with np.load(self._segments_path) as data:
+            product_ids, malls = data["product_ids"], data["malls"]
+            counts = data["counts"].astype(np.int64)
+            times = _undelta(data["first_times"], data["time_deltas"], counts)
+            prices = _undelta(data["first_prices"], data["price_deltas"], counts)
+        self._keys = list(zip(product_ids.tolist(), malls.tolist()))
+        self._codes = {key: code for code, key in enumerate(self._keys)}
+        codes = np.repeat(np.arange(len(self._keys), dtype=np.int32), counts)
+        self._columns = (codes, times, prices)
+        self._offsets = np.concatenate([[0], np.cumsum(counts)])
+        ends = self._offsets[1:] - 1
+        self._last = {code: (int(times[end]), int(prices[end])) for code, end in enumerate(ends) if counts[code]}
+
+    def compact(self, force=False):
+        """로그를 압축 파일에 합치고 비우기 - 합친 줄이 있으면 True
+
+        로그 파일을 먼저 다른 이름으로 옮기므로 그 사이에 다른 프로세스가 쓰는 줄은 새 로그로 갑니다.
+        """
+        if not self.path:
+            return False
+        with self._lock:
+            self._sync()
+            if not force and len(self._pending) < COMPACT_MIN_LINES:
+                return False
+            compacting = f"{self._log_path}.compacting"
+            if os.path.exists(self._log_path):
+                os.replace(self._log_path, compacting)
+            # 옮기기 직전에 붙은 줄까지 읽기
+            if os.path.exists(compacting):
+                with open(compacting, "rb") as f:
+                    f.seek(self._log_offset)
+                    tail = f.read()
+                rows = []
+                for line in tail.decode("utf-8").splitlines():
+                    if line.count("\t") == 3:
+                        product_id, mall, t, price = line.split("\t")
+                        rows.append(((product_id, mall), int(t), int(price)))
+                self._add_rows(rows)
+            self._merge()
+            codes, times, prices = self._columns
+            counts = np.diff(self._offsets)
+            first_times, time_deltas = _delta(times, self._offsets)
+            first_prices, price_deltas = _delta(prices, self._offsets)
+            tmp_path = f"{self._segments_path}.tmp.npz"
+            np.savez_compressed(tmp_path, product_ids=np.array([k[0] for k in self._keys], dtype=str),
+                                malls=np.array([k[1] for k in self._keys], dtype=str),
+                                counts=counts.astype(np.int32), first_times=first_times, first_prices=first_prices,
+                                time_deltas=time_deltas, price_deltas=price_deltas)
+            os.replace(tmp_path, self._segments_path)
+            if os.path.exists(compacting):
+                os.remove(compacting)
+            stat = os.stat(self._segments_path)
+            self._segments_stamp = (stat.st_mtime_ns, stat.st_size)
+            self._log_offset = 0
+            return True
+
+    def nbytes(self):
+        """디스크 사용량 (압축 파일 + 로그)"""
+        if not self.path:
+            return 0
+        return sum(os.path.getsize(p) for p in (self._segments_path, self._log_path) if os.path.exists(p))
+
+    # ------------------------------------------------------------------ 조회
+
+    def _merge(self):
+        """대기 관측값을 정렬 배열에 합치기 (호출 측에서 잠금)"""
+        if not self._pending:
+            return
+        new_codes, new_times, new_prices = (np.asarray(c) for c in zip(*self._pending))
+        codes = np.concatenate([self._columns[0], new_codes.astype(np.int32)])
+        times = np.concatenate([self._columns[1], new_times.astype(np.int64)])
+        prices = np.concatenate([self._columns[2], new_prices.astype(np.int64)])
+        order = np.lexsort((times, codes))
+        self._columns = (codes[order], times[order], prices[order])
+        counts = np.bincount(self._columns[0], minlength=len(self._keys))
+        self._offsets = np.concatenate([[0], np.cumsum(counts)])
+        self._pending = []
+
+    def _arrays(self):
+        with self._lock:
+            self._sync()
+            self._merge()
+            return self._columns, self._offsets, list(self._keys)
+
+    def history(self, product_id, mall):
+        """상품 하나의 (시각 배열, 가격 배열)"""
+        (_, times, prices), offsets, keys = self._arrays()
+        code = self._codes.get((str(product_id), facet_key(mall)))
+        if code is None or code >= len(offsets) - 1:
+            return np.empty(0, np.int64), np.empty(0, np.int64)
+        lo, hi = offsets[code], offsets[code + 1]
+        return times[lo:hi], prices[lo:hi]
+
+    def window_stats(self, start=None, end=None):
+        """기간 안에 관측이 있는 상품별 최저/평균/최고가 - {"keys", "min", "avg", "max", "count"} 배열"""
+        (codes, times, prices), _, keys = self._arrays()
+        mask = np.ones(len(times), dtype=bool)
+        if start is not None:
+            mask &= times >= start
+        if end is not None:
+            mask &= times <= end
+        codes, prices = codes[mask], prices[mask]
+        if not len(codes):
+            return {"keys": [], "min": np.empty(0, np.int64), "avg": np.empty(0), "max": np.empty(0, np.int64),
+                    "count": np.empty(0, np.int64)}
+        # 코드 순으로 정렬돼 있으므로 상품별 연속 구간
+        present, starts, counts = np.unique(codes, return_index=True, return_counts=True)
+        return {"keys": [keys[c] for c in present],
+                "min": np.minimum.reduceat(prices, starts),
+                "max": np.maximum.reduceat(prices, starts),
+                "avg": np.add.reduceat(prices, starts) / counts,
+                "count": counts}
+
+    def price_drops(self, since, min_drop=0.05, limit=50):
+        """since 시점 가격보다 현재(마지막 관측) 가격이 min_drop 비율 이상 내린 상품 (하락률 큰 순)
+
+        since 시점 가격은 그 전 마지막 관측값, 그 뒤에 처음 관측된 상품은 첫 관측값입니다.
+        반환: [(productId, 판매처 키, 기준 가격, 현재 가격, 하락률)]
+        """
+        (codes, times, prices), offsets, keys = self._arrays()
+        if not len(times):
+            return []
+        firsts, lasts = offsets[:-1], offsets[1:] - 1
+        # (코드, 시각) 합성 키로 상품별 "since 이전 마지막 관측" 위치를 한 번에 찾기
+        base = int(times.min())
+        composite = (codes.astype(np.int64) << 32) + (times - base)
+        targets = (np.arange(len(firsts), dtype=np.int64) << 32) + (int(since) - base)
+        before = np.searchsorted(composite, targets, side="right") - 1
+        reference = np.maximum(before, firsts)   # since 이후에 처음 관측된 상품은 첫 관측값
+        ref_prices, current = prices[reference], prices[lasts]
+        drop = (ref_prices - current) / np.maximum(ref_prices, 1)
+        hits = np.flatnonzero(drop >= min_drop)
+        hits = hits[np.argsort(-drop[hits], kind="stable")][:limit]
+        return [(keys[c][0], keys[c][1], int(ref_prices[c]), int(current[c]), float(drop[c])) for c in hits]
+
+    def describe(self, metadata, now=None, window_days=30):
+        """답변 컨텍스트용 한 줄 요약 (이력이 두 번 이상 관측된 상품만, 없으면 '')"""
+        observation = price_observation(metadata)
+        if observation is None:
+            return ""
+        times, prices = self.history(observation[0], observation[1])
+        if len(times) < 2:
+            return ""
+        now = int(now if now is not None else time.time())
+        in_window = times >= now - window_days * DAY_SECONDS
+        if not in_window.any():
+            return ""
+        window = prices[in_window]
+        first, last = int(window[0]), int(prices[-1])
+        change = (last - first) / first * 100 if first else 0.0
+        trend = f"{abs(change):.0f}% {'하락' if change < 0 else '상승'}" if abs(change) >= 1 else "변동 없음"
+        return (f"최근 {window_days}일 가격 이력: 최저 {int(window.min()):,}원 / 평균 {window.mean():,.0f}원 / "
+                f"현재 {last:,}원 (관측 {int(in_window.sum())}회, 기간 내 {trend})")
+
+def _delta(values, offsets):
+    """상품별 (첫 값, 이후 차이 int32) - 첫 값 자리는 차이 배열에서 빠짐"""
+    starts = np.zeros(len(values), dtype=bool)
+    starts[offsets[:-1]] = True
+    diffs = np.diff(values, prepend=values[:1])
+    return values[starts].astype(np.int64), diffs[~starts].astype(np.int32)
+
+def _undelta(firsts, deltas, counts):
+    """_delta의 역변환 - 상품별 누적합"""
+    total = int(counts.sum())
+    if not total:
+        return np.empty(0, np.int64)
+    starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+    full = np.zeros(total, dtype=np.int64)
+    is_start = np.zeros(total, dtype=bool)
+    is_start[starts] = True
+    full[~is_start] = deltas
+    full[starts] = firsts
+    cumulative = np.cumsum(full)
+    segment_base = cumulative[starts] - full[starts]
+    return cumulative - np.repeat(segment_base, counts)
@@ -0,0 +1,140 @@
+# -*- coding: utf-8 -*-
+"""임베딩 차원 축소 (PCA 또는 Matryoshka 방식 앞부분 자르기)
+
+EMBEDDING_PROJECTION 환경 변수에 투영 파일(.npz)을 지정하면 수집과 검색 모두
+같은 투영을 거친 벡터를 씁니다. 투영마다 버전이 있고 행의 embedding_version에
+기록되므로, 투영을 다시 학습하면 reembed.py --projection 으로 옮겨야 검색됩니다.
+
+오프라인 학습 예:
+    python projection.py --dim 256 --sample 20000 --output projections/ko-sroberta-pca256.npz
+    python projection.py --method truncate --dim 256 --output projections/ko-sroberta-trunc256.npz
+"""
+import argparse
+import hashlib
+import json
+import os
+import sys
+from datetime import datetime
+
+import numpy as np
+
+try:
+    from sklearn.decomposition import PCA
+except ImportError:  # scikit-learn이 없으면 numpy SVD로 학습
+    PCA = None
+
+PROJECTION_PATH = os.environ.get("EMBEDDING_PROJECTION", "")
+
+class Projection:
+    """학습된 투영 (method: 'pca' 또는 'truncate')"""
+
+    def __init__(self, method, dim, model_name, mean=None, components=None, fitted_rows=0, created_at=None):
+        self.method = method
+        self.dim = int(dim)
+        self.model_name = model_name
+        self.mean = None if mean is None else np.asarray(mean, dtype=np.float32)
+        self.components = None if components is None else np.asarray(components, dtype=np.float32)  # (dim, 원래 차원)
+        self.fitted_rows = int(fitted_rows)
+        self.created_at = created_at or datetime.now().isoformat(timespec="seconds")
+
+    @property
+    def version(self):
+        """투영 버전 문자열 (같은 행렬이면 같은 값)"""
+        if self.method == "truncate":
+            return f"trunc{self.dim}"
+        digest = hashlib.sha1(self.components.tobytes() + self.mean.tobytes()).hexdigest()[:8]
+        return f"pca{self.dim}-{digest}"
+
+    def transform(self, vectors):
+        """(n, 원래 차원) 또는 (원래 차원,) → 축소 후 L2 정규화된 float32"""
+        x = np.asarray(vectors, dtype=np.float32)
+        single = x.ndim == 1
+        x = np.atleast_2d(x)
+        if self.method == "truncate":
+            y = x[:, :self.dim]
+        else:
+            y = (x - self.mean) @ self.components.T
+        norms = np.linalg.norm(y, axis=1, keepdims=True)
+        y = y / np.where(norms > 0, norms, 1)
+        return y[0] if single else y
+
+    def save(self, path):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        info = {"method": self.method, "dim": self.dim, "model_name": self.model_name,
+                "fitted_rows": self.fitted_rows, "created_at": self.created_at, "version": self.version}
+        arrays = {}
+        if self.method == "pca":
+            arrays = {"mean": self.mean, "components": self.components}
+        with open(path, "wb") as f:
+            np.savez(f, info=np.array(json.dumps(info)), **arrays)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            info = json.loads(str(data["info"]))
+            mean = data["mean"] if "mean" in data.files else None
+            components = data["components"] if "components" in data.files else None
+        return cls(info["method"], info["dim"], info["model_name"], mean, components,
+                   info.get("fitted_rows", 0), info.get("created_at"))
+
+def fit_pca(vectors, dim, model_name):
+    """코퍼스 벡터로 PCA 투영 학습"""
+    x = np.asarray(vectors, dtype=np.float32)
+    if dim >= x.shape[1] or dim > len(x):
+        raise ValueError(f"축소 차원({dim})은 원래 차원({x.shape[1]})과 학습 행 수({len(x)})보다 작아야 합니다")
+    if PCA is not None:
+        pca = PCA(n_components=dim, svd_solver="randomized", random_state=0).fit(x)
+        mean, components = pca.mean_, pca.components_
+    else:
+        mean = x.mean(axis=0)
+        _, _, vt = np.linalg.svd(x - mean, full_matrices=False)
+        mean, components = mean, vt[:dim]
+    return Projection("pca", dim, model_name, mean, components, fitted_rows=len(x))
+
+def truncation(dim, model_name):
+    """Matryoshka 학습 모델용: 앞 dim차원만 사용"""
+    return Projection("truncate", dim, model_name)
+
+def load_projection(path=PROJECTION_PATH):
+    """설정된 투영 (없으면 None)"""
+    if not path:
+        return None
+    return Projection.load(path)
+
+def embedding_version(base_version, projection):
+    """행에 기록할 임베딩 버전 (투영을 쓰면 투영 버전을 덧붙임)"""
+    return base_version if projection is None else f"{base_version}+{projection.version}"
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="임베딩 차원 축소 투영 학습 (오프라인)")
+    parser.add_argument("--method", default="pca", choices=["pca", "truncate"])
+    parser.add_argument("--dim", type=int, default=256, help="축소 후 차원")
+    parser.add_argument("--model", default=os.environ.get("EMBEDDING_MODEL", "jhgan/ko-sroberta-multitask"))
+    parser.add_argument("--sample", type=int, default=20000, help="PCA 학습에 쓸 최대 문서 수")
+    parser.add_argument("--output", required=True, help="저장할 .npz 경로")
+    args = parser.parse_args(argv)
+
+    if args.method == "truncate":
+        projection = truncation(args.dim, args.model)
+    else:
+        import dotenv
+        from storage import open_store
+        from sentence_transformers import SentenceTransformer
+        from documents import prepare_embedding_text
+
+        dotenv.load_dotenv()
+        store = open_store()
+        rows = store.sample(limit=args.sample)
+        texts = [t for t in (prepare_embedding_text(r.get('content') or '') for r in rows) if t]
+        model = SentenceTransformer(args.model)
+        vectors = model.encode(texts, batch_size=64, convert_to_numpy=True, show_progress_bar=True)
+        projection = fit_pca(vectors, args.dim, args.model)
+
+    projection.save(args.output)
+    print(f"저장: {args.output} (version={projection.version})")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,128 @@
+# -*- coding: utf-8 -*-
+"""소스 타입별 GPT 프롬프트와 컨텍스트 문서 형식 (total.py와 검색 서비스가 함께 사용)"""
+from documents import parse_metadata
+
+def get_system_prompt(source_type):
+    """소스 타입에 따른 시스템 프롬프트 생성"""
+    if source_type == "블로그":
+        return """당신은 네이버 블로그 데이터를 기반으로 정확하고 유용한 정보를 제공하는 도우미입니다.
+블로그 글은 개인의 경험과 의견을 담고 있으므로, 주관적인 내용이 포함될 수 있음을 인지하세요.
+여러 블로그의 정보를 종합하여 균형 잡힌 시각을 제공하되, 정보의 출처가 개인 블로그임을 명시하세요.
+특히 레시피, DIY 방법, 여행 경험 등 실용적인 정보에 집중하되, 의학적 조언이나 전문적인 내용은 참고 정보로만 안내하세요."""
+
+    elif source_type == "뉴스":
+        return """당신은 네이버 뉴스 데이터를 기반으로 정확하고 객관적인 정보를 제공하는 도우미입니다.
+뉴스 기사의 사실과 정보를 전달할 때는 편향되지 않게 중립적인 입장을 유지하세요.
+여러 언론사의 기사를 비교하여 다양한 관점을 제시하고, 정보의 출처와 발행 날짜를 명확히 하세요.
+특히 시사 문제, 최신 이슈, 사회 현상에 대해 설명할 때는 다양한 의견이 있을 수 있음을 인지하세요."""
+
+    elif source_type == "쇼핑":
+        return """당신은 네이버 쇼핑 데이터를 기반으로 정확하고 유용한 정보를 제공하는 도우미입니다.
+상품 정보, 가격, 기능, 특징 등을 객관적으로 설명하고 비교하세요.
+다양한 상품 옵션과 가격대를 안내하되, 특정 브랜드나 제품을 지나치게 홍보하지 마세요.
+사용자의 요구에 맞는 상품 추천이나 구매 팁을 제공할 때는 실용적인 관점에서 접근하세요.
+문서에 가격 이력(최저/평균/현재가)이 있으면 지금 가격이 싼 편인지 판단하는 근거로 활용하세요."""
+
+    else:
+        return """당신은 네이버 검색 데이터를 기반으로 정확하고 유용한 정보를 제공하는 도우미입니다.
+주어진 문서들의 내용만 사용하여 사용자 질문에 맞는 최적의 답변을 제공하세요.
+문서에 없는 내용은 추가하지 말고 정확한 사실만 전달하세요."""
+
+def get_user_prompt(query, context_text, source_type):
+    """소스 타입에 따른 사용자 프롬프트 생성"""
+    if source_type == "블로그":
+        return f"""다음은 네이버 블로그에서 수집한 데이터입니다:
+
+{context_text}
+
+위 블로그 글들을 바탕으로 다음 질문에 상세히 답변해주세요: 
+"{query}"
+
+답변 작성 규칙:
+1. 한국어로 자연스럽게 답변해주세요.
+2. 블로그 글은 개인의 경험과 의견을 담고 있으므로, 정보의 주관성을 고려해주세요.
+3. 여러 블로그의 공통된 내용에 중점을 두고, 개인적 경험이나 팁은 "블로거의 경험에 따르면..."과 같이 맥락을 제공해주세요.
+4. 블로그 글들 간에 상충되는 정보가 있다면 "일부 블로거는 A를 추천하는 반면, 다른 블로거는 B를 선호합니다"와 같이 다양한 의견을 제시해주세요.
+5. 레시피, DIY 방법, 여행 경험 등 실용적인 정보에 집중해주세요.
+6. 출처를 명시할 때는 "문서 2의 블로거에 따르면..."과 같이 표현해주세요.
+7. 제공된 문서 내용만 사용하고, 문서에 없는 내용은 추측하거나 답변하지 마세요."""
+
+    elif source_type == "뉴스":
+        return f"""다음은 네이버 뉴스에서 수집한, 신뢰할 수 있는 언론사의 기사입니다:
+
+{context_text}
+
+위 뉴스 기사들을 바탕으로 다음 질문에 상세히 답변해주세요: 
+"{query}"
+
+답변 작성 규칙:
+1. 한국어로 자연스럽게 답변해주세요.
+2. 뉴스 기사의 사실과 정보를 전달할 때는 편향되지 않게 중립적인 입장을 유지하세요.
+3. 기사의 발행 날짜를 고려하여 정보의 시의성을 명시하세요. (예: "2023년 5월 보도에 따르면...")
+4. 여러 언론사의 기사를 인용할 때는 "문서 1의 OO일보에 따르면..."와 같이 출처를 명확히 하세요.
+5. 기사들 간에 상충되는 정보가 있다면 이를 언급하고 각 관점을 공정하게 제시하세요.
+6. 제공된 기사 내용만 사용하고, 기사에 없는 내용은 추측하거나 답변하지 마세요."""
+
+    elif source_type == "쇼핑":
+        return f"""다음은 네이버 쇼핑에서 수집한 상품 정보입니다:
+
+{context_text}
+
+위 쇼핑 데이터를 바탕으로 다음 질문에 상세히 답변해주세요: 
+"{query}"
+
+답변 작성 규칙:
+1. 한국어로 자연스럽게 답변해주세요.
+2. 상품의 가격, 기능, 특징 등을 객관적으로 설명하고 비교해주세요.
+3. 가격은 범위로 표현하고 정확한 가격이 있다면 언급해주세요. (예: "이 제품은 30,000원에서 50,000원 사이의 가격대를 형성하고 있습니다")
+4. 다양한 브랜드와 제품을 균형 있게 소개하고, 특정 상품을 지나치게 홍보하지 마세요.
+5. 상품의 특징을 비교할 때는 "A 제품은 X 기능이 있지만, B 제품은 Y 기능이 강조됩니다"와 같이 객관적으로 설명해주세요.
+6. 제공된 상품 정보만 사용하고, 문서에 없는 내용은 추측하거나 답변하지 마세요."""
+
+    else:
+        return f"""다음은 네이버 검색에서 수집한 데이터입니다:
+
+{context_text}
+
+위 내용을 바탕으로 다음 질문에 상세히 답변해주세요: 
+"{query}"
+
+답변 작성 규칙:
+1. 한국어로 자연스럽게 답변해주세요.
+2. 제공된 문서 내용만 사용하여 사실에 기반한 답변을 작성해주세요.
+3. 문서에 없는 내용은 추측하거나 답변하지 마세요.
+4. 여러 문서 간에 상충되는 정보가 있다면 이를 언급해주세요.
+5. 답변에 적절한 정보가 부족하다면 솔직하게 말씀해주세요.
+6. 답변은 논리적인 구조로 정리하여 사용자가 이해하기 쉽게 작성해주세요.
+7. 필요한 경우 정보의 출처를 언급해주세요(예: "문서 2에 따르면...")."""
+
+def format_context_entry(rank, result, content, source_type, price_history=None):
+    """검색 결과 한 건을 GPT 컨텍스트 문자열로 변환 (price_history: 쇼핑 가격 이력, 있으면 한 줄 추가)"""
+    # metadata 확인 (JSON 문자열일 경우 파싱)
+    metadata = parse_metadata(result.get('metadata'))
+    title = metadata.get('title', '제목 없음')
+    date = metadata.get('date', '')  # 날짜 정보가 있으면 추가
+    
+    # 날짜 정보가 있으면 포함
+    date_info = f" (작성일: {date})" if date else ""
+    
+    # 소스 타입에 맞는 추가 정보
+    if source_type == "블로그" and 'bloggername' in metadata:
+        source_info = f" - 블로거: {metadata['bloggername']}"
+    elif source_type == "뉴스" and 'publisher' in metadata:
+        source_info = f" - 출처: {metadata['publisher']}"
+    elif source_type == "쇼핑" and 'mallname' in metadata:
+        price_info = f", 가격: {metadata.get('lprice', '정보 없음')}원" if 'lprice' in metadata else ""
+        source_info = f" - 판매처: {metadata['mallname']}{price_info}"
+        history_info = price_history.describe(metadata) if price_history is not None else None
+        if history_info:
+            source_info += f"\n{history_info}"
+    else:
+        source_info = ""
+    
+    # 유사도 점수 추가
+    similarity = result.get('similarity', 0) * 100
+    similarity_info = f" (유사도: {similarity:.1f}%)"
+    
+    # 출처 타입과 함께 컨텍스트 추가
+    return f"문서 {rank} - [{source_type}] {title}{date_info}{source_info}{similarity_info}:\n{content}\n"
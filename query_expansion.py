@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+"""검색어 확장 + 순위 융합
+
+소스별 접두어 한 가지로만 임베딩하던 검색어를 여러 형태로 늘려 각각 검색하고,
+결과 순위를 가중 RRF(reciprocal rank fusion)로 합칩니다.
+
+    source     소스 접두어를 붙인 형태 (기존 검색과 같은 문자열 - 항상 첫 번째)
+    raw        입력 그대로
+    keywords   조사/질문 어미/불용어를 뺀 핵심어만
+"""
+import re
+
+# 소스 타입별 검색어 템플릿 (기존 preprocess_query와 같은 문자열)
+SOURCE_QUERY_TEMPLATES = {
+    "뉴스": "뉴스 검색: {query} 뉴스 기사 언론사 보도",
+    "쇼핑": "상품 검색: {query} 쇼핑 상품 가격",
+    "블로그": "블로그 검색: {query} 블로그 포스팅",
+}
+VARIANT_WEIGHTS = {"source": 1.0, "raw": 0.8, "keywords": 0.8}
+RRF_K = 60   # 순위 융합 상수 (클수록 하위 순위도 비슷하게 반영)
+
+# 검색 의도와 상관없는 말 (질문 어미, 요청 표현 등)
+_STOPWORDS = {
+    "알려줘", "알려주세요", "추천해줘", "추천해주세요", "해줘", "해주세요", "있나요", "있어", "있어요", "인가요",
+    "뭐야", "뭐가", "무엇", "어떤", "어떻게", "어디", "어디서", "언제", "왜", "좀", "대해", "대한", "관련", "관해",
+    "정리", "궁금해", "궁금합니다", "무엇인가요", "뭔가요", "있을까요", "할까요", "좋을까요", "어때", "어때요",
+}
+# 단어 끝 조사 (긴 것부터 - 남는 부분이 두 글자 이상일 때만 떼어냄)
+_PARTICLES = ("에서는", "으로는", "에게서", "이라도", "에서", "으로", "에게", "까지", "부터", "처럼", "보다", "이나",
+              "은", "는", "이", "가", "을", "를", "에", "의", "로", "와", "과", "도", "만")
+_TOKEN_RE = re.compile(r"[0-9A-Za-z가-힣]+")
+
+def source_query(query, source_type):
+    """소스 접두어를 붙인 검색어 (블로그 외 알 수 없는 소스는 블로그 템플릿)"""
+    return SOURCE_QUERY_TEMPLATES.get(source_type, SOURCE_QUERY_TEMPLATES["블로그"]).format(query=query)
+
+def _strip_particle(token):
+    for particle in _PARTICLES:
+        if token.endswith(particle) and len(token) - len(particle) >= 2:
+            return token[:-len(particle)]
+    return token
+
+def keyword_query(query):
+    """핵심어만 남긴 검색어 ('가성비 좋은 전자담배는 어떤 게 있나요?' → '가성비 좋은 전자담배')"""
+    keywords = []
+    for token in _TOKEN_RE.findall(query):
+        if token in _STOPWORDS:
+            continue
+        token = _strip_particle(token)
+        if len(token) >= 2 and token not in _STOPWORDS and token not in keywords:
+            keywords.append(token)
+    return " ".join(keywords)
+
+def expand_query(query, source_type):
+    """검색어 변형 목록 [(이름, 문자열, 가중치)] - 같은 문자열은 한 번만, 소스 접두어 형태가 첫 번째"""
+    query = " ".join(query.split())
+    candidates = [("source", source_query(query, source_type)), ("raw", query), ("keywords", keyword_query(query))]
+    variants, seen = [], set()
+    for name, text in candidates:
+        if text and text not in seen:
+            seen.add(text)
+            variants.append((name, text, VARIANT_WEIGHTS[name]))
+    return variants
+
+def fuse_rankings(rankings, k=RRF_K):
+    """[(가중치, 유사도 순 결과 행)]을 가중 RRF로 합친 행 목록 (점수 순)
+
+    행마다 'fusion'(융합 점수)과 'variants'(찾아낸 변형 수)를 붙이고, 'similarity'는 변형 중 가장 높은 값입니다.
+    유사도가 같은 행은 같은 순위로 셉니다 (저장소마다 동점 순서가 달라도 같은 점수).
+    """
+    fused = {}
+    for weight, rows in rankings:
+        rank, previous = 0, None
+        for position, row in enumerate(rows, 1):
+            if row.get('similarity') != previous:
+                rank, previous = position, row.get('similarity')
+            entry = fused.get(row['id'])
+            if entry is None:
+                fused[row['id']] = entry = {**row, 'fusion': 0.0, 'variants': 0}
+            elif row.get('similarity', 0) > entry.get('similarity', 0):
+                entry['similarity'] = row['similarity']
+            entry['fusion'] += weight / (k + rank)
+            entry['variants'] += 1
+    return sorted(fused.values(), key=lambda row: (row['fusion'], row.get('similarity', 0)), reverse=True)
@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+"""저장된 문서를 한 임베딩 모델/버전으로 다시 임베딩하는 백그라운드 작업
+
+예:
+    python reembed.py                                   # 기본 모델, 초당 20행
+    python reembed.py --rows-per-second 5 --batch-size 32
+    nohup python reembed.py > reembed.log 2>&1 &       # 백그라운드 실행 (중단 후 다시 실행하면 이어서 진행)
+
+id 순서로 문서를 묶음 단위로 읽어 태그(metadata.embedding_model/embedding_version)가
+대상과 다른 행만 다시 임베딩해 upsert 합니다. 처리한 마지막 id를 체크포인트에 기록하고,
+검색 지연에 영향이 없도록 초당 처리 행 수를 제한합니다.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+from documents import prepare_embedding_text, pad_embedding, parse_metadata, embedding_tag, is_embedded_with, EMBEDDING_VERSION
+from projection import load_projection, embedding_version, PROJECTION_PATH
+
+DEFAULT_MODEL = "jhgan/ko-sroberta-multitask"
+
+def load_checkpoint(path, model_name, version):
+    """대상 모델/버전이 같을 때만 이전 진행 위치 사용"""
+    state = {"model": model_name, "version": version, "last_id": 0, "migrated": 0, "skipped": 0, "done": False}
+    if path and os.path.exists(path):
+        with open(path, encoding="utf-8") as f:
+            saved = json.load(f)
+        if saved.get("model") == model_name and saved.get("version") == version:
+            state.update(saved)
+    return state
+
+def save_checkpoint(path, state):
+    if not path:
+        return
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(state, f, ensure_ascii=False, indent=1)
+    os.replace(tmp_path, path)
+
+class Throttle:
+    """초당 처리 행 수 제한 (0이면 제한 없음)"""
+
+    def __init__(self, rows_per_second):
+        self.rows_per_second = rows_per_second
+        self.started = time.perf_counter()
+        self.rows = 0
+
+    def wait(self, rows):
+        self.rows += rows
+        if self.rows_per_second > 0:
+            delay = self.started + self.rows / self.rows_per_second - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+
+def run(model, model_name, store, checkpoint_path=None, batch_size=64, rows_per_second=20,
+        projection=None, max_rows=None, stop_event=None, progress=True):
+    """대상 모델(+투영)로 태그되지 않은 행 재임베딩 - 최종 상태(dict) 반환
+
+    stop_event(threading.Event)가 설정되면 현재 묶음을 마치고 멈춥니다.
+    """
+    version = embedding_version(EMBEDDING_VERSION, projection)
+    state = load_checkpoint(checkpoint_path, model_name, version)
+    state["done"] = False   # 지난 실행 이후 추가된 행(더 큰 id)부터 이어서 확인
+    throttle = Throttle(rows_per_second)
+    tag = embedding_tag(model_name, version)
+    scanned = 0
+
+    while not state["done"]:
+        if stop_event is not None and stop_event.is_set():
+            break
+        if max_rows is not None and scanned >= max_rows:
+            break
+        rows = store.scan(state["last_id"], batch_size, columns=('id', 'content', 'metadata'))
+        if not rows:
+            state["done"] = True
+            save_checkpoint(checkpoint_path, state)
+            break
+        scanned += len(rows)
+
+        stale = []
+        for row in rows:
+            metadata = parse_metadata(row.get('metadata'))
+            if is_embedded_with(metadata, model_name, version):
+                continue
+            text = prepare_embedding_text(row.get('content') or '')
+            if text is None:
+                state["skipped"] += 1
+                continue
+            stale.append((row, metadata, text))
+
+        if stale:
+            vectors = model.encode([text for _, _, text in stale], batch_size=batch_size,
+                                   convert_to_numpy=True, show_progress_bar=False)
+            if projection is not None:
+                vectors = projection.transform(vectors)
+            updates = [{'id': row['id'], 'content': row['content'], 'embedding': pad_embedding(vector),
+                        'metadata': {**metadata, **tag}}
+                       for (row, metadata, _), vector in zip(stale, vectors)]
+            store.upsert_many(updates)
+            state["migrated"] += len(updates)
+
+        state["last_id"] = rows[-1]['id']
+        save_checkpoint(checkpoint_path, state)
+        if progress:
+            print(f"  id {state['last_id']}까지 확인, 재임베딩 {state['migrated']}건", file=sys.stderr)
+        throttle.wait(len(rows))
+
+    return state
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="저장된 문서를 한 임베딩 모델로 다시 임베딩")
+    parser.add_argument("--model", default=os.environ.get("EMBEDDING_MODEL", DEFAULT_MODEL), help="대상 SentenceTransformer 모델")
+    parser.add_argument("--checkpoint", default="reembed_checkpoint.json", help="진행 상황 파일 (빈 값이면 기록 안 함)")
+    parser.add_argument("--batch-size", type=int, default=64, help="한 번에 읽고 임베딩할 행 수")
+    parser.add_argument("--rows-per-second", type=float, default=20, help="초당 확인할 최대 행 수 (0이면 제한 없음)")
+    parser.add_argument("--projection", default=PROJECTION_PATH, help="차원 축소 투영 파일 (.npz, 앱과 같은 파일 사용)")
+    args = parser.parse_args(argv)
+    projection = load_projection(args.projection)
+    if projection is not None and projection.model_name != args.model:
+        parser.error(f"임베딩 투영이 다른 모델({projection.model_name})용입니다. --model을 맞추거나 --projection을 비워 주세요.")
+
+    import dotenv
+    from storage import open_store
+    from sentence_transformers import SentenceTransformer
+
+    dotenv.load_dotenv()
+    store = open_store()
+    model = SentenceTransformer(args.model)
+
+    state = run(model, args.model, store, args.checkpoint or None, args.batch_size, args.rows_per_second,
+                projection=projection)
+    print(json.dumps(state, ensure_ascii=False, indent=2))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,281 @@
+# -*- coding: utf-8 -*-
+"""저장된 검색어의 새 글만 가져오는 증분 갱신 CLI
+
+검색어마다 마지막으로 저장한 글의 게시 시각(high-water mark)을 기록해 두고, 네이버를 sort=date로
+최신순으로 넘기다가 이미 저장된 URL 또는 기록보다 오래된 글을 만나면 그 검색어는 멈춥니다.
+저장 여부는 로컬 Bloom 필터로 먼저 거르고, 필터가 "있을 수도 있음"이라고 한 URL만 저장소에
+한 번에 확인하므로 새 글이 몇 건뿐인 검색어는 네이버 요청 1번 + 저장소 조회 1번으로 끝납니다.
+
+예:
+    python refresh.py queries.txt                    # cron으로 주기 실행
+    python refresh.py queries.txt --page-size 20     # 새 글이 적은 검색어가 대부분이면 응답을 작게
+"""
+import argparse
+import hashlib
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+import ingest
+from documents import build_document
+from projection import load_projection, PROJECTION_PATH
+from price_history import PriceHistory, PRICE_HISTORY_PATH
+
+REFRESH_STATE_PATH = os.environ.get("REFRESH_STATE", "refresh_state.json")
+URL_BLOOM_PATH = os.environ.get("URL_BLOOM", "url_bloom.npz")
+BLOOM_CAPACITY = int(os.environ.get("URL_BLOOM_CAPACITY", "1000000"))
+BLOOM_ERROR_RATE = 0.001
+MAX_PAGES = 10          # 검색어당 최대 요청 수 (처음 모으는 검색어는 ingest.py로 수집)
+
+class UrlBloom:
+    """저장된 URL의 Bloom 필터 - 없다고 하면 확실히 없음, 있다고 하면 저장소에서 확인 필요
+
+    scan한 마지막 id(max_id)를 같이 저장해 두고 그 뒤에 추가된 행만 더해 최신 상태로 유지합니다.
+    """
+
+    def __init__(self, capacity=BLOOM_CAPACITY, error_rate=BLOOM_ERROR_RATE):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.n_bits = max(int(-capacity * np.log(error_rate) / np.log(2) ** 2), 64)
+        self.n_hashes = max(int(round(self.n_bits / capacity * np.log(2))), 1)
+        self.bits = np.zeros((self.n_bits + 7) // 8, dtype=np.uint8)
+        self.count = 0
+        self.max_id = 0
+        self._lock = threading.Lock()
+
+    def _positions(self, url):
+        # 이중 해싱: h1 + i*h2 (blake2b 한 번으로 두 해시)
+        digest = hashlib.blake2b(url.encode("utf-8"), digest_size=16).digest()
+        h1, h2 = int.from_bytes(digest[:8], "little"), int.from_bytes(digest[8:], "little") | 1
+        return [(h1 + i * h2) % self.n_bits for i in range(self.n_hashes)]
+
+    def add(self, urls):
+        with self._lock:
+            for url in urls:
+                if not url:
+                    continue
+                positions = np.array(self._positions(url), dtype=np.int64)
+                self.bits[positions >> 3] |= (1 << (positions & 7)).astype(np.uint8)
+                self.count += 1
+
+    def __contains__(self, url):
+        positions = np.array(self._positions(url), dtype=np.int64)
+        return bool(np.all(self.bits[positions >> 3] & (1 << (positions & 7)).astype(np.uint8)))
+
+    def sync(self, store, page_size=1000):
+        """max_id 이후에 저장된 행의 URL 추가 - 추가한 행 수"""
+        added = 0
+        while True:
+            rows = store.scan(after_id=self.max_id, limit=page_size)
+            if not rows:
+                return added
+            self.add(_row_url(row) for row in rows)
+            self.max_id = max(row["id"] for row in rows)
+            added += len(rows)
+
+    def save(self, path):
+        with self._lock:
+            tmp_path = f"{path}.tmp.npz"
+            np.savez(tmp_path, bits=self.bits, meta=np.array([self.capacity, self.count, self.max_id], dtype=np.int64),
+                     error_rate=np.array(self.error_rate))
+            os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path, capacity=BLOOM_CAPACITY):
+        """저장된 필터 (없거나 용량을 넘겼으면 두 배 용량의 빈 필터 - 다음 sync에서 처음부터 채움)"""
+        if path and os.path.exists(path):
+            with np.load(path) as data:
+                saved_capacity, count, max_id = (int(v) for v in data["meta"])
+                bloom = cls(saved_capacity, float(data["error_rate"]))
+                if count <= saved_capacity and bloom.bits.shape == data["bits"].shape:
+                    bloom.bits[:] = data["bits"]
+                    bloom.count, bloom.max_id = count, max_id
+                    return bloom
+                capacity = max(capacity, saved_capacity * 2)
+        return cls(capacity)
+
+def _row_url(row):
+    metadata = row.get("metadata") or {}
+    if isinstance(metadata, str):
+        metadata = json.loads(metadata)
+    return metadata.get("url", "")
+
+class RefreshState:
+    """검색어별 high-water mark(저장한 글 중 가장 최근 게시 시각)와 갱신 기록 (JSON 파일)"""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self.queries = {}
+        if path and os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                self.queries = json.load(f).get("queries", {})
+
+    def get(self, source_type, query):
+        with self._lock:
+            return dict(self.queries.get(ingest.job_key(source_type, query), {}))
+
+    def update(self, source_type, query, latest_at, saved):
+        with self._lock:
+            state = self.queries.setdefault(ingest.job_key(source_type, query), {"latest_at": None, "saved": 0})
+            if latest_at is not None and (state["latest_at"] is None or latest_at > state["latest_at"]):
+                state["latest_at"] = latest_at
+            state["saved"] += saved
+            state["refreshed_at"] = int(time.time())
+
+    def save(self):
+        if not self.path:
+            return
+        with self._lock:
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"queries": self.queries}, f, ensure_ascii=False, indent=1)
+            os.replace(tmp_path, self.path)
+
+def scan_new(source_type, query, fetcher, store, bloom, latest_at, stats, page_size=ingest.PAGE_SIZE, max_pages=MAX_PAGES,
+             prices=None):
+    """최신순으로 넘기며 새 글만 모으기 - (새 문서 목록, 멈춘 이유, Bloom 오탐 수)
+
+    멈추는 조건: 이미 저장된 URL / high-water mark보다 오래된 글 / 결과 끝 / max_pages
+    """
+    new_documents, false_positives = [], 0
+    start = 1
+    for _ in range(max_pages):
+        display = min(page_size, ingest.MAX_START + ingest.PAGE_SIZE - start)
+        data = fetcher.fetch_page(source_type, query, start, display)
+        items = data.get("items", [])
+        stats.add(pages=1, items=len(items))
+
+        page, reason = [], None
+        for item in items:
+            document = build_document(item, source_type)
+            if document is None or len(document[0].strip()) < 20:
+                stats.add(skipped=1)
+                continue
+            published_at = document[1].get("published_at")
+            if latest_at is not None and published_at is not None and published_at < latest_at:
+                reason = "high_water_mark"
+                break
+            page.append(document)
+        if prices is not None and source_type == "쇼핑":
+            prices.record(m for _, m in page)
+
+        # Bloom 필터가 있다고 한 URL만 저장소에서 한 번에 확인
+        maybe = {m["url"] for _, m in page if m.get("url") and m["url"] in bloom}
+        stored = store.existing_urls(maybe) if maybe else set()
+        false_positives += len(maybe - stored)
+        for text, metadata in page:
+            if metadata.get("url") in stored:
+                stats.add(duplicates=1)
+                reason = "known_url"
+                break
+            new_documents.append((text, metadata))
+
+        start += display
+        if reason:
+            return new_documents, reason, false_positives
+        if len(items) < display or start > min(ingest.MAX_START, data.get("total", 0)):
+            return new_documents, "end", false_positives
+    return new_documents, "max_pages", false_positives
+
+def refresh(jobs, model, store, fetcher, state, bloom, stats, workers=4, page_size=ingest.PAGE_SIZE, max_pages=MAX_PAGES,
+            batch_size=64, insert_chunk=100, model_name=ingest.DEFAULT_MODEL, projection=None, prices=None):
+    """검색어 목록 갱신 - 검색어별로 동시에 새 글을 찾고, 모은 새 글은 한 번에 임베딩/저장
+
+    반환: (통계, 검색어별 결과 {job_key: {"new", "stop", "false_positives"}}, 실패 목록)
+    """
+    bloom.sync(store)
+    results, errors = {}, []
+
+    def scan(job):
+        source_type, query = job
+        latest_at = state.get(source_type, query).get("latest_at")
+        return scan_new(source_type, query, fetcher, store, bloom, latest_at, stats, page_size, max_pages, prices)
+
+    with ThreadPoolExecutor(max_workers=max(workers, 1)) as executor:
+        futures = [(job, executor.submit(scan, job)) for job in jobs]
+        found = []
+        for (source_type, query), future in futures:
+            try:
+                documents, reason, false_positives = future.result()
+            except Exception as e:
+                errors.append((source_type, query, str(e)))
+                continue
+            found.append((source_type, query, documents))
+            results[ingest.job_key(source_type, query)] = {"new": len(documents), "stop": reason,
+                                                           "false_positives": false_positives}
+
+    # 여러 검색어에 같은 글이 나오면 한 번만 저장
+    seen, documents = set(), []
+    for _, _, docs in found:
+        for text, metadata in docs:
+            url = metadata.get("url", "")
+            if url and url in seen:
+                stats.add(duplicates=1)
+                continue
+            seen.add(url)
+            documents.append((text, metadata))
+
+    rows = ingest.embed_documents(documents, model, model_name, projection, stats, batch_size)
+    if rows:
+        t0 = time.perf_counter()
+        store.insert_many(rows, insert_chunk)
+        stats.add(saved=len(rows), write_seconds=time.perf_counter() - t0)
+        bloom.sync(store)  # 방금 저장한 행 (다른 프로세스가 저장한 행도 함께)
+
+    for source_type, query, docs in found:
+        published = [m["published_at"] for _, m in docs if m.get("published_at") is not None]
+        state.update(source_type, query, max(published, default=None), len(docs))
+    state.save()
+    return stats.summary(), results, errors
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="저장된 검색어의 새 글만 수집 (증분 갱신)")
+    parser.add_argument("queries", help="검색어 파일 (ingest.py와 같은 형식)")
+    parser.add_argument("--state", default=REFRESH_STATE_PATH, help="검색어별 high-water mark 파일")
+    parser.add_argument("--bloom", default=URL_BLOOM_PATH, help="저장된 URL Bloom 필터 파일 (빈 값이면 매번 새로 만듦)")
+    parser.add_argument("--workers", type=int, default=4, help="동시에 갱신할 검색어 수")
+    parser.add_argument("--page-size", type=int, default=ingest.PAGE_SIZE, help="요청당 결과 수 (최대 100)")
+    parser.add_argument("--max-pages", type=int, default=MAX_PAGES, help="검색어당 최대 요청 수")
+    parser.add_argument("--batch-size", type=int, default=64, help="임베딩 배치 크기")
+    parser.add_argument("--model", default=ingest.DEFAULT_MODEL, help="SentenceTransformer 모델 이름")
+    parser.add_argument("--projection", default=PROJECTION_PATH, help="차원 축소 투영 파일 (.npz, 앱과 같은 파일 사용)")
+    parser.add_argument("--price-history", default=PRICE_HISTORY_PATH, help="쇼핑 가격 이력 폴더 (빈 값이면 기록 안 함)")
+    args = parser.parse_args(argv)
+
+    import dotenv
+    from storage import open_store
+    from sentence_transformers import SentenceTransformer
+
+    dotenv.load_dotenv()
+    store = open_store()
+    model = SentenceTransformer(args.model)
+
+    jobs = ingest.read_jobs(args.queries)
+    stats = ingest.Stats()
+    fetcher = ingest.NaverFetcher(os.environ.get("NAVER_CLIENT_ID"), os.environ.get("NAVER_CLIENT_SECRET"), stats, sort="date")
+    bloom = UrlBloom.load(args.bloom or None)
+    prices = PriceHistory(args.price_history) if args.price_history else None
+
+    print(f"검색어 {len(jobs)}개 갱신 시작 (workers={args.workers})", file=sys.stderr)
+    summary, results, errors = refresh(jobs, model, store, fetcher, RefreshState(args.state or None), bloom, stats,
+                                       workers=args.workers, page_size=args.page_size, max_pages=args.max_pages,
+                                       batch_size=args.batch_size, model_name=args.model,
+                                       projection=load_projection(args.projection), prices=prices)
+    if args.bloom:
+        bloom.save(args.bloom)
+    if prices is not None:
+        prices.compact()
+    for source_type, query, error in errors:
+        print(f"실패: {source_type} '{query}': {error}", file=sys.stderr)
+    summary["queries"] = results
+    print(json.dumps(summary, ensure_ascii=False, indent=2))
+    return 1 if errors else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
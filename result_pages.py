@@ -0,0 +1,133 @@
+# -*- coding: utf-8 -*-
+"""검색 결과 페이지 캐시 + 다음 페이지 미리 가져오기 (app1 페이지 탐색)
+
+검색 조건(검색어, 타입, 정렬, 페이지 크기)마다 ResultPages 하나를 두고, 페이지는 처음 볼 때만 가져옵니다.
+한 페이지를 보여 주는 동안 다음 페이지를 백그라운드에서 가져와 두므로 '다음'을 누르면 바로 표시됩니다.
+네이버 검색 API는 start 최대 1000, display 최대 100이라 그 너머 페이지는 없는 것으로 봅니다.
+
+환경 변수:
+    PAGE_PREFETCH          현재 페이지 뒤로 미리 가져올 페이지 수 (기본 1, 0이면 미리 가져오지 않음)
+    PAGE_CACHE_SEARCHES    세션마다 페이지를 보관할 최근 검색 조건 수 (기본 8)
+"""
+import logging
+import math
+import os
+import threading
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+MAX_START = 1000
+MAX_DISPLAY = 100
+PAGE_PREFETCH = int(os.environ.get("PAGE_PREFETCH", "1"))
+PAGE_CACHE_SEARCHES = int(os.environ.get("PAGE_CACHE_SEARCHES", "8"))
+
+class ResultPages:
+    """한 검색 조건의 페이지 캐시 (페이지 번호는 0부터)"""
+
+    def __init__(self, fetch, page_size, executor=None, prefetch=PAGE_PREFETCH):
+        """fetch(start, display) → 네이버 응답 dict ({'total', 'items', ...}), 실패하면 예외"""
+        self.fetch = fetch
+        self.page_size = max(1, min(int(page_size), MAX_DISPLAY))
+        self.executor = executor  # None이면 미리 가져오지 않음
+        self.prefetch = prefetch
+        self.total = None         # 첫 응답을 받기 전에는 None
+        self.fetches = 0
+        self._pages = {}          # 페이지 번호 → items
+        self._pending = {}        # 페이지 번호 → 미리 가져오는 중인 Future
+        self._lock = threading.Lock()
+
+    @property
+    def page_count(self):
+        """볼 수 있는 페이지 수 (total을 모르면 None)"""
+        if self.total is None:
+            return None
+        reachable = min(self.total, MAX_START + self.page_size - 1)
+        return max(1, math.ceil(reachable / self.page_size))
+
+    def start_of(self, page):
+        return page * self.page_size + 1
+
+    def cached_pages(self):
+        with self._lock:
+            return sorted(self._pages)
+
+    def _load(self, page):
+        start = self.start_of(page)
+        if page < 0 or start > MAX_START:
+            raise IndexError(f"페이지 범위를 벗어남: {page + 1}")
+        data = self.fetch(start, self.page_size)
+        items = data.get('items', [])
+        with self._lock:
+            self.total = int(data.get('total', 0))
+            self._pages[page] = items
+            self.fetches += 1
+        return items
+
+    def _prefetch_page(self, page):
+        try:
+            return self._load(page)
+        except Exception as e:  # 미리 가져오기 실패는 그 페이지를 실제로 볼 때 다시 시도
+            logger.warning("페이지 %d 미리 가져오기 실패: %s", page + 1, e)
+            return None
+        finally:
+            with self._lock:
+                self._pending.pop(page, None)
+
+    def prefetch_after(self, page):
+        """page 뒤로 prefetch 개 페이지를 백그라운드에서 가져오기 시작 (이미 있거나 가져오는 중이면 건너뜀)"""
+        if self.executor is None:
+            return
+        count = self.page_count
+        for next_page in range(page + 1, page + 1 + self.prefetch):
+            if (count is not None and next_page >= count) or self.start_of(next_page) > MAX_START:
+                break
+            with self._lock:
+                if next_page in self._pages or next_page in self._pending:
+                    continue
+                self._pending[next_page] = self.executor.submit(self._prefetch_page, next_page)
+
+    def page(self, page):
+        """page의 항목 - 캐시에 없으면 가져오고(미리 가져오는 중이면 기다림), 다음 페이지 미리 가져오기 시작"""
+        with self._lock:
+            items = self._pages.get(page)
+            pending = self._pending.get(page)
+        if items is None and pending is not None:
+            items = pending.result()
+        if items is None:
+            items = self._load(page)
+        self.prefetch_after(page)
+        return items
+
+    def iter_items(self, first, last):
+        """first~last 페이지(포함)의 항목을 순서대로 하나씩 (캐시된 페이지는 다시 가져오지 않음)"""
+        for page in range(first, last + 1):
+            yield from self.page(page)
+
+class SearchPages:
+    """세션의 검색 조건별 ResultPages (최근 max_searches 개만 보관)"""
+
+    def __init__(self, max_searches=PAGE_CACHE_SEARCHES):
+        self.max_searches = max_searches
+        self._searches = OrderedDict()
+
+    def get(self, key, factory):
+        """key의 ResultPages (없으면 factory()로 만들고, 오래된 조건부터 버림)"""
+        pages = self._searches.get(key)
+        if pages is None:
+            pages = self._searches[key] = factory()
+            while len(self._searches) > max(self.max_searches, 1):
+                self._searches.popitem(last=False)
+        else:
+            self._searches.move_to_end(key)
+        return pages
+
+    def find(self, key):
+        """key의 ResultPages (없으면 None)"""
+        pages = self._searches.get(key)
+        if pages is not None:
+            self._searches.move_to_end(key)
+        return pages
+
+    def pop(self, key):
+        return self._searches.pop(key, None)
@@ -0,0 +1,218 @@
+# -*- coding: utf-8 -*-
+"""시맨틱 검색 파이프라인 (total.py와 검색 서비스 공용)
+
+검색어 변형 → 변형 배치 임베딩 → 쇼핑 패싯/기간 필터 → 변형별 동시 벡터 검색 → RRF 융합 → 최신성 가중.
+저장소 검색 함수, 임베딩 함수, 인덱스, 스레드 풀은 호출하는 쪽이 넘겨주므로
+Streamlit 화면과 서비스 프로세스가 같은 설정이면 같은 검색 결과를 냅니다.
+
+환경 변수:
+    QUERY_EXPANSION            1이면 원문/소스 접두어/핵심어 변형으로 검색 (기본 1)
+    QUERY_EXPANSION_BUDGET_MS  첫 변형 이후 나머지 변형을 기다리는 시간 (기본 150)
+    QUERY_EXPANSION_WORKERS    변형 검색 스레드 수 (기본 16)
+    FACET_REFRESH_SECONDS      패싯/게시 시각 인덱스에 새 문서를 반영하는 주기 (기본 60)
+    FACET_EXACT_LIMIT          필터 결과가 이 수 이하면 해당 문서 벡터만 가져와 직접 유사도 계산 (기본 2000)
+    NEWS_RECENCY_WEIGHT        뉴스 기본 최신성 가중치 (기본 0.3)
+    RECENCY_HALF_LIFE_DAYS     최신성 반감기 (기본 30일)
+"""
+import contextvars
+import logging
+import os
+import time
+from concurrent.futures import wait
+
+import numpy as np
+
+from documents import parse_metadata, published_epoch, is_embedded_with, include_untagged_for
+from query_expansion import expand_query, fuse_rankings, source_query
+from time_index import TIME_INDEXED_SOURCES, recency_score, blend_recency
+from tracing import span
+
+logger = logging.getLogger(__name__)
+
+QUERY_EXPANSION = os.environ.get("QUERY_EXPANSION", "1") == "1"
+QUERY_EXPANSION_BUDGET_MS = float(os.environ.get("QUERY_EXPANSION_BUDGET_MS", "150"))
+QUERY_EXPANSION_WORKERS = int(os.environ.get("QUERY_EXPANSION_WORKERS", "16"))
+FACET_REFRESH_SECONDS = float(os.environ.get("FACET_REFRESH_SECONDS", "60"))
+FACET_EXACT_LIMIT = int(os.environ.get("FACET_EXACT_LIMIT", "2000"))
+NEWS_RECENCY_WEIGHT = float(os.environ.get("NEWS_RECENCY_WEIGHT", "0.3"))
+RECENCY_HALF_LIFE_DAYS = float(os.environ.get("RECENCY_HALF_LIFE_DAYS", "30"))
+
+def query_variants(query, source_type, expansion=QUERY_EXPANSION):
+    """검색에 쓸 검색어 변형 [(이름, 문자열, 가중치)] - expansion이 꺼져 있으면 소스 접두어 형태 하나"""
+    if not expansion:
+        return [("source", source_query(query, source_type), 1.0)]
+    return expand_query(query, source_type)
+
+def adjusted_threshold(source_type, match_threshold):
+    """벡터 검색 임계값 - 더 관대하게 (뉴스는 더 낮게)"""
+    if source_type == "뉴스":
+        return max(0.1, match_threshold - 0.3)
+    return max(0.2, match_threshold - 0.2)
+
+def filter_key(source_type, filters=None, date_range=None):
+    """같은 허용 id 집합이면 같은 키 (single-flight용)
+
+    허용 id는 소스 타입마다 다르므로(뉴스/블로그 기간, 쇼핑 패싯) 소스 타입도 포함 - 원문/핵심어 변형은 소스와 상관없이 같은 문자열
+    """
+    return (source_type, tuple(sorted((k, str(v)) for k, v in (filters or {}).items())), tuple(date_range or ()))
+
+def apply_recency(results, recency_weight, half_life_days=RECENCY_HALF_LIFE_DAYS, now=None):
+    """유사도와 게시 시각 최신성을 섞은 score로 재정렬 (가중치가 0이면 그대로)"""
+    if recency_weight <= 0 or not results:
+        return results
+    epochs = [published_epoch(parse_metadata(row.get('metadata'))) for row in results]
+    recency = recency_score([np.nan if e is None else e for e in epochs], time.time() if now is None else now, half_life_days)
+    blended = blend_recency([row.get('similarity', 0) for row in results], recency, recency_weight)
+    results = [{**row, 'recency': float(r), 'score': float(b)} for row, r, b in zip(results, recency, blended)]
+    results.sort(key=lambda row: row['score'], reverse=True)
+    return results
+
+def search_variants(search_fn, variants, embeddings, executor, budget_seconds, thread_init=None):
+    """변형별 search_fn(변형 문자열, 임베딩) 결과 [(가중치, 행 목록)]
+
+    첫 번째(기존 검색과 같은) 변형은 호출한 스레드에서, 나머지는 executor에서 budget_seconds까지만 기다리고 늦은 변형은 빼고 합칩니다.
+    thread_init은 작업 스레드에서 검색 전에 호출 (Streamlit 실행 컨텍스트 연결 등).
+    """
+    def run(text, embedding):
+        if thread_init is not None:
+            thread_init()
+        return search_fn(text, embedding)
+
+    # 스팬이 현재 trace에 붙도록 contextvars를 복사해서 실행
+    futures = [(weight, executor.submit(contextvars.copy_context().run, run, text, embedding))
+               for (_, text, weight), embedding in zip(variants[1:], embeddings[1:])]
+    rankings = [(variants[0][2], search_fn(variants[0][1], embeddings[0]))]
+    if futures:
+        wait([future for _, future in futures], timeout=budget_seconds)
+        for weight, future in futures:
+            if future.done() and future.exception() is None:
+                rankings.append((weight, future.result()))
+            elif future.done():
+                logger.warning("검색어 변형 검색 실패: %s", future.exception())
+    return rankings
+
+class SearchPipeline:
+    """저장소/임베딩/인덱스를 주입받는 시맨틱 검색
+
+    embed(texts)                                   검색어 임베딩 목록 (임베딩할 수 없는 텍스트는 None)
+    match(embedding, threshold, count)             match_documents 형태의 결과 행
+    match_ids(embedding, threshold, count, ids)    ids 문서만 직접 유사도 계산
+    match_local(embedding, threshold, count, allowed_ids)  로컬 벡터 인덱스 검색 (있으면 match 대신 사용)
+    facets() / times()                             새 문서를 반영한 패싯 / 게시 시각 인덱스
+    """
+
+    def __init__(self, embed, match, match_ids, single_flight, executor, model_name, version,
+                 facets=None, times=None, match_local=None, expansion=QUERY_EXPANSION,
+                 budget_ms=QUERY_EXPANSION_BUDGET_MS, exact_limit=FACET_EXACT_LIMIT,
+                 news_recency_weight=NEWS_RECENCY_WEIGHT, half_life_days=RECENCY_HALF_LIFE_DAYS, thread_init=None):
+        self.embed = embed
+        self.match = match
+        self.match_ids = match_ids
+        self.match_local = match_local
+        self.single_flight = single_flight
+        self.executor = executor
+        self.model_name = model_name
+        self.version = version
+        self.facets = facets
+        self.times = times
+        self.expansion = expansion
+        self.budget_ms = budget_ms
+        self.exact_limit = exact_limit
+        self.news_recency_weight = news_recency_weight
+        self.half_life_days = half_life_days
+        self.thread_init = thread_init
+
+    def variants(self, query, source_type):
+        return query_variants(query, source_type, self.expansion)
+
+    def embed_variants(self, texts):
+        """변형 전체를 encode 한 번으로 임베딩 (같은 변형 동시 임베딩은 한 번만)"""
+        texts = tuple(texts)
+        return self.single_flight.do(("embedding.queries", texts), self.embed, list(texts))
+
+    def allowed_ids(self, source_type, filters=None, date_range=None):
+        """쇼핑 패싯/기간 필터를 통과한 문서 id (필터가 없으면 None)"""
+        allowed = None
+        if filters and source_type == "쇼핑" and self.facets is not None:
+            with span("search.facets", **{k: str(v) for k, v in filters.items()}) as facet_span:
+                allowed = self.facets().filter(**filters)
+                facet_span.set(allowed=-1 if allowed is None else len(allowed))
+        if (date_range and any(d is not None for d in date_range) and source_type in TIME_INDEXED_SOURCES
+                and self.times is not None):
+            with span("search.date_range", start=str(date_range[0]), end=str(date_range[1])) as date_span:
+                date_ids = self.times().range(source_type, *date_range)
+                allowed = date_ids if allowed is None else np.intersect1d(allowed, date_ids)
+                date_span.set(allowed=len(allowed))
+        return allowed
+
+    def searchable(self, metadata, source_type):
+        """소스 타입이 같고 이 파이프라인 모델/버전으로 만든 벡터인지"""
+        return (metadata.get('collection', '') == source_type
+                and is_embedded_with(metadata, self.model_name, self.version, include_untagged_for(self.model_name)))
+
+    def search(self, query, source_type="블로그", limit=10, match_threshold=0.5, filters=None, date_range=None,
+               recency_weight=None, embeddings=None):
+        """(결과 행 목록, 빈 결과 이유) - 이유는 None, "embedding"(검색어 임베딩 실패), "filter"(필터를 통과한 문서 없음)
+
+        embeddings: 변형 순서대로 미리 계산한 임베딩 (전체 소스 검색은 한 번에 계산해 넘겨줌)
+        """
+        variants = self.variants(query, source_type)
+        if embeddings is None:
+            with span("embedding.query", source_type=source_type, query=query[:50], variants=len(variants)):
+                embeddings = self.embed_variants(text for _, text, _ in variants)
+        embedded = [(variant, embedding) for variant, embedding in zip(variants, embeddings) if embedding is not None]
+        if not embedded:
+            return [], "embedding"
+        variants, embeddings = [v for v, _ in embedded], [e for _, e in embedded]
+
+        threshold = adjusted_threshold(source_type, match_threshold)
+        match_count = limit * 5  # 필터링 후 충분한 결과를 위해 더 많이 가져옴
+        allowed_ids = self.allowed_ids(source_type, filters, date_range)
+        if allowed_ids is not None and not len(allowed_ids):
+            return [], "filter"
+
+        allowed = None
+        if self.match_local is not None:
+            search_fn = lambda embedding, threshold, count: self.match_local(embedding, threshold, count, allowed_ids)
+        elif allowed_ids is not None and len(allowed_ids) <= self.exact_limit:
+            search_fn = lambda embedding, threshold, count: self.match_ids(embedding, threshold, count, allowed_ids)
+        else:
+            search_fn = self.match
+            if allowed_ids is not None:
+                allowed = set(allowed_ids.tolist())
+                match_count = limit * 20  # 필터를 통과할 결과가 충분하도록 더 많이 가져온 뒤 id로 거름
+        key = None if allowed_ids is None else filter_key(source_type, filters, date_range)
+        other_model = 0
+
+        def search_variant(text, embedding):
+            """변형 하나 검색 + 소스 타입/모델 필터 (같은 변형 동시 검색은 한 번만)"""
+            nonlocal other_model
+            rows = self.single_flight.do(("rpc.match_documents", text, threshold, match_count, key),
+                                         search_fn, embedding, threshold, match_count)
+            matched = []
+            for row in rows:
+                if allowed is not None and row['id'] not in allowed:
+                    continue
+                metadata = parse_metadata(row.get('metadata'))
+                if metadata.get('collection', '') != source_type:
+                    continue
+                if not self.searchable(metadata, source_type):
+                    other_model += 1
+                    continue
+                matched.append(row)
+            return matched
+
+        with span("rpc.match_documents", threshold=threshold, match_count=match_count,
+                  local_index=self.match_local is not None, variants=len(variants)) as rpc_span:
+            rankings = search_variants(search_variant, variants, embeddings, self.executor,
+                                       self.budget_ms / 1000, self.thread_init)
+            rpc_span.set(rows=sum(len(rows) for _, rows in rankings), answered=len(rankings))
+
+        with span("search.fuse", source_type=source_type, rankings=len(rankings)) as fuse_span:
+            results = fuse_rankings(rankings)
+            fuse_span.set(matched=len(results), other_model=other_model)
+
+        # 융합 순위 그대로 (최신성 가중치가 있으면 유사도와 섞은 점수로 재정렬)
+        if recency_weight is None:
+            recency_weight = self.news_recency_weight if source_type == "뉴스" else 0.0
+        return apply_recency(results, recency_weight, self.half_life_days)[:limit], None
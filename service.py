@@ -0,0 +1,640 @@
+# -*- coding: utf-8 -*-
+"""검색/답변/수집 서비스 (asyncio HTTP, Streamlit 실행과 분리된 장기 실행 프로세스)
+
+모델, 문서 저장소, OpenAI 클라이언트, 패싯/시각 인덱스, 네이버 응답 캐시를 프로세스당 한 번만 올리고
+total.py / app1.py / app3.py가 HTTP로 함께 씁니다. 화면을 다시 실행해도 모델을 다시 올리지 않고,
+동시에 들어온 검색어 임베딩은 마이크로 배치 하나로 묶입니다.
+
+    python service.py --port 8780
+    SEARCH_SERVICE_URL=http://127.0.0.1:8780 streamlit run total.py
+
+API (요청 본문은 JSON):
+    POST /search   {"query", "source_type", "limit", "match_threshold", "filters", "date_range", "recency_weight"}
+                   → {"results": [...]}  ("embedding": "openai"면 app3처럼 OpenAI 임베딩으로 소스 구분 없이 검색)
+    POST /answer   /search 항목 + "token_budget", "results"(있으면 검색 생략)
+                   → NDJSON 스트림 {"type": "results"} → {"type": "delta", "text"}… → {"type": "done"} | {"type": "error"}
+    POST /ingest   {"kind": "collect"|"refresh", "source_type", "query", "count"} → {"job", "created"}
+    GET  /jobs?limit=8, GET /jobs/<id>
+    POST /naver    {"endpoint", "query", "display", "start", "sort"} → 네이버 원본 응답 (응답 캐시 공유)
+    GET  /health, GET /metrics
+"""
+import argparse
+import asyncio
+import functools
+import http.client
+import json
+import logging
+import os
+import sys
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+import ingest
+import refresh
+from collect_jobs import CollectJobs, dedup_key, job_params
+from context_builder import build_context, count_tokens, DEFAULT_TOKEN_BUDGET
+from documents import (parse_metadata, prepare_embedding_text, pad_embedding, is_embedded_with,
+                       SOURCE_ENDPOINTS, EMBEDDING_VERSION, include_untagged_for)
+from embedding_server import MicroBatcher
+from facets import FacetIndex
+from jobqueue import JobQueue, JobWorkers, JOB_WORKERS
+from metrics import (REGISTRY, NAVER_REQUESTS, NAVER_SECONDS, EMBEDDING_SECONDS, DB_SECONDS, RPC_REQUESTS,
+                     GPT_SECONDS, GPT_TOKENS)
+from naver_cache import NaverResponseCache
+from price_history import PriceHistory
+from projection import embedding_version
+from prompts import get_system_prompt, get_user_prompt, format_context_entry
+from search_pipeline import SearchPipeline, QUERY_EXPANSION_WORKERS, FACET_REFRESH_SECONDS
+from singleflight import SingleFlight
+from storage import match_by_ids
+from time_index import TimeIndex
+
+logger = logging.getLogger(__name__)
+
+SEARCH_SERVICE_URL = os.environ.get("SEARCH_SERVICE_URL", "")
+SERVICE_PORT = int(os.environ.get("SEARCH_SERVICE_PORT", "8780"))
+SERVICE_WORKERS = int(os.environ.get("SEARCH_SERVICE_WORKERS", "32"))
+MAX_BODY_BYTES = 1 << 20
+
+OPENAI_EMBEDDING_MODEL = "text-embedding-3-small"   # app3 검색용
+GPT_MODEL = "gpt-4o-mini"
+
+SERVICE_SECONDS = REGISTRY.histogram(
+    "search_service_request_seconds", "Search service request latency (streams: until the last chunk)", ("path",))
+
+class ServiceError(RuntimeError):
+    """잘못된 요청 (HTTP 상태 코드 포함)"""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+class SearchEngine:
+    """검색/답변/수집 처리 - 프로세스당 하나 (모든 요청이 모델/저장소/클라이언트를 공유)"""
+
+    def __init__(self, store, model, model_name, openai_client, projection=None, naver_credentials=("", ""),
+                 naver_base_url=ingest.NAVER_API_BASE_URL, job_queue=None, job_workers=JOB_WORKERS, price_history=None):
+        self.store = store
+        self.model = model
+        self.model_name = model_name
+        self.projection = projection
+        self.version = embedding_version(EMBEDDING_VERSION, projection)
+        self.openai = openai_client
+        self.naver_credentials = naver_credentials
+        self.naver_base_url = naver_base_url
+        self.single_flight = SingleFlight()
+        self.naver_cache = NaverResponseCache.from_env()
+        self.facet_index, self.time_index = FacetIndex(), TimeIndex()
+        self.price_history = price_history if price_history is not None else PriceHistory()
+        # 여러 요청의 검색어 임베딩을 한 번의 encode로 (동시 사용자가 많을수록 배치가 커짐)
+        self.batcher = MicroBatcher(lambda texts: model.encode(texts, batch_size=len(texts), convert_to_numpy=True,
+                                                               show_progress_bar=False))
+        self.variant_executor = ThreadPoolExecutor(QUERY_EXPANSION_WORKERS, thread_name_prefix="service-variant")
+        # total.py와 같은 검색 파이프라인 (같은 설정이면 같은 검색 결과)
+        self.pipeline = SearchPipeline(
+            embed=self.embed_queries,
+            match=self.match,
+            match_ids=lambda embedding, threshold, count, ids: match_by_ids(self.store, embedding, threshold, count, ids),
+            facets=lambda: self._refreshed(self.facet_index, "facet_refresh"),
+            times=lambda: self._refreshed(self.time_index, "time_index_refresh"),
+            single_flight=self.single_flight,
+            executor=self.variant_executor,
+            model_name=model_name,
+            version=self.version,
+        )
+        self.job_queue = job_queue or JobQueue()
+        self.url_bloom = refresh.UrlBloom.load(refresh.URL_BLOOM_PATH)
+        self.refresh_state = refresh.RefreshState(refresh.REFRESH_STATE_PATH)
+        # total.py와 같은 수집/갱신 작업
+        self.jobs = CollectJobs(model, model_name, store, naver_credentials, self.url_bloom, self.refresh_state,
+                                naver_cache=self.naver_cache, single_flight=self.single_flight, base_url=naver_base_url,
+                                projection=projection, prices=self.price_history)
+        self.job_workers = None
+        if job_workers > 0:
+            self.job_workers = JobWorkers(self.job_queue, self.jobs.handlers, workers=job_workers).start()
+
+    def close(self):
+        self.batcher.close()
+        self.variant_executor.shutdown(wait=False)
+        if self.job_workers is not None:
+            self.job_workers.stop(timeout=5)
+
+    # --- 검색 ---
+
+    def embed_queries(self, texts):
+        """검색어 임베딩 (짧은 검색어도 임베딩, 빈 문자열은 None)"""
+        cleaned = [prepare_embedding_text(text) or (" ".join(text.split()) or None) for text in texts]
+        valid = [text for text in cleaned if text is not None]
+        if not valid:
+            return [None] * len(texts)
+        with EMBEDDING_SECONDS.time(kind="service"):
+            vectors = self.batcher.submit(valid)
+        if self.projection is not None:
+            vectors = self.projection.transform(vectors)
+        padded = iter(pad_embedding(vector) for vector in vectors)
+        return [None if text is None else next(padded) for text in cleaned]
+
+    def match(self, query_embedding, threshold, count):
+        try:
+            with DB_SECONDS.time(op="rpc_match_documents"):
+                rows = self.store.match(query_embedding, threshold, count)
+        except Exception:
+            RPC_REQUESTS.inc(outcome="error")
+            raise
+        RPC_REQUESTS.inc(outcome="ok" if rows else "empty")
+        return rows
+
+    def _refreshed(self, index, op):
+        """마지막 갱신 후 FACET_REFRESH_SECONDS가 지났으면 새 문서 반영 (동시 갱신은 한 번만)"""
+        if time.time() - getattr(index, "refreshed_at", 0) >= FACET_REFRESH_SECONDS:
+            def run():
+                with DB_SECONDS.time(op=op):
+                    index.refresh(self.store)
+                index.refreshed_at = time.time()
+            self.single_flight.do((op,), run)
+        return index
+
+    def allowed_ids(self, source_type, filters=None, date_range=None):
+        """쇼핑 패싯/기간 필터를 통과한 문서 id (필터가 없으면 None)"""
+        return self.pipeline.allowed_ids(source_type, filters, date_range)
+
+    def search(self, query, source_type="블로그", limit=10, match_threshold=0.5, filters=None, date_range=None,
+               recency_weight=None):
+        """total.semantic_search와 같은 검색 (search_pipeline) - 변형 배치 임베딩 → 변형별 동시 검색 → RRF 융합 → 최신성 가중"""
+        results, _ = self.pipeline.search(query, source_type, limit, match_threshold, filters, date_range, recency_weight)
+        return results
+
+    def search_openai(self, query, limit=10, match_threshold=0.5):
+        """app3 검색: OpenAI 임베딩으로 match 후 같은 임베딩 모델로 저장된 문서만"""
+        response = self.openai.embeddings.create(input=query, model=OPENAI_EMBEDDING_MODEL)
+        rows = self.match(response.data[0].embedding, match_threshold, limit * 5)
+        return [row for row in rows if is_embedded_with(parse_metadata(row.get('metadata')), OPENAI_EMBEDDING_MODEL,
+                                                        include_untagged=include_untagged_for(OPENAI_EMBEDDING_MODEL))][:limit]
+
+    # --- 답변 ---
+
+    def embed_passages(self, texts):
+        """MMR 중복 제거용 문서 임베딩"""
+        with EMBEDDING_SECONDS.time(kind="batch"):
+            return self.batcher.submit(texts)
+
+    def answer_stream(self, query, source_type, results, token_budget=DEFAULT_TOKEN_BUDGET):
+        """검색 결과 기반 답변을 생성되는 대로 조각(str)으로 반환"""
+        if not results:
+            yield f"죄송합니다. 입력하신 '{query}'에 대한 {source_type} 검색 결과를 찾을 수 없습니다. 다른 검색어나 다른 소스 타입으로 시도해보세요."
+            return
+        context_text, _, context_stats = build_context(
+            results, lambda rank, result, content: format_context_entry(rank, result, content, source_type, self.price_history),
+            token_budget=token_budget, embed_fn=self.embed_passages)
+        system_prompt = get_system_prompt(source_type)
+        user_prompt = get_user_prompt(query, context_text, source_type)
+        started = time.perf_counter()
+        stream = self.openai.chat.completions.create(
+            model=GPT_MODEL,
+            messages=[{"role": "system", "content": system_prompt}, {"role": "user", "content": user_prompt}],
+            temperature=0.3, max_tokens=1000, stream=True)
+        parts = []
+        for chunk in stream:
+            delta = chunk.choices[0].delta.content if chunk.choices else None
+            if delta:
+                parts.append(delta)
+                yield delta
+        latency = time.perf_counter() - started
+        prompt_tokens = count_tokens(system_prompt) + count_tokens(user_prompt)
+        GPT_SECONDS.observe(latency, model=GPT_MODEL)
+        GPT_TOKENS.inc(prompt_tokens, model=GPT_MODEL, kind="prompt")
+        GPT_TOKENS.inc(count_tokens("".join(parts)), model=GPT_MODEL, kind="completion")
+        logger.info("answer source=%s docs=%d/%d context_tokens=%d prompt_tokens=%d latency=%.2fs", source_type,
+                    context_stats['documents'], context_stats['candidates'], context_stats['context_tokens'],
+                    prompt_tokens, latency)
+
+    # --- 수집 ---
+
+    def enqueue(self, kind, source_type, query, count=20):
+        """수집/갱신 작업 등록 - (작업, 새로 만들었는지). 같은 검색어의 진행 중 작업은 하나만"""
+        job, created = self.job_queue.enqueue(kind, job_params(source_type, query, count),
+                                              dedup_key=dedup_key(kind, source_type, query))
+        if created and self.job_workers is not None:
+            self.job_workers.wake()
+        return job, created
+
+    # --- 네이버 원본 검색 (app1) ---
+
+    def naver(self, endpoint, query, display=10, start=1, sort="sim", credentials=None):
+        """네이버 검색 API 원본 응답 - (상태 코드, 본문). 정상 응답은 프로세스 공용 캐시에 저장"""
+        key = NaverResponseCache.make_key(endpoint, query, display, start, sort)
+        cached = self.naver_cache.get(key)
+        if cached is not None:
+            return 200, cached
+        client_id, client_secret = credentials or self.naver_credentials
+
+        def fetch():
+            url = (f"{self.naver_base_url}{endpoint}?sort={sort}&display={int(display)}&start={int(start)}"
+                   f"&query={urllib.parse.quote(query)}")
+            request = urllib.request.Request(url, headers={"X-Naver-Client-Id": client_id,
+                                                           "X-Naver-Client-Secret": client_secret})
+            with NAVER_SECONDS.time(endpoint=endpoint):
+                try:
+                    with urllib.request.urlopen(request, timeout=10) as response:
+                        body = response.read()
+                except urllib.error.HTTPError as e:
+                    NAVER_REQUESTS.inc(endpoint=endpoint, status=e.code)
+                    return e.code, e.read()
+            NAVER_REQUESTS.inc(endpoint=endpoint, status=200)
+            self.naver_cache.put(key, body)
+            return 200, body
+
+        return self.single_flight.do(("naver",) + key, fetch)
+
+def _json_default(value):
+    return value.tolist() if hasattr(value, "tolist") else str(value)
+
+def _dumps(payload):
+    return json.dumps(payload, ensure_ascii=False, default=_json_default).encode("utf-8")
+
+def _search_params(payload):
+    """요청 본문 → SearchEngine.search 인자 (형식이 틀리면 400)"""
+    query = payload.get("query")
+    if not isinstance(query, str) or not query.strip():
+        raise ServiceError(400, "query는 빈 문자열이 아니어야 합니다")
+    try:
+        params = {"query": query, "source_type": payload.get("source_type") or "블로그",
+                  "limit": int(payload.get("limit") or 10), "match_threshold": float(payload.get("match_threshold", 0.5)),
+                  "filters": payload.get("filters") or None, "recency_weight": payload.get("recency_weight")}
+        date_range = payload.get("date_range")
+        params["date_range"] = tuple(date_range) if date_range else None
+        if params["recency_weight"] is not None:
+            params["recency_weight"] = float(params["recency_weight"])
+    except (TypeError, ValueError) as e:
+        raise ServiceError(400, f"잘못된 검색 조건: {e}")
+    if not 1 <= params["limit"] <= 100:
+        raise ServiceError(400, "limit은 1~100 사이여야 합니다")
+    return params
+
+class SearchService:
+    """asyncio HTTP 서버 - 이벤트 루프는 연결/스트림만 다루고 검색·답변은 스레드 풀에서 실행"""
+
+    def __init__(self, engine, workers=SERVICE_WORKERS):
+        self.engine = engine
+        self.executor = ThreadPoolExecutor(workers, thread_name_prefix="service")
+        self.requests = 0
+        self.in_flight = 0
+        self.loop = self.server = None
+
+    @property
+    def url(self):
+        host, port = self.server.sockets[0].getsockname()[:2]
+        return f"http://{host}:{port}"
+
+    async def _call(self, fn, *args, **kwargs):
+        return await asyncio.get_running_loop().run_in_executor(self.executor, functools.partial(fn, *args, **kwargs))
+
+    async def _iterate(self, fn, *args):
+        """동기 생성기 fn(*args)를 스레드 풀에서 돌리며 나오는 대로 받기"""
+        loop = asyncio.get_running_loop()
+        queue = asyncio.Queue()
+        end = object()
+
+        def produce():
+            try:
+                for item in fn(*args):
+                    loop.call_soon_threadsafe(queue.put_nowait, (item, None))
+            except Exception as e:
+                loop.call_soon_threadsafe(queue.put_nowait, (end, e))
+            else:
+                loop.call_soon_threadsafe(queue.put_nowait, (end, None))
+
+        producer = loop.run_in_executor(self.executor, produce)
+        while True:
+            item, error = await queue.get()
+            if item is end:
+                await producer
+                if error is not None:
+                    raise error
+                return
+            yield item
+
+    async def _read_request(self, reader):
+        """요청 하나 - (method, path, query, headers, body), 연결이 끝났으면 None"""
+        line = await reader.readline()
+        if not line.strip():
+            return None
+        method, target, _ = line.decode("latin-1").split(" ", 2)
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+        length = int(headers.get("content-length") or 0)
+        if length > MAX_BODY_BYTES:
+            raise ServiceError(413, "요청 본문이 너무 큽니다")
+        body = await reader.readexactly(length) if length else b""
+        parts = urllib.parse.urlsplit(target)
+        return method.upper(), parts.path, dict(urllib.parse.parse_qsl(parts.query)), headers, body
+
+    async def _send(self, writer, status, body, content_type="application/json; charset=utf-8"):
+        reason = http.client.responses.get(status, "")
+        writer.write(f"HTTP/1.1 {status} {reason}\r\nContent-Type: {content_type}\r\n"
+                     f"Content-Length: {len(body)}\r\n\r\n".encode("latin-1") + body)
+        await writer.drain()
+
+    async def _send_chunk(self, writer, event):
+        data = _dumps(event) + b"\n"
+        writer.write(f"{len(data):x}\r\n".encode("latin-1") + data + b"\r\n")
+        await writer.drain()
+
+    async def handle(self, reader, writer):
+        """연결 하나 (keep-alive로 여러 요청을 순서대로)"""
+        try:
+            while True:
+                try:
+                    request = await self._read_request(reader)
+                except ServiceError as e:
+                    await self._send(writer, e.status, _dumps({"error": str(e)}))
+                    break
+                if request is None:
+                    break
+                method, path, query, headers, body = request
+                self.requests += 1
+                self.in_flight += 1
+                started = time.perf_counter()
+                try:
+                    await self._dispatch(method, path, query, body, writer)
+                except ServiceError as e:
+                    await self._send(writer, e.status, _dumps({"error": str(e)}))
+                except (ConnectionError, asyncio.IncompleteReadError):
+                    raise
+                except Exception as e:
+                    logger.exception("요청 처리 실패: %s %s", method, path)
+                    await self._send(writer, 500, _dumps({"error": str(e)}))
+                finally:
+                    self.in_flight -= 1
+                    SERVICE_SECONDS.observe(time.perf_counter() - started, path=path if path in _ROUTES else "other")
+                if headers.get("connection", "").lower() == "close":
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def _dispatch(self, method, path, query, body, writer):
+        engine = self.engine
+        if method == "GET" and path == "/health":
+            await self._send(writer, 200, _dumps({
+                "model": engine.model_name, "version": engine.version, "requests": self.requests,
+                "in_flight": self.in_flight, "embedding_batches": engine.batcher.batches,
+                "embedding_requests": engine.batcher.requests}))
+        elif method == "GET" and path == "/metrics":
+            await self._send(writer, 200, REGISTRY.exposition().encode("utf-8"), "text/plain; version=0.0.4; charset=utf-8")
+        elif method == "GET" and path == "/jobs":
+            jobs = await self._call(engine.job_queue.recent, limit=int(query.get("limit") or 8))
+            await self._send(writer, 200, _dumps({"jobs": jobs}))
+        elif method == "GET" and path.startswith("/jobs/"):
+            job = await self._call(engine.job_queue.get, int(path.rsplit("/", 1)[1]))
+            if job is None:
+                raise ServiceError(404, "작업이 없습니다")
+            await self._send(writer, 200, _dumps({"job": job}))
+        elif method == "POST" and path in _ROUTES:
+            try:
+                payload = json.loads(body or b"{}")
+            except ValueError:
+                raise ServiceError(400, "본문이 JSON이 아닙니다")
+            if not isinstance(payload, dict):
+                raise ServiceError(400, "본문은 JSON 객체여야 합니다")
+            await getattr(self, _ROUTES[path])(payload, writer)
+        else:
+            raise ServiceError(404, "not found")
+
+    async def _search(self, payload, writer):
+        params = _search_params(payload)
+        if payload.get("embedding") == "openai":
+            results = await self._call(self.engine.search_openai, params["query"], params["limit"], params["match_threshold"])
+        else:
+            results = await self._call(self.engine.search, **params)
+        await self._send(writer, 200, _dumps({"results": results}))
+
+    async def _answer(self, payload, writer):
+        params = _search_params(payload)
+        token_budget = int(payload.get("token_budget") or DEFAULT_TOKEN_BUDGET)
+        results = payload.get("results")
+        if results is not None and not isinstance(results, list):
+            raise ServiceError(400, "results는 검색 결과 목록이어야 합니다")
+        writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: application/x-ndjson; charset=utf-8\r\n"
+                     b"Transfer-Encoding: chunked\r\n\r\n")
+        try:
+            if results is None:
+                results = await self._call(self.engine.search, **params)
+                await self._send_chunk(writer, {"type": "results", "results": results})
+            async for text in self._iterate(self.engine.answer_stream, params["query"], params["source_type"],
+                                            results, token_budget):
+                await self._send_chunk(writer, {"type": "delta", "text": text})
+            event = {"type": "done"}
+        except (ConnectionError, asyncio.IncompleteReadError):
+            raise
+        except Exception as e:
+            logger.exception("답변 생성 실패")
+            event = {"type": "error", "error": str(e)}
+        await self._send_chunk(writer, event)
+        writer.write(b"0\r\n\r\n")
+        await writer.drain()
+
+    async def _ingest(self, payload, writer):
+        kind = payload.get("kind") or "collect"
+        if kind not in ("collect", "refresh"):
+            raise ServiceError(400, "kind는 collect 또는 refresh입니다")
+        if payload.get("source_type") not in SOURCE_ENDPOINTS or not (payload.get("query") or "").strip():
+            raise ServiceError(400, "source_type과 query가 필요합니다")
+        job, created = await self._call(self.engine.enqueue, kind, payload["source_type"], payload["query"],
+                                        payload.get("count") or 20)
+        await self._send(writer, 200, _dumps({"job": job, "created": created}))
+
+    async def _naver(self, payload, writer):
+        if not payload.get("endpoint") or not payload.get("query"):
+            raise ServiceError(400, "endpoint와 query가 필요합니다")
+        credentials = (payload["client_id"], payload.get("client_secret", "")) if payload.get("client_id") else None
+        status, body = await self._call(self.engine.naver, payload["endpoint"], payload["query"],
+                                        payload.get("display", 10), payload.get("start", 1), payload.get("sort", "sim"),
+                                        credentials)
+        await self._send(writer, status, body)
+
+    def close(self):
+        if self.loop is not None:
+            self.loop.call_soon_threadsafe(self.server.close)
+            self.loop.call_soon_threadsafe(self.loop.stop)
+        self.executor.shutdown(wait=False)
+
+_ROUTES = {"/search": "_search", "/answer": "_answer", "/ingest": "_ingest", "/naver": "_naver"}
+
+def start_service(engine, port=SERVICE_PORT, addr="127.0.0.1", workers=SERVICE_WORKERS):
+    """백그라운드 스레드의 이벤트 루프에서 서비스 시작 - SearchService (port=0이면 빈 포트, .url로 주소 확인)"""
+    service = SearchService(engine, workers)
+    started = threading.Event()
+    failure = []
+
+    def run():
+        loop = service.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        try:
+            service.server = loop.run_until_complete(asyncio.start_server(service.handle, addr, int(port)))
+        except Exception as e:
+            failure.append(e)
+            service.loop = None
+            started.set()
+            return
+        started.set()
+        loop.run_forever()
+
+    threading.Thread(target=run, name="search-service", daemon=True).start()
+    started.wait()
+    if failure:
+        raise failure[0]
+    return service
+
+class ServiceClient:
+    """검색 서비스 클라이언트 (스레드별 keep-alive 연결)"""
+
+    def __init__(self, url=SEARCH_SERVICE_URL, timeout=120):
+        parsed = urllib.parse.urlparse(url)
+        self.host, self.port = parsed.hostname or "127.0.0.1", parsed.port or 80
+        self.timeout = timeout
+        self._local = threading.local()
+        info = self._json("GET", "/health")
+        self.model_name, self.version = info["model"], info["version"]
+
+    def _open(self, method, path, payload=None):
+        """요청을 보내고 (연결, 응답) - 서버가 끊은 keep-alive 연결이면 한 번 다시 연결"""
+        body = None if payload is None else _dumps(payload)
+        headers = {"Content-Type": "application/json"} if body is not None else {}
+        for attempt in range(2):
+            connection = getattr(self._local, "connection", None)
+            if connection is None:
+                connection = self._local.connection = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+            try:
+                connection.request(method, path, body=body, headers=headers)
+                return connection, connection.getresponse()
+            except (http.client.HTTPException, ConnectionError):
+                self._drop(connection)
+                if attempt:
+                    raise
+
+    def _drop(self, connection):
+        connection.close()
+        self._local.connection = None
+
+    def _raw(self, method, path, payload=None):
+        _, response = self._open(method, path, payload)
+        return response.status, response.read()
+
+    def _json(self, method, path, payload=None):
+        status, data = self._raw(method, path, payload)
+        if status != 200:
+            raise RuntimeError(f"검색 서비스 오류 {status}: {data[:200].decode('utf-8', 'replace')}")
+        return json.loads(data)
+
+    def search(self, query, source_type="블로그", **params):
+        """SearchEngine.search와 같은 인자 - 결과 행 목록"""
+        return self._json("POST", "/search", {"query": query, "source_type": source_type, **params})["results"]
+
+    def answer_events(self, query, source_type="블로그", results=None, **params):
+        """/answer 스트림 이벤트 (results를 주면 검색 생략) - 오류 이벤트는 예외로"""
+        payload = {"query": query, "source_type": source_type, **params}
+        if results is not None:
+            payload["results"] = results
+        connection, response = self._open("POST", "/answer", payload)
+        if response.status != 200:
+            data = response.read()
+            raise RuntimeError(f"검색 서비스 오류 {response.status}: {data[:200].decode('utf-8', 'replace')}")
+        finished = False
+        try:
+            for line in response:
+                if not line.strip():
+                    continue
+                event = json.loads(line)
+                if event["type"] == "error":
+                    raise RuntimeError(f"답변 생성 실패: {event['error']}")
+                yield event
+            finished = True
+        finally:
+            if not finished:   # 다 읽지 않은 연결은 재사용하지 않음
+                self._drop(connection)
+
+    def answer_stream(self, query, source_type="블로그", results=None, **params):
+        """답변 조각(str)만 - st.write_stream에 바로 넘길 수 있음"""
+        for event in self.answer_events(query, source_type, results, **params):
+            if event["type"] == "delta":
+                yield event["text"]
+
+    def ingest(self, kind, source_type, query, count=20):
+        """수집/갱신 작업 등록 - (작업, 새로 만들었는지)"""
+        reply = self._json("POST", "/ingest", {"kind": kind, "source_type": source_type, "query": query, "count": count})
+        return reply["job"], reply["created"]
+
+    def jobs(self, limit=8):
+        return self._json("GET", f"/jobs?limit={int(limit)}")["jobs"]
+
+    def naver(self, endpoint, query, display=10, start=1, sort="sim", client_id=None, client_secret=None):
+        """네이버 원본 응답 - (상태 코드, 본문 bytes)"""
+        return self._raw("POST", "/naver", {"endpoint": endpoint, "query": query, "display": display, "start": start,
+                                            "sort": sort, "client_id": client_id, "client_secret": client_secret})
+
+def connect(url=SEARCH_SERVICE_URL):
+    """url의 검색 서비스에 연결 - (client, 사유)"""
+    if not url:
+        return None, "SEARCH_SERVICE_URL 미설정"
+    try:
+        return ServiceClient(url), ""
+    except Exception as e:
+        return None, f"검색 서비스 연결 실패 ({url}): {e}"
+
+def build_engine():
+    """환경 변수 설정으로 엔진 구성 (저장소, 임베딩 모델/서버, 투영, OpenAI, 네이버 키)"""
+    from openai import OpenAI
+    from embedding_server import connect as connect_embedding_server, EMBEDDING_SERVER_URL
+    from projection import load_projection
+    from storage import open_store
+    try:
+        import dotenv
+        dotenv.load_dotenv()
+    except ImportError:
+        pass
+    model_name = os.environ.get("EMBEDDING_MODEL", "jhgan/ko-sroberta-multitask")
+    model, reason = connect_embedding_server(model_name, EMBEDDING_SERVER_URL)
+    if model is None:
+        logger.info("%s - 로컬 모델을 로딩합니다.", reason)
+        from sentence_transformers import SentenceTransformer
+        model = SentenceTransformer(model_name)
+    projection = load_projection()
+    if projection is not None and projection.model_name != model_name:
+        logger.warning("임베딩 투영이 다른 모델(%s)용이라 사용하지 않습니다.", projection.model_name)
+        projection = None
+    return SearchEngine(open_store(), model, model_name, OpenAI(api_key=os.environ.get("OPENAI_API_KEY")), projection,
+                        naver_credentials=(os.environ.get("NAVER_CLIENT_ID", ""), os.environ.get("NAVER_CLIENT_SECRET", "")),
+                        naver_base_url=os.environ.get("NAVER_API_BASE_URL", ingest.NAVER_API_BASE_URL))
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="검색/답변/수집 서비스 (asyncio HTTP)")
+    parser.add_argument("--port", type=int, default=SERVICE_PORT)
+    parser.add_argument("--addr", default="127.0.0.1")
+    parser.add_argument("--workers", type=int, default=SERVICE_WORKERS, help="검색/답변을 실행할 스레드 수")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    engine = build_engine()
+    service = start_service(engine, args.port, args.addr, args.workers)
+    logger.info("검색 서비스 시작: %s (model=%s, version=%s)", service.url, engine.model_name, engine.version)
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        service.close()
+        engine.close()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+"""같은 작업의 동시 호출 합치기 (single-flight)
+
+여러 세션이 같은 키로 동시에 do()를 부르면 첫 호출만 실제로 실행하고
+나머지는 그 결과(또는 예외)를 기다려 함께 받습니다. 결과를 저장하지는 않으므로
+작업이 끝난 뒤의 호출은 다시 실행됩니다 (캐시가 아님).
+
+사용 예:
+    flight = SingleFlight()
+    answer = flight.do(("gpt.answer", query, source_type), call_gpt, query)
+"""
+import threading
+
+from metrics import SINGLEFLIGHT_CALLS
+
+class _Call:
+    __slots__ = ("event", "result", "error", "followers")
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+        self.followers = 0
+
+class SingleFlight:
+    """키별 진행 중인 호출 목록 (프로세스 공용으로 하나만 만들어 공유)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key, fn, *args, **kwargs):
+        """key로 진행 중인 호출이 있으면 그 결과를 기다리고, 없으면 fn(*args, **kwargs) 실행
+
+        key는 해시 가능한 튜플이며 첫 원소를 작업 이름(메트릭 op 레이블)으로 씁니다.
+        """
+        op = key[0] if isinstance(key, tuple) else str(key)
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+            else:
+                call.followers += 1
+
+        if not leader:
+            SINGLEFLIGHT_CALLS.inc(op=op, role="follower")
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        SINGLEFLIGHT_CALLS.inc(op=op, role="leader")
+        try:
+            call.result = fn(*args, **kwargs)
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.event.set()
+
+    def in_flight(self):
+        """현재 실행 중인 키 수"""
+        with self._lock:
+            return len(self._calls)
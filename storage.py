@@ -0,0 +1,370 @@
+# -*- coding: utf-8 -*-
+"""문서 저장소 인터페이스 - Supabase 어댑터 / 로컬(SQLite + memmap NumPy) 어댑터
+
+앱과 도구는 supabase 클라이언트 대신 이 저장소를 통해 documents를 읽고 씁니다.
+
+    STORAGE_BACKEND=supabase   (기본) Supabase documents 테이블 + match_documents RPC
+    STORAGE_BACKEND=local      LOCAL_STORE_PATH 디렉터리의 SQLite(행) + vectors.f32(벡터 행렬)
+
+공통 메서드:
+    insert(row) / insert_many(rows) / upsert_many(rows)     row: {'content', 'embedding', 'metadata'} (+ 'id')
+    existing_urls(urls) / url_exists(url)
+    count(collection=None) / count_by_collection(collections)
+    match(query_embedding, threshold, count)                 match_documents RPC와 같은 형태의 행
+    fetch(ids, embedding=False) / scan(after_id, limit, collections, columns) / sample(collection, limit) / max_id()
+
+match_by_ids(store, ...)는 고른 문서들만 벡터를 가져와 직접 유사도를 계산합니다 (패싯/기간 필터 결과가 적을 때).
+"""
+import json
+import os
+import sqlite3
+import threading
+
+import numpy as np
+
+from documents import parse_metadata, EMBEDDING_DIM
+
+STORAGE_BACKEND = os.environ.get("STORAGE_BACKEND", "supabase")
+LOCAL_STORE_PATH = os.environ.get("LOCAL_STORE_PATH", "local_store")
+INSERT_CHUNK = 100
+MATCH_CHUNK_ROWS = 65536   # 로컬 top-k를 이 행 수씩 나눠 계산 (메모리 상한)
+
+def _embedding_list(embedding):
+    if isinstance(embedding, str):
+        return json.loads(embedding)
+    return embedding.tolist() if hasattr(embedding, 'tolist') else list(embedding)
+
+class SupabaseStore:
+    """Supabase documents 테이블 (PostgREST) 어댑터"""
+
+    backend = "supabase"
+
+    def __init__(self, client):
+        self.client = client
+
+    def _table(self):
+        return self.client.table('documents')
+
+    def insert(self, row):
+        self._table().insert(row).execute()
+
+    def insert_many(self, rows, chunk=INSERT_CHUNK):
+        for offset in range(0, len(rows), chunk):
+            self._table().insert(rows[offset:offset + chunk]).execute()
+
+    def upsert_many(self, rows):
+        if rows:
+            self._table().upsert(rows).execute()
+
+    def existing_urls(self, urls):
+        """이미 저장된 URL 집합 (한 번에 조회)"""
+        if not urls:
+            return set()
+        result = self._table().select('metadata->>url').in_('metadata->>url', list(urls)).execute()
+        return {row.get('url') for row in result.data or []}
+
+    def url_exists(self, url):
+        return bool(self._table().select('id').eq('metadata->>url', url).limit(1).execute().data)
+
+    def count(self, collection=None):
+        query = self._table().select('id', count='exact')
+        if collection is not None:
+            query = query.eq('metadata->>collection', collection)
+        result = query.limit(1).execute()
+        return result.count if getattr(result, 'count', None) is not None else len(result.data or [])
+
+    def count_by_collection(self, collections):
+        """{컬렉션: 문서 수} (+ 그 외는 '기타') - 컬렉션마다 count 쿼리 한 번"""
+        counts = {collection: self.count(collection) for collection in collections}
+        other = self.count() - sum(counts.values())
+        if other > 0:
+            counts['기타'] = other
+        return counts
+
+    def match(self, query_embedding, threshold, count):
+        response = self.client.rpc('match_documents', {
+            'query_embedding': _embedding_list(query_embedding),
+            'match_threshold': threshold,
+            'match_count': count,
+        }).execute()
+        return response.data or []
+
+    def fetch(self, ids, embedding=False):
+        columns = 'id, content, metadata, embedding' if embedding else 'id, content, metadata'
+        rows = []
+        ids = [int(i) for i in ids]
+        for start in range(0, len(ids), 500):
+            rows.extend(self._table().select(columns).in_('id', ids[start:start + 500]).execute().data or [])
+        return rows
+
+    def scan(self, after_id=0, limit=1000, collections=None, columns=('id', 'metadata')):
+        """id > after_id 인 행을 id 순으로 최대 limit개"""
+        query = self._table().select(', '.join(columns))
+        if collections is not None:
+            query = query.in_('metadata->>collection', list(collections))
+        return query.gt('id', after_id).order('id').limit(limit).execute().data or []
+
+    def sample(self, collection=None, limit=5):
+        query = self._table().select('*')
+        if collection is not None:
+            query = query.eq('metadata->>collection', collection)
+        return query.limit(limit).execute().data or []
+
+    def max_id(self):
+        rows = self._table().select('id').order('id', desc=True).limit(1).execute().data or []
+        return rows[0]['id'] if rows else 0
+
+class LocalStore:
+    """로컬 디스크 저장소 - 행은 SQLite, 벡터는 memmap 행렬(L2 정규화해서 저장, 코사인 = 내적)
+
+    벡터 파일은 용량이 찰 때마다 두 배로 늘립니다. 조회 중인 스레드는 늘리기 전 매핑을 그대로 읽습니다.
+    앱, 수집/갱신 도구, 작업 워커, 검색 서비스가 같은 경로를 동시에 열 수 있습니다 - 새 슬롯은 쓰기 트랜잭션
+    (BEGIN IMMEDIATE) 안에서 MAX(slot) + 1로 정하고, 조회/쓰기 전에 다른 프로세스가 늘린 슬롯과 파일을 다시 읽습니다.
+    """
+
+    backend = "local"
+
+    def __init__(self, path=LOCAL_STORE_PATH, dim=EMBEDDING_DIM):
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        self.dim = dim
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(os.path.join(path, "documents.sqlite3"), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS documents (
+                id INTEGER PRIMARY KEY AUTOINCREMENT, content TEXT, metadata TEXT,
+                collection TEXT, url TEXT, slot INTEGER);
+            CREATE INDEX IF NOT EXISTS documents_url ON documents (url);
+            CREATE INDEX IF NOT EXISTS documents_collection ON documents (collection);
+            CREATE INDEX IF NOT EXISTS documents_slot ON documents (slot);
+        """)
+        self._conn.commit()
+        self._vectors_path = os.path.join(path, "vectors.f32")
+        self._size = 0
+        self._ids = np.full(1, -1, dtype=np.int64)   # slot → 문서 id (-1은 벡터 없음)
+        self._open_matrix(0)
+        self._sync()
+
+    def _file_capacity(self):
+        return os.path.getsize(self._vectors_path) // (4 * self.dim) if os.path.exists(self._vectors_path) else 0
+
+    def _sync(self):
+        """다른 프로세스가 추가한 슬롯/늘린 벡터 파일 반영 (잠금 안에서 호출)"""
+        size = self._conn.execute("SELECT COALESCE(MAX(slot) + 1, 0) FROM documents").fetchone()[0]
+        if size <= self._size:
+            return
+        capacity = self._file_capacity()
+        if capacity > len(self._matrix):
+            if isinstance(self._matrix, np.memmap):
+                self._matrix.flush()
+            self._open_matrix(capacity)
+        if len(self._ids) < len(self._matrix):
+            ids = np.full(len(self._matrix), -1, dtype=np.int64)
+            ids[:len(self._ids)] = self._ids
+            self._ids = ids
+        for doc_id, slot in self._conn.execute("SELECT id, slot FROM documents WHERE slot >= ?", (self._size,)):
+            self._ids[slot] = doc_id
+        self._size = size
+
+    def _open_matrix(self, capacity):
+        if capacity:
+            self._matrix = np.memmap(self._vectors_path, dtype=np.float32, mode="r+", shape=(capacity, self.dim))
+        else:
+            self._matrix = np.zeros((0, self.dim), dtype=np.float32)
+
+    def _reserve(self, needed):
+        """벡터 슬롯이 needed개 이상이 되도록 파일 늘리기 (잠금 안에서 호출)"""
+        capacity = len(self._matrix)
+        if needed <= capacity:
+            return
+        new_capacity = max(needed, capacity * 2, 1024)
+        if isinstance(self._matrix, np.memmap):
+            self._matrix.flush()
+        new_capacity = max(new_capacity, self._file_capacity())   # 다른 프로세스가 더 크게 늘렸으면 줄이지 않음
+        with open(self._vectors_path, "ab") as f:
+            f.truncate(new_capacity * self.dim * 4)
+        self._open_matrix(new_capacity)
+        ids = np.full(new_capacity, -1, dtype=np.int64)
+        ids[:len(self._ids)] = self._ids[:new_capacity]
+        self._ids = ids
+
+    def _vector(self, embedding):
+        vector = np.zeros(self.dim, dtype=np.float32)
+        values = np.asarray(_embedding_list(embedding), dtype=np.float32)[:self.dim]
+        vector[:len(values)] = values
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm > 0 else vector
+
+    def _write(self, rows, upsert=False):
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")   # 다른 프로세스의 쓰기가 끝날 때까지 기다림 (슬롯 번호가 겹치지 않도록)
+            try:
+                self._sync()
+                self._write_rows(rows, upsert)
+                self._conn.commit()
+            except BaseException:
+                self._conn.rollback()
+                self._size = 0   # 이번에 잡은 슬롯은 버리고 저장된 상태에서 다시 셈
+                self._sync()
+                raise
+            if isinstance(self._matrix, np.memmap):
+                self._matrix.flush()
+
+    def _write_rows(self, rows, upsert):
+        """쓰기 트랜잭션 안에서 행/벡터 저장 - 벡터는 커밋 전에 써 두므로 슬롯이 보이면 벡터도 있음"""
+        cursor = self._conn.cursor()
+        for row in rows:
+            metadata = parse_metadata(row.get('metadata'))
+            values = (row.get('content'), json.dumps(metadata, ensure_ascii=False),
+                      metadata.get('collection'), metadata.get('url') or None)
+            existing = None
+            if upsert and row.get('id') is not None:
+                existing = cursor.execute("SELECT slot FROM documents WHERE id = ?", (row['id'],)).fetchone()
+            if existing is not None:
+                doc_id, slot = int(row['id']), existing[0]
+                cursor.execute("UPDATE documents SET content = ?, metadata = ?, collection = ?, url = ? WHERE id = ?",
+                               values + (doc_id,))
+            else:
+                slot = None
+                cursor.execute("INSERT INTO documents (id, content, metadata, collection, url) VALUES (?, ?, ?, ?, ?)",
+                               (row.get('id') if upsert else None,) + values)
+                doc_id = cursor.lastrowid
+            if row.get('embedding') is not None:
+                if slot is None:
+                    slot = self._size
+                    self._reserve(slot + 1)
+                    self._size += 1
+                    cursor.execute("UPDATE documents SET slot = ? WHERE id = ?", (slot, doc_id))
+                self._matrix[slot] = self._vector(row['embedding'])
+                self._ids[slot] = doc_id
+
+    def insert(self, row):
+        self._write([row])
+
+    def insert_many(self, rows, chunk=INSERT_CHUNK):
+        self._write(rows)
+
+    def upsert_many(self, rows):
+        self._write(rows, upsert=True)
+
+    def _query(self, sql, args=()):
+        with self._lock:
+            return self._conn.execute(sql, args).fetchall()
+
+    def existing_urls(self, urls):
+        urls = [u for u in urls if u]
+        found = set()
+        for start in range(0, len(urls), 500):
+            chunk = urls[start:start + 500]
+            found.update(url for (url,) in self._query(
+                f"SELECT DISTINCT url FROM documents WHERE url IN ({', '.join('?' * len(chunk))})", chunk))
+        return found
+
+    def url_exists(self, url):
+        return bool(self._query("SELECT 1 FROM documents WHERE url = ? LIMIT 1", (url,)))
+
+    def count(self, collection=None):
+        if collection is None:
+            return self._query("SELECT COUNT(*) FROM documents")[0][0]
+        return self._query("SELECT COUNT(*) FROM documents WHERE collection = ?", (collection,))[0][0]
+
+    def count_by_collection(self, collections):
+        counts = {collection: 0 for collection in collections}
+        for collection, count in self._query("SELECT collection, COUNT(*) FROM documents GROUP BY collection"):
+            key = collection if collection in counts else '기타'
+            counts[key] = counts.get(key, 0) + count
+        return counts
+
+    def _rows(self, sql, args, embedding=False):
+        if embedding:
+            with self._lock:
+                self._sync()
+        rows = []
+        for doc_id, content, metadata, slot in self._query(sql, args):
+            row = {'id': doc_id, 'content': content, 'metadata': json.loads(metadata) if metadata else {}}
+            if embedding:
+                row['embedding'] = self._matrix[slot].tolist() if slot is not None else None
+            rows.append(row)
+        return rows
+
+    def match(self, query_embedding, threshold, count):
+        query = self._vector(query_embedding)
+        if not query.any():
+            return []
+        with self._lock:
+            self._sync()
+            matrix, ids, n = self._matrix, self._ids, self._size
+        if n == 0:
+            return []
+        k = min(int(count), n)
+        best_scores, best_slots = np.empty(0, np.float32), np.empty(0, np.int64)
+        for start in range(0, n, MATCH_CHUNK_ROWS):
+            scores = np.asarray(matrix[start:min(n, start + MATCH_CHUNK_ROWS)]) @ query
+            top = np.argpartition(-scores, min(k, len(scores)) - 1)[:k]
+            best_scores = np.concatenate([best_scores, scores[top]])
+            best_slots = np.concatenate([best_slots, top + start])
+            if len(best_scores) > k:
+                keep = np.argpartition(-best_scores, k - 1)[:k]
+                best_scores, best_slots = best_scores[keep], best_slots[keep]
+        order = np.argsort(-best_scores)
+        similarity = {int(ids[best_slots[i]]): float(best_scores[i]) for i in order
+                      if best_scores[i] > threshold and ids[best_slots[i]] >= 0}
+        rows = self.fetch(list(similarity))
+        for row in rows:
+            row['similarity'] = similarity[row['id']]
+        rows.sort(key=lambda row: row['similarity'], reverse=True)
+        return rows
+
+    def fetch(self, ids, embedding=False):
+        ids = [int(i) for i in ids]
+        rows = []
+        for start in range(0, len(ids), 500):
+            chunk = ids[start:start + 500]
+            rows.extend(self._rows(f"SELECT id, content, metadata, slot FROM documents WHERE id IN ({', '.join('?' * len(chunk))})",
+                                   chunk, embedding))
+        return rows
+
+    def scan(self, after_id=0, limit=1000, collections=None, columns=('id', 'metadata')):
+        sql = "SELECT id, content, metadata, slot FROM documents WHERE id > ?"
+        args = [after_id]
+        if collections is not None:
+            collections = list(collections)
+            sql += f" AND collection IN ({', '.join('?' * len(collections))})"
+            args.extend(collections)
+        rows = self._rows(sql + " ORDER BY id LIMIT ?", args + [limit], embedding='embedding' in columns)
+        return [{c: row.get(c) for c in columns} for row in rows]
+
+    def sample(self, collection=None, limit=5):
+        if collection is None:
+            return self._rows("SELECT id, content, metadata, slot FROM documents ORDER BY id LIMIT ?", (limit,))
+        return self._rows("SELECT id, content, metadata, slot FROM documents WHERE collection = ? ORDER BY id LIMIT ?",
+                          (collection, limit))
+
+    def max_id(self):
+        return self._query("SELECT COALESCE(MAX(id), 0) FROM documents")[0][0]
+
+def match_by_ids(store, query_embedding, threshold, count, ids):
+    """ids 문서들의 벡터만 가져와 코사인 유사도 계산 (match와 같은 형태의 행)"""
+    query = np.asarray(query_embedding, dtype=np.float32)
+    query = query / (np.linalg.norm(query) or 1)
+    rows = [row for row in store.fetch(ids, embedding=True) if row.get('embedding') is not None]
+    if not rows:
+        return []
+    matrix = np.asarray([json.loads(r['embedding']) if isinstance(r['embedding'], str) else r['embedding'] for r in rows],
+                        dtype=np.float32)
+    scores = matrix @ query / np.maximum(np.linalg.norm(matrix, axis=1), 1e-12)
+    order = np.argsort(-scores)[:count]
+    return [{'id': rows[i]['id'], 'content': rows[i].get('content'), 'metadata': rows[i].get('metadata'),
+             'similarity': float(scores[i])} for i in order if scores[i] > threshold]
+
+def open_store(supabase_url=None, supabase_key=None, backend=None, path=None):
+    """설정(STORAGE_BACKEND)에 맞는 저장소 열기"""
+    backend = backend or STORAGE_BACKEND
+    if backend == "local":
+        return LocalStore(path or LOCAL_STORE_PATH)
+    if backend != "supabase":
+        raise ValueError(f"알 수 없는 STORAGE_BACKEND: {backend} (supabase 또는 local)")
+    from supabase import create_client
+    return SupabaseStore(create_client(supabase_url or os.environ.get("SUPABASE_URL"),
+                                       supabase_key or os.environ.get("SUPABASE_KEY")))
@@ -0,0 +1,175 @@
+# -*- coding: utf-8 -*-
+"""이미지 검색 그리드용 썸네일 프록시 캐시
+
+브라우저가 이미지 CDN에서 원본 크기 그림을 화면을 다시 그릴 때마다 받는 대신,
+서버가 그림을 동시에 받아 그리드 크기로 줄이고 URL 해시 이름의 JPEG 파일로 저장해 둔 뒤 bytes로 넘깁니다.
+디스크 용량을 넘으면 가장 오래 안 쓴 파일부터 지웁니다 (파일 수정 시각을 마지막 사용 시각으로 써서 재시작 후에도 유지).
+
+환경 변수:
+    THUMBNAIL_CACHE_DIR    저장 디렉터리 (기본: 임시 디렉터리 아래 naver-thumbnails)
+    THUMBNAIL_CACHE_MB     디스크 용량 상한 (기본 200)
+    THUMBNAIL_SIZE         긴 변 최대 픽셀 (기본 320 - 4열 그리드 한 칸)
+    THUMBNAIL_WORKERS      동시에 받을 그림 수 (기본 16)
+"""
+import hashlib
+import io
+import logging
+import os
+import tempfile
+import threading
+import urllib.request
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from PIL import Image
+
+from metrics import THUMBNAIL_REQUESTS, THUMBNAIL_BYTES
+from singleflight import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+THUMBNAIL_CACHE_DIR = os.environ.get("THUMBNAIL_CACHE_DIR", os.path.join(tempfile.gettempdir(), "naver-thumbnails"))
+THUMBNAIL_CACHE_MB = float(os.environ.get("THUMBNAIL_CACHE_MB", "200"))
+THUMBNAIL_SIZE = int(os.environ.get("THUMBNAIL_SIZE", "320"))
+THUMBNAIL_WORKERS = int(os.environ.get("THUMBNAIL_WORKERS", "16"))
+THUMBNAIL_TIMEOUT = 10
+
+class ThumbnailCache:
+    """스레드 안전 디스크 LRU 썸네일 캐시 (프로세스 공용으로 하나만 만들어 공유)"""
+
+    def __init__(self, cache_dir, max_bytes, size=THUMBNAIL_SIZE, workers=THUMBNAIL_WORKERS, timeout=THUMBNAIL_TIMEOUT):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.size = size
+        self.timeout = timeout
+        self.origin_bytes = 0    # CDN에서 받은 원본 크기 합
+        self.served_bytes = 0    # 화면에 넘긴 썸네일 크기 합
+        self._entries = OrderedDict()   # 파일 이름 → 크기 (오래 안 쓴 것부터)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._flight = SingleFlight()
+        self._executor = ThreadPoolExecutor(max_workers=max(workers, 1), thread_name_prefix="thumbnail")
+        os.makedirs(cache_dir, exist_ok=True)
+        self._scan()
+
+    @classmethod
+    def from_env(cls):
+        return cls(THUMBNAIL_CACHE_DIR, int(THUMBNAIL_CACHE_MB * 1024 * 1024))
+
+    @staticmethod
+    def file_name(url, size):
+        return f"{hashlib.sha1(f'{size}|{url}'.encode('utf-8')).hexdigest()}.jpg"
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+    @property
+    def disk_bytes(self):
+        with self._lock:
+            return self._bytes
+
+    def get(self, url):
+        """url 그림의 썸네일 JPEG bytes (없으면 받아서 줄이고 저장 - 실패하면 예외)"""
+        name = self.file_name(url, self.size)
+        data = self._read(name)
+        if data is None:
+            data = self._flight.do(("thumbnail", url, self.size), self._fetch, url, name)
+        else:
+            THUMBNAIL_REQUESTS.inc(result="hit")
+        with self._lock:
+            self.served_bytes += len(data)
+        THUMBNAIL_BYTES.inc(len(data), direction="served")
+        return data
+
+    def get_many(self, urls):
+        """urls 순서대로 썸네일 bytes (실패하거나 URL이 없으면 None) - 캐시에 없는 것은 동시에 받음"""
+        futures = [self._executor.submit(self._get_or_none, url) if url else None for url in urls]
+        return [future.result() if future is not None else None for future in futures]
+
+    def _get_or_none(self, url):
+        try:
+            return self.get(url)
+        except Exception as e:  # 화면은 원래 URL로 대신 표시
+            THUMBNAIL_REQUESTS.inc(result="error")
+            logger.warning("썸네일 생성 실패 %s: %s", url, e)
+            return None
+
+    def _fetch(self, url, name):
+        THUMBNAIL_REQUESTS.inc(result="miss")
+        request = urllib.request.Request(url, headers={"User-Agent": "Mozilla/5.0"})
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            raw = response.read()
+        with self._lock:
+            self.origin_bytes += len(raw)
+        THUMBNAIL_BYTES.inc(len(raw), direction="origin")
+
+        image = Image.open(io.BytesIO(raw))
+        image.draft("RGB", (self.size, self.size))  # JPEG은 디코딩 단계에서 미리 축소
+        image.thumbnail((self.size, self.size))
+        if image.mode != "RGB":
+            image = image.convert("RGB")
+        out = io.BytesIO()
+        image.save(out, format="JPEG", quality=85, optimize=True)
+        data = out.getvalue()
+        self._write(name, data)
+        return data
+
+    # --- 디스크 ---
+
+    def _scan(self):
+        """기존 파일을 마지막 사용 시각 순으로 읽어 들임"""
+        files = []
+        for entry in os.scandir(self.cache_dir):
+            if entry.name.endswith(".jpg") and entry.is_file():
+                stat = entry.stat()
+                files.append((stat.st_mtime, entry.name, stat.st_size))
+        with self._lock:
+            for _, name, size in sorted(files):
+                self._entries[name] = size
+                self._bytes += size
+        self._evict()
+
+    def _read(self, name):
+        with self._lock:
+            if name not in self._entries:
+                return None
+            self._entries.move_to_end(name)
+        path = os.path.join(self.cache_dir, name)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+            os.utime(path)
+        except OSError:  # 다른 프로세스가 지웠으면 다시 받음
+            with self._lock:
+                self._bytes -= self._entries.pop(name, 0)
+            return None
+        return data
+
+    def _write(self, name, data):
+        path = os.path.join(self.cache_dir, name)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning("썸네일 저장 실패 %s: %s", path, e)
+            return
+        with self._lock:
+            self._bytes += len(data) - self._entries.pop(name, 0)
+            self._entries[name] = len(data)
+        self._evict()
+
+    def _evict(self):
+        """용량을 넘으면 가장 오래 안 쓴 파일부터 삭제 (방금 쓴 파일 하나는 남김)"""
+        while True:
+            with self._lock:
+                if self._bytes <= self.max_bytes or len(self._entries) <= 1:
+                    return
+                name, size = self._entries.popitem(last=False)
+                self._bytes -= size
+            try:
+                os.remove(os.path.join(self.cache_dir, name))
+            except OSError:
+                pass
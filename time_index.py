@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+"""컬렉션별 게시 시각 인덱스 + 최신성 점수
+
+수집 시 metadata.published_at(epoch 초)에 게시 시각을 저장하고, 컬렉션(뉴스/블로그)마다
+(게시 시각, 문서 id)를 시각 순으로 정렬해 둡니다. 기간 조건은 searchsorted로 연속 구간을
+잘라내므로 전체를 훑지 않습니다. 새로 들어온 행은 대기 목록에 모았다가 다음 조회 때 병합합니다.
+"""
+import threading
+
+import numpy as np
+
+from documents import parse_metadata, published_epoch
+
+TIME_INDEXED_SOURCES = ("뉴스", "블로그")
+DAY_SECONDS = 86400
+
+def recency_score(epochs, now, half_life_days):
+    """반감기 기준 최신성 (방금 = 1, half_life_days 전 = 0.5, 날짜 없음 = 0)"""
+    epochs = np.asarray(epochs, dtype=np.float64)
+    age_days = np.maximum(now - epochs, 0) / DAY_SECONDS
+    score = np.power(0.5, age_days / max(half_life_days, 1e-9))
+    return np.where(np.isnan(epochs), 0.0, score)
+
+def blend_recency(similarity, recency, weight):
+    """유사도와 최신성 가중 합 (weight=0이면 유사도 그대로)"""
+    return (1 - weight) * np.asarray(similarity) + weight * np.asarray(recency)
+
+class TimeIndex:
+    """컬렉션별 (epoch, id) 정렬 배열"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._sorted = {}    # 컬렉션 -> (epochs, ids) 시각 오름차순
+        self._pending = {}   # 컬렉션 -> [(epoch, id)] 아직 병합 전
+        self.max_id = 0
+
+    def __len__(self):
+        with self._lock:
+            return sum(len(e) for e, _ in self._sorted.values()) + sum(len(p) for p in self._pending.values())
+
+    def add(self, doc_id, collection, epoch):
+        """문서 한 건 추가 (날짜가 없으면 기간 검색에서 제외되므로 추가하지 않음)"""
+        with self._lock:
+            self.max_id = max(self.max_id, int(doc_id))
+            if epoch is not None:
+                self._pending.setdefault(collection, []).append((int(epoch), int(doc_id)))
+
+    def add_arrays(self, collection, epochs, ids):
+        """대량 적재 (벤치마크/재빌드용)"""
+        epochs = np.asarray(epochs, dtype=np.int64)
+        ids = np.asarray(ids, dtype=np.int64)
+        order = np.argsort(epochs, kind="stable")
+        with self._lock:
+            if len(ids):
+                self.max_id = max(self.max_id, int(ids.max()))
+            self._merge(collection, epochs[order], ids[order])
+
+    def _merge(self, collection, epochs, ids):
+        """정렬된 (epochs, ids)를 기존 배열에 끼워 넣기 (호출 측에서 잠금)"""
+        old_epochs, old_ids = self._sorted.get(collection, (np.empty(0, np.int64), np.empty(0, np.int64)))
+        if not len(old_epochs):
+            self._sorted[collection] = (epochs, ids)
+            return
+        positions = np.searchsorted(old_epochs, epochs, side="right")
+        self._sorted[collection] = (np.insert(old_epochs, positions, epochs), np.insert(old_ids, positions, ids))
+
+    def _arrays(self, collection):
+        with self._lock:
+            pending = self._pending.pop(collection, None)
+            if pending:
+                pending.sort()
+                epochs, ids = np.asarray(pending, dtype=np.int64).T
+                self._merge(collection, epochs, ids)
+            return self._sorted.get(collection, (np.empty(0, np.int64), np.empty(0, np.int64)))
+
+    def range(self, collection, start=None, end=None):
+        """start <= 게시 시각 <= end 인 문서 id (오름차순)"""
+        epochs, ids = self._arrays(collection)
+        lo = 0 if start is None else np.searchsorted(epochs, start, side="left")
+        hi = len(epochs) if end is None else np.searchsorted(epochs, end, side="right")
+        return np.sort(ids[lo:hi])
+
+    def latest(self, collection):
+        epochs, _ = self._arrays(collection)
+        return int(epochs[-1]) if len(epochs) else None
+
+    def refresh(self, store, collections=TIME_INDEXED_SOURCES, page_size=1000):
+        """지난 갱신 이후 추가된 행(id > max_id)만 읽어 반영 - 추가된 행 수"""
+        added = 0
+        while True:
+            rows = store.scan(self.max_id, page_size, collections=collections)
+            for row in rows:
+                metadata = parse_metadata(row.get('metadata'))
+                self.add(row['id'], metadata.get('collection'), published_epoch(metadata))
+            added += len(rows)
+            if len(rows) < page_size:
+                return added
@@ -5,864 +5,1076 @@ import json
 import numpy as np
 import urllib.request
 import urllib.parse
-import re
 import pandas as pd
-from datetime import datetime
-from supabase import create_client
+from datetime import datetime, timedelta
+from storage import open_store, match_by_ids, STORAGE_BACKEND, LOCAL_STORE_PATH
 from openai import OpenAI
-from sentence_transformers import SentenceTransformer
-import torch
 import time
+import logging
+import threading
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from documents import parse_metadata, prepare_embedding_text, pad_embedding, EMBEDDING_DIM, EMBEDDING_VERSION
+from projection import load_projection, embedding_version
+from query_expansion import source_query
+from search_pipeline import (SearchPipeline, query_variants as pipeline_variants, QUERY_EXPANSION, QUERY_EXPANSION_BUDGET_MS,
+                             QUERY_EXPANSION_WORKERS, FACET_REFRESH_SECONDS, FACET_EXACT_LIMIT, NEWS_RECENCY_WEIGHT,
+                             RECENCY_HALF_LIFE_DAYS)
+from context_builder import build_context, count_tokens, DEFAULT_TOKEN_BUDGET
+import prompts
+from prompts import get_system_prompt, get_user_prompt
+from tracing import span, start_trace, finish_trace, TRACE_EXPORT_PATH
+from singleflight import SingleFlight
+from naver_cache import NaverResponseCache
+from embedding_server import connect as connect_embedding_server, EMBEDDING_SERVER_URL
+from service import connect as connect_search_service, SEARCH_SERVICE_URL
+from jobqueue import JobQueue, JobWorkers, JOB_WORKERS
+from collect_jobs import CollectJobs, dedup_key, job_params
+import refresh
+from warmup import AnswerStore, QueryLog, WarmupWorker, stored_answer_key, corpus_version
+from pq_index import PQIndex, LOCAL_VECTOR_INDEX
+from facets import FacetIndex
+from price_history import PriceHistory
+from time_index import TimeIndex, TIME_INDEXED_SOURCES
+import metrics
+from metrics import EMBEDDING_SECONDS, DB_SECONDS, LOCAL_INDEX_SECONDS, RPC_REQUESTS, GPT_SECONDS, GPT_TOKENS
+
+try:
+    from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+except ImportError:  # 예전 Streamlit
+    add_script_run_ctx = get_script_run_ctx = None
+
+logger = logging.getLogger(__name__)
 
 # 페이지 구성
 st.set_page_config(page_title="스마트 쇼핑 파인더", layout="wide")
 
-# Streamlit에서 실행 중인지 확인하고 secrets 가져오기
+# 디버깅 모드면 이번 실행의 단계별 시간을 기록 (체크박스는 사이드바 하단, 값은 세션 상태에서 읽음)
+debug_mode = st.session_state.get("debug_mode", False)
+debug_trace = start_trace("total.py 실행", enabled=debug_mode)
+
 try:
-    # Streamlit Cloud 환경에서는 st.secrets 사용
-    supabase_url = st.secrets["SUPABASE_URL"]
-    supabase_key = st.secrets["SUPABASE_KEY"]
-    openai_api_key = st.secrets["OPENAI_API_KEY"]
-    NAVER_CLIENT_ID = st.secrets["NAVER_CLIENT_ID"]
-    NAVER_CLIENT_SECRET = st.secrets["NAVER_CLIENT_SECRET"]
-
-except Exception as e:
-    # 로컬 환경에서는 환경 변수 사용
+    # Streamlit에서 실행 중인지 확인하고 secrets 가져오기
     try:
-        import dotenv
-        dotenv.load_dotenv()
-        supabase_url = os.environ.get("SUPABASE_URL")
-        supabase_key = os.environ.get("SUPABASE_KEY")
-        openai_api_key = os.environ.get("OPENAI_API_KEY")
-    except:
-        st.error("API 키를 가져오는 데 실패했습니다. 환경 변수나 Streamlit Secrets가 제대로 설정되었는지 확인하세요.")
+        # Streamlit Cloud 환경에서는 st.secrets 사용
+        supabase_url = st.secrets["SUPABASE_URL"]
+        supabase_key = st.secrets["SUPABASE_KEY"]
+        openai_api_key = st.secrets["OPENAI_API_KEY"]
+        NAVER_CLIENT_ID = st.secrets["NAVER_CLIENT_ID"]
+        NAVER_CLIENT_SECRET = st.secrets["NAVER_CLIENT_SECRET"]
+
+    except Exception as e:
+        # 로컬 환경에서는 환경 변수 사용
+        try:
+            import dotenv
+            dotenv.load_dotenv()
+            supabase_url = os.environ.get("SUPABASE_URL")
+            supabase_key = os.environ.get("SUPABASE_KEY")
+            openai_api_key = os.environ.get("OPENAI_API_KEY")
+            NAVER_CLIENT_ID = os.environ.get("NAVER_CLIENT_ID")
+            NAVER_CLIENT_SECRET = os.environ.get("NAVER_CLIENT_SECRET")
+        except:
+            st.error("API 키를 가져오는 데 실패했습니다. 환경 변수나 Streamlit Secrets가 제대로 설정되었는지 확인하세요.")
+            st.stop()
+
+    # 네이버 검색 API 주소 (로컬 대역 서버로 바꿀 수 있도록 환경 변수 지원)
+    NAVER_API_BASE_URL = os.environ.get("NAVER_API_BASE_URL", "https://openapi.naver.com/v1/search/")
+
+    # API 키 확인 (로컬 저장소를 쓰면 Supabase 키는 필요 없음)
+    if (STORAGE_BACKEND == "supabase" and (not supabase_url or not supabase_key)) or not openai_api_key:
+        st.error("필요한 API 키가 설정되지 않았습니다. (OpenAI는 답변 생성용으로만 사용됩니다)")
         st.stop()
 
-# API 키 확인
-if not supabase_url or not supabase_key or not openai_api_key:
-    st.error("필요한 API 키가 설정되지 않았습니다. (OpenAI는 답변 생성용으로만 사용됩니다)")
-    st.stop()
+    # 문서 저장소 초기화 (STORAGE_BACKEND: supabase 또는 local)
+    @st.cache_resource
+    def get_document_store(supabase_url, supabase_key):
+        """프로세스 공용 문서 저장소"""
+        return open_store(supabase_url, supabase_key)
 
-# Supabase 클라이언트 초기화
-try:
-    supabase = create_client(supabase_url, supabase_key)
-    st.sidebar.success("Supabase 연결 성공!")
-except Exception as e:
-    st.error(f"Supabase 연결 중 오류가 발생했습니다: {str(e)}")
-    st.stop()
+    try:
+        document_store = get_document_store(supabase_url, supabase_key)
+        st.sidebar.success("Supabase 연결 성공!" if document_store.backend == "supabase" else f"로컬 저장소 사용: {LOCAL_STORE_PATH}")
+    except Exception as e:
+        st.error(f"문서 저장소 연결 중 오류가 발생했습니다: {str(e)}")
+        st.stop()
 
-# OpenAI 클라이언트 초기화 (GPT 답변 생성용)
-try:
-    openai_client = OpenAI(api_key=openai_api_key)
-    st.sidebar.success("OpenAI 연결 성공!")
-except Exception as e:
-    st.error(f"OpenAI 연결 중 오류가 발생했습니다: {str(e)}")
-    st.stop()
-
-# 무료 임베딩 모델 초기화
-@st.cache_resource
-def load_embedding_model():
-    """한국어 임베딩 모델 로딩 (캐시됨)"""
+    # OpenAI 클라이언트 초기화 (GPT 답변 생성용)
     try:
-        # 한국어 성능이 좋은 무료 모델
-        model = SentenceTransformer('jhgan/ko-sroberta-multitask')
-        st.sidebar.success("임베딩 모델 로딩 성공!")
-        return model
+        openai_client = OpenAI(api_key=openai_api_key)
+        st.sidebar.success("OpenAI 연결 성공!")
     except Exception as e:
-        st.sidebar.error(f"임베딩 모델 로딩 실패: {str(e)}")
-        # 백업 모델 사용
+        st.error(f"OpenAI 연결 중 오류가 발생했습니다: {str(e)}")
+        st.stop()
+
+    # 검색 서비스 (SEARCH_SERVICE_URL) - 연결되면 검색/답변/수집은 서비스가 처리하고 이 앱은 화면만 그림 (모델도 올리지 않음)
+    @st.cache_resource
+    def get_search_service():
+        """프로세스 공용 검색 서비스 클라이언트 (미설정이거나 연결 실패면 None - 이 프로세스에서 직접 처리)"""
+        client, reason = connect_search_service(SEARCH_SERVICE_URL)
+        if client is not None:
+            st.sidebar.success(f"검색 서비스 사용 중 ({SEARCH_SERVICE_URL})")
+        elif SEARCH_SERVICE_URL:
+            st.sidebar.warning(f"{reason} - 이 프로세스에서 직접 검색합니다.")
+        return client
+
+    search_service = get_search_service()
+
+    # 무료 임베딩 모델 초기화 (저장하는 행마다 모델 이름을 태그해 다른 모델 벡터와 섞이지 않게 함)
+    EMBEDDING_MODEL_NAME = os.environ.get("EMBEDDING_MODEL", "jhgan/ko-sroberta-multitask")
+    FALLBACK_EMBEDDING_MODEL_NAME = "paraphrase-multilingual-MiniLM-L12-v2"
+
+    @st.cache_resource
+    def load_embedding_model():
+        """한국어 임베딩 모델 로딩 (캐시됨) - (모델, 모델 이름)
+
+        EMBEDDING_SERVER_URL의 임베딩 서버가 같은 모델을 서비스하면 모델을 올리지 않고 서버를 사용합니다.
+        """
+        if EMBEDDING_SERVER_URL:
+            client, reason = connect_embedding_server(EMBEDDING_MODEL_NAME, EMBEDDING_SERVER_URL)
+            if client is not None:
+                st.sidebar.success(f"임베딩 서버 사용 중 ({EMBEDDING_SERVER_URL})")
+                return client, EMBEDDING_MODEL_NAME
+            st.sidebar.warning(f"{reason} - 로컬 모델을 로딩합니다.")
+        from sentence_transformers import SentenceTransformer  # 서버를 쓰면 torch를 import하지 않음
         try:
-            model = SentenceTransformer('paraphrase-multilingual-MiniLM-L12-v2')
-            st.sidebar.warning("백업 임베딩 모델 사용 중")
-            return model
-        except Exception as e2:
-            st.error(f"백업 모델도 로딩 실패: {str(e2)}")
-            st.stop()
+            # 한국어 성능이 좋은 무료 모델
+            model = SentenceTransformer(EMBEDDING_MODEL_NAME)
+            st.sidebar.success("임베딩 모델 로딩 성공!")
+            return model, EMBEDDING_MODEL_NAME
+        except Exception as e:
+            st.sidebar.error(f"임베딩 모델 로딩 실패: {str(e)}")
+            # 백업 모델 사용
+            try:
+                model = SentenceTransformer(FALLBACK_EMBEDDING_MODEL_NAME)
+                st.sidebar.warning("백업 임베딩 모델 사용 중 (이 모델로 저장된 문서만 검색됩니다)")
+                return model, FALLBACK_EMBEDDING_MODEL_NAME
+            except Exception as e2:
+                st.error(f"백업 모델도 로딩 실패: {str(e2)}")
+                st.stop()
 
-# 임베딩 모델 로딩
-embedding_model = load_embedding_model()
+    # 임베딩 모델 로딩 (검색 서비스를 쓰면 서비스 모델의 이름/버전만 사용)
+    if search_service is not None:
+        embedding_model, embedding_model_name = None, search_service.model_name
+    else:
+        embedding_model, embedding_model_name = load_embedding_model()
 
-def test_naver_api():
-    """네이버 API 연결 테스트"""
-    try:
-        test_query = "테스트"
-        encoded_query = urllib.parse.quote(test_query)
-        url = f"https://openapi.naver.com/v1/search/blog?query={encoded_query}&display=1"
-        
-        request = urllib.request.Request(url)
-        request.add_header("X-Naver-Client-Id", NAVER_CLIENT_ID)
-        request.add_header("X-Naver-Client-Secret", NAVER_CLIENT_SECRET)
-        request.add_header("User-Agent", "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36")
-        
-        response = urllib.request.urlopen(request, timeout=10)
-        return response.getcode() == 200
-    except Exception as e:
-        st.sidebar.error(f"네이버 API 테스트 실패: {str(e)}")
-        return False
+    # 선택적 차원 축소 (EMBEDDING_PROJECTION) - 수집과 검색에 같은 투영 사용
+    @st.cache_resource
+    def load_embedding_projection(model_name):
+        """설정된 투영 로딩 (다른 모델용이면 사용하지 않음)"""
+        try:
+            projection = load_projection()
+        except Exception as e:
+            st.sidebar.error(f"임베딩 투영 로딩 실패: {str(e)}")
+            return None
+        if projection is not None and projection.model_name != model_name:
+            st.sidebar.warning(f"임베딩 투영이 다른 모델({projection.model_name})용이라 사용하지 않습니다.")
+            return None
+        return projection
 
-# 네이버 API 상태 확인
-if test_naver_api():
-    st.sidebar.success("네이버 API 연결 성공!")
-else:
-    st.sidebar.error("네이버 API 연결 실패!")
+    embedding_projection = load_embedding_projection(embedding_model_name)
+    current_embedding_version = embedding_version(EMBEDDING_VERSION, embedding_projection) if search_service is None else search_service.version
+    st.sidebar.caption(f"임베딩: {embedding_model_name} ({current_embedding_version})")
 
-def generate_embedding(text):
-    """텍스트에서 무료 임베딩 생성 - 개선된 버전"""
-    try:
-        # 텍스트 전처리 추가
-        if not text or len(text.strip()) < 10:  # 너무 짧은 텍스트 제외
+    # 메트릭 엔드포인트 (프로세스당 하나, 모든 세션이 공유)
+    @st.cache_resource
+    def start_metrics_server():
+        """Prometheus 형식 /metrics 엔드포인트를 백그라운드 스레드로 시작"""
+        return metrics.start_http_server()
+
+    start_metrics_server()
+
+    # 동시 요청 합치기 (같은 질문을 여러 세션이 동시에 보내면 업스트림 호출은 한 번만)
+    @st.cache_resource
+    def get_single_flight():
+        """프로세스 공용 single-flight 객체"""
+        return SingleFlight()
+
+    single_flight = get_single_flight()
+
+    # 네이버 원본 응답 캐시 (세션 간 공유, 엔드포인트별 TTL)
+    @st.cache_resource
+    def get_naver_cache():
+        """프로세스 공용 네이버 응답 캐시"""
+        return NaverResponseCache.from_env()
+
+    naver_cache = get_naver_cache()
+
+    # 로컬 PQ 인덱스 (LOCAL_VECTOR_INDEX) - 있으면 RPC 대신 로컬에서 후보를 찾고 본문만 id로 조회
+    @st.cache_resource
+    def load_vector_index(model_name, version):
+        """pq_index.py로 빌드한 인덱스 로딩 (다른 모델/버전용이면 사용하지 않음)"""
+        if not LOCAL_VECTOR_INDEX:
             return None
-        
-        # 텍스트 정규화 강화
-        cleaned_text = re.sub(r'\s+', ' ', text.strip())            # 공백 정규화
-        cleaned_text = re.sub(r'[^\w\s가-힣\.]', ' ', cleaned_text)  # 특수문자 제거 (마침표는 유지)
-        cleaned_text = ' '.join(cleaned_text.split())               # 중복 공백 제거
-        
-        # 너무 긴 텍스트는 잘라내기 (모델 제한 고려)
-        if len(cleaned_text) > 512:  # sentence-transformers 일반적 제한
-            cleaned_text = cleaned_text[:512]
-        
-        # 무료 임베딩 모델로 임베딩 생성
-        embedding = embedding_model.encode(cleaned_text, convert_to_tensor=False)
-        
-        # numpy array를 list로 변환
-        if hasattr(embedding, 'tolist'):
-            embedding_list = embedding.tolist()
-        else:
-            embedding_list = embedding
-        
-        # 768차원을 1536차원으로 패딩 (0으로 채움)
-        if len(embedding_list) == 768:
-            # 0으로 패딩하여 1536차원으로 만들기
-            padded_embedding = embedding_list + [0.0] * (1536 - 768)
-            return padded_embedding
-        elif len(embedding_list) == 1536:
-            return embedding_list
-        else:
-            st.warning(f"예상치 못한 임베딩 차원: {len(embedding_list)}")
-            # 1536차원으로 맞추기
-            if len(embedding_list) < 1536:
-                return embedding_list + [0.0] * (1536 - len(embedding_list))
-            else:
-                return embedding_list[:1536]
-            
-    except Exception as e:
-        st.error(f"임베딩 생성 중 오류 발생: {str(e)}")
-        raise
+        try:
+            index = PQIndex.load(LOCAL_VECTOR_INDEX)
+        except Exception as e:
+            st.sidebar.error(f"로컬 벡터 인덱스 로딩 실패: {str(e)}")
+            return None
+        if index.info.get("model_name") != model_name or index.info.get("version") != version:
+            st.sidebar.warning(f"로컬 벡터 인덱스가 다른 임베딩({index.info.get('model_name')} {index.info.get('version')})용이라 사용하지 않습니다.")
+            return None
+        return index
 
-def search_naver_api(query, source_type, count=20):
-    """네이버 API를 사용하여 검색하고 결과를 Supabase에 저장 - 개선된 버전"""
-    try:
-        # 소스 타입에 따른 API 엔드포인트 설정
-        if source_type == "블로그":
-            api_endpoint = "blog"
-        elif source_type == "뉴스":
-            api_endpoint = "news"
-        elif source_type == "쇼핑":
-            api_endpoint = "shop"
-        else:
-            api_endpoint = "blog"  # 기본값
-        
-        # 쿼리 인코딩
-        encoded_query = urllib.parse.quote(query)
-        url = f"https://openapi.naver.com/v1/search/{api_endpoint}?query={encoded_query}&display={count}&sort=sim"
-        
-        # 요청 헤더 설정 (개선)
-        request = urllib.request.Request(url)
-        request.add_header("X-Naver-Client-Id", NAVER_CLIENT_ID)
-        request.add_header("X-Naver-Client-Secret", NAVER_CLIENT_SECRET)
-        request.add_header("User-Agent", "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36")
-        
-        # API 요청 및 응답 처리 (개선된 예외 처리)
+    vector_index = load_vector_index(embedding_model_name, current_embedding_version)
+
+    # 인덱스 빌드 뒤 저장된 문서(수집 작업, refresh.py, ingest.py 등) 반영 주기
+    VECTOR_INDEX_REFRESH_SECONDS = float(os.environ.get("VECTOR_INDEX_REFRESH_SECONDS", "10"))
+
+    def refresh_vector_index():
+        """마지막 반영 후 VECTOR_INDEX_REFRESH_SECONDS가 지났으면 새 문서를 인덱스 추가분에 붙임 (동시 갱신은 한 번만)"""
+        if time.time() - getattr(vector_index, "refreshed_at", 0) < VECTOR_INDEX_REFRESH_SECONDS:
+            return vector_index
+        def refresh():
+            with DB_SECONDS.time(op="index_refresh"):
+                vector_index.append_from_store(document_store, embedding_model_name, current_embedding_version)
+            vector_index.refreshed_at = time.time()
+        single_flight.do(("vector_index.refresh",), refresh)
+        return vector_index
+
+    if vector_index is not None:
+        refresh_vector_index()
+        st.sidebar.caption(f"로컬 PQ 인덱스: {len(vector_index):,}건 ({vector_index.code_bytes() / 1e6:.1f}MB 코드, "
+                           f"빌드 후 추가 {vector_index.appended:,}건) · 반영한 id {vector_index.scanned_id:,} / "
+                           f"저장소 최대 id {document_store.max_id():,}")
+        if vector_index.appended > max(len(vector_index) // 10, 1000):
+            st.sidebar.info("빌드 후 추가된 문서가 많습니다. pq_index.py로 다시 빌드하면 검색이 빨라집니다.")
+
+    # 쇼핑 패싯 인덱스 (가격/판매처/브랜드) - 새로 저장된 상품은 FACET_REFRESH_SECONDS마다 반영
+
+    @st.cache_resource
+    def get_facet_index():
+        """프로세스 공용 쇼핑 패싯 인덱스"""
+        return FacetIndex()
+
+    facet_index = get_facet_index()
+
+    def refresh_facet_index():
+        """마지막 갱신 후 FACET_REFRESH_SECONDS가 지났으면 새 상품 반영 (동시 갱신은 한 번만)"""
+        if time.time() - getattr(facet_index, "refreshed_at", 0) < FACET_REFRESH_SECONDS:
+            return facet_index
+        def refresh():
+            with DB_SECONDS.time(op="facet_refresh"):
+                facet_index.refresh(document_store)
+            facet_index.refreshed_at = time.time()
+        single_flight.do(("facets.refresh",), refresh)
+        return facet_index
+
+    # 쇼핑 가격 이력 - 이미 저장된 상품도 수집할 때마다 가격을 기록 (CLI 수집과 같은 폴더)
+    @st.cache_resource
+    def get_price_history():
+        return PriceHistory()
+
+    price_history = get_price_history()
+
+    # 뉴스/블로그 게시 시각 인덱스 (최신성 가중치는 search_pipeline 설정)
+    @st.cache_resource
+    def get_time_index():
+        """프로세스 공용 게시 시각 인덱스"""
+        return TimeIndex()
+
+    time_index = get_time_index()
+
+    def refresh_time_index():
+        """마지막 갱신 후 FACET_REFRESH_SECONDS가 지났으면 새 문서 반영 (동시 갱신은 한 번만)"""
+        if time.time() - getattr(time_index, "refreshed_at", 0) < FACET_REFRESH_SECONDS:
+            return time_index
+        def refresh():
+            with DB_SECONDS.time(op="time_index_refresh"):
+                time_index.refresh(document_store)
+            time_index.refreshed_at = time.time()
+        single_flight.do(("time_index.refresh",), refresh)
+        return time_index
+
+    def test_naver_api():
+        """네이버 API 연결 테스트"""
         try:
-            response = urllib.request.urlopen(request, timeout=15)
-            response_code = response.getcode()
-            
-            if response_code == 200:
-                # 응답 읽기
-                response_body = response.read()
-                
-                # 응답이 비어있는지 확인
-                if not response_body:
-                    st.error("네이버 API에서 빈 응답을 받았습니다.")
-                    return [], 0, 0
-                
-                # 디코딩 및 JSON 파싱 (개선된 오류 처리)
-                try:
-                    response_text = response_body.decode('utf-8')
-                    
-                    # 디버깅: 응답 내용의 시작 부분 확인
-                    if not response_text.strip().startswith('{'):
-                        st.error(f"유효하지 않은 JSON 응답: {response_text[:200]}...")
-                        return [], 0, 0
-                    
-                    response_data = json.loads(response_text)
-                    
-                except json.JSONDecodeError as e:
-                    st.error(f"JSON 파싱 오류: {str(e)}")
-                    st.error(f"응답 내용 미리보기: {response_text[:200] if 'response_text' in locals() else '디코딩 실패'}...")
-                    return [], 0, 0
-                except UnicodeDecodeError as e:
-                    st.error(f"응답 디코딩 오류: {str(e)}")
-                    return [], 0, 0
-                
-                # 응답 데이터 확인
-                if 'items' not in response_data:
-                    st.warning("검색 결과가 없거나 응답 형식이 올바르지 않습니다.")
-                    return [], 0, 0
-                
-                # 결과 처리 및 Supabase에 저장
-                saved_count = 0
-                items = response_data.get('items', [])
-                
-                for i, item in enumerate(items):
-                    try:
-                        # HTML 태그 제거
-                        title = re.sub('<[^<]+?>', '', item.get('title', '')) if item.get('title') else '제목 없음'
-                        
-                        # 소스 타입에 따른 내용 필드 추출 및 개선된 텍스트 구성
-                        if source_type == "블로그":
-                            content = re.sub('<[^<]+?>', '', item.get('description', '')) if item.get('description') else ''
-                            metadata = {
-                                'title': title,
-                                'url': item.get('link', ''),
-                                'bloggername': item.get('bloggername', ''),
-                                'date': item.get('postdate', ''),
-                                'collection': source_type
-                            }
-                            # 개선된 전체 텍스트 구성
-                            full_text = f"제목: {title}\n내용: {content}\n블로거: {metadata.get('bloggername', '')}\n카테고리: 블로그"
-                            
-                        elif source_type == "뉴스":
-                            content = re.sub('<[^<]+?>', '', item.get('description', '')) if item.get('description') else ''
-                            # 간단한 날짜 처리
-                            pub_date = item.get('pubDate', '')
-                            
-                            metadata = {
-                                'title': title,
-                                'url': item.get('link', ''),
-                                'publisher': item.get('originallink', '').replace('https://', '').replace('http://', '').split('/')[0] if item.get('originallink') else '',
-                                'date': pub_date,
-                                'collection': source_type
-                            }
-                            # 개선된 전체 텍스트 구성 - 뉴스에 맞게 수정
-                            full_text = f"뉴스 제목: {title}\n뉴스 내용: {content}\n언론사: {metadata.get('publisher', '')}\n날짜: {pub_date}\n분류: 뉴스 기사"
-                            
-                        elif source_type == "쇼핑":
-                            content = f"{title}. " + re.sub('<[^<]+?>', '', item.get('category3', '')) if item.get('category3') else title
-                            metadata = {
-                                'title': title,
-                                'url': item.get('link', ''),
-                                'lprice': item.get('lprice', ''),
-                                'hprice': item.get('hprice', ''),
-                                'mallname': item.get('mallName', ''),
-                                'maker': item.get('maker', ''),
-                                'brand': item.get('brand', ''),
-                                'collection': source_type
-                            }
-                            # 개선된 전체 텍스트 구성
-                            full_text = f"상품명: {title}\n설명: {content}\n브랜드: {metadata.get('brand', '')}\n제조사: {metadata.get('maker', '')}\n판매처: {metadata.get('mallname', '')}\n카테고리: 쇼핑"
-                        
-                        # 빈 텍스트 건너뛰기
-                        if not full_text.strip() or len(full_text.strip()) < 20:
-                            continue
-                        
-                        # 뉴스 데이터 디버깅 (임시)
-                        if source_type == "뉴스" and i < 3:  # 처음 3개만 디버깅
-                            st.sidebar.write(f"**뉴스 저장 디버깅 {i+1}:**")
-                            st.sidebar.write(f"- 제목: {title[:50]}...")
-                            st.sidebar.write(f"- 언론사: {metadata.get('publisher', 'N/A')}")
-                            st.sidebar.write(f"- 텍스트 길이: {len(full_text)}")
-                        
-                        try:
-                            # 임베딩 생성
-                            embedding = generate_embedding(full_text)
-                            
-                            if embedding is None:  # 임베딩 생성 실패 시 건너뛰기
-                                continue
-                            
-                            # Supabase에 데이터 삽입
-                            data = {
-                                'content': full_text,
-                                'embedding': embedding,
-                                'metadata': metadata
-                            }
-                            
-                            # 중복 체크 개선 (제목과 URL 기반)
-                            check_url = metadata.get('url', '')
-                            
-                            try:
-                                # URL 기반 중복 체크
-                                if check_url:
-                                    existing = supabase.table('documents').select('id').eq(f"metadata->>url", check_url).execute()
-                                    
-                                    if not existing.data:  # 중복이 없을 경우에만 삽입
-                                        result = supabase.table('documents').insert(data).execute()
-                                        saved_count += 1
-                                        if source_type == "뉴스":
-                                            st.sidebar.success(f"뉴스 저장 성공: {title[:30]}...")
-                                else:
-                                    # URL이 없으면 그냥 저장
-                                    result = supabase.table('documents').insert(data).execute()
-                                    saved_count += 1
-                            
-                            except Exception as e:
-                                st.warning(f"항목 {i+1} 저장 중 상세 오류: {str(e)}")
-                                continue
-                            
-                        except Exception as e:
-                            st.warning(f"항목 {i+1} 저장 중 오류: {str(e)}")
-                            continue
-                        
-                    except Exception as e:
-                        st.warning(f"항목 {i+1} 처리 중 오류: {str(e)}")
-                        continue
-                
-                return items, response_data.get('total', 0), saved_count
-            
-            else:
-                st.error(f"네이버 API HTTP 오류: {response_code}")
-                return [], 0, 0
+            test_query = "테스트"
+            encoded_query = urllib.parse.quote(test_query)
+            url = f"{NAVER_API_BASE_URL}blog?query={encoded_query}&display=1"
         
-        except urllib.error.HTTPError as e:
-            st.error(f"네이버 API HTTP 오류: {e.code} - {e.reason}")
-            if e.code == 400:
-                st.error("잘못된 요청입니다. 검색어를 확인해주세요.")
-            elif e.code == 401:
-                st.error("인증 오류입니다. API 키를 확인해주세요.")
-            elif e.code == 403:
-                st.error("접근 거부되었습니다. API 사용 권한을 확인해주세요.")
-            elif e.code == 429:
-                st.error("API 호출 한도를 초과했습니다. 잠시 후 다시 시도해주세요.")
-            return [], 0, 0
-            
-        except urllib.error.URLError as e:
-            st.error(f"네트워크 연결 오류: {str(e)}")
-            return [], 0, 0
-            
+            request = urllib.request.Request(url)
+            request.add_header("X-Naver-Client-Id", NAVER_CLIENT_ID)
+            request.add_header("X-Naver-Client-Secret", NAVER_CLIENT_SECRET)
+            request.add_header("User-Agent", "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36")
+        
+            response = urllib.request.urlopen(request, timeout=10)
+            return response.getcode() == 200
         except Exception as e:
-            st.error(f"예상치 못한 오류: {str(e)}")
-            return [], 0, 0
-            
-    except Exception as e:
-        st.error(f"네이버 검색 중 전체 오류 발생: {str(e)}")
-        return [], 0, 0
+            st.sidebar.error(f"네이버 API 테스트 실패: {str(e)}")
+            return False
 
-def semantic_search(query_text, source_type="블로그", limit=10, match_threshold=0.5):
-    """시맨틱 검색 수행 - 개선된 버전"""
-    try:
-        # 쿼리 전처리를 소스 타입별로 다르게
-        if source_type == "뉴스":
-            processed_query = f"뉴스 검색: {query_text} 뉴스 기사 언론사 보도"
-        elif source_type == "쇼핑":
-            processed_query = f"상품 검색: {query_text} 쇼핑 상품 가격"
-        else:
-            processed_query = f"블로그 검색: {query_text} 블로그 포스팅"
-        
-        # 쿼리 텍스트에 대한 임베딩 생성
-        query_embedding = generate_embedding(processed_query)
+    # 네이버 API 상태 확인
+    if test_naver_api():
+        st.sidebar.success("네이버 API 연결 성공!")
+    else:
+        st.sidebar.error("네이버 API 연결 실패!")
+
+    def generate_embedding(text):
+        """텍스트에서 무료 임베딩 생성 - 개선된 버전"""
+        try:
+            # 텍스트 전처리 (공백/특수문자 정규화, 길이 제한)
+            cleaned_text = prepare_embedding_text(text)
+            if cleaned_text is None:  # 너무 짧은 텍스트 제외
+                return None
         
-        if query_embedding is None:
-            st.error("쿼리 임베딩 생성에 실패했습니다.")
-            return []
+            # 무료 임베딩 모델로 임베딩 생성
+            with span("embedding.encode", chars=len(cleaned_text)), EMBEDDING_SECONDS.time(kind="single"):
+                embedding = embedding_model.encode(cleaned_text, convert_to_tensor=False)
         
-        # 디버깅: 쿼리 정보 출력
-        if source_type == "뉴스":
-            st.sidebar.write(f"뉴스 검색 쿼리: {processed_query[:50]}...")
-            st.sidebar.write(f"임베딩 차원: {len(query_embedding)}")
+            # 차원 축소 투영 (설정된 경우)
+            if embedding_projection is not None:
+                embedding = embedding_projection.transform(embedding)
+            elif len(embedding) not in (768, EMBEDDING_DIM):
+                st.warning(f"예상치 못한 임베딩 차원: {len(embedding)}")
         
-        # match_documents 함수를 사용한 벡터 검색 - 더 관대한 설정
-        try:
-            # 뉴스의 경우 더 낮은 임계값 사용
-            if source_type == "뉴스":
-                adjusted_threshold = max(0.1, match_threshold - 0.3)
-            else:
-                adjusted_threshold = max(0.2, match_threshold - 0.2)
-            
-            response = supabase.rpc(
-                'match_documents', 
-                {
-                    'query_embedding': query_embedding,
-                    'match_threshold': adjusted_threshold,
-                    'match_count': limit * 5  # 필터링 후 충분한 결과를 위해 더 많이 가져옴
-                }
-            ).execute()
+            # 컬럼 차원(1536)에 맞게 패딩 (0으로 채움)
+            return pad_embedding(embedding)
             
-            if response.data and len(response.data) > 0:
-                # 클라이언트 측에서 소스 타입에 따라 필터링
-                filtered_results = []
-                for item in response.data:
-                    # metadata 확인
-                    metadata = item.get('metadata', {})
-                    if isinstance(metadata, str):
-                        try:
-                            metadata = json.loads(metadata)
-                        except:
-                            metadata = {}
-                    
-                    item_source_type = metadata.get('collection', '')
-                    
-                    # 소스 타입이 일치하는 경우에만 추가
-                    if item_source_type == source_type:
-                        filtered_results.append(item)
-                        # 뉴스 디버깅
-                        if source_type == "뉴스" and len(filtered_results) <= 3:
-                            st.sidebar.write(f"뉴스 매칭 발견: {metadata.get('title', '')[:30]}... (유사도: {item.get('similarity', 0):.3f})")
-                
-                # 유사도 점수로 재정렬
-                filtered_results.sort(key=lambda x: x.get('similarity', 0), reverse=True)
-                
-                # 최대 limit 개수만큼 결과 반환
-                return filtered_results[:limit]
-            else:
-                st.info(f"'{query_text}'에 대한 {source_type} 검색 결과가 없습니다.")
-                # 뉴스 디버깅
-                if source_type == "뉴스":
-                    st.sidebar.warning(f"뉴스 검색 결과 없음. 임계값: {adjusted_threshold}")
-                return []
-                
         except Exception as e:
-            st.sidebar.warning(f"시맨틱 검색 실패: {str(e)}")
-            return []
-        
-    except Exception as e:
-        st.error(f"시맨틱 검색 중 오류 발생: {str(e)}")
-        raise
-
-def get_system_prompt(source_type):
-    """소스 타입에 따른 시스템 프롬프트 생성"""
-    if source_type == "블로그":
-        return """당신은 네이버 블로그 데이터를 기반으로 정확하고 유용한 정보를 제공하는 도우미입니다.
-블로그 글은 개인의 경험과 의견을 담고 있으므로, 주관적인 내용이 포함될 수 있음을 인지하세요.
-여러 블로그의 정보를 종합하여 균형 잡힌 시각을 제공하되, 정보의 출처가 개인 블로그임을 명시하세요.
-특히 레시피, DIY 방법, 여행 경험 등 실용적인 정보에 집중하되, 의학적 조언이나 전문적인 내용은 참고 정보로만 안내하세요."""
-
-    elif source_type == "뉴스":
-        return """당신은 네이버 뉴스 데이터를 기반으로 정확하고 객관적인 정보를 제공하는 도우미입니다.
-뉴스 기사의 사실과 정보를 전달할 때는 편향되지 않게 중립적인 입장을 유지하세요.
-여러 언론사의 기사를 비교하여 다양한 관점을 제시하고, 정보의 출처와 발행 날짜를 명확히 하세요.
-특히 시사 문제, 최신 이슈, 사회 현상에 대해 설명할 때는 다양한 의견이 있을 수 있음을 인지하세요."""
-
-    elif source_type == "쇼핑":
-        return """당신은 네이버 쇼핑 데이터를 기반으로 정확하고 유용한 정보를 제공하는 도우미입니다.
-상품 정보, 가격, 기능, 특징 등을 객관적으로 설명하고 비교하세요.
-다양한 상품 옵션과 가격대를 안내하되, 특정 브랜드나 제품을 지나치게 홍보하지 마세요.
-사용자의 요구에 맞는 상품 추천이나 구매 팁을 제공할 때는 실용적인 관점에서 접근하세요."""
-
-    else:
-        return """당신은 네이버 검색 데이터를 기반으로 정확하고 유용한 정보를 제공하는 도우미입니다.
-주어진 문서들의 내용만 사용하여 사용자 질문에 맞는 최적의 답변을 제공하세요.
-문서에 없는 내용은 추가하지 말고 정확한 사실만 전달하세요."""
+            st.error(f"임베딩 생성 중 오류 발생: {str(e)}")
+            raise
 
-def get_user_prompt(query, context_text, source_type):
-    """소스 타입에 따른 사용자 프롬프트 생성"""
-    if source_type == "블로그":
-        return f"""다음은 네이버 블로그에서 수집한 데이터입니다:
+    def generate_embeddings(texts, allow_short=False):
+        """여러 텍스트를 encode 한 번으로 임베딩 (너무 짧은 텍스트는 None, allow_short면 짧은 검색어도 임베딩)"""
+        cleaned = [prepare_embedding_text(text) or (' '.join(text.split()) or None if allow_short else None) for text in texts]
+        valid = [text for text in cleaned if text is not None]
+        if not valid:
+            return [None] * len(texts)
+        with span("embedding.encode", texts=len(valid)), EMBEDDING_SECONDS.time(kind="batch"):
+            vectors = embedding_model.encode(valid, batch_size=len(valid), convert_to_numpy=True, show_progress_bar=False)
+        if embedding_projection is not None:
+            vectors = embedding_projection.transform(vectors)
+        padded = iter(pad_embedding(vector) for vector in vectors)
+        return [None if text is None else next(padded) for text in cleaned]
 
-{context_text}
-
-위 블로그 글들을 바탕으로 다음 질문에 상세히 답변해주세요: 
-"{query}"
+    def match_documents(query_embedding, match_threshold, match_count):
+        """match_documents 벡터 검색 (Supabase RPC 또는 로컬 저장소, 결과 행 목록)"""
+        try:
+            with DB_SECONDS.time(op="rpc_match_documents"):
+                rows = document_store.match(query_embedding, match_threshold, match_count)
+        except Exception:
+            RPC_REQUESTS.inc(outcome="error")
+            raise
+        RPC_REQUESTS.inc(outcome="ok" if rows else "empty")
+        return rows
 
-답변 작성 규칙:
-1. 한국어로 자연스럽게 답변해주세요.
-2. 블로그 글은 개인의 경험과 의견을 담고 있으므로, 정보의 주관성을 고려해주세요.
-3. 여러 블로그의 공통된 내용에 중점을 두고, 개인적 경험이나 팁은 "블로거의 경험에 따르면..."과 같이 맥락을 제공해주세요.
-4. 블로그 글들 간에 상충되는 정보가 있다면 "일부 블로거는 A를 추천하는 반면, 다른 블로거는 B를 선호합니다"와 같이 다양한 의견을 제시해주세요.
-5. 레시피, DIY 방법, 여행 경험 등 실용적인 정보에 집중해주세요.
-6. 출처를 명시할 때는 "문서 2의 블로거에 따르면..."과 같이 표현해주세요.
-7. 제공된 문서 내용만 사용하고, 문서에 없는 내용은 추측하거나 답변하지 마세요."""
+    def match_documents_local(query_embedding, match_threshold, match_count, allowed_ids=None):
+        """로컬 PQ 인덱스로 match_documents와 같은 형태의 결과 행 목록 반환 (allowed_ids: 패싯 필터 결과)"""
+        with LOCAL_INDEX_SECONDS.time():
+            ids, scores = vector_index.search(query_embedding, k=match_count, rerank=max(100, match_count * 4),
+                                              allowed_ids=allowed_ids)
+        similarity = {int(i): float(s) for i, s in zip(ids, scores) if s > match_threshold}
+        if not similarity:
+            return []
+        with DB_SECONDS.time(op="select_by_id"):
+            fetched = document_store.fetch(list(similarity))
+        rows = [{**row, 'similarity': similarity[row['id']]} for row in fetched]
+        rows.sort(key=lambda row: row['similarity'], reverse=True)
+        return rows
 
-    elif source_type == "뉴스":
-        return f"""다음은 네이버 뉴스에서 수집한, 신뢰할 수 있는 언론사의 기사입니다:
+    def match_documents_by_ids(query_embedding, match_threshold, match_count, ids):
+        """패싯 필터로 고른 문서들의 벡터만 가져와 직접 코사인 유사도 계산 (match_documents와 같은 형태)"""
+        with DB_SECONDS.time(op="select_by_id"):
+            return match_by_ids(document_store, query_embedding, match_threshold, match_count, ids)
 
-{context_text}
+    def preprocess_query(query_text, source_type):
+        """쿼리 전처리를 소스 타입별로 다르게"""
+        return source_query(query_text, source_type)
 
-위 뉴스 기사들을 바탕으로 다음 질문에 상세히 답변해주세요: 
-"{query}"
+    def query_variants(query_text, source_type):
+        """검색에 쓸 검색어 변형 [(이름, 문자열, 가중치)] - QUERY_EXPANSION=0이면 소스 접두어 형태 하나"""
+        return pipeline_variants(query_text, source_type, QUERY_EXPANSION)
 
-답변 작성 규칙:
-1. 한국어로 자연스럽게 답변해주세요.
-2. 뉴스 기사의 사실과 정보를 전달할 때는 편향되지 않게 중립적인 입장을 유지하세요.
-3. 기사의 발행 날짜를 고려하여 정보의 시의성을 명시하세요. (예: "2023년 5월 보도에 따르면...")
-4. 여러 언론사의 기사를 인용할 때는 "문서 1의 OO일보에 따르면..."와 같이 출처를 명확히 하세요.
-5. 기사들 간에 상충되는 정보가 있다면 이를 언급하고 각 관점을 공정하게 제시하세요.
-6. 제공된 기사 내용만 사용하고, 기사에 없는 내용은 추측하거나 답변하지 마세요."""
+    @st.cache_resource
+    def get_variant_executor():
+        """검색어 변형별 벡터 검색을 동시에 실행하는 스레드 풀 (첫 번째 변형은 호출한 스레드에서)"""
+        return ThreadPoolExecutor(max_workers=QUERY_EXPANSION_WORKERS, thread_name_prefix="query-variant")
 
-    elif source_type == "쇼핑":
-        return f"""다음은 네이버 쇼핑에서 수집한 상품 정보입니다:
+    def search_pipeline():
+        """이 화면의 저장소/모델/인덱스로 만든 공용 검색 파이프라인 (설정과 인덱스는 호출할 때의 값)"""
+        script_ctx = get_script_run_ctx() if get_script_run_ctx else None
+        return SearchPipeline(
+            embed=lambda texts: generate_embeddings(texts, True),
+            match=match_documents,
+            match_ids=match_documents_by_ids,
+            match_local=match_documents_local if vector_index is not None else None,
+            facets=refresh_facet_index,
+            times=refresh_time_index,
+            single_flight=single_flight,
+            executor=get_variant_executor(),
+            model_name=embedding_model_name,
+            version=current_embedding_version,
+            expansion=QUERY_EXPANSION,
+            budget_ms=QUERY_EXPANSION_BUDGET_MS,
+            exact_limit=FACET_EXACT_LIMIT,
+            news_recency_weight=NEWS_RECENCY_WEIGHT,
+            half_life_days=RECENCY_HALF_LIFE_DAYS,
+            # 변형 검색 스레드에서도 st.* 메시지 표시
+            thread_init=(lambda: add_script_run_ctx(threading.current_thread(), script_ctx)) if script_ctx is not None else None,
+        )
 
-{context_text}
+    def service_search(query_text, source_type, limit, match_threshold, filters=None, date_range=None, recency_weight=None):
+        """검색 서비스로 시맨틱 검색 (결과 없음/오류 안내는 semantic_search와 같음)"""
+        try:
+            with span("service.search", source_type=source_type, query=query_text[:50]):
+                results = search_service.search(query_text, source_type, limit=limit, match_threshold=match_threshold,
+                                                filters=filters, date_range=date_range, recency_weight=recency_weight)
+        except Exception as e:
+            st.sidebar.warning(f"시맨틱 검색 실패: {str(e)}")
+            return []
+        if not results:
+            st.info(f"'{query_text}'에 대한 {source_type} 검색 결과가 없습니다.")
+        return results
 
-위 쇼핑 데이터를 바탕으로 다음 질문에 상세히 답변해주세요: 
-"{query}"
+    def semantic_search(query_text, source_type="블로그", limit=10, match_threshold=0.5, filters=None,
+                        date_range=None, recency_weight=None, query_embeddings=None):
+        """시맨틱 검색 수행 - 개선된 버전
 
-답변 작성 규칙:
-1. 한국어로 자연스럽게 답변해주세요.
-2. 상품의 가격, 기능, 특징 등을 객관적으로 설명하고 비교해주세요.
-3. 가격은 범위로 표현하고 정확한 가격이 있다면 언급해주세요. (예: "이 제품은 30,000원에서 50,000원 사이의 가격대를 형성하고 있습니다")
-4. 다양한 브랜드와 제품을 균형 있게 소개하고, 특정 상품을 지나치게 홍보하지 마세요.
-5. 상품의 특징을 비교할 때는 "A 제품은 X 기능이 있지만, B 제품은 Y 기능이 강조됩니다"와 같이 객관적으로 설명해주세요.
-6. 제공된 상품 정보만 사용하고, 문서에 없는 내용은 추측하거나 답변하지 마세요."""
+        filters (쇼핑만): {'price_min': 원, 'price_max': 원, 'malls': [판매처], 'brands': [브랜드]}
+        date_range (뉴스/블로그): (시작 epoch, 끝 epoch), 한쪽은 None 가능
+        조건은 유사도 계산 전에 패싯/시각 인덱스로 적용합니다.
+        recency_weight: 최신성 가중치 (None이면 뉴스는 NEWS_RECENCY_WEIGHT, 그 외 0)
+        query_embeddings: query_variants() 순서대로 미리 계산한 쿼리 임베딩 (없으면 여기서 생성)
 
-    else:
-        return f"""다음은 네이버 검색에서 수집한 데이터입니다:
+        검색어를 여러 형태로 늘려(query_variants) 한 번의 배치로 임베딩하고, 변형별 검색을 동시에 실행한 뒤
+        순위를 융합(RRF)합니다. 최신성 가중치는 변형 중 가장 높은 유사도와 섞습니다.
+        과정은 검색 서비스와 같은 search_pipeline.SearchPipeline이 처리합니다 (서비스에 연결되어 있으면 서비스가 처리).
+        """
+        if search_service is not None:
+            return service_search(query_text, source_type, limit, match_threshold, filters, date_range, recency_weight)
+        try:
+            if vector_index is not None:
+                refresh_vector_index()
+            results, empty_reason = search_pipeline().search(query_text, source_type, limit, match_threshold, filters,
+                                                             date_range, recency_weight, query_embeddings)
+        except Exception as e:
+            st.sidebar.warning(f"시맨틱 검색 실패: {str(e)}")
+            return []
+        if empty_reason == "embedding":
+            st.error("쿼리 임베딩 생성에 실패했습니다.")
+        elif empty_reason == "filter":
+            st.info("필터 조건에 맞는 문서가 없습니다.")
+        elif not results:
+            st.info(f"'{query_text}'에 대한 {source_type} 검색 결과가 없습니다.")
+        return results
 
-{context_text}
+    def format_context_entry(rank, result, content, source_type):
+        """검색 결과 한 건을 GPT 컨텍스트 문자열로 변환 (쇼핑은 가격 이력 포함)"""
+        return prompts.format_context_entry(rank, result, content, source_type, price_history)
 
-위 내용을 바탕으로 다음 질문에 상세히 답변해주세요: 
-"{query}"
+    def embed_passages(texts):
+        """MMR 중복 제거용 문서 임베딩 (배치 처리)"""
+        with EMBEDDING_SECONDS.time(kind="batch"):
+            return embedding_model.encode(texts, batch_size=32, convert_to_numpy=True, show_progress_bar=False)
 
-답변 작성 규칙:
-1. 한국어로 자연스럽게 답변해주세요.
-2. 제공된 문서 내용만 사용하여 사실에 기반한 답변을 작성해주세요.
-3. 문서에 없는 내용은 추측하거나 답변하지 마세요.
-4. 여러 문서 간에 상충되는 정보가 있다면 이를 언급해주세요.
-5. 답변에 적절한 정보가 부족하다면 솔직하게 말씀해주세요.
-6. 답변은 논리적인 구조로 정리하여 사용자가 이해하기 쉽게 작성해주세요.
-7. 필요한 경우 정보의 출처를 언급해주세요(예: "문서 2에 따르면...")."""
+    def answer_key(query, search_results, source_type, token_budget):
+        """같은 질문·같은 검색 결과면 같은 키 (동시 답변 생성 합치기용)"""
+        result_ids = tuple((r.get('id'), round(r.get('similarity', 0), 6)) for r in search_results)
+        return ("gpt.answer", query, source_type, token_budget, result_ids)
 
-def generate_answer_with_gpt(query, search_results, source_type):
-    """GPT-4o-mini를 사용하여 검색 결과에 기반한 답변 생성"""
-    try:
-        # 검색 결과가 없는 경우
-        if not search_results:
-            return f"죄송합니다. 입력하신 '{query}'에 대한 {source_type} 검색 결과를 찾을 수 없습니다. 다른 검색어나 다른 소스 타입으로 시도해보세요."
-            
-        # 검색 결과를 컨텍스트로 정리
-        contexts = []
-        for i, result in enumerate(search_results[:5]):  # 상위 5개 결과만 사용
-            content = result['content']
-            
-            # metadata 확인 (JSON 문자열일 경우 파싱)
-            metadata = result.get('metadata', {})
-            if isinstance(metadata, str):
-                try:
-                    metadata = json.loads(metadata)
-                except:
-                    metadata = {}
-                    
-            title = metadata.get('title', '제목 없음')
-            date = metadata.get('date', '')  # 날짜 정보가 있으면 추가
-            
-            # 날짜 정보가 있으면 포함
-            date_info = f" (작성일: {date})" if date else ""
-            
-            # 소스 타입에 맞는 추가 정보
-            if source_type == "블로그" and 'bloggername' in metadata:
-                source_info = f" - 블로거: {metadata['bloggername']}"
-            elif source_type == "뉴스" and 'publisher' in metadata:
-                source_info = f" - 출처: {metadata['publisher']}"
-            elif source_type == "쇼핑" and 'mallname' in metadata:
-                price_info = f", 가격: {metadata.get('lprice', '정보 없음')}원" if 'lprice' in metadata else ""
-                source_info = f" - 판매처: {metadata['mallname']}{price_info}"
-            else:
-                source_info = ""
-            
-            # 유사도 점수 추가
-            similarity = result.get('similarity', 0) * 100
-            similarity_info = f" (유사도: {similarity:.1f}%)"
-            
-            # 출처 타입과 함께 컨텍스트 추가
-            contexts.append(f"문서 {i+1} - [{source_type}] {title}{date_info}{source_info}{similarity_info}:\n{content}\n")
+    def generate_answer_with_gpt(query, search_results, source_type, token_budget=DEFAULT_TOKEN_BUDGET):
+        """GPT-4o-mini를 사용하여 검색 결과에 기반한 답변 생성"""
+        try:
+            # 검색 결과가 없는 경우
+            if not search_results:
+                return f"죄송합니다. 입력하신 '{query}'에 대한 {source_type} 검색 결과를 찾을 수 없습니다. 다른 검색어나 다른 소스 타입으로 시도해보세요."
         
-        context_text = "\n".join(contexts)
+            # 같은 답변을 다른 세션이 생성 중이면 그 결과를 함께 받음
+            return single_flight.do(
+                answer_key(query, search_results, source_type, token_budget),
+                compose_answer if search_service is None else service_answer, query, search_results, source_type, token_budget
+            )
         
+        except Exception as e:
+            st.error(f"GPT 답변 생성 중 오류 발생: {str(e)}")
+            return "답변 생성 중 오류가 발생했습니다."
+
+    def compose_answer(query, search_results, source_type, token_budget):
+        """컨텍스트 구성 + GPT 호출 (오류는 호출자에게 전달)"""
+        # 토큰 예산 안에서 중복 없는 문서로 컨텍스트 구성 (MMR)
+        with span("context.build", candidates=len(search_results), token_budget=token_budget) as context_span:
+            context_text, used_results, context_stats = build_context(
+                search_results,
+                lambda rank, result, content: format_context_entry(rank, result, content, source_type),
+                token_budget=token_budget,
+                embed_fn=embed_passages
+            )
+            context_span.set(documents=context_stats['documents'], context_tokens=context_stats['context_tokens'])
+    
         # 소스 타입에 맞는 프롬프트 생성
         system_prompt = get_system_prompt(source_type)
         user_prompt = get_user_prompt(query, context_text, source_type)
 
         # GPT-4o-mini로 답변 생성
-        response = openai_client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_prompt}
-            ],
-            temperature=0.3,  # 일관성 있는 답변을 위해 낮은 온도 설정
-            max_tokens=1000    # 충분한 답변 길이
+        answer, prompt_tokens, latency = call_gpt(system_prompt, user_prompt)
+        logger.info(
+            "answer source=%s docs=%d/%d truncated=%d context_tokens=%d prompt_tokens=%d latency=%.2fs",
+            source_type, context_stats['documents'], context_stats['candidates'], context_stats['truncated'],
+            context_stats['context_tokens'], prompt_tokens, latency
         )
+    
+        return answer
+
+    def service_answer(query, search_results, source_type, token_budget):
+        """검색 서비스 /answer 스트림을 끝까지 받아 답변 하나로"""
+        with span("service.answer", source_type=source_type, candidates=len(search_results)):
+            return "".join(search_service.answer_stream(query, source_type, search_results, token_budget=token_budget))
+
+    def call_gpt(system_prompt, user_prompt, max_tokens=1000):
+        """GPT-4o-mini 호출 + 토큰/지연 시간 기록 - (답변, 프롬프트 토큰 수, 지연 시간)"""
+        start_time = time.perf_counter()
+        with span("gpt.generate", model="gpt-4o-mini") as gpt_span:
+            response = openai_client.chat.completions.create(
+                model="gpt-4o-mini",
+                messages=[
+                    {"role": "system", "content": system_prompt},
+                    {"role": "user", "content": user_prompt}
+                ],
+                temperature=0.3,  # 일관성 있는 답변을 위해 낮은 온도 설정
+                max_tokens=max_tokens    # 충분한 답변 길이
+            )
+            latency = time.perf_counter() - start_time
         
-        return response.choices[0].message.content
-        
-    except Exception as e:
-        st.error(f"GPT 답변 생성 중 오류 발생: {str(e)}")
-        return "답변 생성 중 오류가 발생했습니다."
-
-# 메인 UI
-st.title("🛍️ 스마트 쇼핑 파인더: 네이버 검색 & AI 답변")
-st.write("똑똑한 쇼핑을 위한 맞춤형 검색! 네이버 쇼핑, 블로그, 뉴스 정보를 AI가 요약하고 답변해 드립니다.")
-
-# 검색 모드 선택 (사이드바)
-search_mode = st.sidebar.radio(
-    "검색 모드 선택",
-    options=["시맨틱 검색 (저장된 데이터)", "새 데이터 수집 및 저장"],
-    index=0
-)
-
-# --- 검색 소스 및 질문 입력 로직 ---
-source_options = ["쇼핑", "블로그", "뉴스"]  # 검색 소스 순서: 쇼핑 → 블로그 → 뉴스
-
-vape_questions = [
-    "가성비 좋은 전자담배 추천해 주세요.",
-    "전자담배 액상 추천해주세요.",
-    "입호흡과 폐호흡 전자담배 차이점이 뭐예요?"
-]
-
-default_queries_map = {
-    "쇼핑": vape_questions[0],  # 쇼핑 탭 기본 질문
-    "블로그": "전자담배 초보자가 알아야 할 꿀팁이 뭐가 있나요?",
-    "뉴스": "전자담배 관련 최신 규제나 이슈가 있나요?"
-}
-
-
-# 세션 상태 초기화 (앱 로드 시 한 번만 실행되도록)
-if "query_input" not in st.session_state:
-    # 앱 처음 로드 시 기본 소스("쇼핑")의 기본 질문으로 초기화
-    st.session_state.query_input = default_queries_map[source_options[0]]
-if "current_source_type" not in st.session_state:
-    st.session_state.current_source_type = source_options[0] # 초기 소스 타입은 "쇼핑"
-
-# 검색 소스 변경 시 호출될 콜백 함수
-def source_type_on_change():
-    # st.session_state.source_type_radio_key 는 radio 버튼의 현재 선택된 값
-    new_source_type = st.session_state.source_type_radio_key 
-    st.session_state.current_source_type = new_source_type
-    st.session_state.query_input = default_queries_map[new_source_type]
-    # 콜백 내에서 st.rerun()은 Streamlit이 자동으로 처리하므로 명시적으로 호출할 필요 없음
-
-# 검색 소스 선택 라디오 버튼
-selected_source_from_radio = st.radio(
-    "검색 소스 선택",
-    options=source_options,
-    index=source_options.index(st.session_state.current_source_type), # 현재 세션 상태의 인덱스 사용
-    horizontal=True,
-    key="source_type_radio_key", # on_change 콜백에서 이 키를 통해 값을 참조
-    on_change=source_type_on_change
-)
-# selected_source_from_radio는 현재 UI의 값. 실제 관리되는 상태는 st.session_state.current_source_type
-active_source_type = st.session_state.current_source_type
-
-# 검색 입력 필드 도움말 텍스트
-help_texts = {
-    "쇼핑": "전자담배 추천 질문을 클릭하거나 직접 검색어를 입력하세요. (예: 가성비 전자담배)",
-    "블로그": "블로그 관련 검색어를 입력하세요. (예: 전자담배 액상 추천, 입호흡 팁)",
-    "뉴스": "전자담배 관련 뉴스 키워드를 입력하세요. (예: 전자담배 규제, 건강 이슈)"
-}
-current_help_text = help_texts[active_source_type]
-
-# 검색어 입력창
-user_typed_query = st.text_input(
-    "질문 입력",
-    value=st.session_state.query_input, # 세션 상태의 값을 표시
-    help=current_help_text,
-    key="query_text_input_widget" # 위젯 자체의 키
-)
-# 사용자가 직접 입력한 경우, 세션 상태 업데이트
-if user_typed_query != st.session_state.query_input:
-    st.session_state.query_input = user_typed_query
-    # 이 업데이트는 다음 rerun 시 반영됨 (타이핑 중 계속 rerun 방지)
-
-# "쇼핑" 탭일 때 전자담배 추천 질문 버튼 표시
-if active_source_type == "쇼핑":
-    st.markdown("👇 **전자담배 관련 추천 질문을 선택해보세요!**")
-    cols = st.columns(len(vape_questions))
-    for i, q_text in enumerate(vape_questions):
-        if cols[i].button(q_text, key=f"vape_q_btn_{i}"):
-            st.session_state.query_input = q_text  # 세션 상태 업데이트
-            st.rerun()  # 버튼 클릭 시 텍스트 입력 필드를 즉시 업데이트하고 UI를 새로고침
-
-# 최종적으로 사용할 쿼리는 st.session_state.query_input
-query_to_use_in_search = st.session_state.query_input
-
-# 원본 검색 결과 표시 옵션
-show_raw_results = st.sidebar.checkbox("원본 검색 결과 표시", value=True)
-
-# 검색 결과 수 및 유사도 설정
-if search_mode == "시맨틱 검색 (저장된 데이터)":
-    col1, col2 = st.sidebar.columns(2)
-    with col1:
-        result_count = st.slider("검색 결과 수", min_value=3, max_value=20, value=10)
-    with col2:
-        similarity_threshold = st.slider("유사도 임계값", min_value=0.0, max_value=1.0, value=0.4, step=0.05)
-else:
-    result_count = st.sidebar.slider("검색 결과 수", min_value=5, max_value=50, value=20)
-
-# 검색 버튼
-search_button_text = "시맨틱 검색" if search_mode == "시맨틱 검색 (저장된 데이터)" else "데이터 수집 및 저장"
-if st.button(f"{active_source_type}에서 {search_button_text}", key="search_button"):
-    if query_to_use_in_search:
-        if search_mode == "시맨틱 검색 (저장된 데이터)":
-            with st.spinner(f"{active_source_type} 시맨틱 검색 중..."):
+            # 프롬프트 토큰 수와 지연 시간 기록
+            usage = getattr(response, 'usage', None)
+            prompt_tokens = getattr(usage, 'prompt_tokens', None) or (count_tokens(system_prompt) + count_tokens(user_prompt))
+            completion_tokens = getattr(usage, 'completion_tokens', None) or 0
+            gpt_span.set(prompt_tokens=prompt_tokens, completion_tokens=completion_tokens)
+            GPT_SECONDS.observe(latency, model="gpt-4o-mini")
+            GPT_TOKENS.inc(prompt_tokens, model="gpt-4o-mini", kind="prompt")
+            GPT_TOKENS.inc(completion_tokens, model="gpt-4o-mini", kind="completion")
+        return response.choices[0].message.content, prompt_tokens, latency
+
+    # 전체 소스 동시 검색 - 쿼리 임베딩은 한 번에, 소스별 검색+답변은 스레드 풀에서 동시에
+    MULTI_SOURCE_TYPES = ("쇼핑", "블로그", "뉴스")
+    MULTI_SOURCE_WORKERS = int(os.environ.get("MULTI_SOURCE_WORKERS", "6"))
+
+    @st.cache_resource
+    def get_search_executor():
+        """세션들이 함께 쓰는 검색/답변 스레드 풀"""
+        return ThreadPoolExecutor(max_workers=MULTI_SOURCE_WORKERS, thread_name_prefix="multi-source")
+
+    def multi_source_answers(query_text, source_types=MULTI_SOURCE_TYPES, limit=10, match_threshold=0.4,
+                             token_budget=DEFAULT_TOKEN_BUDGET, executor=None):
+        """소스별 (소스 타입, 검색 결과, 답변)을 끝나는 순서대로 반환 (전체 시간 ≈ 가장 느린 소스 하나)"""
+        if search_service is not None:
+            embeddings = [None] * len(source_types)   # 검색어 임베딩도 서비스가 처리
+        else:
+            variants = [[text for _, text, _ in query_variants(query_text, source_type)] for source_type in source_types]
+            processed = [text for texts in variants for text in texts]
+            with span("embedding.query", source_type="전체", queries=len(processed)):
+                flat = single_flight.do(("embedding.queries", tuple(processed)), generate_embeddings, processed, True)
+            # 소스별 변형 개수만큼 다시 나누기
+            embeddings, start = [], 0
+            for texts in variants:
+                embeddings.append(flat[start:start + len(texts)])
+                start += len(texts)
+        script_ctx = get_script_run_ctx() if get_script_run_ctx else None
+
+        def run(source_type, query_embedding):
+            if script_ctx is not None:
+                add_script_run_ctx(threading.current_thread(), script_ctx)  # 작업 스레드에서도 st.* 메시지 표시
+            results = semantic_search(query_text, source_type=source_type, limit=limit, match_threshold=match_threshold,
+                                      query_embeddings=query_embedding)
+            answer = generate_answer_with_gpt(query_text, results, source_type, token_budget=token_budget) if results else None
+            return source_type, results, answer
+
+        executor = executor or get_search_executor()
+        # 스팬이 현재 trace에 붙도록 contextvars를 복사해서 실행
+        futures = [executor.submit(contextvars.copy_context().run, run, source_type, query_embedding)
+                   for source_type, query_embedding in zip(source_types, embeddings)]
+        for future in as_completed(futures):
+            yield future.result()
+
+    def merge_answers(query, answers):
+        """소스별 답변 {소스 타입: 답변}을 하나의 답변으로 종합"""
+        sections = "\n\n".join(f"[{source_type} 기반 답변]\n{answer}" for source_type, answer in answers.items() if answer)
+        if not sections:
+            return None
+        system_prompt = """당신은 네이버 쇼핑/블로그/뉴스 데이터를 각각 요약한 답변을 종합하는 도우미입니다.
+상품 정보(쇼핑), 사용 경험(블로그), 규제·이슈(뉴스)를 구분해 한 번에 읽기 좋게 정리하고, 서로 다른 내용은 출처를 밝혀 함께 제시하세요.
+주어진 답변에 없는 내용은 추측하지 마세요."""
+        user_prompt = f"질문: {query}\n\n{sections}\n\n위 답변들을 종합해 질문에 답해 주세요."
+        with span("answer.merge", sources=len(answers)):
+            answer, _, _ = call_gpt(system_prompt, user_prompt)
+        return answer
+
+    def render_search_results(results, source_type):
+        """검색 결과 원본 목록 (제목/유사도 expander)"""
+        for i, result in enumerate(results):
+            similarity = result['similarity'] * 100
+            metadata = parse_metadata(result.get('metadata'))
+            title = metadata.get('title', '제목 없음')
+            url = metadata.get('url', None)
+            with st.expander(f"{i+1}. {title} (유사도: {similarity:.2f}%)"):
+                st.write(f"**내용:** {result['content']}")
+                meta_col1, meta_col2 = st.columns(2)
+                with meta_col1:
+                    if source_type == "블로그" and 'bloggername' in metadata: st.write(f"**블로거:** {metadata['bloggername']}")
+                    elif source_type == "뉴스" and 'publisher' in metadata: st.write(f"**언론사:** {metadata['publisher']}")
+                    elif source_type == "쇼핑" and 'maker' in metadata: st.write(f"**제조사:** {metadata['maker']}")
+                    elif source_type == "쇼핑" and 'brand' in metadata: st.write(f"**브랜드:** {metadata['brand']}")
+                    if 'date' in metadata: st.write(f"**날짜:** {metadata['date']}")
+                with meta_col2:
+                    if url: st.markdown(f"**링크:** [원본 보기]({url})")
+                    if source_type == "쇼핑":
+                        if 'lprice' in metadata: st.write(f"**최저가:** {metadata['lprice']}원")
+                        if 'mallname' in metadata: st.write(f"**판매처:** {metadata['mallname']}")
+
+    # 메인 UI
+    st.title("🛍️ 스마트 쇼핑 파인더: 네이버 검색 & AI 답변")
+    st.write("똑똑한 쇼핑을 위한 맞춤형 검색! 네이버 쇼핑, 블로그, 뉴스 정보를 AI가 요약하고 답변해 드립니다.")
+
+    # 검색 모드 선택 (사이드바)
+    search_mode = st.sidebar.radio(
+        "검색 모드 선택",
+        options=["시맨틱 검색 (저장된 데이터)", "새 데이터 수집 및 저장"],
+        index=0
+    )
+
+    # --- 검색 소스 및 질문 입력 로직 ---
+    source_options = ["쇼핑", "블로그", "뉴스"]  # 검색 소스 순서: 쇼핑 → 블로그 → 뉴스
+
+    vape_questions = [
+        "가성비 좋은 전자담배 추천해 주세요.",
+        "전자담배 액상 추천해주세요.",
+        "입호흡과 폐호흡 전자담배 차이점이 뭐예요?"
+    ]
+
+    default_queries_map = {
+        "쇼핑": vape_questions[0],  # 쇼핑 탭 기본 질문
+        "블로그": "전자담배 초보자가 알아야 할 꿀팁이 뭐가 있나요?",
+        "뉴스": "전자담배 관련 최신 규제나 이슈가 있나요?"
+    }
+
+    # 미리 계산된 답변 - 프리셋/자주 묻는 질문을 기본 검색 조건으로 미리 계산해 코퍼스 버전별로 저장
+    ANSWER_WARMUP = os.environ.get("ANSWER_WARMUP", "1") == "1"
+    DEFAULT_RESULT_COUNT = 10
+    DEFAULT_SIMILARITY_THRESHOLD = 0.4
+
+    @st.cache_resource
+    def get_answer_store():
+        """프로세스 공용 답변 저장소"""
+        return AnswerStore()
+
+    @st.cache_resource
+    def get_query_log():
+        """프로세스 공용 질문 기록"""
+        return QueryLog()
+
+    answer_store = get_answer_store()
+    query_log = get_query_log()
+
+    @st.cache_data(ttl=30, show_spinner=False)
+    def cached_corpus_version():
+        """현재 코퍼스 버전 (30초 캐시 - 클릭마다 DB를 조회하지 않도록)"""
+        return corpus_version(document_store, current_embedding_version)
+
+    def search_params(source_type, limit, match_threshold, token_budget, filters=None, date_range=None, recency_weight=None):
+        """답변 저장 키에 들어가는 검색 조건 (기본값을 채워 같은 조건이면 같은 키)"""
+        if recency_weight is None:
+            recency_weight = NEWS_RECENCY_WEIGHT if source_type == "뉴스" else 0.0
+        filters = {k: v for k, v in (filters or {}).items() if v} or None
+        return {"limit": limit, "match_threshold": match_threshold, "token_budget": token_budget,
+                "filters": filters, "date_range": date_range, "recency_weight": recency_weight}
+
+    def compute_answer(query, source_type, limit, match_threshold, token_budget, filters=None, date_range=None, recency_weight=None):
+        """검색 + 답변 생성 - (검색 결과, 답변)"""
+        results = semantic_search(query, source_type=source_type, limit=limit, match_threshold=match_threshold,
+                                  filters=filters, date_range=date_range, recency_weight=recency_weight)
+        if not results:
+            return results, None
+        return results, generate_answer_with_gpt(query, results, source_type, token_budget=token_budget)
+
+    def warmup_jobs():
+        """프리셋 질문 + 질문 기록 상위 질문 (기본 검색 조건)"""
+        presets = [("쇼핑", q) for q in vape_questions] + list(default_queries_map.items())
+        logged = [(source_type, q) for source_type, q in query_log.top() if source_type in source_options]
+        jobs, seen = [], set()
+        for source_type, query in presets + logged:
+            params = search_params(source_type, DEFAULT_RESULT_COUNT, DEFAULT_SIMILARITY_THRESHOLD, DEFAULT_TOKEN_BUDGET)
+            key = stored_answer_key(source_type, query, **params)
+            if key not in seen:
+                seen.add(key)
+                jobs.append((key, {"query": query, "source_type": source_type, **params}))
+        return jobs
+
+    @st.cache_resource
+    def start_warmup_worker():
+        """시작 시(배포) 한 번, 이후 코퍼스 버전이 바뀔 때마다 미리 계산 (프로세스당 스레드 하나)"""
+        if not ANSWER_WARMUP:
+            return None
+        return WarmupWorker(answer_store, lambda: corpus_version(document_store, current_embedding_version),
+                            warmup_jobs, compute_answer).start()
+
+    warmup_worker = start_warmup_worker()
+
+    # 수집 작업 큐 - 화면은 등록/상태 조회만, 수집·임베딩·저장은 작업 스레드가 처리
+    @st.cache_resource
+    def get_job_queue():
+        """프로세스 공용 작업 큐 (SQLite 파일은 다른 프로세스와 공유)"""
+        return JobQueue()
+
+    job_queue = get_job_queue()
+
+    def collect_dedup_key(source_type, query, kind="collect"):
+        """같은 소스/검색어의 진행 중 수집 작업은 하나만"""
+        return dedup_key(kind, source_type, query)
+
+    # 증분 갱신 - 저장된 URL Bloom 필터와 검색어별 high-water mark는 프로세스 공용 (refresh.py CLI와 같은 파일)
+    @st.cache_resource
+    def get_refresh_state():
+        return refresh.UrlBloom.load(refresh.URL_BLOOM_PATH), refresh.RefreshState(refresh.REFRESH_STATE_PATH)
+
+    url_bloom, refresh_state = get_refresh_state()
+
+    def job_saved(summary):
+        """수집/갱신 작업이 새 문서를 저장한 뒤"""
+        if vector_index is not None:
+            vector_index.refreshed_at = 0   # 다음 검색에서 방금 저장한 문서 반영
+        if warmup_worker is not None:
+            warmup_worker.wake()  # 코퍼스가 바뀌었으니 미리 계산된 답변 갱신
+
+    def collect_jobs():
+        """이 화면의 모델/저장소/캐시로 만든 공용 수집 작업 (검색 서비스와 같은 collect_jobs.CollectJobs, 값은 호출할 때의 것)"""
+        return CollectJobs(embedding_model, embedding_model_name, document_store, (NAVER_CLIENT_ID, NAVER_CLIENT_SECRET),
+                           url_bloom, refresh_state, naver_cache=naver_cache, single_flight=single_flight,
+                           base_url=NAVER_API_BASE_URL, projection=embedding_projection, prices=price_history,
+                           on_saved=job_saved)
+
+    def run_collect_job(params, report):
+        """수집 작업: 네이버 페이지 수집 → 묶음 임베딩 → 묶음 저장 (ingest 파이프라인)"""
+        return collect_jobs().collect(params, report)
+
+    def run_refresh_job(params, report):
+        """갱신 작업: sort=date로 새 글만 가져오다 이미 저장된 글을 만나면 멈춤"""
+        return collect_jobs().refresh(params, report)
+
+    @st.cache_resource
+    def start_job_workers():
+        """작업 스레드 시작 (JOB_WORKERS=0이거나 검색 서비스를 쓰면 다른 프로세스가 처리)"""
+        if JOB_WORKERS <= 0 or search_service is not None:
+            return None
+        return JobWorkers(job_queue, {"collect": run_collect_job, "refresh": run_refresh_job}).start()
+
+    job_workers = start_job_workers()
+
+    def render_job(job):
+        """작업 한 건의 상태/진행률"""
+        params, progress = job["params"], job["progress"] or {}
+        label = f"#{job['id']} {params['source_type']} · {params['query']}" + (" (새 글만)" if job["kind"] == "refresh" else "")
+        if job["status"] == "queued":
+            st.write(f"⏳ {label} — 대기 중")
+        elif job["status"] == "running":
+            target = max(progress.get("target") or params.get("count") or 1, 1)
+            st.progress(min(progress.get("items", 0) / target, 1.0),
+                        text=f"🔄 {label} — {progress.get('stage', '실행 중')} (수집 {progress.get('items', 0)}건, 저장 {progress.get('saved', 0)}건)")
+        elif job["status"] == "done":
+            result = job["result"] or {}
+            st.write(f"✅ {label} — 수집 {result.get('items', 0)}건, 새로 저장 {result.get('saved', 0)}건, 중복 {result.get('duplicates', 0)}건")
+        else:
+            st.write(f"❌ {label} — 실패: {job['error']}")
+
+    def render_job_status():
+        """최근 수집 작업 목록 (진행 중인 작업이 있으면 주기적으로 새로 고침)"""
+        jobs = job_queue.recent(limit=8) if search_service is None else search_service.jobs(limit=8)
+        if not jobs:
+            st.caption("등록된 수집 작업이 없습니다.")
+        for job in jobs:
+            render_job(job)
+
+    # st.fragment가 있으면 작업 목록만 2초마다 다시 그림 (화면 전체는 그대로)
+    if hasattr(st, "fragment"):
+        render_job_status = st.fragment(run_every=2)(render_job_status)
+
+
+    # 세션 상태 초기화 (앱 로드 시 한 번만 실행되도록)
+    if "query_input" not in st.session_state:
+        # 앱 처음 로드 시 기본 소스("쇼핑")의 기본 질문으로 초기화
+        st.session_state.query_input = default_queries_map[source_options[0]]
+    if "current_source_type" not in st.session_state:
+        st.session_state.current_source_type = source_options[0] # 초기 소스 타입은 "쇼핑"
+
+    # 검색 소스 변경 시 호출될 콜백 함수
+    def source_type_on_change():
+        # st.session_state.source_type_radio_key 는 radio 버튼의 현재 선택된 값
+        new_source_type = st.session_state.source_type_radio_key 
+        st.session_state.current_source_type = new_source_type
+        st.session_state.query_input = default_queries_map[new_source_type]
+        # 콜백 내에서 st.rerun()은 Streamlit이 자동으로 처리하므로 명시적으로 호출할 필요 없음
+
+    # 검색 소스 선택 라디오 버튼
+    selected_source_from_radio = st.radio(
+        "검색 소스 선택",
+        options=source_options,
+        index=source_options.index(st.session_state.current_source_type), # 현재 세션 상태의 인덱스 사용
+        horizontal=True,
+        key="source_type_radio_key", # on_change 콜백에서 이 키를 통해 값을 참조
+        on_change=source_type_on_change
+    )
+    # selected_source_from_radio는 현재 UI의 값. 실제 관리되는 상태는 st.session_state.current_source_type
+    active_source_type = st.session_state.current_source_type
+
+    # 검색 입력 필드 도움말 텍스트
+    help_texts = {
+        "쇼핑": "전자담배 추천 질문을 클릭하거나 직접 검색어를 입력하세요. (예: 가성비 전자담배)",
+        "블로그": "블로그 관련 검색어를 입력하세요. (예: 전자담배 액상 추천, 입호흡 팁)",
+        "뉴스": "전자담배 관련 뉴스 키워드를 입력하세요. (예: 전자담배 규제, 건강 이슈)"
+    }
+    current_help_text = help_texts[active_source_type]
+
+    # 검색어 입력창
+    user_typed_query = st.text_input(
+        "질문 입력",
+        value=st.session_state.query_input, # 세션 상태의 값을 표시
+        help=current_help_text,
+        key="query_text_input_widget" # 위젯 자체의 키
+    )
+    # 사용자가 직접 입력한 경우, 세션 상태 업데이트
+    if user_typed_query != st.session_state.query_input:
+        st.session_state.query_input = user_typed_query
+        # 이 업데이트는 다음 rerun 시 반영됨 (타이핑 중 계속 rerun 방지)
+
+    # "쇼핑" 탭일 때 전자담배 추천 질문 버튼 표시
+    if active_source_type == "쇼핑":
+        st.markdown("👇 **전자담배 관련 추천 질문을 선택해보세요!**")
+        cols = st.columns(len(vape_questions))
+        for i, q_text in enumerate(vape_questions):
+            if cols[i].button(q_text, key=f"vape_q_btn_{i}"):
+                st.session_state.query_input = q_text  # 세션 상태 업데이트
+                st.session_state.auto_search = True    # 새로고침 후 바로 검색 (미리 계산된 답변이 있으면 즉시 표시)
+                st.rerun()  # 버튼 클릭 시 텍스트 입력 필드를 즉시 업데이트하고 UI를 새로고침
+
+    # 최종적으로 사용할 쿼리는 st.session_state.query_input
+    query_to_use_in_search = st.session_state.query_input
+
+    # 원본 검색 결과 표시 옵션
+    show_raw_results = st.sidebar.checkbox("원본 검색 결과 표시", value=True)
+
+    # 검색 결과 수 및 유사도 설정
+    if search_mode == "시맨틱 검색 (저장된 데이터)":
+        col1, col2 = st.sidebar.columns(2)
+        with col1:
+            result_count = st.slider("검색 결과 수", min_value=3, max_value=20, value=10)
+        with col2:
+            similarity_threshold = st.slider("유사도 임계값", min_value=0.0, max_value=1.0, value=0.4, step=0.05)
+    else:
+        result_count = st.sidebar.slider("검색 결과 수", min_value=5, max_value=50, value=20)
+
+    # 쇼핑 필터 (시맨틱 검색 전에 패싯 인덱스로 적용)
+    search_filters = None
+    if search_mode == "시맨틱 검색 (저장된 데이터)" and active_source_type == "쇼핑":
+        with st.sidebar.expander("쇼핑 필터 (가격/판매처/브랜드)"):
+            try:
+                facets_now = refresh_facet_index()
+                low, high = facets_now.price_bounds()
+                mall_options = [label for label, _ in facets_now.top_values("mall")]
+                brand_options = [label for label, _ in facets_now.top_values("brand")]
+            except Exception as e:
+                st.warning(f"패싯 인덱스 갱신 실패: {str(e)}")
+                low, high, mall_options, brand_options = 0, 0, [], []
+            price_col1, price_col2 = st.columns(2)
+            filter_price_min = price_col1.number_input("최저가(원)", min_value=0, value=0, step=1000)
+            filter_price_max = price_col2.number_input("최고가(원)", min_value=0, value=0, step=1000,
+                                                       help=f"0이면 제한 없음 (저장된 상품 가격: {low:,}~{high:,}원)")
+            filter_malls = st.multiselect("판매처", mall_options)
+            filter_brands = st.multiselect("브랜드", brand_options)
+        search_filters = {
+            "price_min": filter_price_min or None,
+            "price_max": filter_price_max or None,
+            "malls": filter_malls,
+            "brands": filter_brands,
+        }
+
+    # 기간 필터 / 최신성 가중치 (뉴스/블로그)
+    search_date_range = None
+    search_recency_weight = None
+    if search_mode == "시맨틱 검색 (저장된 데이터)" and active_source_type in TIME_INDEXED_SOURCES:
+        with st.sidebar.expander("기간 / 최신성"):
+            use_date_range = st.checkbox("기간 지정", value=False)
+            if use_date_range:
+                today = datetime.now().date()
+                date_from = st.date_input("시작일", value=today - timedelta(days=30))
+                date_to = st.date_input("종료일", value=today)
+                search_date_range = (int(datetime.combine(date_from, datetime.min.time()).timestamp()),
+                                     int(datetime.combine(date_to, datetime.max.time()).timestamp()))
+            search_recency_weight = st.slider("최신성 가중치", min_value=0.0, max_value=1.0, step=0.05,
+                                              value=NEWS_RECENCY_WEIGHT if active_source_type == "뉴스" else 0.0,
+                                              help=f"0이면 유사도만 사용합니다. 게시 후 {RECENCY_HALF_LIFE_DAYS:g}일이 지나면 최신성 점수가 절반이 됩니다.")
+
+    # AI 답변에 사용할 컨텍스트 토큰 예산
+    context_token_budget = st.sidebar.slider("컨텍스트 토큰 예산", min_value=500, max_value=8000, value=DEFAULT_TOKEN_BUDGET, step=250,
+                                             help="AI 답변 생성 시 참고 문서에 사용할 최대 토큰 수입니다. 예산 안에서 중복되지 않는 문서를 최대한 많이 포함합니다.")
+
+    # 전체 소스 동시 검색 (시맨틱 검색에서만)
+    search_all_sources = merge_all_answers = False
+    if search_mode == "시맨틱 검색 (저장된 데이터)":
+        search_all_sources = st.sidebar.checkbox("전체 소스 동시 검색 (쇼핑/블로그/뉴스)", value=False,
+                                                 help="세 소스를 한 번에 검색하고 답변을 탭으로 보여줍니다. 소스별 검색과 답변 생성은 동시에 실행됩니다.")
+        if search_all_sources:
+            merge_all_answers = st.sidebar.checkbox("통합 답변 생성", value=True)
+
+    # 새 글만 갱신 (수집 모드에서만)
+    refresh_only = False
+    if search_mode == "새 데이터 수집 및 저장":
+        refresh_only = st.sidebar.checkbox("새 글만 가져오기 (증분 갱신)", value=False,
+                                           help="최신순으로 가져오다 이미 저장된 글을 만나면 멈춥니다. 전에 수집한 검색어를 다시 갱신할 때 요청 수가 크게 줄어듭니다.")
+
+    # 검색 버튼
+    search_button_text = "시맨틱 검색" if search_mode == "시맨틱 검색 (저장된 데이터)" else "데이터 수집 및 저장"
+    search_scope = "전체 소스" if search_all_sources else active_source_type
+    auto_search = st.session_state.pop("auto_search", False) and search_mode == "시맨틱 검색 (저장된 데이터)"
+    if st.button(f"{search_scope}에서 {search_button_text}", key="search_button") or auto_search:
+        if debug_trace is not None:
+            debug_trace.name = f"{search_button_text}: {search_scope} / {query_to_use_in_search}"
+        if query_to_use_in_search:
+            query_log.append(search_scope, query_to_use_in_search)
+            if search_mode == "시맨틱 검색 (저장된 데이터)" and search_all_sources:
+                # 소스별 탭 - 끝나는 순서대로 채움
+                tab_names = list(MULTI_SOURCE_TYPES) + (["통합 답변"] if merge_all_answers else [])
+                tabs = dict(zip(tab_names, st.tabs(tab_names)))
+                placeholders = {}
+                for source_type in MULTI_SOURCE_TYPES:
+                    with tabs[source_type]:
+                        placeholders[source_type] = st.empty()
+                        placeholders[source_type].info(f"{source_type} 검색 및 답변 생성 중...")
+                answers = {}
                 try:
-                    results = semantic_search(query_to_use_in_search, source_type=active_source_type, limit=result_count, match_threshold=similarity_threshold)
-                    
-                    if results:
-                        st.success(f"{len(results)}개의 {active_source_type} 결과를 찾았습니다.")
-                        with st.spinner("AI 에이전트 답변 생성 중..."):
-                            gpt_answer = generate_answer_with_gpt(query_to_use_in_search, results, active_source_type)
-                            st.markdown(f"## AI 답변 ({active_source_type} 데이터 기반)")
-                            st.markdown(gpt_answer)
-                            st.markdown("---")
-                        
-                        if show_raw_results:
-                            st.markdown(f"## {active_source_type} 검색 결과 원본")
-                            for i, result in enumerate(results):
-                                similarity = result['similarity'] * 100
-                                metadata = result.get('metadata', {})
-                                if isinstance(metadata, str):
-                                    try: metadata = json.loads(metadata)
-                                    except: metadata = {}
-                                title = metadata.get('title', '제목 없음')
-                                url = metadata.get('url', None)
-                                with st.expander(f"{i+1}. {title} (유사도: {similarity:.2f}%)"):
-                                    st.write(f"**내용:** {result['content']}")
-                                    meta_col1, meta_col2 = st.columns(2)
-                                    with meta_col1:
-                                        if active_source_type == "블로그" and 'bloggername' in metadata: st.write(f"**블로거:** {metadata['bloggername']}")
-                                        elif active_source_type == "뉴스" and 'publisher' in metadata: st.write(f"**언론사:** {metadata['publisher']}")
-                                        elif active_source_type == "쇼핑" and 'maker' in metadata: st.write(f"**제조사:** {metadata['maker']}")
-                                        elif active_source_type == "쇼핑" and 'brand' in metadata: st.write(f"**브랜드:** {metadata['brand']}")
-                                        if 'date' in metadata: st.write(f"**날짜:** {metadata['date']}")
-                                    with meta_col2:
-                                        if url: st.markdown(f"**링크:** [원본 보기]({url})")
-                                        if active_source_type == "쇼핑":
-                                            if 'lprice' in metadata: st.write(f"**최저가:** {metadata['lprice']}원")
-                                            if 'mallname' in metadata: st.write(f"**판매처:** {metadata['mallname']}")
-                    else:
-                        st.warning(f"{active_source_type}에서 검색 결과가 없습니다. 새 데이터를 수집하거나 다른 검색어를 시도해보세요.")
-                        st.info("💡 팁: 유사도 임계값을 더 낮추거나, 다른 검색어로 시도해보세요.")
+                    for source_type, results, gpt_answer in multi_source_answers(
+                            query_to_use_in_search, MULTI_SOURCE_TYPES, limit=result_count,
+                            match_threshold=similarity_threshold, token_budget=context_token_budget):
+                        answers[source_type] = gpt_answer
+                        with placeholders[source_type].container():
+                            if results:
+                                st.success(f"{len(results)}개의 {source_type} 결과를 찾았습니다.")
+                                st.markdown(f"## AI 답변 ({source_type} 데이터 기반)")
+                                st.markdown(gpt_answer)
+                                if show_raw_results:
+                                    st.markdown("---")
+                                    st.markdown(f"## {source_type} 검색 결과 원본")
+                                    render_search_results(results, source_type)
+                            else:
+                                st.warning(f"{source_type}에서 검색 결과가 없습니다.")
+                    if merge_all_answers:
+                        with tabs["통합 답변"]:
+                            with st.spinner("통합 답변 생성 중..."):
+                                merged_answer = merge_answers(query_to_use_in_search, answers)
+                            st.markdown(merged_answer or "통합할 답변이 없습니다. 검색어나 유사도 임계값을 바꿔 보세요.")
                 except Exception as e:
                     st.error(f"검색 중 오류가 발생했습니다: {str(e)}")
         
-        else: # 새 데이터 수집 및 저장 모드
-            with st.spinner(f"네이버 {active_source_type} API 검색 및 데이터 저장 중..."):
-                try:
-                    items, total_count, saved_count = search_naver_api(query_to_use_in_search, active_source_type, result_count)
+            elif search_mode == "시맨틱 검색 (저장된 데이터)":
+                with st.spinner(f"{active_source_type} 시맨틱 검색 중..."):
+                    try:
+                        params = search_params(active_source_type, result_count, similarity_threshold, context_token_budget,
+                                               search_filters, search_date_range, search_recency_weight)
+                        stored_key = stored_answer_key(active_source_type, query_to_use_in_search, **params)
+                        try:
+                            version = cached_corpus_version()
+                            stored = answer_store.get(version, stored_key)
+                        except Exception as e:
+                            logger.warning("미리 계산된 답변 조회 실패: %s", e)
+                            version, stored = None, None
                     
-                    if items:
-                        st.success(f"네이버 {active_source_type}에서 총 {total_count}개 중 {len(items)}개의 결과를 찾았고, {saved_count}개를 새로 저장했습니다.")
-                        with st.spinner("저장된 데이터로 시맨틱 검색 중..."):
-                            time.sleep(5)
-                            results = semantic_search(query_to_use_in_search, source_type=active_source_type, limit=result_count, match_threshold=0.3)
-                            if results:
+                        if stored is not None:
+                            results, gpt_answer = stored
+                        else:
+                            results = semantic_search(query_to_use_in_search, source_type=active_source_type, **{k: v for k, v in params.items() if k != "token_budget"})
+                            gpt_answer = None
+                    
+                        if results:
+                            st.success(f"{len(results)}개의 {active_source_type} 결과를 찾았습니다.")
+                            if stored is not None:
+                                st.caption("⚡ 미리 계산된 답변입니다 (현재 저장 데이터 기준).")
+                            elif search_service is None or not hasattr(st, "write_stream"):
                                 with st.spinner("AI 에이전트 답변 생성 중..."):
-                                    gpt_answer = generate_answer_with_gpt(query_to_use_in_search, results, active_source_type)
-                                    st.markdown(f"## AI 답변 ({active_source_type} 데이터 기반)")
-                                    st.markdown(gpt_answer)
-                                    st.markdown("---")
+                                    gpt_answer = generate_answer_with_gpt(query_to_use_in_search, results, active_source_type, token_budget=context_token_budget)
+                            st.markdown(f"## AI 답변 ({active_source_type} 데이터 기반)")
+                            if gpt_answer is None:
+                                # 검색 서비스가 생성하는 대로 답변 표시
+                                gpt_answer = st.write_stream(search_service.answer_stream(
+                                    query_to_use_in_search, active_source_type, results, token_budget=context_token_budget))
                             else:
-                                st.warning("데이터는 저장되었지만 시맨틱 검색에서 관련 결과를 찾지 못했습니다. 잠시 후 다시 시도해 보세요.")
-                                st.info("💡 새로 저장된 데이터의 임베딩 처리가 완료될 때까지 몇 분 정도 소요될 수 있습니다.")
+                                st.markdown(gpt_answer)
+                            if stored is None and version is not None:
+                                answer_store.put(version, stored_key, results, gpt_answer)
+                            st.markdown("---")
                         
-                        if show_raw_results:
-                            st.markdown(f"## 네이버 {active_source_type} 검색 결과")
-                            df_data = []
-                            for i, item in enumerate(items):
-                                try:
-                                    title = re.sub('<[^<]+?>', '', item.get('title', '')) if item.get('title') else '제목 없음'
-                                    if active_source_type == "블로그":
-                                        description = re.sub('<[^<]+?>', '', item.get('description', '')) if item.get('description') else ''
-                                        df_data.append({'제목': title, '내용 미리보기': description[:100] + "..." if len(description) > 100 else description, '블로거': item.get('bloggername', ''), '날짜': item.get('postdate', ''), '링크': item.get('link', '')})
-                                    elif active_source_type == "뉴스":
-                                        description = re.sub('<[^<]+?>', '', item.get('description', '')) if item.get('description') else ''
-                                        df_data.append({'제목': title, '내용 미리보기': description[:100] + "..." if len(description) > 100 else description, '언론사': item.get('originallink', '').replace('https://', '').replace('http://', '').split('/')[0] if item.get('originallink') else '', '날짜': item.get('pubDate', ''), '링크': item.get('link', '')})
-                                    elif active_source_type == "쇼핑":
-                                        price_display = f"{item.get('lprice', '')}원" if item.get('lprice') else '가격 정보 없음'
-                                        df_data.append({'제품명': title, '가격': price_display, '판매처': item.get('mallName', ''), '제조사': item.get('maker', ''), '링크': item.get('link', '')})
-                                except Exception as e:
-                                    st.warning(f"항목 {i+1} 처리 중 오류: {str(e)}")
-                                    continue
-                            if df_data:
-                                df = pd.DataFrame(df_data)
-                                st.dataframe(df, use_container_width=True)
-                                for i, item in enumerate(items):
-                                    try:
-                                        title = re.sub('<[^<]+?>', '', item.get('title', '')) if item.get('title') else '제목 없음'
-                                        with st.expander(f"{i+1}. {title}"):
-                                            if active_source_type in ["블로그", "뉴스"]:
-                                                description = re.sub('<[^<]+?>', '', item.get('description', '')) if item.get('description') else ''
-                                                if description: st.write(f"**내용:** {description}")
-                                            meta_col1, meta_col2 = st.columns(2)
-                                            with meta_col1:
-                                                if active_source_type == "블로그":
-                                                    if item.get('bloggername'): st.write(f"**블로거:** {item.get('bloggername')}")
-                                                    if item.get('postdate'): st.write(f"**날짜:** {item.get('postdate')}")
-                                                elif active_source_type == "뉴스":
-                                                    if item.get('originallink'): publisher = item.get('originallink', '').replace('https://', '').replace('http://', '').split('/')[0]; st.write(f"**언론사:** {publisher}")
-                                                    if item.get('pubDate'): st.write(f"**날짜:** {item.get('pubDate')}")
-                                                elif active_source_type == "쇼핑":
-                                                    if item.get('maker'): st.write(f"**제조사:** {item.get('maker')}")
-                                                    if item.get('brand'): st.write(f"**브랜드:** {item.get('brand')}")
-                                            with meta_col2:
-                                                if item.get('link'): st.markdown(f"**링크:** [원본 보기]({item.get('link')})")
-                                                if active_source_type == "쇼핑":
-                                                    if item.get('lprice'): st.write(f"**최저가:** {item.get('lprice')}원")
-                                                    if item.get('mallName'): st.write(f"**판매처:** {item.get('mallName')}")
-                                    except Exception as e:
-                                        st.warning(f"항목 {i+1} 표시 중 오류: {str(e)}")
-                                        continue
-                            else: st.warning("표시할 수 있는 검색 결과가 없습니다.")
+                            if show_raw_results:
+                                st.markdown(f"## {active_source_type} 검색 결과 원본")
+                                render_search_results(results, active_source_type)
+                        else:
+                            st.warning(f"{active_source_type}에서 검색 결과가 없습니다. 새 데이터를 수집하거나 다른 검색어를 시도해보세요.")
+                            st.info("💡 팁: 유사도 임계값을 더 낮추거나, 다른 검색어로 시도해보세요.")
+                    except Exception as e:
+                        st.error(f"검색 중 오류가 발생했습니다: {str(e)}")
+        
+            else: # 새 데이터 수집 및 저장 모드 - 작업 큐에 등록하고 바로 돌아옴
+                try:
+                    job_kind = "refresh" if refresh_only else "collect"
+                    if search_service is not None:
+                        job, created = search_service.ingest(job_kind, active_source_type, query_to_use_in_search, result_count)
                     else:
-                        st.warning(f"네이버 {active_source_type}에서 검색 결과가 없습니다. 다른 검색어나 다른 소스 타입으로 시도해보세요.")
+                        job, created = job_queue.enqueue(
+                            job_kind, job_params(active_source_type, query_to_use_in_search, result_count),
+                            dedup_key=collect_dedup_key(active_source_type, query_to_use_in_search, job_kind))
+                    if created:
+                        st.success(f"수집 작업 #{job['id']}을 등록했습니다. 다른 화면으로 이동해도 작업은 계속됩니다.")
+                        if job_workers is not None:
+                            job_workers.wake()
+                    else:
+                        st.info(f"같은 검색어의 수집 작업 #{job['id']}이 이미 진행 중입니다. 그 작업의 결과를 함께 사용합니다.")
                 except Exception as e:
-                    st.error(f"검색 중 오류가 발생했습니다: {str(e)}")
-                    import traceback
-                    st.error(f"상세 오류: {traceback.format_exc()}")
-    else:
-        st.warning("질문을 입력하세요.")
+                    st.error(f"수집 작업 등록 중 오류가 발생했습니다: {str(e)}")
+        else:
+            st.warning("질문을 입력하세요.")
 
-# 데이터베이스 상태
-st.sidebar.title("데이터베이스 상태")
-try:
-    result = supabase.table('documents').select('id', count='exact').execute()
-    doc_count = result.count if hasattr(result, 'count') else len(result.data)
-    st.sidebar.info(f"저장된 총 문서 수: {doc_count}개")
-    try:
-        collections = {}
-        collection_query = supabase.table('documents').select('metadata').execute()
-        for item in collection_query.data:
-            metadata = item.get('metadata', {})
-            if isinstance(metadata, str):
-                try: metadata = json.loads(metadata)
-                except: continue
-            collection = metadata.get('collection', '기타')
-            if collection in collections: collections[collection] += 1
-            else: collections[collection] = 1
-        for collection, count in collections.items():
-            st.sidebar.info(f"{collection} 문서 수: {count}개")
-    except Exception as e:
-        st.sidebar.warning(f"소스별 통계 조회 실패: {str(e)}")
-except Exception as e:
-    st.sidebar.error(f"데이터베이스 상태를 확인할 수 없습니다: {str(e)}")
+    # 수집 작업 상태
+    if search_mode == "새 데이터 수집 및 저장":
+        st.markdown("### 수집 작업")
+        render_job_status()
+        st.caption("수집이 끝나면 '시맨틱 검색' 모드에서 새 데이터로 검색할 수 있습니다.")
 
-# 뉴스 데이터 샘플 확인 버튼 추가
-if st.sidebar.button("뉴스 데이터 샘플 확인"):
+    # 데이터베이스 상태
+    st.sidebar.title("데이터베이스 상태")
     try:
-        with st.spinner("뉴스 데이터 조회 중..."):
-            news_sample = supabase.table('documents').select('*').eq('metadata->>collection', '뉴스').limit(5).execute()
-            if news_sample.data:
-                st.sidebar.write("### 저장된 뉴스 데이터 샘플")
-                for i, item in enumerate(news_sample.data):
-                    st.sidebar.write(f"**샘플 {i+1}:**")
-                    st.sidebar.write(f"내용: {item['content'][:100]}...")
-                    metadata = item.get('metadata', {})
-                    if isinstance(metadata, str):
-                        try: metadata = json.loads(metadata)
-                        except: metadata = {}
-                    st.sidebar.write(f"메타데이터: {metadata}")
-                    st.sidebar.write("---")
-            else:
-                st.sidebar.warning("저장된 뉴스 데이터가 없습니다.")
+        with span("db.count"), DB_SECONDS.time(op="count"):
+            doc_count = document_store.count()
+        st.sidebar.info(f"저장된 총 문서 수: {doc_count}개")
+        try:
+            with span("db.collections"), DB_SECONDS.time(op="collections"):
+                collections = document_store.count_by_collection(source_options)
+            for collection, count in collections.items():
+                st.sidebar.info(f"{collection} 문서 수: {count}개")
+        except Exception as e:
+            st.sidebar.warning(f"소스별 통계 조회 실패: {str(e)}")
     except Exception as e:
-        st.sidebar.error(f"뉴스 데이터 조회 실패: {str(e)}")
+        st.sidebar.error(f"데이터베이스 상태를 확인할 수 없습니다: {str(e)}")
+
+    # 뉴스 데이터 샘플 확인 버튼 추가
+    if st.sidebar.button("뉴스 데이터 샘플 확인"):
+        try:
+            with st.spinner("뉴스 데이터 조회 중..."):
+                news_sample = document_store.sample('뉴스', limit=5)
+                if news_sample:
+                    st.sidebar.write("### 저장된 뉴스 데이터 샘플")
+                    for i, item in enumerate(news_sample):
+                        st.sidebar.write(f"**샘플 {i+1}:**")
+                        st.sidebar.write(f"내용: {item['content'][:100]}...")
+                        st.sidebar.write(f"메타데이터: {parse_metadata(item.get('metadata'))}")
+                        st.sidebar.write("---")
+                else:
+                    st.sidebar.warning("저장된 뉴스 데이터가 없습니다.")
+        except Exception as e:
+            st.sidebar.error(f"뉴스 데이터 조회 실패: {str(e)}")
 
-# 사용 안내
-st.sidebar.title("사용 안내")
-st.sidebar.info(f"""
+    # 사용 안내
+    st.sidebar.title("사용 안내")
+    st.sidebar.info(f"""
 **검색 모드:**
 1. **시맨틱 검색 (저장된 데이터)**: 이미 저장된 데이터를 의미 기반으로 검색합니다.
-2. **새 데이터 수집 및 저장**: 네이버 API에서 새 데이터를 가져와 저장하고 검색합니다.
+2. **새 데이터 수집 및 저장**: 네이버 API에서 새 데이터를 가져와 저장하는 작업을 백그라운드로 등록합니다.
 
 **검색 소스 선택:** 쇼핑, 블로그, 뉴스 중에서 검색할 소스를 선택하세요. 쇼핑이 기본입니다.
 
@@ -885,9 +1097,9 @@ st.sidebar.info(f"""
 - 뉴스: 전자담배 관련 규제, 건강 이슈, 정책 변화 등
 """)
 
-# 네이버 API 정보 및 문제해결
-st.sidebar.title("네이버 API 정보")
-st.sidebar.info("""
+    # 네이버 API 정보 및 문제해결
+    st.sidebar.title("네이버 API 정보")
+    st.sidebar.info("""
 **API 상태:**
 - Client ID: 9XhhxLV1IzDpTZagoBr1
 - 데이터 출처: 네이버 검색 API
@@ -898,17 +1110,58 @@ st.sidebar.info("""
 - 다른 소스 타입으로 시도해보세요
 """)
 
-# 추가 디버깅 정보 (개발용)
-st.sidebar.title("디버깅 정보")
-if st.sidebar.checkbox("디버깅 모드", value=False):
-    st.sidebar.write(f"현재 검색 모드: {search_mode}")
-    st.sidebar.write(f"선택된 소스: {active_source_type}") # st.session_state.current_source_type
-    st.sidebar.write(f"현재 쿼리: {query_to_use_in_search}") # st.session_state.query_input
-    st.sidebar.write(f"사용 중인 임베딩 모델: jhgan/ko-sroberta-multitask")
+    # 추가 디버깅 정보 (개발용)
+    def render_trace_waterfall(trace_name, records):
+        """단계별 실행 시간을 워터폴 차트로 표시"""
+        import plotly.graph_objects as go
+    
+        total_ms = max(r['start_ms'] + r['duration_ms'] for r in records) - records[0]['start_ms']
+        st.markdown(f"**{trace_name}** — 총 {total_ms:.0f}ms, 스팬 {len(records)}개")
+    
+        labels = [f"{r['name']} #{i+1}" for i, r in enumerate(records)]
+        fig = go.Figure(go.Bar(
+            y=labels,
+            x=[r['duration_ms'] for r in records],
+            base=[r['start_ms'] for r in records],
+            orientation='h',
+            hovertext=[json.dumps(r['attrs'], ensure_ascii=False, default=str) for r in records],
+        ))
+        fig.update_yaxes(autorange="reversed")
+        fig.update_layout(xaxis_title="ms", height=max(250, 22 * len(records)), margin=dict(l=10, r=10, t=10, b=10))
+        st.plotly_chart(fig, use_container_width=True)
     
-    st.sidebar.write("**API 키 상태:**")
-    st.sidebar.write(f"- Supabase URL: {'✅' if supabase_url else '❌'}")
-    st.sidebar.write(f"- Supabase Key: {'✅' if supabase_key else '❌'}")
-    st.sidebar.write(f"- OpenAI Key: {'✅' if openai_api_key else '❌'}")
-    st.sidebar.write(f"- Naver Client ID: {'✅' if NAVER_CLIENT_ID else '❌'}")
-    st.sidebar.write(f"- Naver Client Secret: {'✅' if NAVER_CLIENT_SECRET else '❌'}")
+        # 단계별 합계
+        summary = {}
+        for r in records:
+            stage = summary.setdefault(r['name'], {'단계': r['name'], '횟수': 0, '합계(ms)': 0.0, '최대(ms)': 0.0})
+            stage['횟수'] += 1
+            stage['합계(ms)'] += r['duration_ms']
+            stage['최대(ms)'] = max(stage['최대(ms)'], r['duration_ms'])
+        st.dataframe(pd.DataFrame(sorted(summary.values(), key=lambda x: -x['합계(ms)'])), use_container_width=True)
+
+    st.sidebar.title("디버깅 정보")
+    if st.sidebar.checkbox("디버깅 모드", value=False, key="debug_mode",
+                           help=f"켜면 다음 실행부터 단계별 실행 시간을 기록하고 {TRACE_EXPORT_PATH} 파일로 내보냅니다."):
+        st.sidebar.write(f"현재 검색 모드: {search_mode}")
+        st.sidebar.write(f"선택된 소스: {active_source_type}")
+        st.sidebar.write(f"현재 쿼리: {query_to_use_in_search}")
+        st.sidebar.write(f"사용 중인 임베딩 모델: {embedding_model_name}")
+
+        st.sidebar.write("**API 키 상태:**")
+        st.sidebar.write(f"- Supabase URL: {'✅' if supabase_url else '❌'}")
+        st.sidebar.write(f"- Supabase Key: {'✅' if supabase_key else '❌'}")
+        st.sidebar.write(f"- OpenAI Key: {'✅' if openai_api_key else '❌'}")
+        st.sidebar.write(f"- Naver Client ID: {'✅' if NAVER_CLIENT_ID else '❌'}")
+        st.sidebar.write(f"- Naver Client Secret: {'✅' if NAVER_CLIENT_SECRET else '❌'}")
+finally:
+    # st.stop()이나 예외로 중간에 끝나도 트레이스를 종료하고 내보냄
+    finished_trace = finish_trace()
+    if finished_trace is not None and finished_trace.records():
+        # 검색 실행의 트레이스는 다음 실행에서도 볼 수 있도록 보관
+        if finished_trace.name != "total.py 실행" or "debug_last_trace" not in st.session_state:
+            st.session_state.debug_last_trace = (finished_trace.name, finished_trace.records())
+
+if debug_mode and "debug_last_trace" in st.session_state:
+    with st.expander("🔍 디버깅: 단계별 실행 시간", expanded=True):
+        render_trace_waterfall(*st.session_state.debug_last_trace)
+        st.caption(f"스팬 기록 파일: {TRACE_EXPORT_PATH}")
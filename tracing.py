@@ -0,0 +1,156 @@
+# -*- coding: utf-8 -*-
+"""파이프라인 단계별 실행 시간 측정 (가벼운 트레이싱)
+
+사용 예:
+    trace = start_trace("검색 요청", enabled=debug_mode)
+    with span("naver.fetch", endpoint="blog"):
+        ...
+    finish_trace()
+
+트레이스가 시작되지 않았으면 span()은 아무 일도 하지 않는 공용 객체를 돌려주므로
+비활성화 상태의 비용은 ContextVar 조회 한 번뿐입니다.
+"""
+import contextvars
+import json
+import os
+import threading
+import time
+import uuid
+from datetime import datetime
+
+# 스팬을 JSONL로 내보낼 기본 경로 (오프라인 분석용)
+TRACE_EXPORT_PATH = os.environ.get("TRACE_EXPORT_PATH", "traces.jsonl")
+
+_current_trace = contextvars.ContextVar("current_trace", default=None)
+_current_span = contextvars.ContextVar("current_span", default=None)
+_export_lock = threading.Lock()
+
+class _NoopSpan:
+    """트레이싱 비활성화 시 사용되는 빈 스팬"""
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+    def set(self, **attrs):
+        pass
+
+_NOOP_SPAN = _NoopSpan()
+
+class Span:
+    """하나의 파이프라인 단계 (시작/종료 시간과 속성 기록)"""
+    __slots__ = ("trace", "name", "attrs", "span_id", "parent_id", "start", "end", "_token")
+
+    def __init__(self, trace, name, attrs):
+        self.trace = trace
+        self.name = name
+        self.attrs = attrs
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = None
+        self.start = None
+        self.end = None
+        self._token = None
+
+    def __enter__(self):
+        parent = _current_span.get()
+        self.parent_id = parent.span_id if parent is not None else None
+        self._token = _current_span.set(self)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.end = time.perf_counter()
+        _current_span.reset(self._token)
+        if exc_type is not None:
+            self.attrs["error"] = f"{exc_type.__name__}: {exc}"
+        self.trace.record(self)
+        return False
+
+    def set(self, **attrs):
+        """스팬에 속성 추가 (결과 수, 상태 코드 등)"""
+        self.attrs.update(attrs)
+
+class Trace:
+    """한 번의 요청에서 수집된 스팬 모음"""
+
+    def __init__(self, name, export_path=None):
+        self.trace_id = uuid.uuid4().hex
+        self.name = name
+        self.started_at = datetime.now().isoformat()
+        self.origin = time.perf_counter()
+        self.export_path = export_path or TRACE_EXPORT_PATH
+        self.spans = []
+        self._lock = threading.Lock()  # 작업 스레드에서 기록되는 스팬 보호
+
+    def record(self, span):
+        record = {
+            "trace_id": self.trace_id,
+            "trace_name": self.name,
+            "started_at": self.started_at,
+            "span_id": span.span_id,
+            "parent_id": span.parent_id,
+            "name": span.name,
+            "start_ms": round((span.start - self.origin) * 1000, 3),
+            "duration_ms": round((span.end - span.start) * 1000, 3),
+            "thread": threading.current_thread().name,
+            "attrs": span.attrs,
+        }
+        with self._lock:
+            self.spans.append(record)
+
+    def records(self):
+        """시작 시간 순으로 정렬된 스팬 목록"""
+        with self._lock:
+            return sorted(self.spans, key=lambda s: s["start_ms"])
+
+    def total_ms(self):
+        records = self.records()
+        if not records:
+            return 0.0
+        return max(s["start_ms"] + s["duration_ms"] for s in records) - records[0]["start_ms"]
+
+    def export_jsonl(self, path=None):
+        """스팬을 JSONL 파일에 추가 (한 줄에 스팬 하나)"""
+        path = path or self.export_path
+        records = self.records()
+        if not path or not records:
+            return
+        with _export_lock:
+            with open(path, "a", encoding="utf-8") as f:
+                for record in records:
+                    f.write(json.dumps(record, ensure_ascii=False, default=str) + "\n")
+
+def start_trace(name, enabled=True, export_path=None):
+    """현재 실행 컨텍스트에서 새 트레이스 시작 (비활성화면 None)"""
+    if not enabled:
+        _current_trace.set(None)
+        return None
+    trace = Trace(name, export_path)
+    _current_trace.set(trace)
+    return trace
+
+def current_trace():
+    return _current_trace.get()
+
+def finish_trace(export=True):
+    """현재 트레이스를 종료하고 JSONL로 내보내기"""
+    trace = _current_trace.get()
+    if trace is None:
+        return None
+    _current_trace.set(None)
+    if export:
+        try:
+            trace.export_jsonl()
+        except OSError:
+            pass  # 내보내기 실패가 앱 동작을 막지 않도록
+    return trace
+
+def span(name, **attrs):
+    """파이프라인 단계 측정용 컨텍스트 매니저"""
+    trace = _current_trace.get()
+    if trace is None:
+        return _NOOP_SPAN
+    return Span(trace, name, attrs)
@@ -0,0 +1,167 @@
+# -*- coding: utf-8 -*-
+"""자주 쓰는 질문의 검색 결과/답변 미리 계산 (코퍼스 버전별 저장)
+
+- QueryLog: 사용자가 실행한 질문을 JSONL로 기록하고 많이 나온 질문을 뽑음
+- AnswerStore: (코퍼스 버전, 질문 키) → 검색 결과 + 답변 (SQLite)
+- corpus_version: 가장 큰 문서 id + 임베딩 버전 - 새 문서가 들어오거나 재임베딩하면 바뀌므로
+  예전 버전의 답변은 자동으로 쓰이지 않음
+
+total.py가 배포(시작) 시와 코퍼스 버전이 바뀔 때(수집 후) 백그라운드에서 warm()을 실행합니다.
+"""
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import Counter
+
+logger = logging.getLogger(__name__)
+
+WARMUP_DB_PATH = os.environ.get("WARMUP_DB", "warmup.sqlite3")
+QUERY_LOG_PATH = os.environ.get("QUERY_LOG", "query_log.jsonl")
+WARMUP_TOP_QUERIES = int(os.environ.get("WARMUP_TOP_QUERIES", "20"))
+WARMUP_CHECK_SECONDS = float(os.environ.get("WARMUP_CHECK_SECONDS", "300"))
+
+class QueryLog:
+    """질문 기록 (한 줄에 하나: {"ts", "source_type", "query"})"""
+
+    def __init__(self, path=QUERY_LOG_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def append(self, source_type, query):
+        if not self.path or not query:
+            return
+        line = json.dumps({"ts": int(time.time()), "source_type": source_type, "query": query.strip()}, ensure_ascii=False)
+        with self._lock, open(self.path, "a", encoding="utf-8") as f:
+            f.write(line + "\n")
+
+    def top(self, limit=WARMUP_TOP_QUERIES, since_days=30):
+        """최근 since_days일 동안 많이 나온 (소스 타입, 질문) 목록"""
+        if not self.path or not os.path.exists(self.path):
+            return []
+        since = time.time() - since_days * 86400
+        counts = Counter()
+        with open(self.path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue
+                if entry.get("ts", 0) >= since and entry.get("query"):
+                    counts[(entry.get("source_type"), entry["query"])] += 1
+        return [key for key, _ in counts.most_common(limit)]
+
+def stored_answer_key(source_type, query, **params):
+    """저장 키 (같은 질문이라도 검색 조건이 다르면 다른 키)"""
+    return json.dumps([source_type, query.strip(), sorted(params.items())], ensure_ascii=False, default=str)
+
+class AnswerStore:
+    """코퍼스 버전별 검색 결과 + 답변 저장소"""
+
+    def __init__(self, path=WARMUP_DB_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("""CREATE TABLE IF NOT EXISTS answers (
+            version TEXT NOT NULL, key TEXT NOT NULL, results TEXT NOT NULL, answer TEXT,
+            created_at REAL NOT NULL, PRIMARY KEY (version, key))""")
+        self._conn.commit()
+
+    def get(self, version, key):
+        """(검색 결과, 답변) 또는 None"""
+        with self._lock:
+            row = self._conn.execute("SELECT results, answer FROM answers WHERE version = ? AND key = ?",
+                                     (version, key)).fetchone()
+        return (json.loads(row[0]), row[1]) if row else None
+
+    def put(self, version, key, results, answer):
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO answers VALUES (?, ?, ?, ?, ?)",
+                               (version, key, json.dumps(results, ensure_ascii=False, default=str), answer, time.time()))
+            self._conn.commit()
+
+    def prune(self, keep_version):
+        """다른 코퍼스 버전의 답변 삭제 - 삭제한 행 수"""
+        with self._lock:
+            deleted = self._conn.execute("DELETE FROM answers WHERE version != ?", (keep_version,)).rowcount
+            self._conn.commit()
+        return deleted
+
+    def count(self, version=None):
+        with self._lock:
+            if version is None:
+                return self._conn.execute("SELECT COUNT(*) FROM answers").fetchone()[0]
+            return self._conn.execute("SELECT COUNT(*) FROM answers WHERE version = ?", (version,)).fetchone()[0]
+
+def corpus_version(store, embedding_version):
+    """현재 코퍼스 버전 (가장 큰 문서 id + 임베딩 버전)"""
+    return f"{store.max_id()}|{embedding_version}"
+
+def warm(store, version, jobs, compute, stop_event=None):
+    """jobs [(key, 인자 dict)] 중 저장되지 않은 것만 compute(**인자) → (결과, 답변)로 계산해 저장"""
+    stats = {"version": version, "jobs": len(jobs), "computed": 0, "cached": 0, "empty": 0, "errors": 0}
+    for key, kwargs in jobs:
+        if stop_event is not None and stop_event.is_set():
+            break
+        if store.get(version, key) is not None:
+            stats["cached"] += 1
+            continue
+        try:
+            results, answer = compute(**kwargs)
+        except Exception as e:
+            logger.warning("warm-up 계산 실패 (%s): %s", key, e)
+            stats["errors"] += 1
+            continue
+        if not results:
+            stats["empty"] += 1
+            continue
+        store.put(version, key, results, answer)
+        stats["computed"] += 1
+    return stats
+
+class WarmupWorker:
+    """코퍼스 버전을 주기적으로 확인해 바뀌면(또는 wake() 호출 시) warm-up 실행하는 백그라운드 스레드"""
+
+    def __init__(self, store, get_version, get_jobs, compute, interval=WARMUP_CHECK_SECONDS):
+        self.store = store
+        self.get_version = get_version
+        self.get_jobs = get_jobs
+        self.compute = compute
+        self.interval = interval
+        self.warmed_version = None
+        self.last_stats = None
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="answer-warmup", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def wake(self):
+        """새 문서를 저장한 직후 등 - 다음 주기를 기다리지 않고 확인"""
+        self._wake.set()
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+
+    def run_once(self):
+        version = self.get_version()
+        if version == self.warmed_version:
+            return None
+        self.last_stats = warm(self.store, version, self.get_jobs(), self.compute, self._stop)
+        self.store.prune(version)
+        self.warmed_version = version
+        return self.last_stats
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.run_once()
+            except Exception as e:
+                logger.warning("답변 warm-up 실패 (다음 주기에 다시 시도): %s", e)
+            self._wake.wait(self.interval)
+            self._wake.clear()